@@ -7,54 +7,88 @@ import uuid
 import os
 import secrets
 from datetime import datetime, timedelta
-import jwt 
 import random
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from flask import request
+from werkzeug.datastructures import MultiDict
 from werkzeug.utils import secure_filename
 from functools import wraps
 import logging
-from logging.handlers import RotatingFileHandler
-from flask import Flask, request, jsonify, session, send_from_directory
+from flask import Flask, request, jsonify, session, send_from_directory, g
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
 from flask import render_template
 from werkzeug.middleware.proxy_fix import ProxyFix
+from db_pool import ConnectionPool, PoolTimeout
+from metrics import Metrics, gauge_lines
+from structured_logging import configure_logging, parse_levels, parse_rates
+from cache import ProductListingCache, ResponseCache, create_cache
+from http_validators import CatalogWatermark, live_epoch, make_etag, validators
+from search import search_clause
+from sessions import ProfileCache, ServerSessionInterface
+import auth_tokens
+from auth_tokens import AccessTokens, BearerSessionInterface, RefreshTokenSweeper, TokenError, TokenKeys
+import facets
+from facets import FacetIndex
+from fieldsets import Fieldset
+from pagination import InvalidCursor, Keyset, page_limit
+from view_counter import ViewCountBuffer
+from audit_log import AuditLog
+import seller_stats
+from seller_stats import SellerStatsReconciler
+import reservations
+from reservations import ReservationSweeper
+from media_derivatives import DerivativePipeline, register_product_images
+import product_documents
+from product_documents import DocumentRefresher, image_urls
+import media_store as blobs
+from media_store import MediaGarbageCollector, MediaStore
+import chunked_uploads as uploads
+from chunked_uploads import ChunkError, ChunkStore, UploadSessionSweeper
+from password_hashing import HasherBusy, PasswordHasher
+from static_assets import AssetCache, file_etag, is_immutable_upload, negotiate
+from json_provider import FastJSONProvider
 
 # Initialize Flask app
 app = Flask(__name__)
 
 app.config['DEBUG'] = True
 
+# JSON encoding: 'fast' (orjson, see json_provider.py) or 'default' (Flask's encoder)
+app.config['JSON_PROVIDER'] = os.getenv('JSON_PROVIDER', 'fast')
+app.config['JSON_DATETIME_FORMAT'] = os.getenv('JSON_DATETIME_FORMAT', 'http')  # 'http' as before, or 'iso'
+
+if app.config['JSON_PROVIDER'] == 'fast':
+    app.json = FastJSONProvider(app)
+    app.json.datetime_format = app.config['JSON_DATETIME_FORMAT']
+
 app.wsgi_app = ProxyFix(
     app.wsgi_app,
     x_proto=1,
     x_host=1
 )
 
-#Secure session and JWT configuratuion
+#Secure session configuratuion
 app.config.update(
     SECRET_KEY='your-super-secret-key', # Replace with a secure key
     SESSION_COOKIE_SECURE=False,
     SESSION_COOKIE_HTTPONLY=True,
     SESSION_COOKIE_SAMESITE='Lax',
-    SESSION_TYPE='filesystem',
     PERMANENT_SESSION_LIFETIME=timedelta(hours=24)
 )
 
-#JWT token generator
-def generate_token(user_id, email):
-    payload = {
-        'user_id': user_id,
-        'email': email,
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=2)
-    }
-    token = jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
-    return token
+# Rendered index.html and the JS bundles, kept in memory with gzip/brotli encodings
+static_asset_cache = AssetCache()
 
 #Homepage route
 @app.route('/')
 def home():
-    return render_template("index.html")
+    template = os.path.join(app.root_path, app.template_folder, 'index.html')
+    asset = static_asset_cache.rendered('index.html', os.path.getmtime(template),
+                                        lambda: render_template("index.html"))
+    return compressed_response(asset, 'text/html', app.config['STATIC_ASSET_MAX_AGE'])
 
 CORS(app,supports_credentials=True)
 
@@ -64,6 +98,11 @@ app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'mov', 'avi', 'webm'}
 
+# Browser caching: content-addressed uploads never change; everything else revalidates via ETag
+app.config['IMMUTABLE_MAX_AGE'] = int(os.getenv('IMMUTABLE_MAX_AGE', 365 * 86400))  # seconds
+app.config['UPLOAD_MAX_AGE'] = int(os.getenv('UPLOAD_MAX_AGE', 3600))  # legacy uuid-named uploads
+app.config['STATIC_ASSET_MAX_AGE'] = int(os.getenv('STATIC_ASSET_MAX_AGE', 0))  # 0 = always revalidate
+
 # Email configuration
 app.config['MAIL_SERVER'] = 'smtp.gmail.com'
 app.config['MAIL_PORT'] = 587
@@ -74,40 +113,497 @@ mail = Mail(app)
 
 # Database configuration
 db_config = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '@Khizo14251',
-    'database': 'thriftshop_sa',
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'user': os.getenv('DB_USER', 'root'),
+    'password': os.getenv('DB_PASSWORD', '@Khizo14251'),
+    'database': os.getenv('DB_NAME', 'thriftshop_sa'),
 #    'auth_plugin': 'mysql_native_password'
 }
 
-# Setup logging
+# Setup logging: JSON lines through a queue handler, so file I/O happens on a listener thread
+app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'INFO')
+app.config['LOG_LEVELS'] = parse_levels(os.getenv('LOG_LEVELS', 'werkzeug=WARNING'))  # per logger ('app' = app.logger)
+app.config['LOG_SAMPLE_RATES'] = parse_rates(os.getenv('LOG_SAMPLE_RATES', ''))  # keep share of sub-WARNING records
+app.config['LOG_FORMAT'] = os.getenv('LOG_FORMAT', 'json')  # 'json' or 'text'
+app.config['LOG_FILE'] = os.getenv('LOG_FILE', 'logs/mzansi_thrift.log')  # empty for console only
+app.config['LOG_MAX_BYTES'] = int(os.getenv('LOG_MAX_BYTES', 20_000_000))
+app.config['LOG_BACKUP_COUNT'] = int(os.getenv('LOG_BACKUP_COUNT', 10))
+
 def configure_log():
-    if not os.path.exists('logs'):
-        os.mkdir('logs')
-        file_handler = RotatingFileHandler('logs/mzansi_thrift.log', maxBytes=1_000_000, backupCount=5,delay=True)
-        file_handler.setFormatter(logging.Formatter(
-            "%(asctime)s %(levelname)s %(message)s in %(pathname)s: %(lineno)s"
-))
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
-        app.logger.setLevel(logging.INFO)
-        app.logger.info('Mzansi Thrift Store startup')
-    
+    if app.config['LOG_FILE']:
+        os.makedirs(os.path.dirname(app.config['LOG_FILE']) or '.', exist_ok=True)
+    listener = configure_logging(
+        app,
+        level=app.config['LOG_LEVEL'],
+        logger_levels=app.config['LOG_LEVELS'],
+        sample_rates=app.config['LOG_SAMPLE_RATES'],
+        log_file=app.config['LOG_FILE'] or None,
+        max_bytes=app.config['LOG_MAX_BYTES'],
+        backup_count=app.config['LOG_BACKUP_COUNT'],
+        json_format=app.config['LOG_FORMAT'] == 'json'
+    )
+    atexit.register(listener.stop)
+    app.logger.info('Mzansi Thrift Store startup')
+
 configure_log()
 
+# Request/query metrics served at /api/metrics
+app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+app.config['METRICS_QUERY_SAMPLE_RATE'] = float(os.getenv('METRICS_QUERY_SAMPLE_RATE', 0.1))
+app.config['SLOW_QUERY_THRESHOLD_MS'] = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200))  # 0 disables
+
+metrics = Metrics(
+    query_sample_rate=app.config['METRICS_QUERY_SAMPLE_RATE'],
+    slow_query_threshold=app.config['SLOW_QUERY_THRESHOLD_MS'] / 1000
+)
+
+# Connection pool configuration
+app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 10))
+app.config['DB_POOL_MAX_IDLE'] = int(os.getenv('DB_POOL_MAX_IDLE', 300))  # seconds
+app.config['DB_POOL_MAX_LIFETIME'] = int(os.getenv('DB_POOL_MAX_LIFETIME', 3600))  # seconds
+app.config['DB_POOL_WAIT_TIMEOUT'] = float(os.getenv('DB_POOL_WAIT_TIMEOUT', 5))  # seconds
+
+db_pool = ConnectionPool(
+    db_config,
+    name='thriftshop_sa',
+    size=app.config['DB_POOL_SIZE'],
+    max_idle=app.config['DB_POOL_MAX_IDLE'],
+    max_lifetime=app.config['DB_POOL_MAX_LIFETIME'],
+    wait_timeout=app.config['DB_POOL_WAIT_TIMEOUT'],
+    cursor_wrapper=metrics.instrument if app.config['METRICS_ENABLED'] else None,
+    wait_observer=metrics.observe_connection_wait if app.config['METRICS_ENABLED'] else None
+)
+atexit.register(db_pool.close_all)
+
+# Product listing cache configuration ('local' per worker, or 'redis' shared across workers)
+app.config['CACHE_BACKEND'] = os.getenv('CACHE_BACKEND', 'local')
+app.config['CACHE_REDIS_URL'] = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+app.config['PRODUCT_CACHE_TTL'] = int(os.getenv('PRODUCT_CACHE_TTL', 60))  # seconds
+app.config['PRODUCT_CACHE_MAX_ENTRIES'] = int(os.getenv('PRODUCT_CACHE_MAX_ENTRIES', 1024))
+
+if app.config['CACHE_BACKEND'] == 'redis':
+    cache_backend = create_cache('redis', app.config['CACHE_REDIS_URL'],
+                                 default_ttl=app.config['PRODUCT_CACHE_TTL'])
+else:
+    cache_backend = create_cache('local', max_entries=app.config['PRODUCT_CACHE_MAX_ENTRIES'],
+                                 default_ttl=app.config['PRODUCT_CACHE_TTL'])
+product_cache = ProductListingCache(cache_backend, ttl=app.config['PRODUCT_CACHE_TTL'])
+
+# Conditional GETs for the catalog: ETag/Last-Modified from updated_at watermarks, bodies cached per URL
+app.config['CATALOG_WATERMARK_TTL'] = float(os.getenv('CATALOG_WATERMARK_TTL', 1))  # seconds
+app.config['RESPONSE_CACHE_TTL'] = int(os.getenv('RESPONSE_CACHE_TTL', 300))  # seconds
+# How far view/purchase counters in a validated response may trail; 0 revalidates them every request
+app.config['LIVE_FIELDS_MAX_AGE'] = int(os.getenv('LIVE_FIELDS_MAX_AGE', 60))  # seconds
+
+catalog_watermark = CatalogWatermark(db_pool.connection, ttl=app.config['CATALOG_WATERMARK_TTL'])
+response_cache = ResponseCache(cache_backend, ttl=app.config['RESPONSE_CACHE_TTL'])
+
+# Server-side sessions (sessions.py): 'redis' shared across workers, 'local' for a single worker process, or
+# 'cookie' for Flask's signed-cookie sessions (the default without REDIS_URL). Profiles are cached in a store
+# of the same kind, per session or, with cookie sessions, per account.
+app.config['SESSION_BACKEND'] = os.getenv('SESSION_BACKEND', 'redis' if os.getenv('REDIS_URL') else 'cookie')
+app.config['SESSION_REDIS_URL'] = os.getenv('SESSION_REDIS_URL',
+                                            os.getenv('REDIS_URL') or app.config['CACHE_REDIS_URL'])
+app.config['SESSION_MAX_ENTRIES'] = int(os.getenv('SESSION_MAX_ENTRIES', 100000))
+app.config['SESSION_REFRESH_AFTER'] = int(os.getenv('SESSION_REFRESH_AFTER', 60))  # seconds between expiry extensions
+app.config['PROFILE_CACHE_TTL'] = int(os.getenv('PROFILE_CACHE_TTL', 60))  # seconds
+app.config['PROFILE_CACHE_MAX_ENTRIES'] = int(os.getenv('PROFILE_CACHE_MAX_ENTRIES', 10000))
+
+if app.config['SESSION_BACKEND'] == 'redis':
+    session_backend = create_cache('redis', app.config['SESSION_REDIS_URL'])
+    profile_backend = create_cache('redis', app.config['SESSION_REDIS_URL'])
+else:
+    session_backend = create_cache('local', max_entries=app.config['SESSION_MAX_ENTRIES'])
+    profile_backend = create_cache('local', max_entries=app.config['PROFILE_CACHE_MAX_ENTRIES'])
+server_sessions = None
+if app.config['SESSION_BACKEND'] == 'local':
+    # Each worker would only know its own sessions, signing users out whenever another one answers
+    if int(os.getenv('WEB_CONCURRENCY', 1)) > 1:
+        raise RuntimeError("SESSION_BACKEND=local keeps sessions per process; use 'redis' or 'cookie' "
+                           "with WEB_CONCURRENCY > 1")
+    app.logger.warning('SESSION_BACKEND=local: sessions live in this process only. '
+                       'Run a single worker, or use SESSION_BACKEND=redis')
+if app.config['SESSION_BACKEND'] in ('local', 'redis'):
+    server_sessions = ServerSessionInterface(session_backend, refresh_after=app.config['SESSION_REFRESH_AFTER'])
+    app.session_interface = server_sessions
+profile_cache = ProfileCache(profile_backend, app.json.dumps, app.json.loads, ttl=app.config['PROFILE_CACHE_TTL'])
+
+def load_profile(kind, account_id):
+    """The signed-in buyer's ('user') or seller's profile row, from profile_cache when possible"""
+    def load():
+        with db_cursor() as (conn, cursor):
+            if kind == 'seller':
+                cursor.execute("""
+                               SELECT id, email, business_name, status, phone, rating, total_sales
+                               FROM sellers WHERE id = %s
+                               """, (account_id,))
+            else:
+                cursor.execute("""
+                               SELECT id, email, full_name, phone, address_line1, city, province
+                               FROM users WHERE id = %s
+                               """, (account_id,))
+            return cursor.fetchone()
+    return profile_cache.get_or_load(getattr(session, 'sid', None), kind, account_id, load)
+
+# Bearer tokens for API clients (auth_tokens.py). AUTH_TOKEN_KEYS is "kid:secret,..." with the signing key
+# first; without it tokens are signed with a key derived from SECRET_KEY.
+app.config['AUTH_TOKEN_KEYS'] = os.getenv('AUTH_TOKEN_KEYS', '')
+app.config['ACCESS_TOKEN_TTL'] = int(os.getenv('ACCESS_TOKEN_TTL', 900))  # seconds
+app.config['REFRESH_TOKEN_TTL'] = int(os.getenv('REFRESH_TOKEN_TTL', 30 * 86400))  # seconds
+app.config['REFRESH_TOKEN_SWEEP_INTERVAL'] = int(os.getenv('REFRESH_TOKEN_SWEEP_INTERVAL', 3600))  # seconds, 0 disables
+
+access_tokens = AccessTokens(TokenKeys.parse(app.config['AUTH_TOKEN_KEYS'], app.config['SECRET_KEY']),
+                             ttl=app.config['ACCESS_TOKEN_TTL'])
+# Requests with an Authorization: Bearer header get their session from the token
+app.session_interface = BearerSessionInterface(app.session_interface, access_tokens)
+refresh_token_sweeper = RefreshTokenSweeper(db_pool.connection, interval=app.config['REFRESH_TOKEN_SWEEP_INTERVAL'])
+refresh_token_sweeper.start()
+atexit.register(refresh_token_sweeper.stop)
+
+def request_audience():
+    """'member' for signed-in users and sellers, else 'anonymous'; responses are cached per audience"""
+    return 'member' if 'user_id' in session or 'seller_id' in session else 'anonymous'
+
+def not_modified(etag, last_modified):
+    """True when the client's copy is current (If-None-Match wins over If-Modified-Since)"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return bool(last_modified and since and last_modified <= since)
+
+def validated_response(body, etag, last_modified, audience):
+    """A JSON response carrying the validators; body None makes it a 304"""
+    response = app.response_class(body, status=200 if body is not None else 304, mimetype=app.json.mimetype)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Clients and shared caches must revalidate; only anonymous responses may be stored by shared caches
+    response.headers['Cache-Control'] = ('public' if audience == 'anonymous' else 'private') + ', no-cache'
+    response.vary.add('Cookie')
+    return response
+
+# Write-behind view counting: flush every N seconds or every M views
+app.config['VIEW_FLUSH_INTERVAL'] = float(os.getenv('VIEW_FLUSH_INTERVAL', 10))  # seconds
+app.config['VIEW_FLUSH_MAX_PENDING'] = int(os.getenv('VIEW_FLUSH_MAX_PENDING', 1000))
+app.config['VIEW_DEDUPE_WINDOW'] = int(os.getenv('VIEW_DEDUPE_WINDOW', 1800))  # seconds, 0 disables
+
+view_counter = ViewCountBuffer(
+    db_pool.connection,
+    flush_interval=app.config['VIEW_FLUSH_INTERVAL'],
+    max_pending=app.config['VIEW_FLUSH_MAX_PENDING'],
+    dedupe_window=app.config['VIEW_DEDUPE_WINDOW']
+)
+view_counter.start()
+atexit.register(view_counter.stop)
+
+def current_viewer():
+    """Stable per-visitor key used to collapse repeat product views"""
+    if not app.config['VIEW_DEDUPE_WINDOW']:
+        return None
+    if 'user_id' in session:
+        return f"user:{session['user_id']}"
+    if 'seller_id' in session:
+        return f"seller:{session['seller_id']}"
+    # Anonymous visitors get a plain cookie of their own: writing the id to the session would
+    # create a server-side session for every visitor who opens a product
+    viewer_id = request.cookies.get(VIEWER_COOKIE)
+    if not viewer_id or len(viewer_id) != 16:
+        viewer_id = g.new_viewer_id = secrets.token_hex(8)
+    return f"anon:{viewer_id}"
+
+VIEWER_COOKIE = 'viewer'
+
+@app.after_request
+def set_viewer_cookie(response):
+    viewer_id = g.pop('new_viewer_id', None)
+    if viewer_id:
+        response.set_cookie(VIEWER_COOKIE, viewer_id, max_age=app.config['VIEW_DEDUPE_WINDOW'], httponly=True,
+                            secure=app.config['SESSION_COOKIE_SECURE'], samesite='Lax')
+        # Shared caches must not hand this visitor's cookie to others
+        response.headers['Cache-Control'] = response.headers.get('Cache-Control', '').replace('public', 'private')
+    return response
+
+# activity_logs rows are queued and written in batches by a background thread
+app.config['AUDIT_FLUSH_INTERVAL'] = float(os.getenv('AUDIT_FLUSH_INTERVAL', 2))  # seconds
+app.config['AUDIT_BATCH_SIZE'] = int(os.getenv('AUDIT_BATCH_SIZE', 500))
+app.config['AUDIT_QUEUE_SIZE'] = int(os.getenv('AUDIT_QUEUE_SIZE', 10000))  # events held in memory
+app.config['AUDIT_OVERFLOW'] = os.getenv('AUDIT_OVERFLOW', 'drop')  # 'drop' or 'block' when the queue is full
+app.config['AUDIT_JOURNAL_DIR'] = os.getenv('AUDIT_JOURNAL_DIR', 'logs')  # spill file while MySQL is down
+
+audit_log = AuditLog(
+    db_pool.connection,
+    journal_dir=app.config['AUDIT_JOURNAL_DIR'],
+    flush_interval=app.config['AUDIT_FLUSH_INTERVAL'],
+    batch_size=app.config['AUDIT_BATCH_SIZE'],
+    max_queue=app.config['AUDIT_QUEUE_SIZE'],
+    overflow=app.config['AUDIT_OVERFLOW']
+)
+audit_log.start()
+atexit.register(audit_log.stop)
+
+def audit(action, resource_type=None, resource_id=None, description=None, metadata=None):
+    """Queue an activity_logs row for the current request's user or seller"""
+    user_id, user_type = session.get('user_id'), 'user'
+    if user_id is None and 'seller_id' in session:
+        # activity_logs.user_id references users, so sellers are identified in metadata
+        user_type = 'seller'
+        metadata = dict(metadata or {}, seller_id=session['seller_id'])
+    audit_log.record(action, user_id=user_id, user_type=user_type, resource_type=resource_type,
+                     resource_id=resource_id, description=description, metadata=metadata,
+                     ip_address=request.remote_addr, user_agent=request.user_agent.string)
+
+# Bulk seller_stats reconciliation, off the request path (0 disables the background job)
+app.config['SELLER_STATS_RECONCILE_INTERVAL'] = int(os.getenv('SELLER_STATS_RECONCILE_INTERVAL', 3600))  # seconds
+
+stats_reconciler = SellerStatsReconciler(db_pool.connection, interval=app.config['SELLER_STATS_RECONCILE_INTERVAL'])
+stats_reconciler.start()
+atexit.register(stats_reconciler.stop)
+
+# Cart stock holds: how long an add-to-cart reserves stock and how often expired holds are released
+app.config['RESERVATION_TTL'] = int(os.getenv('RESERVATION_TTL', 900))  # seconds
+app.config['RESERVATION_SWEEP_INTERVAL'] = int(os.getenv('RESERVATION_SWEEP_INTERVAL', 60))  # seconds
+
+# Content-addressed upload storage; unreferenced blobs are collected after a grace period
+app.config['MEDIA_GC_INTERVAL'] = int(os.getenv('MEDIA_GC_INTERVAL', 86400))  # seconds, 0 disables
+app.config['MEDIA_GC_GRACE_HOURS'] = float(os.getenv('MEDIA_GC_GRACE_HOURS', 24))
+
+media_store = MediaStore(app.config['UPLOAD_FOLDER'])
+media_gc = MediaGarbageCollector(db_pool.connection, media_store, interval=app.config['MEDIA_GC_INTERVAL'],
+                                 grace_hours=app.config['MEDIA_GC_GRACE_HOURS'])
+media_gc.start()
+atexit.register(media_gc.stop)
+
+# Resumable chunked uploads for large media; each request carries at most one chunk
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.getenv('UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024))  # bytes
+app.config['CHUNKED_UPLOAD_MAX_SIZE'] = int(os.getenv('CHUNKED_UPLOAD_MAX_SIZE', 500 * 1024 * 1024))  # bytes
+app.config['UPLOAD_SESSION_TTL'] = int(os.getenv('UPLOAD_SESSION_TTL', 86400))  # seconds since the last chunk
+app.config['UPLOAD_SESSION_SWEEP_INTERVAL'] = int(os.getenv('UPLOAD_SESSION_SWEEP_INTERVAL', 900))  # seconds
+
+chunk_store = ChunkStore(app.config['UPLOAD_FOLDER'])
+upload_sweeper = UploadSessionSweeper(db_pool.connection, chunk_store,
+                                      interval=app.config['UPLOAD_SESSION_SWEEP_INTERVAL'])
+upload_sweeper.start()
+atexit.register(upload_sweeper.stop)
+
+# Resized WebP/AVIF image derivatives, rendered in a process pool after upload
+app.config['MEDIA_DERIVATIVES_ENABLED'] = os.getenv('MEDIA_DERIVATIVES_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+app.config['MEDIA_DERIVATIVE_WORKERS'] = int(os.getenv('MEDIA_DERIVATIVE_WORKERS', 2))
+
+media_pipeline = DerivativePipeline(
+    db_pool.connection,
+    app.config['UPLOAD_FOLDER'],
+    max_workers=app.config['MEDIA_DERIVATIVE_WORKERS'],
+    on_complete=lambda product: derivatives_ready(product)
+)
+atexit.register(media_pipeline.shutdown)
+
+def schedule_derivatives(media):
+    """Queue derivatives for [(media_id, file_url)] image rows; call after commit"""
+    if app.config['MEDIA_DERIVATIVES_ENABLED']:
+        for media_id, file_url in media:
+            media_pipeline.schedule(media_id, file_url)
+
+def register_images(cursor, product_id, seller_id, urls):
+    """product_media rows (and blob references) for images listed on products.images"""
+    created = register_product_images(cursor, product_id, seller_id, urls)
+    for _, url in created:
+        blobs.add_reference(cursor, url)
+    return created
+
+def release_media(cursor, product_id, urls=None, media_type=None):
+    """
+    Delete a product's product_media rows (only those for `urls`/`media_type`
+    if given) and drop their blob references, in the caller's transaction
+    """
+    query = "SELECT id, file_url FROM product_media WHERE product_id = %s"
+    params = [product_id]
+    if media_type is not None:
+        query += " AND media_type = %s"
+        params.append(media_type)
+    if urls is not None:
+        if not urls:
+            return
+        query += f" AND file_url IN ({', '.join(['%s'] * len(urls))})"
+        params.extend(urls)
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    if not rows:
+        return
+    cursor.execute(f"DELETE FROM product_media WHERE id IN ({', '.join(['%s'] * len(rows))})",
+                   [row['id'] for row in rows])
+    for row in rows:
+        blobs.remove_reference(cursor, row['file_url'])
+
+# Keyset pagination page sizes for list endpoints
+app.config['PAGE_SIZE_DEFAULT'] = int(os.getenv('PAGE_SIZE_DEFAULT', 50))
+app.config['PAGE_SIZE_MAX'] = int(os.getenv('PAGE_SIZE_MAX', 100))
+
+# In-memory facet index (facets.py) for price/condition/size/color/brand filters and counts
+app.config['FACET_INDEX_INTERVAL'] = float(os.getenv('FACET_INDEX_INTERVAL', 5))  # seconds between syncs, 0 disables
+app.config['FACET_INDEX_REBUILD_INTERVAL'] = int(os.getenv('FACET_INDEX_REBUILD_INTERVAL', 600))  # seconds
+# Search matches handed to the index as ids; broader searches get their facet counts from MySQL
+app.config['FACET_SEARCH_IDS_MAX'] = int(os.getenv('FACET_SEARCH_IDS_MAX', 10000))
+
+facet_index = FacetIndex(db_pool.connection, interval=app.config['FACET_INDEX_INTERVAL'],
+                         rebuild_interval=app.config['FACET_INDEX_REBUILD_INTERVAL'])
+facet_index.start()
+atexit.register(facet_index.stop)
+
+def invalidate_product_listings(category_ids=(), seller_ids=()):
+    """Call after committing any write that changes what /api/products returns"""
+    product_cache.invalidate(category_ids=category_ids, seller_ids=seller_ids)
+    catalog_watermark.invalidate()
+    facet_index.poke()
+
+# Expired holds give stock back, which listings show as available_quantity
+reservation_sweeper = ReservationSweeper(db_pool.connection, interval=app.config['RESERVATION_SWEEP_INTERVAL'],
+                                         on_expired=invalidate_product_listings)
+reservation_sweeper.start()
+atexit.register(reservation_sweeper.stop)
+
+# Product read model (product_documents.py): ready-to-serve JSON per product
+app.config['PRODUCT_DOCUMENT_REFRESH_INTERVAL'] = int(os.getenv('PRODUCT_DOCUMENT_REFRESH_INTERVAL', 60))  # seconds
+
+# Stock, counters and updated_at are selected live next to the stored document
+LIVE_PRODUCT_COLUMNS = {
+    'stock_quantity': 'p.stock_quantity',
+    'reserved_quantity': 'p.reserved_quantity',
+    'view_count': 'p.view_count',
+    'purchase_count': 'p.purchase_count',
+    'wishlist_count': 'p.wishlist_count',
+    'updated_at': 'p.updated_at',
+    'available_quantity': 'GREATEST(0, p.stock_quantity - p.reserved_quantity)',
+}
+
+# ?fields= whitelists (fieldsets.py); listing views default to compact projections
+PRODUCT_COLUMNS = {**dict.fromkeys(product_documents.DOCUMENT_FIELDS), **LIVE_PRODUCT_COLUMNS}
+product_fields = Fieldset(PRODUCT_COLUMNS, default=product_documents.SUMMARY_FIELDS + ('available_quantity',))
+product_detail_fields = Fieldset({**PRODUCT_COLUMNS, 'seller_sales': 's.total_sales'})
+seller_product_fields = Fieldset(PRODUCT_COLUMNS, default=product_documents.SUMMARY_FIELDS + ('is_active',)
+                                 + tuple(LIVE_PRODUCT_COLUMNS))
+# Fields product_documents.summary can answer without the full document
+SUMMARY_COVERS = set(product_documents.SUMMARY_FIELDS) | LIVE_PRODUCT_COLUMNS.keys() | {'seller_sales'}
+
+ORDER_COLUMNS = {name: f'o.{name}' for name in (
+    'id', 'order_number', 'user_id', 'total_amount', 'shipping_fee', 'tax_amount', 'discount_amount',
+    'final_amount', 'status', 'shipping_address', 'billing_address', 'payment_method', 'payment_status',
+    'tracking_number', 'customer_notes', 'admin_notes', 'estimated_delivery', 'delivered_at', 'created_at',
+    'updated_at')}
+ORDER_SUMMARY = ('id', 'order_number', 'status', 'payment_status', 'final_amount', 'created_at')
+buyer_order_fields = Fieldset(
+    {**ORDER_COLUMNS, 'item_count': '(SELECT COUNT(*) FROM order_items WHERE order_id = o.id)'},
+    default=ORDER_SUMMARY + ('item_count',))
+# Sellers see one row per order item
+seller_order_fields = Fieldset(
+    {**ORDER_COLUMNS, 'order_item_id': 'oi.id', 'product_id': 'oi.product_id', 'quantity': 'oi.quantity',
+     'unit_price': 'oi.unit_price', 'item_status': 'oi.status', 'product_name': 'p.name',
+     'customer_name': 'u.full_name', 'customer_phone': 'u.phone'},
+    default=ORDER_SUMMARY + ('order_item_id', 'product_id', 'product_name', 'quantity', 'unit_price',
+                             'item_status', 'customer_name'))
+
+document_refresher = DocumentRefresher(
+    db_pool.connection,
+    lambda document: app.json.dumps(document),
+    interval=app.config['PRODUCT_DOCUMENT_REFRESH_INTERVAL'],
+    on_rebuilt=invalidate_product_listings
+)
+document_refresher.start()
+atexit.register(document_refresher.stop)
+
+def refresh_products(cursor, product_ids=(), seller_ids=()):
+    """
+    Rebuild the read-model documents of changed products inside the write's
+    transaction. Returns (category_ids, seller_ids) for invalidate_product_listings()
+    once committed.
+    """
+    documents = product_documents.refresh(cursor, app.json.dumps, product_ids, seller_ids)
+    return ([document['category_id'] for document in documents.values()],
+            [document['seller_id'] for document in documents.values()])
+
+def product_columns(fieldset, fields, extra=()):
+    """
+    (SELECT list, stored column) for product rows answering `fields`: p.id and
+    p.created_at, d.summary when it covers them (d.document otherwise), and
+    only the live columns asked for plus `extra`
+    """
+    stored = 'summary' if SUMMARY_COVERS.issuperset(fields) else 'document'
+    live = fieldset.select(fields, extra)
+    return f"p.id, p.created_at, d.{stored}" + (f", {live}" if live else ""), stored
+
+def product_responses(conn, cursor, rows, fields=None, stored='document'):
+    """Response documents for rows from product_columns(), cut down to `fields`"""
+    products, built = product_documents.merge(cursor, rows, app.json.dumps, column=stored)
+    if built:
+        conn.commit()
+    return Fieldset.project(products, fields) if fields is not None else products
+
+def derivatives_ready(product):
+    """DerivativePipeline callback: new image variants belong in the product's document"""
+    with db_cursor() as (conn, cursor):
+        refresh_products(cursor, [product['id']])
+        conn.commit()
+    invalidate_product_listings([product['category_id']], [product['seller_id']])
+
 def get_db_connection():
+    """Check a connection out of the pool; close() hands it back"""
     try:
-        return mysql.connector.connect(**db_config)
-           # auth_plugin='mysql_native_password'
-    except mysql.connector.Error as err:
-        print("DB ERROR:", err)
+        return db_pool.acquire()
+    except (PoolTimeout, mysql.connector.Error) as err:
         app.logger.error(f"Database connection error: {err}")
         return None
+
+class DatabaseUnavailable(Exception):
+    """Raised by db_cursor() when no pooled connection can be obtained"""
+
+@contextmanager
+def db_cursor(dictionary=True):
+    """Yield (conn, cursor) from the pool. Both are returned on every exit path."""
+    try:
+        conn = db_pool.acquire()
+    except (PoolTimeout, mysql.connector.Error) as err:
+        app.logger.error(f"Database connection error: {err}")
+        raise DatabaseUnavailable(str(err)) from err
+
+    # Buffered, so the whole round trip is timed in execute() and rowcount is exact
+    cursor = conn.cursor(dictionary=dictionary, buffered=True)
+    try:
+        yield conn, cursor
+    finally:
+        cursor.close()
+        conn.close()
     
+
 # Bcrypt for password hashing
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))  # existing hashes are upgraded on login
 bcrypt = Bcrypt(app)
 
+# Hashing/verification runs in a bounded process pool; beyond the queue limit requests get a 503
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_MAX_QUEUE'] = int(os.getenv('PASSWORD_HASH_MAX_QUEUE', 32))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))  # seconds
+
+password_hasher = PasswordHasher(
+    rounds=app.config['BCRYPT_LOG_ROUNDS'],
+    max_workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_queue=app.config['PASSWORD_HASH_MAX_QUEUE'],
+    timeout=app.config['PASSWORD_HASH_TIMEOUT']
+)
+atexit.register(password_hasher.shutdown)
+
+def upgrade_password_hash(table, account_id, password, old_hash):
+    """Re-hash at the configured cost in the background; only replaces the hash that was just verified"""
+    if not password_hasher.needs_rehash(old_hash):
+        return
+
+    def store(new_hash):
+        with db_cursor() as (conn, cursor):
+            cursor.execute(f"UPDATE {table} SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                           (new_hash, account_id, old_hash))
+            conn.commit()
+        app.logger.info(f'Upgraded password hash for {table} {account_id} to cost {password_hasher.rounds}')
+
+    password_hasher.rehash_later(password, store)
+
 # Utility functions
 def allowed_file(filename, allowed_extensions):
     return '.' in filename and \
@@ -134,12 +630,56 @@ def calculate_shipping(province, weight=1):
     }
     return base_costs.get(province, 85.00) + (weight * 2.5)
 
-# Authentication decorators
+def decrement_stock(cursor, quantities):
+    """
+    Subtract {product_id: quantity} from stock (and add to purchase_count) in a
+    single UPDATE. Rows without enough unreserved stock are left alone, so the
+    result is False if any product is short and the caller should roll back.
+    Release the buyer's own holds first so they do not count against them.
+    """
+    ids = sorted(quantities)
+    cases = ' '.join('WHEN %s THEN %s' for _ in ids)
+    case_params = [v for product_id in ids for v in (product_id, quantities[product_id])]
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"""
+                   UPDATE products
+                   SET stock_quantity = stock_quantity - CASE id {cases} END,
+                       purchase_count = purchase_count + CASE id {cases} END,
+                       updated_at = updated_at
+                   WHERE id IN ({placeholders}) AND stock_quantity - reserved_quantity >= CASE id {cases} END
+                   """, case_params + case_params + ids + case_params)
+    return cursor.rowcount == len(ids)
+
+def restore_stock(cursor, quantities):
+    """Undo decrement_stock() for a cancelled order's {product_id: quantity}, in one UPDATE"""
+    ids = sorted(quantities)
+    if not ids:
+        return
+    cases = ' '.join('WHEN %s THEN %s' for _ in ids)
+    case_params = [v for product_id in ids for v in (product_id, quantities[product_id])]
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"""
+                   UPDATE products
+                   SET stock_quantity = stock_quantity + CASE id {cases} END,
+                       purchase_count = GREATEST(0, purchase_count - CASE id {cases} END),
+                       updated_at = updated_at
+                   WHERE id IN ({placeholders})
+                   """, case_params + case_params + ids)
+
+# Authentication decorators; a session cookie or a bearer access token both fill `session`
+def unauthorized(message):
+    """401 response; bearer-token clients are told what was wrong with their token"""
+    token_error = getattr(session, 'token_error', None)
+    if auth_tokens.bearer_token(request) is None:
+        return jsonify({'error': message}), 401
+    challenge = f'Bearer error="invalid_token", error_description="{token_error}"' if token_error else 'Bearer'
+    return jsonify({'error': token_error or message}), 401, {'WWW-Authenticate': challenge}
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session and 'seller_id' not in session:
-            return jsonify({'error': 'Authentication required'}), 401
+            return unauthorized('Authentication required')
         return f(*args, **kwargs)
     return decorated_function
 
@@ -147,7 +687,7 @@ def seller_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'seller_id' not in session:
-            return jsonify({'error': 'Seller authentication required'}), 401
+            return unauthorized('Seller authentication required')
         return f(*args, **kwargs)
     return decorated_function
 
@@ -155,7 +695,7 @@ def buyer_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
-            return jsonify({'error': 'Buyer authentication required'}), 401
+            return unauthorized('Buyer authentication required')
         return f(*args, **kwargs)
     return decorated_function
 
@@ -175,7 +715,7 @@ create_upload_dirs()
 def register():
     app.logger.info("🔥 /api/register HIT")
     data = request.get_json()
-    app.logger.info(f"📥 Incoming data: {request.get_json()}")
+    app.logger.debug('Incoming data', extra={'body': data})
     
     if not data:
         return jsonify({'error': 'Invalid or missing JSON body'}), 400
@@ -189,70 +729,55 @@ def register():
         return jsonify({'error': 'All fields are required'}), 400
     
     # Hash password and create user
-    password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
-        
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-    
-    try:
-        cursor = conn.cursor(dictionary=True)
+    password_hash = password_hasher.hash(password)
         
+    with db_cursor() as (conn, cursor):
+        try:
+            # Check if user is already registered
+            cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
+            if cursor.fetchone():
+                return jsonify({'error': 'Email already registered'}), 409
+
+            cursor.execute("""
+                INSERT INTO users (email, password_hash, full_name, phone)
+                VALUES (%s, %s, %s, %s)
+            """, (email, password_hash, full_name, phone))
         
-        # Check if user is already registered
-        cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
-        if cursor.fetchone():
-            return jsonify({'error': 'Email already registered'}), 409
-
-        cursor.execute("""
-            INSERT INTO users (email, password_hash, full_name, phone)
-            VALUES (%s, %s, %s, %s)
-        """, (email, password_hash, full_name, phone))
-        
-        conn.commit()
-        user_id = cursor.lastrowid
+            conn.commit()
+            user_id = cursor.lastrowid
         
-        # Create session for current user
-        session['user_id'] = user_id
-        session['user_name'] = full_name
-        session.permanent = True
+            # Create session for current user
+            session['user_id'] = user_id
+            session['user_name'] = full_name
+            session.permanent = True
         
-         # Log user activity
-        cursor.execute("""
-            INSERT INTO activity_logs (user_id, action, ip_address)
-            VALUES (%s, %s, %s)
-        """, (user_id, 'user_registered', request.remote_addr))
-        conn.commit()
+             # Log user activity
+            audit('user_registered', 'user', user_id)
         
-        app.logger.info(f'New user registered: {email}')
+            app.logger.info(f'New user registered: {email}')
         
-        # Return success response with current user's name
-        return jsonify({
-            "message": "Registration successful",
-            "current_user": full_name,
-            "user": {
-                "id": user_id,
-                "full_name": full_name,
-                "email": email,
-                "phone": phone
-            }
-        }), 201
-
-    except mysql.connector.Error as err:
-        #conn.rollback()
-        app.logger.error(f'Registration error: {err}')
-        return jsonify({'error': 'Database error occurred'}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+            # Return success response with current user's name
+            return jsonify({
+                "message": "Registration successful",
+                "current_user": full_name,
+                "user": {
+                    "id": user_id,
+                    "full_name": full_name,
+                    "email": email,
+                    "phone": phone
+                }
+            }), 201
+
+        except mysql.connector.Error as err:
+            #conn.rollback()
+            app.logger.error(f'Registration error: {err}')
+            return jsonify({'error': 'Database error occurred'}), 500
     
 @app.route('/api/login', methods=['POST'])
 def login():
     app.logger.info("🔥 /api/login HIT")
     data = request.get_json()
-    app.logger.info(f"📥 Incoming data: {request.get_json()}")
+    app.logger.debug('Incoming data', extra={'body': data})
     
     email = data.get('email')
     password = data.get('password')
@@ -261,21 +786,12 @@ def login():
     if not email or not password:
         return jsonify({'error': 'Missing email or password'}), 400
 
-    conn = get_db_connection()
-    
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-    
-    cursor = conn.cursor(dictionary=True)
-    
-    cursor.execute(
-        "SELECT id, full_name, email, password_hash, phone FROM users WHERE email = %s",
-        (email,)
-    )
-    user = cursor.fetchone()
-     
-    cursor.close()
-    conn.close()
+    with db_cursor() as (conn, cursor):
+        cursor.execute(
+            "SELECT id, full_name, email, password_hash, phone FROM users WHERE email = %s",
+            (email,)
+        )
+        user = cursor.fetchone()
 
 
      # VERIFY USER EXISTS IN DATABASE
@@ -283,8 +799,9 @@ def login():
         return jsonify({'error': 'Invalid email or password'}), 401
 
      # VERIFY PASSWORD
-    if not bcrypt.check_password_hash(user['password_hash'], password):
+    if not password_hasher.verify(password, user['password_hash']):
         return jsonify({'error': 'Invalid email or password'}), 401
+    upgrade_password_hash('users', user['id'], password, user['password_hash'])
         
         
      #Create session
@@ -305,61 +822,154 @@ def login():
 
 @app.route('/api/logout', methods=['POST'])
 def logout():
-    user_id = session.get('user_id') or session.get('seller_id')
-    if user_id:
-        # Log logout activity
-        conn = get_db_connection()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute("""
-                               INSERT INTO activity_logs (user_id, action, ip_address)
-                               VALUES (%s, %s, %s)
-                               """, (user_id, 'user_logout', request.remote_addr))
-                conn.commit()
-                cursor.close()
-            except Exception as e:
-                app.logger.error(f'Error logging logout activity: {e}')
-            finally:
-                conn.close()
+    if 'user_id' in session or 'seller_id' in session:
+        audit('user_logout')
 
+    profile_cache.forget(getattr(session, 'sid', None))
     session.clear()
     app.logger.info('User logged out')
     return jsonify({'message': 'Logout successful'})
 
-@app.route('/api/user')
+# Profile fields each account type may change through PUT /api/user
+PROFILE_UPDATE_FIELDS = {
+    'user': ('full_name', 'phone', 'address_line1', 'city', 'province'),
+    'seller': ('business_name', 'phone'),
+}
+
+# Bearer-token sign-in for API clients; browser clients keep using the session routes above
+def token_response(kind, account_id, refresh_token):
+    access_token, expires_in = access_tokens.issue(kind, account_id)
+    return {
+        'access_token': access_token,
+        'token_type': 'Bearer',
+        'expires_in': expires_in,
+        'refresh_token': refresh_token,
+        'refresh_expires_in': app.config['REFRESH_TOKEN_TTL'],
+        'user_type': 'seller' if kind == 'seller' else 'buyer',
+    }
+
+@app.route('/api/token', methods=['POST'])
+def issue_token():
+    data = request.get_json(silent=True) or {}
+    email = data.get('email')
+    password = data.get('password')
+    kind = 'seller' if data.get('user_type') == 'seller' else 'user'
+    if not email or not password:
+        return jsonify({'error': 'Missing email or password'}), 400
+
+    table = 'sellers' if kind == 'seller' else 'users'
+    with db_cursor() as (conn, cursor):
+        cursor.execute(f"SELECT id, password_hash FROM {table} WHERE email = %s", (email,))
+        account = cursor.fetchone()
+
+    if not account or not password_hasher.verify(password, account['password_hash']):
+        return jsonify({'error': 'Invalid email or password'}), 401
+    upgrade_password_hash(table, account['id'], password, account['password_hash'])
+
+    with db_cursor() as (conn, cursor):
+        refresh_token = auth_tokens.issue_refresh_token(cursor, kind, account['id'],
+                                                        app.config['REFRESH_TOKEN_TTL'])
+        conn.commit()
+    app.logger.info(f"Issued tokens for {kind} {account['id']}")
+    return jsonify(token_response(kind, account['id'], refresh_token)), 200
+
+@app.route('/api/token/refresh', methods=['POST'])
+def refresh_access_token():
+    data = request.get_json(silent=True) or {}
+    if not data.get('refresh_token'):
+        return jsonify({'error': 'Missing refresh_token'}), 400
+
+    with db_cursor() as (conn, cursor):
+        try:
+            kind, account_id, next_token = auth_tokens.rotate_refresh_token(
+                cursor, data['refresh_token'], app.config['REFRESH_TOKEN_TTL'])
+            cursor.execute(f"SELECT id FROM {'sellers' if kind == 'seller' else 'users'} WHERE id = %s",
+                           (account_id,))
+            if not cursor.fetchone():
+                auth_tokens.revoke_account(cursor, kind, account_id)
+                raise TokenError('Account no longer exists')
+            conn.commit()
+        except TokenError as e:
+            # A reused token has just had its family revoked; keep that
+            conn.commit()
+            return jsonify({'error': str(e)}), 401
+        except mysql.connector.Error as err:
+            conn.rollback()
+            app.logger.error(f'Token refresh error: {err}')
+            return jsonify({'error': 'Failed to refresh token'}), 500
+
+    return jsonify(token_response(kind, account_id, next_token)), 200
+
+@app.route('/api/token/revoke', methods=['POST'])
+def revoke_token():
+    data = request.get_json(silent=True) or {}
+    if not data.get('refresh_token'):
+        return jsonify({'error': 'Missing refresh_token'}), 400
+    with db_cursor() as (conn, cursor):
+        auth_tokens.revoke_refresh_token(cursor, data['refresh_token'])
+        conn.commit()
+    # Unknown tokens get the same answer, so this can't be used to probe for valid ones
+    return jsonify({'message': 'Token revoked'})
+
+@app.route('/api/user', methods=['GET', 'PUT'])
 @login_required
 def get_current_user():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
-    try:
-        cursor = conn.cursor(dictionary=True)
+    if 'seller_id' in session:
+        kind, account_id, user_type = 'seller', session['seller_id'], 'seller'
+    else:
+        kind, account_id, user_type = 'user', session['user_id'], 'buyer'
 
-        if 'seller_id' in session:
-            cursor.execute("""
-                           SELECT id, email, business_name, status, phone, rating, total_sales
-                           FROM sellers WHERE id = %s
-                           """, (session['seller_id'],))
-            user = cursor.fetchone()
-            user_type = 'seller'
-        else:
-            cursor.execute("""
-                           SELECT id, email, full_name, phone, address_line1, city, province
-                           FROM users WHERE id = %s
-                           """, (session['user_id'],))
-            user = cursor.fetchone()
-            user_type = 'buyer'
+    if request.method == 'PUT':
+        return update_profile(kind, account_id)
 
+    try:
+        user = load_profile(kind, account_id)
         return jsonify({'user': user, 'user_type': user_type})
 
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         app.logger.error(f'Error getting user: {e}')
         return jsonify({'error': 'Failed to get user data'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+def update_profile(kind, account_id):
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'Invalid or missing JSON body'}), 400
+    changes = {field: data[field] for field in PROFILE_UPDATE_FIELDS[kind] if field in data}
+    if not changes:
+        return jsonify({'error': f"Nothing to update; allowed fields: {', '.join(PROFILE_UPDATE_FIELDS[kind])}"}), 400
+    for field in ('full_name', 'business_name'):
+        if field in changes and not (changes[field] or '').strip():
+            return jsonify({'error': f'{field} cannot be empty'}), 400
+
+    table = 'sellers' if kind == 'seller' else 'users'
+    assignments = ', '.join(f'{field} = %s' for field in changes)
+    with db_cursor() as (conn, cursor):
+        try:
+            if 'business_name' in changes:
+                cursor.execute("SELECT id FROM sellers WHERE business_name = %s AND id != %s",
+                               (changes['business_name'], account_id))
+                if cursor.fetchone():
+                    return jsonify({'error': 'Business name already taken'}), 409
+
+            cursor.execute(f"UPDATE {table} SET {assignments} WHERE id = %s", (*changes.values(), account_id))
+            touched = ([], [])
+            if 'business_name' in changes:
+                # Product documents carry the seller's name
+                touched = refresh_products(cursor, seller_ids=[account_id])
+            conn.commit()
+
+        except mysql.connector.Error as err:
+            conn.rollback()
+            app.logger.error(f'Profile update error: {err}')
+            return jsonify({'error': 'Failed to update profile'}), 500
+
+    profile_cache.invalidate(kind, account_id)
+    if 'business_name' in changes:
+        invalidate_product_listings(*touched)
+    audit('profile_updated', table, account_id, metadata={'fields': list(changes)})
+    return jsonify({'user': load_profile(kind, account_id), 'user_type': 'seller' if kind == 'seller' else 'buyer'})
 
 # Seller Registration
 @app.route('/api/seller/register', methods=['POST'])
@@ -379,76 +989,63 @@ def seller_register():
     if not all([business_name, email, password, phone]):
         return jsonify({'error': 'Missing required fields'}), 400
 
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-    
     # Hash password and create user
-    password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
-    
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
+    password_hash = password_hasher.hash(password)
     
-    try:
-        cursor = conn.cursor(dictionary=True)
-
-        # Check if seller exists
-        cursor.execute("SELECT id FROM sellers WHERE email = %s OR business_name = %s",
-                       (email, business_name))
-        if cursor.fetchone():
-            return jsonify({'error': 'Seller already exists with this email or business name'}), 400
-
-        cursor.execute("""
-                       INSERT INTO sellers (email, password_hash, business_name, business_type, phone, status)
-                       VALUES (%s, %s, %s, %s, %s, 'pending')
-        """, (email, password_hash, business_name, business_type, phone))
+    with db_cursor() as (conn, cursor):
+        try:
+            # Check if seller exists
+            cursor.execute("SELECT id FROM sellers WHERE email = %s OR business_name = %s",
+                           (email, business_name))
+            if cursor.fetchone():
+                return jsonify({'error': 'Seller already exists with this email or business name'}), 400
+
+            cursor.execute("""
+                           INSERT INTO sellers (email, password_hash, business_name, business_type, phone, status)
+                           VALUES (%s, %s, %s, %s, %s, 'pending')
+            """, (email, password_hash, business_name, business_type, phone))
           
 
         
-        conn.commit()
-        seller_id = cursor.lastrowid
+            conn.commit()
+            seller_id = cursor.lastrowid
         
-        # Create session for current seller
-        session['seller_id'] = seller_id
-        session['business_name'] = business_name
-        session.permanent = True
+            # Create session for current seller
+            session['seller_id'] = seller_id
+            session['business_name'] = business_name
+            session.permanent = True
         
-        # Initialize seller stats
-        cursor.execute("""
-                       INSERT INTO seller_stats (seller_id, total_revenue, total_orders, total_products, pending_orders)
-                       VALUES (%s, 0, 0, 0, 0)
-        """, (seller_id,))
+            # Initialize seller stats
+            cursor.execute("""
+                           INSERT INTO seller_stats (seller_id, total_revenue, total_orders, total_products, pending_orders)
+                           VALUES (%s, 0, 0, 0, 0)
+            """, (seller_id,))
+            conn.commit()
         
-        app.logger.info(f'New seller registered: {business_name}')
-
-# Return success response with current user's name
-        return jsonify({
-            "message": "Registration successful",
-            "current_seller": business_name,
-            "current seller": {
-                "id": seller_id,
-                "full_name": business_name,
-                "email": email,
-                "phone": phone
-            }
-        }), 201
-
-    except mysql.connector.Error as err:
-        conn.rollback()
-        app.logger.error(f'Seller registration error: {err}')
-        return jsonify({'error': 'Database error occurred'}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+            app.logger.info(f'New seller registered: {business_name}')
+
+            # Return success response with current user's name
+            return jsonify({
+                "message": "Registration successful",
+                "current_seller": business_name,
+                "current seller": {
+                    "id": seller_id,
+                    "full_name": business_name,
+                    "email": email,
+                    "phone": phone
+                }
+            }), 201
+
+        except mysql.connector.Error as err:
+            conn.rollback()
+            app.logger.error(f'Seller registration error: {err}')
+            return jsonify({'error': 'Database error occurred'}), 500
 # Buyer Login
 @app.route('/api/seller/login', methods=['POST'])
 def seller_login():
     app.logger.info("🔥 /api/Seller/login HIT")
     data = request.get_json()
-    app.logger.info(f"📥 Incoming data: {request.get_json()}")
+    app.logger.debug('Incoming data', extra={'body': data})
     
     email = data.get('email')
     password = data.get('password')
@@ -457,21 +1054,12 @@ def seller_login():
     if not email or not password:
         return jsonify({'error': 'Missing email or password'}), 400
 
-    conn = get_db_connection()
-    
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-    
-    cursor = conn.cursor(dictionary=True)
-    
-    cursor.execute(
-        "SELECT id, business_name, email, password_hash, phone FROM sellers WHERE email = %s",
-        (email,)
-    )
-    currentSeller = cursor.fetchone()
-     
-    cursor.close()
-    conn.close()
+    with db_cursor() as (conn, cursor):
+        cursor.execute(
+            "SELECT id, business_name, email, password_hash, phone FROM sellers WHERE email = %s",
+            (email,)
+        )
+        currentSeller = cursor.fetchone()
 
 
      # VERIFY USER EXISTS IN DATABASE
@@ -479,8 +1067,9 @@ def seller_login():
         return jsonify({'error': 'Invalid email or password'}), 401
 
      # VERIFY PASSWORD
-    if not bcrypt.check_password_hash(currentSeller['password_hash'], password):
+    if not password_hasher.verify(password, currentSeller['password_hash']):
         return jsonify({'error': 'Invalid email or password'}), 401
+    upgrade_password_hash('sellers', currentSeller['id'], password, currentSeller['password_hash'])
         
         
      #Create session
@@ -510,152 +1099,203 @@ def serialize_product(product):
              "videos": product.videos if product.videos else [] }        
 
 # Product Routes
+def product_listing(args, audience, is_current=None):
+    """
+    /api/products for the given query args: (body, etag, last_modified), the
+    last always None. body is None when is_current(etag, last_modified) says
+    the client's copy is still good. Raises ValueError for invalid filters.
+    """
+    category_id = args.get('category_id')
+    seller_id = args.get('seller_id')
+    search = args.get('search')
+    featured = args.get('featured')
+    limit = page_limit(args.get('limit'), app.config['PAGE_SIZE_DEFAULT'], app.config['PAGE_SIZE_MAX'])
+    page_cursor = args.get('cursor')
+    want_facets = (args.get('facets') or '').lower() in ['1', 'true', 'yes']
+    want_featured = bool(featured) and featured.lower() in ['1', 'true', 'yes']
+    filters = facets.parse_filters(args)
+    fields = product_fields.parse(args.get('fields'))
+
+    cache_query = product_cache.normalize(category_id, seller_id, search, featured, limit, page_cursor,
+                                          filters, want_facets, fields)
+    cache_query['audience'] = audience
+    # The scoped generations catch stock and hold changes (checkout, cancel, cart holds and their expiry),
+    # which leave updated_at alone; view counters (and the featured order, which sorts on them) only go
+    # stale for LIVE_FIELDS_MAX_AGE.
+    # Facet counts come from the in-memory index, which can trail the watermark by a sync
+    generation = product_cache.generation(cache_query)
+    live = want_featured or any(field in product_documents.LIVE_FIELDS for field in fields)
+    etag, _ = catalog_watermark.validators(
+        ('products', 'sellers', 'categories', 'product_documents'), json.dumps(cache_query, sort_keys=True),
+        generation, facet_index.version if want_facets else None,
+        live_max_age=app.config['LIVE_FIELDS_MAX_AGE'] if live else None)
+    # No Last-Modified: the generations, facet version and live epoch move the ETag without touching
+    # updated_at, so If-Modified-Since against it could answer 304 for a changed listing
+    last_modified = None
+    if is_current and is_current(etag, last_modified):
+        return None, etag, last_modified
+
+    cached = product_cache.get(cache_query, generation)
+    if cached is not None and cached['etag'] == etag:
+        return cached['body'], etag, last_modified
+
+    # The featured keyset sorts on view_count, so it is selected even when not requested
+    columns, stored = product_columns(product_fields, fields, ('view_count',) if want_featured else ())
+    column_params = []
+    where = " WHERE p.is_active = TRUE AND s.status = 'approved'"
+    params = []
+
+    if category_id:
+        where += " AND p.category_id = %s"
+        params.append(category_id)
+
+    if seller_id:
+        where += " AND p.seller_id = %s"
+        params.append(seller_id)
+    scope_where, scope_params = where, list(params)
+
+    filter_sql, filter_params = facets.filter_clause(filters)
+    where += filter_sql
+    params.extend(filter_params)
+
+    rank_sql = search_sql = None
+    if search:
+        search_sql, search_params, rank_sql, rank_params = search_clause(search)
+        where += search_sql
+        params.extend(search_params)
+
+    # Keyset pagination: each page continues strictly after the previous page's last row
+    if want_featured:
+        where += " AND p.featured = 1"
+        keyset = Keyset(('p.view_count', 'view_count'), ('p.created_at', 'created_at'), ('p.id', 'id'))
+    elif rank_sql:
+        columns += f", {rank_sql} AS search_rank"
+        column_params = rank_params
+        keyset = Keyset((rank_sql, 'search_rank', rank_params), ('p.created_at', 'created_at'), ('p.id', 'id'))
+    else:
+        keyset = Keyset(('p.created_at', 'created_at'), ('p.id', 'id'))
+
+    after_sql, after_params = keyset.after(page_cursor)
+    order_sql, order_params = keyset.order_by()
+    query = f"""
+            SELECT {columns}
+            FROM products p
+                     JOIN sellers s ON p.seller_id = s.id
+                     LEFT JOIN product_documents d ON d.product_id = p.id
+            {where}{after_sql}{order_sql} LIMIT %s
+            """
+    params = column_params + params + after_params + order_params + [limit + 1]
+
+    with db_cursor() as (conn, cursor):
+        cursor.execute(query, params)
+        rows, next_cursor = keyset.page(cursor.fetchall(), limit)
+        products = product_responses(conn, cursor, rows, fields, stored)
+        result = {'products': products, 'next_cursor': next_cursor}
+
+        if want_facets:
+            product_ids = None
+            if search_sql:
+                cursor.execute(f"SELECT p.id FROM products p WHERE p.is_active = TRUE{search_sql} LIMIT %s",
+                               search_params + [app.config['FACET_SEARCH_IDS_MAX'] + 1])
+                product_ids = [row['id'] for row in cursor.fetchall()]
+            if product_ids is not None and len(product_ids) > app.config['FACET_SEARCH_IDS_MAX']:
+                # Too many matches to hand to the index; count them in MySQL instead
+                if want_featured:
+                    scope_where += " AND p.featured = 1"
+                result['facets'] = facets.sql_counts(cursor, scope_where + search_sql, scope_params + search_params,
+                                                     filters)
+            else:
+                scope = {'category_id': cache_query['category_id'], 'seller_id': cache_query['seller_id'],
+                         'featured': True if cache_query['featured'] else None}
+                # None while the index is still loading
+                result['facets'] = facet_index.query(filters, scope, product_ids)
+
+    body = app.json.dumps(result)
+    product_cache.set(cache_query, generation, {'etag': etag, 'body': body})
+    return body, etag, last_modified
+
 @app.route('/api/products')
 def get_products():
-    category_id = request.args.get('category_id')
-    seller_id = request.args.get('seller_id')
-    search = request.args.get('search')
-    featured = request.args.get('featured')
-    limit = request.args.get('limit')
-
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
+    audience = request_audience()
     try:
-        cursor = conn.cursor(dictionary=True)
-
-        query = """
-                SELECT p.*, c.name as category_name, s.business_name as seller_name,
-                       s.rating as seller_rating
-                FROM products p
-                         LEFT JOIN categories c ON p.category_id = c.id
-                         LEFT JOIN sellers s ON p.seller_id = s.id
-                WHERE p.is_active = TRUE AND s.status = 'approved' \
-                """
-        params = []
-
-        if category_id:
-            query += " AND p.category_id = %s"
-            params.append(category_id)
-
-        if seller_id:
-            query += " AND p.seller_id = %s"
-            params.append(seller_id)
-
-        if search:
-            query += " AND (p.name LIKE %s OR p.description LIKE %s OR p.brand LIKE %s)"
-            params.extend([f'%{search}%', f'%{search}%', f'%{search}%'])
-
-        if featured and featured.lower() in ["1", "true", "yes"]:
-            query += " AND p.featured = 1"
-            query += " ORDER BY p.view_count DESC, p.created_at DESC"
-        else:
-            query += " ORDER BY p.created_at DESC"
-            if limit:
-                query += " LIMIT %s"
-                params.append(int(limit))
+        body, etag, last_modified = product_listing(request.args, audience, not_modified)
+        return validated_response(body, etag, last_modified, audience)
 
-        cursor.execute(query, params)
-        products = cursor.fetchall()
-
-        # Convert JSON images to Python list
-        # Convert JSON images/videos safely
-        for product in products:
-            images = product.get('images')
-            videos = product.get('videos')
-
-            # Handle images
-            if images:
-                filenames = json.loads(images) # ✅ parse JSON string into list
-                product['images'] = []
-                try:
-                    for fname in filenames: # ✅ loop through each filename
-                        if fname.startswith("/static/"): # Already a full path → use directly
-                            product['images'].append(fname)
-                        else: # Just a filename → prepend the static path
-                            product['images'].append(f"/static/uploads/images/{fname}")
-                except Exception:
-                    product['images'] = ["/static/uploads/images/no-image.png"]
-            else:
-                product['images'] = ["/static/uploads/images/no-image.png"]
-            app.logger.info(f"Product {product['id']} raw images: {images}")
-
-            # Handle videos
-            if videos:
-                try:
-                    filenames = json.loads(videos)
-                    product['videos'] = [f"/static/uploads/videos/{fname}" for fname in filenames]
-                except Exception:
-                    product['videos'] = []
-            else:
-                product['videos'] = []
-        return jsonify({'products': products})
-    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except (InvalidCursor, DatabaseUnavailable):
+        raise
     except Exception as e:
         app.logger.error(f'Error getting products: {e}')
         return jsonify({'error': 'Failed to fetch products'}), 500
-    finally:
-        cursor.close()
-        conn.close()
 
 @app.route('/api/products/<int:product_id>')
 def get_product(product_id):
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
+    audience = request_audience()
     try:
-        cursor = conn.cursor(dictionary=True)
+        fields = product_detail_fields.parse(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-        # Update view count
-        cursor.execute("UPDATE products SET view_count = view_count + 1 WHERE id = %s", (product_id,))
+    with db_cursor() as (conn, cursor):
+        try:
+            # Validators first, so a current client copy costs one small primary-key lookup
+            cursor.execute("""
+                           SELECT UNIX_TIMESTAMP(p.updated_at) as product_modified,
+                                  UNIX_TIMESTAMP(s.updated_at) as seller_modified,
+                                  UNIX_TIMESTAMP(d.built_at) as document_built,
+                                  p.stock_quantity - p.reserved_quantity as available,
+                                  UNIX_TIMESTAMP(NOW(6)) as now
+                           FROM products p
+                                    LEFT JOIN sellers s ON p.seller_id = s.id
+                                    LEFT JOIN product_documents d ON d.product_id = p.id
+                           WHERE p.id = %s AND p.is_active = TRUE
+                           """, (product_id,))
+            stamp = cursor.fetchone()
 
-        cursor.execute("""
-                       SELECT p.*, c.name as category_name, s.business_name as seller_name,
-                              s.rating as seller_rating, s.total_sales as seller_sales
-                       FROM products p
-                                LEFT JOIN categories c ON p.category_id = c.id
-                                LEFT JOIN sellers s ON p.seller_id = s.id
-                       WHERE p.id = %s AND p.is_active = TRUE
-                       """, (product_id,))
+            if not stamp:
+                return jsonify({'error': 'Product not found'}), 404
 
-        product = cursor.fetchone()
-        conn.commit()
+            # Buffered view count; written back in batches by view_counter
+            view_counter.record(product_id, current_viewer())
+
+            # Stock is exact (it's in the stamp); counters may trail by LIVE_FIELDS_MAX_AGE
+            stamps = {name: (float(stamp[name]) if stamp[name] is not None else None, 1)
+                      for name in ('product_modified', 'seller_modified', 'document_built')}
+            counters = {'view_count', 'purchase_count', 'wishlist_count', 'seller_sales'}.intersection(fields)
+            live = live_epoch(float(stamp['now']), app.config['LIVE_FIELDS_MAX_AGE']) if counters else None
+            etag, last_modified = validators(stamps, float(stamp['now']), 'product', product_id,
+                                             stamp['available'], live, ','.join(fields))
+            if not_modified(etag, last_modified):
+                return validated_response(None, etag, last_modified, audience)
+            body = response_cache.get(request.full_path, audience, etag)
+            if body is not None:
+                return validated_response(body, etag, last_modified, audience)
+
+            columns, stored = product_columns(product_detail_fields, fields)
+            cursor.execute(f"""
+                           SELECT {columns}
+                           FROM products p
+                                    LEFT JOIN sellers s ON p.seller_id = s.id
+                                    LEFT JOIN product_documents d ON d.product_id = p.id
+                           WHERE p.id = %s AND p.is_active = TRUE
+                           """, (product_id,))
 
-        if not product:
-            return jsonify({'error': 'Product not found'}), 404
-
-        # Safely handle images
-        images = product.get('images')
-        if images:
-            try:
-                filenames = json.loads(images)
-                product['images'] = [
-                    fname if fname.startswith("/static/") else f"/static/uploads/images/{fname}"
-                    for fname in filenames
-               ]
-            except Exception:
-                product['images'] = ["/static/uploads/images/no-image.png"]
-        else:
-            product['images'] = ["/static/uploads/images/no-image.png"]
-
-        # Safely handle videos
-        videos = product.get('videos')
-        if videos:
-            try:
-                filenames = json.loads(videos)
-                product['videos'] = [f"/static/uploads/videos/{fname}" for fname in filenames]
-            except Exception:
-                product['videos'] = []
-        else:
-            product['videos'] = []
+            row = cursor.fetchone()
 
-    except Exception as e:
-        app.logger.error(f'Error getting product {product_id}: {e}')
-        return jsonify({'error': 'Failed to fetch product'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+            if not row:
+                return jsonify({'error': 'Product not found'}), 404
+            product = product_responses(conn, cursor, [row], fields, stored)[0]
+            if 'view_count' in product:
+                product['view_count'] += view_counter.pending(product_id)
+
+            body = app.json.dumps({'product': product})
+            response_cache.set(request.full_path, audience, etag, body)
+            return validated_response(body, etag, last_modified, audience)
+
+        except Exception as e:
+            app.logger.error(f'Error getting product {product_id}: {e}')
+            return jsonify({'error': 'Failed to fetch product'}), 500
 
 
 # Cart Routes
@@ -666,84 +1306,88 @@ def manage_cart():
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
+    with db_cursor() as (conn, cursor):
+        try:
+            if request.method == 'GET':
+                cursor.execute("""
+                               SELECT c.*, p.name, p.price, p.images, p.stock_quantity,
+                                      GREATEST(0, p.stock_quantity - p.reserved_quantity) as available_quantity,
+                                      r.expires_at as reserved_until,
+                                      s.business_name as seller_name, s.id as seller_id
+                               FROM cart c
+                                        JOIN products p ON c.product_id = p.id
+                                        JOIN sellers s ON p.seller_id = s.id
+                                        LEFT JOIN stock_reservations r ON r.user_id = c.user_id AND r.product_id = c.product_id
+                               WHERE c.user_id = %s
+                               """, (user_id,))
 
-    try:
-        cursor = conn.cursor(dictionary=True)
+                cart_items = cursor.fetchall()
 
-        if request.method == 'GET':
-            cursor.execute("""
-                           SELECT c.*, p.name, p.price, p.images, p.stock_quantity,
-                                  s.business_name as seller_name, s.id as seller_id
-                           FROM cart c
-                                    JOIN products p ON c.product_id = p.id
-                                    JOIN sellers s ON p.seller_id = s.id
-                           WHERE c.user_id = %s
-                           """, (user_id,))
-
-            cart_items = cursor.fetchall()
-
-            for item in cart_items:
-                if item['images']:
-                    item['images'] = json.loads(item['images'])
-                else:
-                    item['images'] = []
+                for item in cart_items:
+                    if item['images']:
+                        item['images'] = json.loads(item['images'])
+                    else:
+                        item['images'] = []
 
-            return jsonify({'cart_items': cart_items})
+                return jsonify({'cart_items': cart_items})
 
-        elif request.method == 'POST':
-            data = request.json
-            product_id = data.get('product_id')
-            quantity = data.get('quantity', 1)
+            elif request.method == 'POST':
+                data = request.json
+                product_id = data.get('product_id')
+                quantity = data.get('quantity', 1)
 
-            # Check if product exists and has stock
-            cursor.execute("SELECT stock_quantity FROM products WHERE id = %s AND is_active = TRUE", (product_id,))
-            product = cursor.fetchone()
+                if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity <= 0:
+                    return jsonify({'error': 'Quantity must be a positive integer'}), 400
 
-            if not product:
-                return jsonify({'error': 'Product not found'}), 404
+                # Check if product exists
+                cursor.execute("SELECT id, category_id, seller_id FROM products WHERE id = %s AND is_active = TRUE",
+                               (product_id,))
+                product = cursor.fetchone()
 
-            if product['stock_quantity'] < quantity:
-                return jsonify({'error': 'Insufficient stock'}), 400
+                if not product:
+                    return jsonify({'error': 'Product not found'}), 404
 
-            # Check if item already in cart
-            cursor.execute("SELECT id, quantity FROM cart WHERE user_id = %s AND product_id = %s", (user_id, product_id))
-            existing_item = cursor.fetchone()
+                # Check if item already in cart
+                cursor.execute("SELECT id, quantity FROM cart WHERE user_id = %s AND product_id = %s", (user_id, product_id))
+                existing_item = cursor.fetchone()
+                new_quantity = (existing_item['quantity'] if existing_item else 0) + quantity
 
-            if existing_item:
-                new_quantity = existing_item['quantity'] + quantity
-                if new_quantity > product['stock_quantity']:
-                    return jsonify({'error': 'Cannot add more than available stock'}), 400
+                # Hold the stock for this cart; fails if other carts already hold what is left
+                if not reservations.reserve(cursor, user_id, product_id, new_quantity, app.config['RESERVATION_TTL']):
+                    conn.rollback()
+                    if existing_item:
+                        return jsonify({'error': 'Cannot add more than available stock'}), 400
+                    return jsonify({'error': 'Insufficient stock'}), 400
 
-                cursor.execute("UPDATE cart SET quantity = %s WHERE user_id = %s AND product_id = %s",
-                               (new_quantity, user_id, product_id))
-            else:
-                cursor.execute("INSERT INTO cart (user_id, product_id, quantity) VALUES (%s, %s, %s)",
-                               (user_id, product_id, quantity))
+                if existing_item:
+                    cursor.execute("UPDATE cart SET quantity = %s WHERE user_id = %s AND product_id = %s",
+                                   (new_quantity, user_id, product_id))
+                else:
+                    cursor.execute("INSERT INTO cart (user_id, product_id, quantity) VALUES (%s, %s, %s)",
+                                   (user_id, product_id, quantity))
 
-            conn.commit()
-            return jsonify({'message': 'Item added to cart'})
+                conn.commit()
+                invalidate_product_listings([product['category_id']], [product['seller_id']])
+                return jsonify({'message': 'Item added to cart'})
 
-        elif request.method == 'DELETE':
-            product_id = request.args.get('product_id')
+            elif request.method == 'DELETE':
+                product_id = request.args.get('product_id')
 
-            if product_id:
-                cursor.execute("DELETE FROM cart WHERE user_id = %s AND product_id = %s", (user_id, product_id))
-            else:
-                cursor.execute("DELETE FROM cart WHERE user_id = %s", (user_id,))
+                if product_id:
+                    cursor.execute("DELETE FROM cart WHERE user_id = %s AND product_id = %s", (user_id, product_id))
+                    touched = reservations.release(cursor, user_id, product_id)
+                else:
+                    cursor.execute("DELETE FROM cart WHERE user_id = %s", (user_id,))
+                    touched = reservations.release(cursor, user_id)
 
-            conn.commit()
-            return jsonify({'message': 'Cart item removed'})
+                conn.commit()
+                invalidate_product_listings(*touched)
+                return jsonify({'message': 'Cart item removed'})
 
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f'Cart operation error: {e}')
-        return jsonify({'error': 'Cart operation failed'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        except Exception as e:
+            conn.rollback()
+            app.logger.error(f'Cart operation error: {e}')
+            return jsonify({'error': 'Cart operation failed'}), 500
 
 @app.route('/api/cart/<int:product_id>', methods=['PUT'])
 @buyer_required
@@ -755,185 +1399,193 @@ def update_cart_item(product_id):
    data = request.json
    quantity = data.get('quantity')
    
-   if quantity <= 0:
-        return jsonify({'error': 'Quantity must be positive'}), 400
+   if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity <= 0:
+        return jsonify({'error': 'Quantity must be a positive integer'}), 400
     
-   conn = get_db_connection()
-   if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
-   try:
-       cursor = conn.cursor(dictionary=True)
-       # Check product stock
-       cursor.execute("SELECT stock_quantity FROM products WHERE id = %s", (product_id,))
-       product = cursor.fetchone()
+   with db_cursor() as (conn, cursor):
+       try:
+           # Check product exists
+           cursor.execute("SELECT id, category_id, seller_id FROM products WHERE id = %s", (product_id,))
+           product = cursor.fetchone()
 
-       if not product:
-            return jsonify({'error': 'Product not found'}), 404
+           if not product:
+                return jsonify({'error': 'Product not found'}), 404
 
-       if product['stock_quantity'] < quantity:
-            return jsonify({'error': 'Insufficient stock'}), 400
+           cursor.execute("SELECT id FROM cart WHERE user_id = %s AND product_id = %s", (user_id, product_id))
+           if not cursor.fetchone():
+               return jsonify({'error': 'Cart item not found'}), 404
 
-       cursor.execute("UPDATE cart SET quantity = %s WHERE user_id = %s AND product_id = %s",
-                       (quantity, user_id, product_id))
+           # Resize the hold to the new quantity (and restart its TTL)
+           if not reservations.reserve(cursor, user_id, product_id, quantity, app.config['RESERVATION_TTL']):
+               conn.rollback()
+               return jsonify({'error': 'Insufficient stock'}), 400
 
-       if cursor.rowcount == 0:
-           return jsonify({'error': 'Cart item not found'}), 404
+           cursor.execute("UPDATE cart SET quantity = %s WHERE user_id = %s AND product_id = %s",
+                           (quantity, user_id, product_id))
 
-       conn.commit()
-       return jsonify({'message': 'Cart updated successfully'})
+           conn.commit()
+           invalidate_product_listings([product['category_id']], [product['seller_id']])
+           return jsonify({'message': 'Cart updated successfully'})
                       
-   except Exception as e:
-       conn.rollback()
-       app.logger.error(f'Cart update error: {e}')
-       return jsonify({'error': 'Failed to update cart'}), 500
-   finally:
-       cursor.close()
-       conn.close()
+       except Exception as e:
+           conn.rollback()
+           app.logger.error(f'Cart update error: {e}')
+           return jsonify({'error': 'Failed to update cart'}), 500
 
 # Order Routes
 @app.route('/api/orders', methods=['GET', 'POST'])
 @login_required
 def manage_orders():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
-    try:
-        cursor = conn.cursor(dictionary=True)
+    if request.method == 'GET':
+        limit = page_limit(request.args.get('limit'), app.config['PAGE_SIZE_DEFAULT'], app.config['PAGE_SIZE_MAX'])
+        if 'seller_id' in session:
+            # A seller sees one row per order item, so the item id breaks ties within an order
+            keyset = Keyset(('o.created_at', 'created_at'), ('o.id', 'id'), ('oi.id', 'order_item_id'))
+            fieldset = seller_order_fields
+        else:
+            keyset = Keyset(('o.created_at', 'created_at'), ('o.id', 'id'))
+            fieldset = buyer_order_fields
+        after_sql, after_params = keyset.after(request.args.get('cursor'))
+        order_sql, _ = keyset.order_by()
+        try:
+            fields = fieldset.parse(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        # The keyset columns are selected for next_cursor even when not requested
+        columns = fieldset.select(fields, [key for _, key, _ in keyset.columns])
 
-        if request.method == 'GET':
-            if 'seller_id' in session:
-                # Get seller's orders
-                seller_id = session.get('seller_id')
+    with db_cursor() as (conn, cursor):
+        try:
+            if request.method == 'GET':
+                if 'seller_id' in session:
+                    # Get seller's orders
+                    seller_id = session.get('seller_id')
+                    if not seller_id:
+                        return jsonify({'error': 'Unauthorized'}), 401
+
+                    cursor.execute(f"""
+                                   SELECT {columns}
+                                   FROM orders o
+                                            JOIN order_items oi ON o.id = oi.order_id
+                                            JOIN products p ON oi.product_id = p.id
+                                            JOIN users u ON o.user_id = u.id
+                                   WHERE oi.seller_id = %s{after_sql}
+                                   {order_sql}
+                                   LIMIT %s
+                                   """, (seller_id, *after_params, limit + 1))
+                else:
+                    # Get buyer's orders
+                    user_id = session['user_id']
+                    cursor.execute(f"""
+                                   SELECT {columns}
+                                   FROM orders o
+                                   WHERE o.user_id = %s{after_sql}
+                                   {order_sql}
+                                   LIMIT %s
+                                   """, (user_id, *after_params, limit + 1))
+
+                orders, next_cursor = keyset.page(cursor.fetchall(), limit)
+                return jsonify({'orders': fieldset.project(orders, fields), 'next_cursor': next_cursor})
+
+            elif request.method == 'POST':
+                if 'user_id' not in session:
+                    return jsonify({'error': 'Buyer authentication required'}), 401
+
+                user_id = session.get('user_id')
                 if not user_id:
                     return jsonify({'error': 'Unauthorized'}), 401
+                data = request.json
+                shipping_address = data.get('shipping_address')
+                payment_method = data.get('payment_method', 'credit_card')
 
+                if not shipping_address:
+                    return jsonify({'error': 'Shipping address required'}), 400
+
+                # Get cart items
                 cursor.execute("""
-                               SELECT o.*, oi.product_id, oi.quantity, oi.unit_price, oi.status as item_status,
-                                      p.name as product_name, u.full_name as customer_name, u.phone as customer_phone
-                               FROM orders o
-                                        JOIN order_items oi ON o.id = oi.order_id
-                                        JOIN products p ON oi.product_id = p.id
-                                        JOIN users u ON o.user_id = u.id
-                               WHERE oi.seller_id = %s
-                               ORDER BY o.created_at DESC
-                               """, (seller_id,))
-            else:
-                # Get buyer's orders
-                user_id = session['user_id']
-                cursor.execute("""
-                               SELECT o.*,
-                                      (SELECT COUNT(*) FROM order_items WHERE order_id = o.id) as item_count
-                               FROM orders o
-                               WHERE o.user_id = %s
-                               ORDER BY o.created_at DESC
+                               SELECT c.product_id, c.quantity, p.price, p.seller_id, p.category_id, p.name,
+                                      p.stock_quantity - p.reserved_quantity + COALESCE(r.quantity, 0) AS available_quantity
+                               FROM cart c
+                                        LEFT JOIN stock_reservations r ON r.user_id = c.user_id AND r.product_id = c.product_id
+                                        JOIN products p ON c.product_id = p.id
+                               WHERE c.user_id = %s
                                """, (user_id,))
 
-            orders = cursor.fetchall()
-            return jsonify({'orders': orders})
+                cart_items = cursor.fetchall()
 
-        elif request.method == 'POST':
-            if 'user_id' not in session:
-                return jsonify({'error': 'Buyer authentication required'}), 401
+                if not cart_items:
+                    return jsonify({'error': 'Cart is empty'}), 400
 
-            user_id = session.get('user_id')
-            if not user_id:
-                return jsonify({'error': 'Unauthorized'}), 401
-            data = request.json
-            shipping_address = data.get('shipping_address')
-            payment_method = data.get('payment_method', 'credit_card')
+                # Calculate totals; several cart rows may point at the same product
+                total_amount = 0
+                order_items = []
+                quantities = {}
 
-            if not shipping_address:
-                return jsonify({'error': 'Shipping address required'}), 400
+                for item in cart_items:
+                    item_total = item['price'] * item['quantity']
+                    total_amount += item_total
+                    quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
 
-            # Get cart items
-            cursor.execute("""
-                           SELECT c.product_id, c.quantity, p.price, p.seller_id, p.name, p.stock_quantity
-                           FROM cart c
-                                    JOIN products p ON c.product_id = p.id
-                           WHERE c.user_id = %s
-                           """, (user_id,))
+                    order_items.append((item['product_id'], item['seller_id'], item['name'], item['price'],
+                                        item['quantity'], item['price'], item_total))
 
-            cart_items = cursor.fetchall()
+                # Turn the buyer's holds into a sale: release them, then take stock for the whole
+                # cart in one statement that only touches rows other buyers have not reserved
+                reservations.release(cursor, user_id)
+                if not decrement_stock(cursor, quantities):
+                    short = [item['name'] for item in cart_items
+                             if item['available_quantity'] < quantities[item['product_id']]]
+                    conn.rollback()
+                    name = short[0] if short else 'one or more items'
+                    return jsonify({'error': f'Insufficient stock for {name}'}), 400
 
-            if not cart_items:
-                return jsonify({'error': 'Cart is empty'}), 400
+                shipping_fee = calculate_shipping(shipping_address.get('province', 'Gauteng'))
+                total_amount += shipping_fee
 
-            # Validate stock and calculate total
-            total_amount = 0
-            order_items = []
-
-            for item in cart_items:
-                if item['stock_quantity'] < item['quantity']:
-                    return jsonify({'error': f'Insufficient stock for {item["name"]}'}), 400
-
-                item_total = item['price'] * item['quantity']
-                total_amount += item_total
-
-                order_items.append({
-                    'product_id': item['product_id'],
-                    'seller_id': item['seller_id'],
-                    'quantity': item['quantity'],
-                    'unit_price': item['price'],
-                    'total_price': item_total
-                })
-
-            shipping_fee = calculate_shipping(shipping_address.get('province', 'Gauteng'))
-            total_amount += shipping_fee
-
-            # Create order
-            order_number = generate_order_number()
-            cursor.execute("""
-                           INSERT INTO orders (order_number, user_id, total_amount, shipping_fee,
-                                               shipping_address, payment_method)
-                           VALUES (%s, %s, %s, %s, %s, %s)
-                           """, (order_number, user_id, total_amount, shipping_fee,
-                                 json.dumps(shipping_address), payment_method))
-
-            order_id = cursor.lastrowid
-
-            # Create order items and update product stock
-            for item in order_items:
-                cursor.execute("""
-                               INSERT INTO order_items (order_id, product_id, seller_id, quantity, unit_price, total_price)
-                               VALUES (%s, %s, %s, %s, %s, %s)
-                               """, (order_id, item['product_id'], item['seller_id'], item['quantity'],
-                                     item['unit_price'], item['total_price']))
-
-                # Update product stock
+                # Create order
+                order_number = generate_order_number()
                 cursor.execute("""
-                               UPDATE products SET stock_quantity = stock_quantity - %s
-                               WHERE id = %s
-                               """, (item['quantity'], item['product_id']))
-
-            # Clear cart
-            cursor.execute("DELETE FROM cart WHERE user_id = %s", (user_id,))
-
-            # Log order creation
-            cursor.execute("""
-                           INSERT INTO activity_logs (user_id, action, ip_address)
-                           VALUES (%s, %s, %s)
-                           """, (user_id, 'order_created', request.remote_addr))
+                               INSERT INTO orders (order_number, user_id, total_amount, final_amount, shipping_fee,
+                                                   shipping_address, payment_method)
+                               VALUES (%s, %s, %s, %s, %s, %s, %s)
+                               """, (order_number, user_id, total_amount, total_amount, shipping_fee,
+                                     json.dumps(shipping_address), payment_method))
+
+                order_id = cursor.lastrowid
+
+                # Create all order items in one multi-row insert
+                rows = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s)'] * len(order_items))
+                cursor.execute(f"""
+                               INSERT INTO order_items (order_id, product_id, seller_id, product_name, product_price,
+                                                        quantity, unit_price, total_price)
+                               VALUES {rows}
+                               """, [v for line in order_items for v in (order_id, *line)])
+
+                # Add this order to each seller's stats
+                seller_stats.record_checkout(cursor, order_id)
+
+                # Clear cart
+                cursor.execute("DELETE FROM cart WHERE user_id = %s", (user_id,))
 
-            conn.commit()
+                conn.commit()
+                audit('order_created', 'order', order_id, metadata={'order_number': order_number})
+                invalidate_product_listings(
+                    category_ids=[item['category_id'] for item in cart_items],
+                    seller_ids=[item['seller_id'] for item in cart_items])
 
-            app.logger.info(f'Order created: {order_number} by user {user_id}')
+                app.logger.info(f'Order created: {order_number} by user {user_id}')
 
-            return jsonify({
-                'message': 'Order created successfully',
-                'order_id': order_id,
-                'order_number': order_number,
-                'total_amount': total_amount
-            }), 201
+                return jsonify({
+                    'message': 'Order created successfully',
+                    'order_id': order_id,
+                    'order_number': order_number,
+                    'total_amount': total_amount
+                }), 201
 
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f'Order operation error: {e}')
-        return jsonify({'error': 'Order operation failed'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        except Exception as e:
+            conn.rollback()
+            app.logger.error(f'Order operation error: {e}')
+            return jsonify({'error': 'Order operation failed'}), 500
 
 @app.route('/api/orders/<int:order_id>/cancel', methods=['POST'])
 @buyer_required
@@ -942,57 +1594,54 @@ def cancel_order(order_id):
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
-    try:
-        cursor = conn.cursor(dictionary=True)
-
-        # Verify order belongs to user and can be cancelled
-        cursor.execute("""
-                       SELECT id, status FROM orders
-                       WHERE id = %s AND user_id = %s AND status IN ('pending', 'confirmed')
-                       """, (order_id, user_id))
-
-        order = cursor.fetchone()
-        if not order:
-            return jsonify({'error': 'Order not found or cannot be cancelled'}), 404
+    with db_cursor() as (conn, cursor):
+        try:
+            # Verify order belongs to user and can be cancelled
+            cursor.execute("""
+                           SELECT id, status FROM orders
+                           WHERE id = %s AND user_id = %s AND status IN ('pending', 'confirmed')
+                           """, (order_id, user_id))
 
-        # Get order items to restore stock
-        cursor.execute("SELECT product_id, quantity FROM order_items WHERE order_id = %s", (order_id,))
-        order_items = cursor.fetchall()
+            order = cursor.fetchone()
+            if not order:
+                return jsonify({'error': 'Order not found or cannot be cancelled'}), 404
 
-        # Restore product stock
-        for item in order_items:
+            # Get order items to restore stock
             cursor.execute("""
-                           UPDATE products SET stock_quantity = stock_quantity + %s
-                           WHERE id = %s
-                           """, (item['quantity'], item['product_id']))
+                           SELECT oi.product_id, oi.quantity, p.seller_id, p.category_id
+                           FROM order_items oi
+                                    JOIN products p ON oi.product_id = p.id
+                           WHERE oi.order_id = %s
+                           """, (order_id,))
+            order_items = cursor.fetchall()
 
-        # Cancel order
-        cursor.execute("UPDATE orders SET status = 'cancelled' WHERE id = %s", (order_id,))
-        cursor.execute("UPDATE order_items SET status = 'cancelled' WHERE order_id = %s", (order_id,))
+            # Restore product stock and take the order back out of purchase_count
+            quantities = {}
+            for item in order_items:
+                quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+            restore_stock(cursor, quantities)
 
-        # Log cancellation
-        cursor.execute("""
-                       INSERT INTO activity_logs (user_id, action, ip_address)
-                       VALUES (%s, %s, %s)
-                       """, (user_id, 'order_cancelled', request.remote_addr))
+            # Reverse this order's contribution to seller stats
+            seller_stats.record_cancellation(cursor, order_id)
 
-        conn.commit()
+            # Cancel order
+            cursor.execute("UPDATE orders SET status = 'cancelled' WHERE id = %s", (order_id,))
+            cursor.execute("UPDATE order_items SET status = 'cancelled' WHERE order_id = %s", (order_id,))
 
-        app.logger.info(f'Order cancelled: {order_id} by user {user_id}')
+            conn.commit()
+            audit('order_cancelled', 'order', order_id)
+            invalidate_product_listings(
+                category_ids=[item['category_id'] for item in order_items],
+                seller_ids=[item['seller_id'] for item in order_items])
 
-        return jsonify({'message': 'Order cancelled successfully'})
+            app.logger.info(f'Order cancelled: {order_id} by user {user_id}')
 
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f'Order cancellation error: {e}')
-        return jsonify({'error': 'Failed to cancel order'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+            return jsonify({'message': 'Order cancelled successfully'})
+
+        except Exception as e:
+            conn.rollback()
+            app.logger.error(f'Order cancellation error: {e}')
+            return jsonify({'error': 'Failed to cancel order'}), 500
 
 # Payment Routes
 @app.route('/api/payments/process', methods=['POST'])
@@ -1006,78 +1655,59 @@ def process_payment():
     if not all([order_id, payment_method, amount]):
         return jsonify({'error': 'Missing payment information'}), 400
 
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
+    with db_cursor() as (conn, cursor):
+        try:
+            # Verify order exists and belongs to user
+            cursor.execute("SELECT id, user_id, total_amount FROM orders WHERE id = %s", (order_id,))
+            order = cursor.fetchone()
 
-    try:
-        cursor = conn.cursor(dictionary=True)
+            if not order or order['user_id'] != session['user_id']:
+                return jsonify({'error': 'Order not found'}), 404
 
-        # Verify order exists and belongs to user
-        cursor.execute("SELECT id, user_id, total_amount FROM orders WHERE id = %s", (order_id,))
-        order = cursor.fetchone()
+            if abs(order['total_amount'] - float(amount)) > 0.01:  # Allow small floating point differences
+                return jsonify({'error': 'Amount mismatch'}), 400
 
-        if not order or order['user_id'] != session['user_id']:
-            return jsonify({'error': 'Order not found'}), 404
+            # Simulate payment processing with random success/failure
+            success = random.random() > 0.2  # 80% success rate
+            transaction_id = str(uuid.uuid4())
 
-        if abs(order['total_amount'] - float(amount)) > 0.01:  # Allow small floating point differences
-            return jsonify({'error': 'Amount mismatch'}), 400
+            if success:
+                # Pending items become confirmed; revenue and order totals were counted at checkout
+                seller_stats.record_payment(cursor, order_id)
 
-        # Simulate payment processing with random success/failure
-        success = random.random() > 0.2  # 80% success rate
-        transaction_id = str(uuid.uuid4())
+                # Update order status
+                cursor.execute("UPDATE orders SET payment_status = 'completed', status = 'confirmed' WHERE id = %s", (order_id,))
+                cursor.execute("UPDATE order_items SET status = 'confirmed' WHERE order_id = %s", (order_id,))
 
-        if success:
-            # Update order status
-            cursor.execute("UPDATE orders SET payment_status = 'completed', status = 'confirmed' WHERE id = %s", (order_id,))
-            cursor.execute("UPDATE order_items SET status = 'confirmed' WHERE order_id = %s", (order_id,))
+                status = 'success'
+                message = 'Payment processed successfully'
+            else:
+                cursor.execute("UPDATE orders SET payment_status = 'failed' WHERE id = %s", (order_id,))
+                status = 'failed'
+                message = 'Payment failed. Please try again.'
 
-            # Update seller stats
+            # Record payment transaction
             cursor.execute("""
-                           UPDATE seller_stats ss
-                               JOIN order_items oi ON ss.seller_id = oi.seller_id
-                               SET ss.total_orders = ss.total_orders + 1,
-                                   ss.total_revenue = ss.total_revenue + oi.total_price,
-                                   ss.pending_orders = ss.pending_orders + 1
-                           WHERE oi.order_id = %s
-                           """, (order_id,))
+                           INSERT INTO payment_transactions (order_id, transaction_id, amount, payment_method, status)
+                           VALUES (%s, %s, %s, %s, %s)
+                           """, (order_id, transaction_id, amount, payment_method, status))
 
-            status = 'success'
-            message = 'Payment processed successfully'
-        else:
-            cursor.execute("UPDATE orders SET payment_status = 'failed' WHERE id = %s", (order_id,))
-            status = 'failed'
-            message = 'Payment failed. Please try again.'
-
-        # Record payment transaction
-        cursor.execute("""
-                       INSERT INTO payment_transactions (order_id, transaction_id, amount, payment_method, status)
-                       VALUES (%s, %s, %s, %s, %s)
-                       """, (order_id, transaction_id, amount, payment_method, status))
-
-        # Log payment activity
-        cursor.execute("""
-                       INSERT INTO activity_logs (user_id, action, ip_address)
-                       VALUES (%s, %s, %s)
-                       """, (session['user_id'], f'payment_{status}', request.remote_addr))
-
-        conn.commit()
+            conn.commit()
+            audit(f'payment_{status}', 'order', order_id,
+                  metadata={'transaction_id': transaction_id, 'payment_method': payment_method})
 
-        app.logger.info(f'Payment {status} for order {order_id}')
+            app.logger.info(f'Payment {status} for order {order_id}')
 
-        return jsonify({
-            'success': success,
-            'message': message,
-            'transaction_id': transaction_id
-        })
+            return jsonify({
+                'success': success,
+                'message': message,
+                'transaction_id': transaction_id
+            })
 
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f'Payment processing error: {e}')
-        return jsonify({'error': 'Payment processing failed'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        except Exception as e:
+            conn.rollback()
+            app.logger.error(f'Payment processing error: {e}')
+            return jsonify({'error': 'Payment processing failed'}), 500
 
 
 @app.route('/api/products/<int:product_id>/media', methods=['GET', 'POST'])
@@ -1085,185 +1715,324 @@ def process_payment():
 def manage_product_media(product_id):
     seller_id = session['seller_id']
 
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
-    try:
-        cursor = conn.cursor(dictionary=True)
-
-        # Verify product belongs to seller
-        cursor.execute("SELECT id FROM products WHERE id = %s AND seller_id = %s", (product_id, seller_id))
-        if not cursor.fetchone():
-            return jsonify({'error': 'Product not found'}), 404
-
-        if request.method == 'GET':
-            cursor.execute("""
-                           SELECT * FROM product_media
-                           WHERE product_id = %s
-                           ORDER BY sort_order, created_at
-                           """, (product_id,))
+    with db_cursor() as (conn, cursor):
+        try:
+            # Verify product belongs to seller
+            cursor.execute("SELECT id FROM products WHERE id = %s AND seller_id = %s", (product_id, seller_id))
+            if not cursor.fetchone():
+                return jsonify({'error': 'Product not found'}), 404
 
-            media_items = cursor.fetchall()
-            return jsonify({'media': media_items})
+            if request.method == 'GET':
+                cursor.execute("""
+                               SELECT * FROM product_media
+                               WHERE product_id = %s
+                               ORDER BY sort_order, created_at
+                               """, (product_id,))
+
+                media_items = cursor.fetchall()
+                return jsonify({'media': media_items})
+
+            elif request.method == 'POST':
+                if 'media' not in request.files:
+                    return jsonify({'error': 'No files provided'}), 400
+
+                files = request.files.getlist('media')
+                uploaded_media = []
+                new_images = []
+
+                for file in files:
+                    if file.filename == '':
+                        continue
+
+                    filename = secure_filename(file.filename)
+                    file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+                    # Determine media type
+                    if file_ext in ALLOWED_IMAGE_EXTENSIONS:
+                        media_type = 'image'
+                        upload_dir = 'images'
+                        mime_type = f'image/{file_ext}'
+                    elif file_ext in ALLOWED_VIDEO_EXTENSIONS:
+                        media_type = 'video'
+                        upload_dir = 'videos'
+                        mime_type = f'video/{file_ext}'
+                    else:
+                        continue  # Skip invalid files
+
+                    # Store by content hash; identical uploads share one file
+                    blob = media_store.save(file.stream, file_ext, upload_dir)
+                    blobs.record_blob(cursor, blob, mime_type)
+                    file_size = blob.size
+
+                    # Insert into database
+                    cursor.execute("""
+                                   INSERT INTO product_media (product_id, media_type, file_url, file_name, file_size, mime_type, uploader_id, uploader_type)
+                                   VALUES (%s, %s, %s, %s, %s, %s, %s, 'seller')
+                                   """, (product_id, media_type, blob.url,
+                                         filename, file_size, mime_type, seller_id))
+
+                    media_id = cursor.lastrowid
+                    blobs.add_reference(cursor, blob.url)
+                    if media_type == 'image':
+                        new_images.append((media_id, blob.url))
+
+                    uploaded_media.append({
+                        'id': media_id,
+                        'media_type': media_type,
+                        'file_url': blob.url,
+                        'file_name': filename,
+                        'file_size': file_size,
+                        'mime_type': mime_type
+                    })
+
+                touched = refresh_products(cursor, [product_id])
+                conn.commit()
+                invalidate_product_listings(*touched)
+                schedule_derivatives(new_images)
 
-        elif request.method == 'POST':
-            if 'media' not in request.files:
-                return jsonify({'error': 'No files provided'}), 400
+                app.logger.info(f'Media uploaded for product {product_id}: {len(uploaded_media)} items')
 
-            files = request.files.getlist('media')
-            uploaded_media = []
+                return jsonify({
+                    'message': 'Media uploaded successfully',
+                    'media': uploaded_media
+                }), 201
 
-            for file in files:
-                if file.filename == '':
-                    continue
+        except Exception as e:
+            conn.rollback()
+            app.logger.error(f'Product media error: {e}')
+            return jsonify({'error': 'Media operation failed'}), 500
 
-                filename = secure_filename(file.filename)
-                file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+@app.route('/api/products/<int:product_id>/media/<int:media_id>', methods=['PUT', 'DELETE'])
+@seller_required
+def manage_single_product_media(product_id, media_id):
+    seller_id = session['seller_id']
 
-                # Determine media type
-                if file_ext in ALLOWED_IMAGE_EXTENSIONS:
-                    media_type = 'image'
-                    upload_dir = 'images'
-                    mime_type = f'image/{file_ext}'
-                elif file_ext in ALLOWED_VIDEO_EXTENSIONS:
-                    media_type = 'video'
-                    upload_dir = 'videos'
-                    mime_type = f'video/{file_ext}'
+    with db_cursor() as (conn, cursor):
+        try:
+            # Verify media belongs to seller's product
+            cursor.execute("""
+                           SELECT pm.* FROM product_media pm
+                                                JOIN products p ON pm.product_id = p.id
+                           WHERE pm.id = %s AND p.id = %s AND p.seller_id = %s
+                           """, (media_id, product_id, seller_id))
+
+            media_item = cursor.fetchone()
+            if not media_item:
+                return jsonify({'error': 'Media item not found'}), 404
+
+            if request.method == 'PUT':
+                data = request.json
+
+                update_fields = []
+                params = []
+
+                if 'alt_text' in data:
+                    update_fields.append("alt_text = %s")
+                    params.append(data['alt_text'])
+
+                if 'caption' in data:
+                    update_fields.append("caption = %s")
+                    params.append(data['caption'])
+
+                if 'sort_order' in data:
+                    update_fields.append("sort_order = %s")
+                    params.append(data['sort_order'])
+
+                if 'is_primary' in data:
+                    # If setting as primary, remove primary from other media
+                    if data['is_primary']:
+                        cursor.execute("UPDATE product_media SET is_primary = FALSE WHERE product_id = %s", (product_id,))
+
+                    update_fields.append("is_primary = %s")
+                    params.append(data['is_primary'])
+
+                if update_fields:
+                    params.extend([media_id, product_id, seller_id])
+                    query = f"""
+                        UPDATE product_media pm
+                        JOIN products p ON pm.product_id = p.id
+                        SET {', '.join(update_fields)}
+                        WHERE pm.id = %s AND p.id = %s AND p.seller_id = %s
+                    """
+
+                    cursor.execute(query, params)
+                    touched = refresh_products(cursor, [product_id])
+                    conn.commit()
+                    invalidate_product_listings(*touched)
+
+                    return jsonify({'message': 'Media updated successfully'})
                 else:
-                    continue  # Skip invalid files
+                    return jsonify({'error': 'No fields to update'}), 400
 
-                # Generate unique filename
-                unique_filename = f"{uuid.uuid4()}_{filename}"
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], upload_dir, unique_filename)
-                file.save(filepath)
+            elif request.method == 'DELETE':
+                # Other listings may share the file; drop our reference and let the media GC remove it
+                cursor.execute("DELETE FROM product_media WHERE id = %s", (media_id,))
+                blobs.remove_reference(cursor, media_item['file_url'])
+                touched = refresh_products(cursor, [product_id])
+                conn.commit()
+                invalidate_product_listings(*touched)
 
-                # Get file size
-                file_size = os.path.getsize(filepath)
+                app.logger.info(f'Media deleted: {media_id} from product {product_id}')
 
-                # Insert into database
-                cursor.execute("""
-                               INSERT INTO product_media (product_id, media_type, file_url, file_name, file_size, mime_type, uploader_id, uploader_type)
-                               VALUES (%s, %s, %s, %s, %s, %s, %s, 'seller')
-                               """, (product_id, media_type, f'/static/uploads/{upload_dir}/{unique_filename}',
-                                     filename, file_size, mime_type, seller_id))
-
-                media_id = cursor.lastrowid
-
-                uploaded_media.append({
-                    'id': media_id,
-                    'media_type': media_type,
-                    'file_url': f'/static/uploads/{upload_dir}/{unique_filename}',
-                    'file_name': filename,
-                    'file_size': file_size,
-                    'mime_type': mime_type
-                })
+                return jsonify({'message': 'Media deleted successfully'})
 
-            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            app.logger.error(f'Single media operation error: {e}')
+            return jsonify({'error': 'Media operation failed'}), 500
+
+# Resumable chunked uploads (see chunked_uploads.py). No pooled connection is held while
+# a chunk body is being received, and no request lasts longer than one chunk.
+def upload_progress(upload, offset):
+    return {
+        'upload_id': upload['id'],
+        'file_name': upload['file_name'],
+        'file_size': upload['file_size'],
+        'offset': offset,
+        'chunk_size': app.config['UPLOAD_CHUNK_SIZE'],
+        'expires_at': upload['expires_at'].isoformat() if upload.get('expires_at') else None
+    }
 
-            app.logger.info(f'Media uploaded for product {product_id}: {len(uploaded_media)} items')
+@app.route('/api/products/<int:product_id>/media/uploads', methods=['POST'])
+@seller_required
+def start_chunked_upload(product_id):
+    seller_id = session['seller_id']
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('file_name') or '')
+    file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    file_size = data.get('file_size')
+
+    if file_ext in ALLOWED_VIDEO_EXTENSIONS:
+        media_type, mime_type = 'video', f'video/{file_ext}'
+    elif file_ext in ALLOWED_IMAGE_EXTENSIONS:
+        media_type, mime_type = 'image', f'image/{file_ext}'
+    else:
+        return jsonify({'error': 'Unsupported file type'}), 400
+    if not isinstance(file_size, int) or file_size <= 0:
+        return jsonify({'error': 'file_size must be a positive integer'}), 400
+    if file_size > app.config['CHUNKED_UPLOAD_MAX_SIZE']:
+        return jsonify({'error': 'File too large'}), 413
+
+    with db_cursor() as (conn, cursor):
+        try:
+            cursor.execute("SELECT id FROM products WHERE id = %s AND seller_id = %s", (product_id, seller_id))
+            if not cursor.fetchone():
+                return jsonify({'error': 'Product not found'}), 404
 
-            return jsonify({
-                'message': 'Media uploaded successfully',
-                'media': uploaded_media
-            }), 201
+            upload_id = uploads.create_session(cursor, seller_id, product_id, filename, file_size, media_type,
+                                               mime_type, app.config['UPLOAD_SESSION_TTL'])
+            conn.commit()
+            upload = uploads.get_session(cursor, upload_id, seller_id)
+        except Exception as e:
+            conn.rollback()
+            app.logger.error(f'Start upload error: {e}')
+            return jsonify({'error': 'Failed to start upload'}), 500
 
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f'Product media error: {e}')
-        return jsonify({'error': 'Media operation failed'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    chunk_store.create(upload_id)
+    app.logger.info(f'Chunked upload {upload_id} started for product {product_id}: {filename} ({file_size} bytes)')
+    return jsonify(upload_progress(upload, 0)), 201
 
-@app.route('/api/products/<int:product_id>/media/<int:media_id>', methods=['PUT', 'DELETE'])
+@app.route('/api/media/uploads/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
 @seller_required
-def manage_single_product_media(product_id, media_id):
+def chunked_upload(upload_id):
     seller_id = session['seller_id']
 
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
+    with db_cursor() as (conn, cursor):
+        upload = uploads.get_session(cursor, upload_id, seller_id)
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
 
-    try:
-        cursor = conn.cursor(dictionary=True)
-
-        # Verify media belongs to seller's product
-        cursor.execute("""
-                       SELECT pm.* FROM product_media pm
-                                            JOIN products p ON pm.product_id = p.id
-                       WHERE pm.id = %s AND p.id = %s AND p.seller_id = %s
-                       """, (media_id, product_id, seller_id))
-
-        media_item = cursor.fetchone()
-        if not media_item:
-            return jsonify({'error': 'Media item not found'}), 404
-
-        if request.method == 'PUT':
-            data = request.json
-
-            update_fields = []
-            params = []
-
-            if 'alt_text' in data:
-                update_fields.append("alt_text = %s")
-                params.append(data['alt_text'])
-
-            if 'caption' in data:
-                update_fields.append("caption = %s")
-                params.append(data['caption'])
-
-            if 'sort_order' in data:
-                update_fields.append("sort_order = %s")
-                params.append(data['sort_order'])
-
-            if 'is_primary' in data:
-                # If setting as primary, remove primary from other media
-                if data['is_primary']:
-                    cursor.execute("UPDATE product_media SET is_primary = FALSE WHERE product_id = %s", (product_id,))
-
-                update_fields.append("is_primary = %s")
-                params.append(data['is_primary'])
-
-            if update_fields:
-                params.extend([media_id, product_id, seller_id])
-                query = f"""
-                    UPDATE product_media pm
-                    JOIN products p ON pm.product_id = p.id
-                    SET {', '.join(update_fields)}
-                    WHERE pm.id = %s AND p.id = %s AND p.seller_id = %s
-                """
+    if request.method == 'GET':
+        return jsonify(upload_progress(upload, chunk_store.offset(upload_id)))
 
-                cursor.execute(query, params)
-                conn.commit()
+    if request.method == 'DELETE':
+        with db_cursor() as (conn, cursor):
+            uploads.delete_session(cursor, upload_id)
+            conn.commit()
+        chunk_store.discard(upload_id)
+        return jsonify({'message': 'Upload cancelled'})
 
-                return jsonify({'message': 'Media updated successfully'})
-            else:
-                return jsonify({'error': 'No fields to update'}), 400
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'offset is required'}), 400
+    max_bytes = min(app.config['UPLOAD_CHUNK_SIZE'], upload['file_size'] - offset)
+    if request.content_length is not None and request.content_length > max_bytes:
+        return jsonify({'error': f'Chunk larger than {max_bytes} bytes'}), 413
 
-        elif request.method == 'DELETE':
-            # Delete physical file
-            file_path = media_item['file_url'].replace('/static/uploads/', '')
-            full_path = os.path.join(app.config['UPLOAD_FOLDER'], file_path)
+    try:
+        new_offset = chunk_store.write_chunk(upload_id, offset, request.stream, max_bytes)
+    except ChunkError as e:
+        return jsonify({'error': str(e), 'offset': chunk_store.offset(upload_id)}), e.status
 
-            if os.path.exists(full_path):
-                os.remove(full_path)
+    with db_cursor() as (conn, cursor):
+        uploads.touch_session(cursor, upload_id, new_offset, app.config['UPLOAD_SESSION_TTL'])
+        conn.commit()
+    return jsonify(upload_progress(upload, new_offset))
 
-            # Delete from database
-            cursor.execute("DELETE FROM product_media WHERE id = %s", (media_id,))
-            conn.commit()
+@app.route('/api/media/uploads/<upload_id>/complete', methods=['POST'])
+@seller_required
+def complete_chunked_upload(upload_id):
+    seller_id = session['seller_id']
 
-            app.logger.info(f'Media deleted: {media_id} from product {product_id}')
+    with db_cursor() as (conn, cursor):
+        upload = uploads.get_session(cursor, upload_id, seller_id)
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
 
-            return jsonify({'message': 'Media deleted successfully'})
+    received = chunk_store.offset(upload_id)
+    if received != upload['file_size']:
+        return jsonify({'error': 'Upload incomplete', 'offset': received}), 409
 
+    file_ext = upload['file_name'].rsplit('.', 1)[1].lower()
+    reader = chunk_store.reader(upload_id)
+    try:
+        blob = media_store.save(reader, file_ext, f"{upload['media_type']}s")
     except Exception as e:
-        conn.rollback()
-        app.logger.error(f'Single media operation error: {e}')
-        return jsonify({'error': 'Media operation failed'}), 500
+        # The chunks stay put, so the client can retry the completion
+        app.logger.error(f'Complete upload error: {e}')
+        return jsonify({'error': 'Failed to store upload'}), 500
     finally:
-        cursor.close()
-        conn.close()
+        reader.close()
+
+    with db_cursor() as (conn, cursor):
+        try:
+            # Only one completion wins; the session row also disappears if the product was deleted
+            if not uploads.delete_session(cursor, upload_id):
+                conn.rollback()
+                return jsonify({'error': 'Upload not found'}), 404
+
+            blobs.record_blob(cursor, blob, upload['mime_type'])
+            cursor.execute("""
+                           INSERT INTO product_media (product_id, media_type, file_url, file_name, file_size, mime_type, uploader_id, uploader_type)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s, 'seller')
+                           """, (upload['product_id'], upload['media_type'], blob.url,
+                                 upload['file_name'], blob.size, upload['mime_type'], seller_id))
+            media_id = cursor.lastrowid
+            blobs.add_reference(cursor, blob.url)
+            touched = refresh_products(cursor, [upload['product_id']])
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            app.logger.error(f'Complete upload error: {e}')
+            return jsonify({'error': 'Failed to complete upload'}), 500
+
+    chunk_store.discard(upload_id)
+    invalidate_product_listings(*touched)
+    if upload['media_type'] == 'image':
+        schedule_derivatives([(media_id, blob.url)])
+
+    app.logger.info(f"Chunked upload {upload_id} completed for product {upload['product_id']}: {blob.size} bytes")
+    return jsonify({
+        'message': 'Media uploaded successfully',
+        'media': {
+            'id': media_id,
+            'media_type': upload['media_type'],
+            'file_url': blob.url,
+            'file_name': upload['file_name'],
+            'file_size': blob.size,
+            'mime_type': upload['mime_type']
+        }
+    }), 201
 
 # Enhanced product creation with media
 @app.route('/api/products-with-media', methods=['POST'])
@@ -1272,110 +2041,103 @@ def create_product_with_media():
     seller_id = session['seller_id']
 
     # This endpoint expects form data with both product info and files
-    try:
-        # Get product data
-        product_data = {
-            'name': request.form.get('name'),
-            'description': request.form.get('description'),
-            'price': request.form.get('price'),
-            'category_id': request.form.get('category_id'),
-            'conditions': request.form.get('conditions', 'good'),
-            'stock_quantity': request.form.get('stock_quantity', 1)
-        }
-
-        # Validate required fields
-        required_fields = ['name', 'description', 'price', 'category_id']
-        for field in required_fields:
-            if not product_data.get(field):
-                return jsonify({'error': f'Missing required field: {field}'}), 400
-
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-
-        cursor = conn.cursor(dictionary=True)
-
-        # Create product
-        cursor.execute("""
-                       INSERT INTO products (seller_id, category_id, name, description, price, conditions, stock_quantity)
-                       VALUES (%s, %s, %s, %s, %s, %s, %s)
-                       """, (seller_id, product_data['category_id'], product_data['name'],
-                             product_data['description'], product_data['price'],
-                             product_data['conditions'], product_data['stock_quantity']))
-
-        product_id = cursor.lastrowid
-
-        # Handle media uploads
-        if 'media' in request.files:
-            files = request.files.getlist('media')
-            primary_set = False
-
-            for i, file in enumerate(files):
-                if file.filename == '':
-                    continue
-
-                filename = secure_filename(file.filename)
-                file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
-
-                # Determine media type
-                if file_ext in ALLOWED_IMAGE_EXTENSIONS:
-                    media_type = 'image'
-                    upload_dir = 'images'
-                    mime_type = f'image/{file_ext}'
-                elif file_ext in ALLOWED_VIDEO_EXTENSIONS:
-                    media_type = 'video'
-                    upload_dir = 'videos'
-                    mime_type = f'video/{file_ext}'
-                else:
-                    continue  # Skip invalid files
-
-                # Generate unique filename
-                unique_filename = f"{uuid.uuid4()}_{filename}"
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], upload_dir, unique_filename)
-                file.save(filepath)
+    # Get product data
+    product_data = {
+        'name': request.form.get('name'),
+        'description': request.form.get('description'),
+        'price': request.form.get('price'),
+        'category_id': request.form.get('category_id'),
+        'conditions': request.form.get('conditions', 'good'),
+        'stock_quantity': request.form.get('stock_quantity', 1)
+    }
 
-                # Get file size
-                file_size = os.path.getsize(filepath)
+    # Validate required fields
+    required_fields = ['name', 'description', 'price', 'category_id']
+    for field in required_fields:
+        if not product_data.get(field):
+            return jsonify({'error': f'Missing required field: {field}'}), 400
 
-                # Set first image as primary
-                is_primary = not primary_set and media_type == 'image'
-                if is_primary:
-                    primary_set = True
+    with db_cursor() as (conn, cursor):
+        try:
+            # Create product
+            cursor.execute("""
+                           INSERT INTO products (seller_id, category_id, name, description, price, conditions, stock_quantity)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s)
+                           """, (seller_id, product_data['category_id'], product_data['name'],
+                                 product_data['description'], product_data['price'],
+                                 product_data['conditions'], product_data['stock_quantity']))
+
+            product_id = cursor.lastrowid
+            new_images = []
+
+            # Handle media uploads
+            if 'media' in request.files:
+                files = request.files.getlist('media')
+                primary_set = False
+
+                for i, file in enumerate(files):
+                    if file.filename == '':
+                        continue
+
+                    filename = secure_filename(file.filename)
+                    file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+                    # Determine media type
+                    if file_ext in ALLOWED_IMAGE_EXTENSIONS:
+                        media_type = 'image'
+                        upload_dir = 'images'
+                        mime_type = f'image/{file_ext}'
+                    elif file_ext in ALLOWED_VIDEO_EXTENSIONS:
+                        media_type = 'video'
+                        upload_dir = 'videos'
+                        mime_type = f'video/{file_ext}'
+                    else:
+                        continue  # Skip invalid files
+
+                    # Store by content hash; identical uploads share one file
+                    blob = media_store.save(file.stream, file_ext, upload_dir)
+                    blobs.record_blob(cursor, blob, mime_type)
+                    file_size = blob.size
+
+                    # Set first image as primary
+                    is_primary = not primary_set and media_type == 'image'
+                    if is_primary:
+                        primary_set = True
+
+                    # Insert into database
+                    cursor.execute("""
+                                   INSERT INTO product_media (product_id, media_type, file_url, file_name, file_size,
+                                                              mime_type, sort_order, is_primary, uploader_id, uploader_type)
+                                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'seller')
+                                   """, (product_id, media_type, blob.url,
+                                         filename, file_size, mime_type, i, is_primary, seller_id))
+                    if media_type == 'image':
+                        new_images.append((cursor.lastrowid, blob.url))
+                    blobs.add_reference(cursor, blob.url)
 
-                # Insert into database
-                cursor.execute("""
-                               INSERT INTO product_media (product_id, media_type, file_url, file_name, file_size,
-                                                          mime_type, sort_order, is_primary, uploader_id, uploader_type)
-                               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'seller')
-                               """, (product_id, media_type, f'/static/uploads/{upload_dir}/{unique_filename}',
-                                     filename, file_size, mime_type, i, is_primary, seller_id))
-
-        # Update seller stats
-        cursor.execute("""
-                       UPDATE seller_stats
-                       SET total_products = total_products + 1
-                       WHERE seller_id = %s
-                       """, (seller_id,))
+            # Update seller stats
+            cursor.execute("""
+                           UPDATE seller_stats
+                           SET total_products = total_products + 1
+                           WHERE seller_id = %s
+                           """, (seller_id,))
 
-        conn.commit()
+            refresh_products(cursor, [product_id])
+            conn.commit()
+            invalidate_product_listings([product_data['category_id']], [seller_id])
+            schedule_derivatives(new_images)
 
-        app.logger.info(f'Product created with media: {product_id} by seller {seller_id}')
+            app.logger.info(f'Product created with media: {product_id} by seller {seller_id}')
 
-        return jsonify({
-            'message': 'Product created successfully with media',
-            'product_id': product_id
-        }), 201
+            return jsonify({
+                'message': 'Product created successfully with media',
+                'product_id': product_id
+            }), 201
 
-    except Exception as e:
-        if 'conn' in locals():
+        except Exception as e:
             conn.rollback()
-        app.logger.error(f'Product with media creation error: {e}')
-        return jsonify({'error': 'Product creation failed'}), 500
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
+            app.logger.error(f'Product with media creation error: {e}')
+            return jsonify({'error': 'Product creation failed'}), 500
 
 
 
@@ -1386,60 +2148,57 @@ def seller_dashboard():
      seller_id = session.get('seller_id')
      if not seller_id:
          return jsonify({'error': 'Unauthorized'}), 401
-
-     conn = get_db_connection()
-     if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
+     # fields= picks the recent_orders fields, as on /api/orders
      try:
-         cursor = conn.cursor(dictionary=True)
-
-        # Get seller stats
-         cursor.execute("""
-             SELECT total_revenue, total_orders, total_products, pending_orders
-             FROM seller_stats
-             WHERE seller_id = %s
-         """, (seller_id,))
+         fields = seller_order_fields.parse(request.args.get('fields'))
+     except ValueError as e:
+         return jsonify({'error': str(e)}), 400
+
+     with db_cursor() as (conn, cursor):
+         try:
+            # Get seller stats
+             cursor.execute("""
+                 SELECT total_revenue, total_orders, total_products, pending_orders
+                 FROM seller_stats
+                 WHERE seller_id = %s
+             """, (seller_id,))
          
-         stats = cursor.fetchone() or {
-             'total_revenue': 0,
-             'total_orders': 0,
-             'total_products': 0,
-             'pending_orders': 0
-         }
+             stats = cursor.fetchone() or {
+                 'total_revenue': 0,
+                 'total_orders': 0,
+                 'total_products': 0,
+                 'pending_orders': 0
+             }
          
-         # Confirm seller exists
-        # cursor.execute("SELECT id FROM sellers WHERE id = %s", (seller_id,))
-        # if not cursor.fetchone():
-         #    return jsonify({'error': 'Seller not found'}), 404
+             # Confirm seller exists
+            # cursor.execute("SELECT id FROM sellers WHERE id = %s", (seller_id,))
+            # if not cursor.fetchone():
+             #    return jsonify({'error': 'Seller not found'}), 404
 
          
-        # Get recent orders
-         cursor.execute("""
-              SELECT o.*, oi.product_id, oi.quantity, oi.status as item_status,
-              p.name as product_name, u.full_name as customer_name
-                       FROM orders o
-              JOIN order_items oi ON o.id = oi.order_id
-              JOIN products p ON oi.product_id = p.id
-              JOIN users u ON o.user_id = u.id
-              WHERE oi.seller_id = %s
-              ORDER BY o.created_at DESC
-              LIMIT 5
-         """, (seller_id,))
-         recent_orders = cursor.fetchall()
+            # Get recent orders
+             cursor.execute(f"""
+                  SELECT {seller_order_fields.select(fields)}
+                           FROM orders o
+                  JOIN order_items oi ON o.id = oi.order_id
+                  JOIN products p ON oi.product_id = p.id
+                  JOIN users u ON o.user_id = u.id
+                  WHERE oi.seller_id = %s
+                  ORDER BY o.created_at DESC
+                  LIMIT 5
+             """, (seller_id,))
+             recent_orders = cursor.fetchall()
          
-        # app.logger.info(f'Seller {seller_id} accessed dashboard')
+            # app.logger.info(f'Seller {seller_id} accessed dashboard')
 
-         return jsonify({
-             'stats': stats,
-             'recent_orders': recent_orders
-         })
+             return jsonify({
+                 'stats': stats,
+                 'recent_orders': recent_orders
+             })
 
-     except Exception as e:
-        app.logger.error(f'Seller dashboard error: {e}')
-        return jsonify({'error': 'Failed to load dashboard'}), 500
-     finally:
-         cursor.close()
-         conn.close()
+         except Exception as e:
+            app.logger.error(f'Seller dashboard error: {e}')
+            return jsonify({'error': 'Failed to load dashboard'}), 500
 
 @app.route('/api/seller/products', methods=['GET', 'POST'])
 @seller_required
@@ -1448,77 +2207,79 @@ def manage_seller_products():
     if not seller_id:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
-    try:
-        cursor = conn.cursor(dictionary=True)
-
-        if request.method == 'GET':
-            cursor.execute("""
-                           SELECT p.*, c.name as category_name
-                           FROM products p
-                                    LEFT JOIN categories c ON p.category_id = c.id
-                           WHERE p.seller_id = %s
-                           ORDER BY p.created_at DESC
-                           """, (seller_id,))
-
-            products = cursor.fetchall()
+    if request.method == 'GET':
+        limit = page_limit(request.args.get('limit'), app.config['PAGE_SIZE_DEFAULT'], app.config['PAGE_SIZE_MAX'])
+        keyset = Keyset(('p.created_at', 'created_at'), ('p.id', 'id'))
+        after_sql, after_params = keyset.after(request.args.get('cursor'))
+        order_sql, _ = keyset.order_by()
+        try:
+            fields = seller_product_fields.parse(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        columns, stored = product_columns(seller_product_fields, fields)
 
-            for product in products:
-                if product['images']:
-                    product['images'] = json.loads(product['images'])
-                else:
-                    product['images'] = []
+    with db_cursor() as (conn, cursor):
+        try:
+            if request.method == 'GET':
+                cursor.execute(f"""
+                               SELECT {columns}
+                               FROM products p
+                                        LEFT JOIN product_documents d ON d.product_id = p.id
+                               WHERE p.seller_id = %s{after_sql}
+                               {order_sql}
+                               LIMIT %s
+                               """, (seller_id, *after_params, limit + 1))
 
-                if product['videos']:
-                    product['videos'] = json.loads(product['videos'])
-                else:
-                    product['videos'] = []
+                rows, next_cursor = keyset.page(cursor.fetchall(), limit)
+                products = product_responses(conn, cursor, rows, fields, stored)
 
-            return jsonify({'products': products})
+                return jsonify({'products': products, 'next_cursor': next_cursor})
 
-        elif request.method == 'POST':
-            data = request.json
+            elif request.method == 'POST':
+                data = request.json
 
-            required_fields = ['name', 'description', 'price', 'category_id']
-            for field in required_fields:
-                if not data.get(field):
-                    return jsonify({'error': f'Missing required field: {field}'}), 400
+                required_fields = ['name', 'description', 'price', 'category_id']
+                for field in required_fields:
+                    if not data.get(field):
+                        return jsonify({'error': f'Missing required field: {field}'}), 400
 
-            images = json.dumps(data.get('images', []))
-            videos = json.dumps(data.get('videos', []))
+                images = json.dumps(data.get('images', []))
+                videos = json.dumps(data.get('videos', []))
 
-            cursor.execute("""
-                           INSERT INTO products (seller_id, category_id, name, description, price, original_price,
-                                                 conditions, size, color, brand, material, images, videos, stock_quantity)
-                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                           """, (seller_id, data.get('category_id'), data.get('name'), data.get('description'),
-                                 data.get('price'), data.get('original_price'), data.get('conditions', 'good'),
-                                 data.get('size'), data.get('color'), data.get('brand'), data.get('material'),
-                                 images, videos, data.get('stock_quantity', 1)))
-
-            # Update seller product count
-            cursor.execute("""
-                           UPDATE seller_stats
-                           SET total_products = total_products + 1
-                           WHERE seller_id = %s
-                           """, (seller_id,))
+                cursor.execute("""
+                               INSERT INTO products (seller_id, category_id, name, description, price, original_price,
+                                                     conditions, size, color, brand, material, images, videos, stock_quantity)
+                               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                               """, (seller_id, data.get('category_id'), data.get('name'), data.get('description'),
+                                     data.get('price'), data.get('original_price'), data.get('conditions', 'good'),
+                                     data.get('size'), data.get('color'), data.get('brand'), data.get('material'),
+                                     images, videos, data.get('stock_quantity', 1)))
+
+                # Track the images in product_media so they get derivatives
+                product_id = cursor.lastrowid
+                new_images = register_images(cursor, product_id, seller_id,
+                                             image_urls(data.get('images', [])))
+                refresh_products(cursor, [product_id])
+
+                # Update seller product count
+                cursor.execute("""
+                               UPDATE seller_stats
+                               SET total_products = total_products + 1
+                               WHERE seller_id = %s
+                               """, (seller_id,))
 
-            conn.commit()
+                conn.commit()
+                invalidate_product_listings([data.get('category_id')], [seller_id])
+                schedule_derivatives(new_images)
 
-            app.logger.info(f'New product added by seller {seller_id}')
+                app.logger.info(f'New product added by seller {seller_id}')
 
-            return jsonify({'message': 'Product added successfully'}), 201
+                return jsonify({'message': 'Product added successfully'}), 201
 
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f'Seller products error: {e}')
-        return jsonify({'error': 'Product operation failed'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        except Exception as e:
+            conn.rollback()
+            app.logger.error(f'Seller products error: {e}')
+            return jsonify({'error': 'Product operation failed'}), 500
 
 @app.route('/api/seller/products/<int:product_id>', methods=['PUT', 'DELETE'])
 @seller_required
@@ -1527,70 +2288,80 @@ def manage_seller_product(product_id):
     if not seller_id:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
-    try:
-        cursor = conn.cursor(dictionary=True)
-
-        # Verify product belongs to seller
-        cursor.execute("SELECT id FROM products WHERE id = %s AND seller_id = %s", (product_id, seller_id))
-        if not cursor.fetchone():
-            return jsonify({'error': 'Product not found'}), 404
+    with db_cursor() as (conn, cursor):
+        try:
+            # Verify product belongs to seller
+            cursor.execute("SELECT id, category_id, images FROM products WHERE id = %s AND seller_id = %s",
+                           (product_id, seller_id))
+            existing = cursor.fetchone()
+            if not existing:
+                return jsonify({'error': 'Product not found'}), 404
 
-        if request.method == 'PUT':
-            data = request.json
+            if request.method == 'PUT':
+                data = request.json
 
-            update_fields = []
-            params = []
+                update_fields = []
+                params = []
 
-            allowed_fields = ['name', 'description', 'price', 'original_price', 'category_id',
-                              'conditions', 'size', 'color', 'brand', 'material', 'stock_quantity',
-                              'images', 'videos', 'is_active']
+                allowed_fields = ['name', 'description', 'price', 'original_price', 'category_id',
+                                  'conditions', 'size', 'color', 'brand', 'material', 'stock_quantity',
+                                  'images', 'videos', 'is_active']
 
-            for field in allowed_fields:
-                if field in data:
-                    update_fields.append(f"{field} = %s")
-                    if field in ['images', 'videos']:
-                        params.append(json.dumps(data[field]))
-                    else:
-                        params.append(data[field])
+                for field in allowed_fields:
+                    if field in data:
+                        update_fields.append(f"{field} = %s")
+                        if field in ['images', 'videos']:
+                            params.append(json.dumps(data[field]))
+                        else:
+                            params.append(data[field])
 
-            if not update_fields:
-                return jsonify({'error': 'No fields to update'}), 400
+                if not update_fields:
+                    return jsonify({'error': 'No fields to update'}), 400
 
-            params.extend([product_id, seller_id])
-            query = f"UPDATE products SET {', '.join(update_fields)} WHERE id = %s AND seller_id = %s"
+                params.extend([product_id, seller_id])
+                query = f"UPDATE products SET {', '.join(update_fields)} WHERE id = %s AND seller_id = %s"
 
-            cursor.execute(query, params)
-            conn.commit()
+                cursor.execute(query, params)
+                new_images = []
+                if 'images' in data:
+                    urls = image_urls(data['images'] or [])
+                    # Images dropped from the list lose their media rows and blob references
+                    try:
+                        previous = image_urls(existing['images'])
+                    except (ValueError, TypeError):
+                        previous = []
+                    release_media(cursor, product_id, [url for url in previous if url not in urls], 'image')
+                    new_images = register_images(cursor, product_id, seller_id, urls)
+                refresh_products(cursor, [product_id])
+                conn.commit()
+                invalidate_product_listings([existing['category_id'], data.get('category_id')], [seller_id])
+                schedule_derivatives(new_images)
 
-            return jsonify({'message': 'Product updated successfully'})
+                return jsonify({'message': 'Product updated successfully'})
 
-        elif request.method == 'DELETE':
-            cursor.execute("DELETE FROM products WHERE id = %s AND seller_id = %s", (product_id, seller_id))
+            elif request.method == 'DELETE':
+                # The media rows would go with the product (ON DELETE CASCADE); release their blobs first
+                release_media(cursor, product_id)
+                cursor.execute("DELETE FROM products WHERE id = %s AND seller_id = %s", (product_id, seller_id))
 
-            # Update seller product count
-            cursor.execute("""
-                           UPDATE seller_stats
-                           SET total_products = GREATEST(0, total_products - 1)
-                           WHERE seller_id = %s
-                           """, (seller_id,))
+                # Update seller product count
+                cursor.execute("""
+                               UPDATE seller_stats
+                               SET total_products = GREATEST(0, total_products - 1)
+                               WHERE seller_id = %s
+                               """, (seller_id,))
 
-            conn.commit()
+                conn.commit()
+                invalidate_product_listings([existing['category_id']], [seller_id])
 
-            app.logger.info(f'Product {product_id} deleted by seller {seller_id}')
+                app.logger.info(f'Product {product_id} deleted by seller {seller_id}')
 
-            return jsonify({'message': 'Product deleted successfully'})
+                return jsonify({'message': 'Product deleted successfully'})
 
-    except Exception as e:
-        conn.rollback()
-        app.logger.error(f'Seller product operation error: {e}')
-        return jsonify({'error': 'Product operation failed'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+        except Exception as e:
+            conn.rollback()
+            app.logger.error(f'Seller product operation error: {e}')
+            return jsonify({'error': 'Product operation failed'}), 500
 
 # File Upload Route
 @app.route('/api/upload-media', methods=['POST'])
@@ -1601,6 +2372,7 @@ def upload_media():
 
     files = request.files.getlist('media')
     uploaded_files = {'images': [], 'videos': []}
+    stored = []
 
     for file in files:
         if file.filename == '':
@@ -1612,17 +2384,15 @@ def upload_media():
         try:
             if file_ext in ALLOWED_IMAGE_EXTENSIONS:
                 # Save image
-                unique_filename = f"{uuid.uuid4()}_{filename}"
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], 'images', unique_filename)
-                file.save(filepath)
-                uploaded_files['images'].append(f'/static/uploads/images/{unique_filename}')
+                blob = media_store.save(file.stream, file_ext, 'images')
+                stored.append((blob, f'image/{file_ext}'))
+                uploaded_files['images'].append(blob.url)
 
             elif file_ext in ALLOWED_VIDEO_EXTENSIONS:
                 # Save video
-                unique_filename = f"{uuid.uuid4()}_{filename}"
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], 'videos', unique_filename)
-                file.save(filepath)
-                uploaded_files['videos'].append(f'/static/uploads/videos/{unique_filename}')
+                blob = media_store.save(file.stream, file_ext, 'videos')
+                stored.append((blob, f'video/{file_ext}'))
+                uploaded_files['videos'].append(blob.url)
 
             else:
                 return jsonify({'error': f'Invalid file type: {file_ext}'}), 400
@@ -1631,35 +2401,136 @@ def upload_media():
             app.logger.error(f'File upload error: {e}')
             return jsonify({'error': 'Failed to upload files'}), 500
 
+    # Unreferenced until a product uses them; the media GC's grace period covers the gap
+    if stored:
+        with db_cursor() as (conn, cursor):
+            for blob, mime_type in stored:
+                blobs.record_blob(cursor, blob, mime_type)
+            conn.commit()
+
     app.logger.info(f'Media uploaded: {len(uploaded_files["images"])} images, {len(uploaded_files["videos"])} videos')
     return jsonify(uploaded_files)
 
 # Static file serving
+def compressed_response(asset, mimetype, max_age):
+    """Serve a CompressedAsset in the best encoding the client accepts, answering If-None-Match with 304"""
+    encoding = negotiate(lambda name: request.accept_encodings[name], asset.encodings)
+    response = app.response_class(asset.body(encoding), mimetype=mimetype)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(asset.etag_for(encoding))
+    response.headers['Cache-Control'] = f'public, max-age={max_age}' if max_age else 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/static/<any("app.js", "backend-connector.js"):filename>')
+def serve_static_asset(filename):
+    asset = static_asset_cache.file(os.path.join(app.static_folder, filename))
+    return compressed_response(asset, 'text/javascript', app.config['STATIC_ASSET_MAX_AGE'])
+
 @app.route('/static/uploads/<path:filename>')
 def serve_uploaded_files(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    upload_root = os.path.normpath(os.path.join(app.root_path, app.config['UPLOAD_FOLDER']))
+    path = os.path.normpath(os.path.join(upload_root, filename))
+    if filename.startswith('.') or not path.startswith(upload_root + os.sep) or not os.path.isfile(path):
+        return jsonify({'error': 'Endpoint not found'}), 404
+
+    # send_file answers If-None-Match/If-Modified-Since with 304 and Range requests (video seeking) with 206
+    immutable = is_immutable_upload(filename)
+    response = send_from_directory(
+        app.config['UPLOAD_FOLDER'], filename,
+        etag=file_etag(path, filename),
+        max_age=app.config['IMMUTABLE_MAX_AGE'] if immutable else app.config['UPLOAD_MAX_AGE'],
+        conditional=True
+    )
+    if immutable:
+        response.headers['Cache-Control'] = f"public, max-age={app.config['IMMUTABLE_MAX_AGE']}, immutable"
+    return response
 
 # Categories Route
-@app.route('/api/categories')
-def get_categories():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-
-    try:
-        cursor = conn.cursor(dictionary=True)
-
+def category_listing(audience, is_current=None):
+    """/api/categories: (body, etag, last_modified), body None when is_current(etag, last_modified)"""
+    etag, last_modified = catalog_watermark.validators(('categories',), 'categories')
+    if is_current and is_current(etag, last_modified):
+        return None, etag, last_modified
+    body = response_cache.get('/api/categories', audience, etag)
+    if body is not None:
+        return body, etag, last_modified
+
+    with db_cursor() as (conn, cursor):
         cursor.execute("SELECT * FROM categories WHERE is_active = TRUE ORDER BY name")
         categories = cursor.fetchall()
 
-        return jsonify({'categories': categories})
+    body = app.json.dumps({'categories': categories})
+    response_cache.set('/api/categories', audience, etag, body)
+    return body, etag, last_modified
 
+@app.route('/api/categories')
+def get_categories():
+    audience = request_audience()
+    try:
+        body, etag, last_modified = category_listing(audience, not_modified)
+        return validated_response(body, etag, last_modified, audience)
+
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         app.logger.error(f'Categories error: {e}')
         return jsonify({'error': 'Failed to fetch categories'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+
+# Home page bootstrap: everything the first paint needs in one response
+app.config['BOOTSTRAP_WORKERS'] = int(os.getenv('BOOTSTRAP_WORKERS', 8))
+app.config['BOOTSTRAP_FEATURED_LIMIT'] = int(os.getenv('BOOTSTRAP_FEATURED_LIMIT', 6))
+
+bootstrap_executor = ThreadPoolExecutor(max_workers=app.config['BOOTSTRAP_WORKERS'],
+                                        thread_name_prefix='bootstrap')
+atexit.register(bootstrap_executor.shutdown, wait=False)
+
+def session_summary(user_id, seller_id):
+    """{'user', 'user_type', 'cart_count'} for the signed-in buyer or seller"""
+    if user_id is None and seller_id is None:
+        return {'user': None, 'user_type': None, 'cart_count': 0}
+    if seller_id is not None:
+        return {'user': load_profile('seller', seller_id), 'user_type': 'seller', 'cart_count': 0}
+    user = load_profile('user', user_id)
+    with db_cursor() as (conn, cursor):
+        cursor.execute("SELECT COALESCE(SUM(quantity), 0) AS items FROM cart WHERE user_id = %s", (user_id,))
+        return {'user': user, 'user_type': 'buyer', 'cart_count': int(cursor.fetchone()['items'])}
+
+@app.route('/api/bootstrap')
+def bootstrap():
+    """
+    Session user, cart count, categories, featured and newest products in one
+    response. categories/featured/products hold exactly what /api/categories,
+    /api/products?featured=1 and /api/products return; they are built in
+    parallel from the same caches as those endpoints.
+    """
+    audience = request_audience()
+    user_id, seller_id = session.get('user_id'), session.get('seller_id')
+    featured_args = MultiDict({'featured': '1', 'limit': str(app.config['BOOTSTRAP_FEATURED_LIMIT'])})
+    try:
+        pieces = {
+            'categories': bootstrap_executor.submit(category_listing, audience),
+            'featured': bootstrap_executor.submit(product_listing, featured_args, audience),
+            'products': bootstrap_executor.submit(product_listing, MultiDict(), audience),
+        }
+        summary = session_summary(user_id, seller_id)
+        catalog = {name: future.result() for name, future in pieces.items()}
+    except DatabaseUnavailable:
+        raise
+    except Exception as e:
+        app.logger.error(f'Bootstrap error: {e}')
+        return jsonify({'error': 'Failed to load the home page'}), 500
+
+    # The catalog pieces are already serialized; splice them in rather than decode and re-encode
+    summary_json = app.json.dumps(summary)
+    body = '{' + ','.join([f'"{name}":{piece[0]}' for name, piece in catalog.items()] +
+                          [summary_json[1:-1]]) + '}'
+    etag = make_etag(summary_json, *(piece[1] for piece in catalog.values()))
+    # The product listings and the session summary carry no date, so the ETag alone validates
+    if not_modified(etag, None):
+        body = None
+    return validated_response(body, etag, None, audience)
 
 # Contact Route
 @app.route('/api/contact', methods=['POST'])
@@ -1679,16 +2550,12 @@ def contact():
         app.logger.info(f'Contact form submitted: {subject} from {name} ({email})')
 
         # Store message in database if needed
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor()
+        with db_cursor(dictionary=False) as (conn, cursor):
             cursor.execute("""
                            INSERT INTO messages (sender_name, sender_email, subject, message)
                            VALUES (%s, %s, %s, %s)
                            """, (name, email, subject, message))
             conn.commit()
-            cursor.close()
-            conn.close()
 
         return jsonify({'message': 'Thank you for your message. We will get back to you soon.'})
 
@@ -1708,9 +2575,63 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'database': db_status,
+        'db_pool': db_pool.stats(),
+        'product_cache': product_cache.stats(),
+        'response_cache': response_cache.stats(),
+        'catalog_watermark': catalog_watermark.stats(),
+        'facet_index': facet_index.stats(),
+        'sessions': server_sessions.stats() if server_sessions else {'backend': 'cookie'},
+        'access_tokens': access_tokens.stats(),
+        'refresh_token_sweeper': refresh_token_sweeper.stats(),
+        'profile_cache': profile_cache.stats(),
+        'view_counts': view_counter.stats(),
+        'seller_stats_reconciler': stats_reconciler.stats(),
+        'reservation_sweeper': reservation_sweeper.stats(),
+        'media_derivatives': media_pipeline.stats(),
+        'media_gc': media_gc.stats(),
+        'upload_sessions': upload_sweeper.stats(),
+        'password_hasher': password_hasher.stats(),
+        'audit_log': audit_log.stats(),
+        'product_documents': document_refresher.stats(),
         'timestamp': datetime.now().isoformat()
     })
 
+# Request metrics
+@app.before_request
+def start_request_metrics():
+    if app.config['METRICS_ENABLED']:
+        # Route template rather than the raw path, so /api/products/<int:product_id> is one series
+        metrics.begin_request(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+def record_request_metrics(response):
+    if app.config['METRICS_ENABLED']:
+        timing = metrics.end_request(request.method, response.status_code)
+        if timing:
+            duration, queries, db_time = timing
+            response.headers['Server-Timing'] = (f'app;dur={duration * 1000:.1f}, '
+                                                 f'db;dur={db_time * 1000:.1f};desc="{queries} queries"')
+    return response
+
+def pool_metrics():
+    stats = db_pool.stats()
+    ns = metrics.namespace
+    return (gauge_lines(f'{ns}_db_pool_connections', 'Pooled connections by state',
+                        [({'state': 'in_use'}, stats['in_use']), ({'state': 'idle'}, stats['idle'])]) +
+            gauge_lines(f'{ns}_db_pool_size', 'Maximum pooled connections', [({}, stats['size'])]) +
+            gauge_lines(f'{ns}_db_pool_checkouts_total', 'Connections checked out of the pool',
+                        [({}, stats['checkouts'])], kind='counter') +
+            gauge_lines(f'{ns}_db_pool_timeouts_total', 'Checkouts that gave up waiting for a connection',
+                        [({}, stats['timeouts'])], kind='counter'))
+
+metrics.register_collector(pool_metrics)
+
+@app.route('/api/metrics')
+def get_metrics():
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -1725,31 +2646,27 @@ def internal_error(error):
 def too_large(error):
     return jsonify({'error': 'File too large'}), 413
 
+@app.errorhandler(InvalidCursor)
+def invalid_cursor(error):
+    return jsonify({'error': 'Invalid cursor'}), 400
+
+@app.errorhandler(DatabaseUnavailable)
+def database_unavailable(error):
+    return jsonify({'error': 'Database connection failed'}), 500
+
+@app.errorhandler(HasherBusy)
+def password_hasher_busy(error):
+    app.logger.warning(f'Password hashing overloaded: {error}')
+    response = jsonify({'error': 'Server busy, please try again shortly'})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
 
 
 if __name__ == '__main__':
     # Create upload directories
     create_upload_dirs()
 
-    # Configure logging only once
-    if not app.logger.handlers:
-        import os, logging
-        from logging.handlers import RotatingFileHandler
-
-        os.makedirs("logs", exist_ok=True)
-        handler = RotatingFileHandler(
-            "logs/mzansi_thrift.log",
-            maxBytes=1_000_000,
-            backupCount=5,
-            delay=True  # helps avoid Windows file locks
-        )
-        handler.setLevel(logging.INFO)
-        formatter = logging.Formatter(
-            "%(asctime)s %(levelname)s in %(module)s: %(message)s"
-        )
-        handler.setFormatter(formatter)
-        app.logger.addHandler(handler)
-
     # Start the Flask application
     app.logger.info('Starting Mzansi Thrift Store API server...')
     app.run(debug=True, host='0.0.0.0', port=5000, use_reloader=False)
@@ -0,0 +1,271 @@
+"""
+Write-behind queue for activity_logs.
+
+Request handlers call AuditLog.record() and return; a background thread
+collects queued events into a batch until `batch_size` of them are in it or
+`flush_interval` seconds have passed since its first one, and writes each
+batch with one multi-row INSERT.
+
+- Memory is bounded by `max_queue`. When the queue is full, the 'drop'
+  policy discards the new event at once; 'block' makes the caller wait up
+  to `block_timeout` seconds for room before dropping it. Dropped events
+  are counted in stats().
+- If MySQL cannot be reached, the batch is appended to a JSON-lines
+  journal (<journal_dir>/audit-journal-<pid>.jsonl) and replayed once
+  writes succeed again. A journal left behind by a dead process is picked up
+  by whichever process replays next. Replays claim a journal by renaming it
+  to <journal>.replay-<pid>; one left by a replay that died midway is put
+  back in line at startup (its already-written rows are written again).
+- A batch rejected for its data (e.g. a user deleted since the event was
+  queued, failing the foreign key) is retried row by row, so one bad row
+  does not discard the others.
+- stop() flushes what is still queued, falling back to the journal.
+
+Events carry their own created_at, so delayed writes keep the time the
+action happened.
+"""
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ('user_id', 'user_type', 'action', 'description', 'ip_address', 'user_agent',
+           'resource_type', 'resource_id', 'metadata', 'created_at')
+MAX_USER_AGENT = 1000
+STALE_REPLAY_AFTER = 600  # seconds; where the claiming process can't be checked
+
+
+def _replay_abandoned(path, pid):
+    """Whether the process that claimed a journal for replay is gone (checked at startup)"""
+    if pid == os.getpid():
+        return True  # a previous process with our pid; we haven't replayed anything yet
+    if os.name != 'posix':
+        # os.kill() can't probe a process on Windows; replays touch their file once per batch
+        return time.time() - os.path.getmtime(path) > STALE_REPLAY_AFTER
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass  # exists, but belongs to someone else
+    return False
+
+
+class AuditLog:
+    def __init__(self, connection_factory, journal_dir='logs', flush_interval=2.0, batch_size=500,
+                 max_queue=10000, overflow='drop', block_timeout=0.05):
+        if overflow not in ('drop', 'block'):
+            raise ValueError(f'Unknown overflow policy: {overflow}')
+        self.connection_factory = connection_factory
+        self.journal_dir = journal_dir
+        self.journal_path = os.path.join(journal_dir, f'audit-journal-{os.getpid()}.jsonl')
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._recover_replays()
+        self._journal_pending = bool(glob.glob(os.path.join(journal_dir, 'audit-journal-*.jsonl')))
+        self._stats = {'recorded': 0, 'written': 0, 'dropped': 0, 'rejected': 0, 'journaled': 0,
+                       'replayed': 0, 'failed_flushes': 0}
+
+    def record(self, action, user_id=None, user_type='user', resource_type=None, resource_id=None,
+               description=None, metadata=None, ip_address=None, user_agent=None):
+        """Queue one activity_logs row; returns False if it was dropped because the queue is full"""
+        row = (user_id, user_type, action, description, ip_address,
+               user_agent[:MAX_USER_AGENT] if user_agent else None, resource_type, resource_id,
+               json.dumps(metadata) if metadata else None,
+               datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        try:
+            if self.overflow == 'block':
+                self._queue.put(row, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            return False
+        with self._lock:
+            self._stats['recorded'] += 1
+        return True
+
+    def _take(self, limit, timeout=None):
+        """Up to `limit` queued rows, waiting up to `timeout` seconds for the first one"""
+        rows = []
+        try:
+            rows.append(self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait())
+            while len(rows) < limit:
+                rows.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return rows
+
+    def _insert(self, conn, rows):
+        cursor = conn.cursor()
+        try:
+            placeholders = '(' + ', '.join(['%s'] * len(COLUMNS)) + ')'
+            query = (f"INSERT INTO activity_logs ({', '.join(COLUMNS)}) "
+                     f"VALUES {', '.join([placeholders] * len(rows))}")
+            try:
+                cursor.execute(query, [v for row in rows for v in row])
+                conn.commit()
+                return len(rows)
+            except (mysql.connector.IntegrityError, mysql.connector.DataError) as err:
+                conn.rollback()
+                logger.warning(f'Audit batch rejected ({err}); retrying {len(rows)} rows one by one')
+
+            written = 0
+            for row in rows:
+                try:
+                    cursor.execute(f"INSERT INTO activity_logs ({', '.join(COLUMNS)}) VALUES {placeholders}", row)
+                    written += 1
+                except (mysql.connector.IntegrityError, mysql.connector.DataError) as err:
+                    logger.error(f'Dropping audit event {row[2]} for {row[1]} {row[0]}: {err}')
+                    with self._lock:
+                        self._stats['rejected'] += 1
+            conn.commit()
+            return written
+        finally:
+            cursor.close()
+
+    def _write(self, rows):
+        """Insert rows; on a connection/server failure append them to the journal instead"""
+        try:
+            with self.connection_factory() as conn:
+                written = self._insert(conn, rows)
+        except Exception as err:
+            logger.error(f'Audit flush failed, journaling {len(rows)} events: {err}')
+            self._journal(rows)
+            with self._lock:
+                self._stats['failed_flushes'] += 1
+            return False
+        with self._lock:
+            self._stats['written'] += written
+        return True
+
+    def _journal(self, rows):
+        try:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps(row) + '\n')
+        except OSError as err:
+            logger.error(f'Audit journal write failed, dropping {len(rows)} events: {err}')
+            with self._lock:
+                self._stats['dropped'] += len(rows)
+            return
+        self._journal_pending = True
+        with self._lock:
+            self._stats['journaled'] += len(rows)
+
+    def _recover_replays(self):
+        """Rename journals claimed by a replay whose process is gone so they get replayed again"""
+        for path in glob.glob(os.path.join(self.journal_dir, 'audit-journal-*.jsonl.replay-*')):
+            journal, _, pid = path.rpartition('.replay-')
+            if not pid.isdigit() or not _replay_abandoned(path, int(pid)):
+                continue
+            recovered = f'{journal[:-len(".jsonl")]}-recovered-{pid}.jsonl'
+            try:
+                os.rename(path, recovered)
+            except OSError as err:
+                logger.error(f'Could not recover audit journal {path}: {err}')
+                continue
+            logger.warning(f'Recovered audit journal {path} left by an interrupted replay')
+
+    def _replay_journal(self):
+        """Write journaled events back to MySQL; files are claimed by renaming so only one process replays each"""
+        pending = False
+        for path in sorted(glob.glob(os.path.join(self.journal_dir, 'audit-journal-*.jsonl'))):
+            claimed = f'{path}.replay-{os.getpid()}'
+            try:
+                os.rename(path, claimed)
+                os.utime(claimed)
+            except OSError:
+                continue  # another process got it first
+            with open(claimed, encoding='utf-8') as f:
+                rows = [tuple(json.loads(line)) for line in f if line.strip()]
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                try:
+                    with self.connection_factory() as conn:
+                        written = self._insert(conn, batch)
+                except Exception as err:
+                    logger.error(f'Audit journal replay failed: {err}')
+                    self._journal(rows[start:])
+                    pending = True
+                    break
+                with self._lock:
+                    self._stats['written'] += written
+                    self._stats['replayed'] += written
+                os.utime(claimed)
+            os.remove(claimed)
+            if pending:
+                break
+        self._journal_pending = pending
+
+    def flush(self):
+        """Write everything queued right now; returns the number of events taken off the queue"""
+        with self._flush_lock:
+            taken, healthy = 0, True
+            while True:
+                rows = self._take(self.batch_size)
+                if not rows:
+                    break
+                taken += len(rows)
+                if healthy:
+                    healthy = self._write(rows)
+                else:
+                    self._journal(rows)  # MySQL is down; don't wait for it once per batch
+            if healthy and self._journal_pending:
+                self._replay_journal()
+            return taken
+
+    def _run(self):
+        while not self._stopped.is_set():
+            rows = self._take(self.batch_size, timeout=self.flush_interval)
+            # Fill the batch until it is full or flush_interval has passed since its first event
+            deadline = time.monotonic() + self.flush_interval
+            while rows and len(rows) < self.batch_size and not self._stopped.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                rows += self._take(self.batch_size - len(rows), timeout=remaining)
+            with self._flush_lock:
+                healthy = self._write(rows) if rows else True
+                if healthy and self._journal_pending:
+                    self._replay_journal()
+            if not healthy:
+                self._stopped.wait(min(self.flush_interval, 5))  # give MySQL a moment before the next attempt
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the writer and flush whatever is still queued"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(queued=self._queue.qsize(), overflow=self.overflow,
+                     journal_pending=self._journal_pending)
+        return stats
@@ -0,0 +1,383 @@
+"""
+Bearer tokens for API clients (mobile apps, scripts, other services).
+
+    POST /api/token           email/password/user_type -> access token + refresh token
+    POST /api/token/refresh   refresh token -> a new pair; the old refresh token is spent
+    POST /api/token/revoke    refresh token -> ends that sign-in
+
+Access tokens are HS256 JWTs naming the account ('user:12' or 'seller:3')
+with a key id in the header. Checking one takes a signature and an expiry
+check, with no database or session store involved, so any worker can
+verify any token. They cannot be revoked, so they are short-lived
+(ACCESS_TOKEN_TTL). That lifetime is how long a leaked token stays usable.
+A client sends the same token until it expires, so tokens that passed
+verification are remembered, up to `cache_size` of them, along with their
+expiry and key id. A repeat request then costs a dictionary lookup instead
+of two base64 decodes and an HMAC.
+
+Refresh tokens are opaque random strings. Only their SHA-256 is stored, in
+auth_refresh_tokens. Each use spends the token and issues the next one in
+the same family. If a spent token is presented again, it was copied, so the
+whole family is revoked and both holders have to sign in again.
+
+Key rotation: TokenKeys holds HMAC keys by id. The first one signs, and
+all of them verify. To rotate, put a new key first and keep the old one
+for ACCESS_TOKEN_TTL, so the tokens it signed can expire, then drop it:
+
+    AUTH_TOKEN_KEYS="2024-06:<new secret>,2024-01:<old secret>"
+
+BearerSessionInterface wraps the app's session interface. A request with an
+Authorization: Bearer header gets a TokenSession holding the ids a login
+would have put in the session (user_id or seller_id). Routes and the auth
+decorators keep reading `session` either way.
+
+The functions taking a cursor expect a dictionary cursor and leave the
+commit to the caller.
+
+    python auth_tokens.py sweep      # delete expired and revoked refresh tokens now
+"""
+import hashlib
+import hmac
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from flask.sessions import SessionInterface, SessionMixin
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_KINDS = ('user', 'seller')
+# Session key a login sets for each account kind
+SESSION_KEYS = {'user': 'user_id', 'seller': 'seller_id'}
+
+
+class TokenError(Exception):
+    """Raised for a token that is malformed, expired, revoked or signed with an unknown key"""
+
+
+class TokenKeys:
+    def __init__(self, keys):
+        """`keys` is [(key_id, secret), ...]; the first one signs"""
+        if not keys:
+            raise ValueError('At least one token signing key is required')
+        self.keys = dict(keys)
+        self.active = keys[0][0]
+
+    @classmethod
+    def parse(cls, spec, fallback_secret=None):
+        """
+        Keys from "kid:secret,kid:secret". Without any, a key derived from
+        `fallback_secret` (the app's SECRET_KEY) under the id 'default'.
+        """
+        keys = []
+        for entry in (spec or '').split(','):
+            kid, _, secret = entry.strip().partition(':')
+            if kid and secret:
+                keys.append((kid, secret))
+            elif entry.strip():
+                raise ValueError(f"Token key entries must be 'kid:secret', got {kid!r}")
+        if not keys and fallback_secret:
+            # Its own key rather than SECRET_KEY itself, which also signs session cookies
+            derived = hmac.new(fallback_secret.encode(), b'thriftshop access tokens', hashlib.sha256).hexdigest()
+            keys.append(('default', derived))
+        return cls(keys)
+
+
+class AccessTokens:
+    algorithm = 'HS256'
+    issuer = 'thriftshop'
+
+    def __init__(self, keys, ttl=900, leeway=30, cache_size=4096):
+        self.keys = keys
+        self.ttl = ttl
+        self.leeway = leeway  # seconds of clock skew tolerated between issuing and verifying hosts
+        self.cache_size = cache_size
+        self._verified = OrderedDict()  # token -> (kind, account_id, exp, kid)
+        self._lock = threading.Lock()
+        self._stats = {'issued': 0, 'verified': 0, 'cache_hits': 0, 'rejected': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def issue(self, kind, account_id, now=None):
+        """(token, expires_in seconds) for the account"""
+        if kind not in ACCOUNT_KINDS:
+            raise ValueError(f'Unknown account kind: {kind}')
+        now = int(time.time() if now is None else now)
+        claims = {'sub': f'{kind}:{account_id}', 'typ': 'access', 'iss': self.issuer, 'iat': now,
+                  'exp': now + self.ttl}
+        token = jwt.encode(claims, self.keys.keys[self.keys.active], algorithm=self.algorithm,
+                           headers={'kid': self.keys.active})
+        self._count('issued')
+        return token, self.ttl
+
+    def verify(self, token):
+        """(kind, account_id) for a valid token; raises TokenError"""
+        with self._lock:
+            hit = self._verified.get(token)
+            if hit is not None:
+                kind, account_id, exp, kid = hit
+                # The key may have been retired since, and the token may have expired
+                if kid in self.keys.keys and time.time() < exp + self.leeway:
+                    self._verified.move_to_end(token)
+                    self._stats['cache_hits'] += 1
+                    return kind, account_id
+                del self._verified[token]
+        try:
+            try:
+                kid = jwt.get_unverified_header(token).get('kid')
+            except jwt.InvalidTokenError as err:
+                raise TokenError('Malformed token') from err
+            key = self.keys.keys.get(kid)
+            if key is None:
+                raise TokenError('Token signed with an unknown key')
+            try:
+                claims = jwt.decode(token, key, algorithms=[self.algorithm], issuer=self.issuer,
+                                    leeway=self.leeway, options={'require': ['exp', 'iat', 'sub']})
+            except jwt.ExpiredSignatureError as err:
+                raise TokenError('Token expired') from err
+            except jwt.InvalidTokenError as err:
+                raise TokenError('Invalid token') from err
+            kind, _, account_id = str(claims['sub']).partition(':')
+            if claims.get('typ') != 'access' or kind not in ACCOUNT_KINDS or not account_id.isdigit():
+                raise TokenError('Invalid token')
+        except TokenError:
+            self._count('rejected')
+            raise
+        with self._lock:
+            self._stats['verified'] += 1
+            if self.cache_size > 0:
+                self._verified[token] = (kind, int(account_id), claims['exp'], kid)
+                while len(self._verified) > self.cache_size:
+                    self._verified.popitem(last=False)
+        return kind, int(account_id)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached'] = len(self._verified)
+        stats.update({'ttl': self.ttl, 'active_key': self.keys.active, 'keys': len(self.keys.keys)})
+        return stats
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_refresh_token(cursor, kind, account_id, ttl, family=None):
+    """A new refresh token for the account, in `family` or a new one"""
+    token = secrets.token_urlsafe(32)
+    cursor.execute("""
+                   INSERT INTO auth_refresh_tokens (token_hash, family, account_type, account_id, expires_at)
+                   VALUES (%s, %s, %s, %s, NOW() + INTERVAL %s SECOND)
+                   """, (_digest(token), family or secrets.token_hex(16), kind, account_id, int(ttl)))
+    return token
+
+
+def rotate_refresh_token(cursor, token, ttl):
+    """
+    Spend a refresh token: (kind, account_id, next refresh token). Raises
+    TokenError; after a detected reuse the family has been revoked, so the
+    caller should commit before answering.
+    """
+    cursor.execute("""
+                   SELECT id, family, account_type, account_id, used_at, revoked_at, expires_at <= NOW() AS expired
+                   FROM auth_refresh_tokens
+                   WHERE token_hash = %s
+                   FOR UPDATE
+                   """, (_digest(token or ''),))
+    row = cursor.fetchone()
+    if row is None:
+        raise TokenError('Invalid refresh token')
+    if row['revoked_at'] is not None:
+        raise TokenError('Refresh token revoked')
+    if row['used_at'] is not None:
+        revoke_family(cursor, row['family'])
+        logger.warning(f"Refresh token reused for {row['account_type']} {row['account_id']}; family revoked")
+        raise TokenError('Refresh token already used; sign in again')
+    if row['expired']:
+        raise TokenError('Refresh token expired')
+    cursor.execute("UPDATE auth_refresh_tokens SET used_at = NOW() WHERE id = %s", (row['id'],))
+    return (row['account_type'], row['account_id'],
+            issue_refresh_token(cursor, row['account_type'], row['account_id'], ttl, row['family']))
+
+
+def revoke_family(cursor, family):
+    cursor.execute("UPDATE auth_refresh_tokens SET revoked_at = NOW() WHERE family = %s AND revoked_at IS NULL",
+                   (family,))
+    return cursor.rowcount
+
+
+def revoke_refresh_token(cursor, token):
+    """Revoke the sign-in a refresh token belongs to; False if the token is unknown"""
+    cursor.execute("SELECT family FROM auth_refresh_tokens WHERE token_hash = %s", (_digest(token or ''),))
+    row = cursor.fetchone()
+    if row is None:
+        return False
+    revoke_family(cursor, row['family'])
+    return True
+
+
+def revoke_account(cursor, kind, account_id):
+    """Revoke every refresh token of the account (e.g. after a password change)"""
+    cursor.execute("""
+                   UPDATE auth_refresh_tokens SET revoked_at = NOW()
+                   WHERE account_type = %s AND account_id = %s AND revoked_at IS NULL
+                   """, (kind, account_id))
+    return cursor.rowcount
+
+
+def sweep(conn, batch_size=1000):
+    """Delete expired and revoked refresh tokens; returns how many"""
+    cursor = conn.cursor()
+    removed = 0
+    try:
+        while True:
+            cursor.execute("""
+                           DELETE FROM auth_refresh_tokens
+                           WHERE expires_at <= NOW() OR revoked_at IS NOT NULL
+                           LIMIT %s
+                           """, (batch_size,))
+            conn.commit()
+            removed += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return removed
+    finally:
+        cursor.close()
+
+
+class RefreshTokenSweeper:
+    """
+    Background thread that runs sweep() every `interval` seconds; a MySQL
+    named lock keeps it to one process at a time
+    """
+
+    lock_name = 'refresh_token_sweeper'
+
+    def __init__(self, connection_factory, interval=3600):
+        self.connection_factory = connection_factory
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+        self.last_run = None
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.removed = 0
+
+    def _locked(self, conn, sql):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, (self.lock_name,))
+            return cursor.fetchone()[0] == 1
+        finally:
+            cursor.close()
+
+    def run_once(self):
+        try:
+            with self.connection_factory() as conn:
+                if not self._locked(conn, "SELECT GET_LOCK(%s, 0)"):
+                    self.skipped += 1  # another process is sweeping
+                    return True
+                try:
+                    removed = sweep(conn)
+                finally:
+                    self._locked(conn, "SELECT RELEASE_LOCK(%s)")
+        except Exception as err:
+            self.failures += 1
+            logger.error(f'Refresh token sweep failed: {err}')
+            return False
+        self.runs += 1
+        self.removed += removed
+        self.last_run = time.time()
+        if removed:
+            logger.info(f'Deleted {removed} expired or revoked refresh tokens')
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='refresh-token-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'removed': self.removed,
+            'last_run': self.last_run,
+        }
+
+
+class TokenSession(dict, SessionMixin):
+    """The identity a bearer token carries; never saved and never sets a cookie"""
+    new = False
+    modified = False
+    accessed = True
+
+    def __init__(self, identity=None, error=None):
+        super().__init__(identity or {})
+        self.token_error = error
+
+
+def bearer_token(request):
+    """The token of an `Authorization: Bearer <token>` header, or None"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' else None
+
+
+class BearerSessionInterface(SessionInterface):
+    def __init__(self, inner, tokens):
+        self.inner = inner
+        self.tokens = tokens
+
+    def open_session(self, app, request):
+        token = bearer_token(request)
+        if token is None:
+            return self.inner.open_session(app, request)
+        try:
+            kind, account_id = self.tokens.verify(token)
+        except TokenError as err:
+            return TokenSession(error=str(err))
+        return TokenSession({SESSION_KEYS[kind]: account_id})
+
+    def save_session(self, app, session, response):
+        if isinstance(session, TokenSession):
+            return None
+        return self.inner.save_session(app, session, response)
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    from contextlib import closing
+
+    import mysql.connector
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description='Refresh token maintenance')
+    parser.add_argument('command', choices=['sweep'])
+    parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    config = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'user': os.getenv('DB_USER', 'root'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'database': os.getenv('DB_NAME', 'thriftshop_sa'),
+    }
+    with closing(mysql.connector.connect(**config)) as conn:
+        print(f'Deleted {sweep(conn)} expired or revoked refresh tokens')
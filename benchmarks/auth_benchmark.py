@@ -0,0 +1,146 @@
+"""
+Cost of finding out who a request is from, per authentication path.
+
+Each mode runs the app's session interface (or the query it replaces)
+for a signed-in buyer:
+
+    token    BearerSessionInterface verifying a fresh access token each time (signature + expiry, no I/O)
+    token-repeat  the same, for a token already verified once (what a client's later requests cost)
+    cookie   Flask's signed-cookie session, the app's original session store
+    local    ServerSessionInterface over the in-process LocalCache
+    redis    ServerSessionInterface over RedisCache (--redis-url)
+    mysql    the users-row lookup /api/user ran per request before the profile cache (--mysql, DB_* from .env)
+
+Every mode is checked to resolve the same user_id before it is timed.
+
+    python benchmarks/auth_benchmark.py --rounds 20000
+    python benchmarks/auth_benchmark.py --redis-url redis://localhost:6379/0 --mysql --user-id 1
+"""
+import argparse
+import json
+import math
+import os
+import secrets
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from auth_tokens import AccessTokens, BearerSessionInterface, TokenKeys  # noqa: E402
+from cache import create_cache  # noqa: E402
+from sessions import ServerSessionInterface  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def measure(lookup, rounds):
+    lookup()  # warm-up
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        lookup()
+        samples.append(time.perf_counter() - started)
+    return {
+        'mean_us': round(sum(samples) / len(samples) * 1e6, 2),
+        'p50_us': round(percentile(samples, 50) * 1e6, 2),
+        'p95_us': round(percentile(samples, 95) * 1e6, 2),
+    }
+
+
+def session_lookup(app, interface, headers):
+    """A callable returning the user_id the interface resolves for a request with `headers`"""
+    req = app.test_request_context('/api/user', headers=headers).request
+    return lambda: interface.open_session(app, req).get('user_id')
+
+
+def server_session(app, backend, user_id):
+    interface = ServerSessionInterface(backend)
+    sid = secrets.token_urlsafe(32)
+    backend.set(f'{interface.namespace}:{sid}', {'data': {'user_id': user_id, '_permanent': True},
+                                                 'saved_at': time.time()}, 3600)
+    return interface, {'Cookie': f'session={sid}'}
+
+
+def mysql_lookup(user_id):
+    import mysql.connector
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    conn = mysql.connector.connect(host=os.getenv('DB_HOST', 'localhost'), user=os.getenv('DB_USER', 'root'),
+                                   password=os.getenv('DB_PASSWORD', ''),
+                                   database=os.getenv('DB_NAME', 'thriftshop_sa'))
+    cursor = conn.cursor(dictionary=True, buffered=True)
+
+    def lookup():
+        cursor.execute("""
+                       SELECT id, email, full_name, phone, address_line1, city, province
+                       FROM users WHERE id = %s
+                       """, (user_id,))
+        row = cursor.fetchone()
+        return row['id'] if row else None
+    return lookup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=20000)
+    parser.add_argument('--user-id', type=int, default=42)
+    parser.add_argument('--redis-url')
+    parser.add_argument('--mysql', action='store_true')
+    parser.add_argument('--output', default='benchmarks/results/auth_verification.json')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY=secrets.token_hex(32), PERMANENT_SESSION_LIFETIME=timedelta(hours=24))
+
+    keys = TokenKeys.parse('', app.config['SECRET_KEY'])
+    tokens = AccessTokens(keys)
+    access_token, _ = tokens.issue('user', args.user_id)
+    cookie_sessions = SecureCookieSessionInterface()
+    uncached = BearerSessionInterface(cookie_sessions, AccessTokens(keys, cache_size=0))
+    cookie = cookie_sessions.get_signing_serializer(app).dumps({'user_id': args.user_id, '_permanent': True})
+
+    modes = {
+        'token': session_lookup(app, uncached, {'Authorization': f'Bearer {access_token}'}),
+        'token-repeat': session_lookup(app, BearerSessionInterface(cookie_sessions, tokens),
+                                       {'Authorization': f'Bearer {access_token}'}),
+        'cookie': session_lookup(app, cookie_sessions, {'Cookie': f'session={cookie}'}),
+        'local': session_lookup(app, *server_session(app, create_cache('local'), args.user_id)),
+    }
+    if args.redis_url:
+        modes['redis'] = session_lookup(app, *server_session(app, create_cache('redis', args.redis_url),
+                                                             args.user_id))
+    if args.mysql:
+        modes['mysql'] = mysql_lookup(args.user_id)
+
+    for name, lookup in modes.items():
+        if lookup() != args.user_id:
+            raise SystemExit(f'{name} did not resolve user {args.user_id}')
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {'rounds': args.rounds, 'token_bytes': len(access_token), 'cookie_bytes': len(cookie)},
+        'modes': {},
+    }
+    print(f"{'mode':<13} {'mean us':>9} {'p50 us':>9} {'p95 us':>9} {'vs token':>9}")
+    for name, lookup in modes.items():
+        stats = measure(lookup, args.rounds)
+        results['modes'][name] = stats
+        ratio = stats['mean_us'] / results['modes']['token']['mean_us']
+        print(f"{name:<13} {stats['mean_us']:>9} {stats['p50_us']:>9} {stats['p95_us']:>9} {ratio:>8.2f}x")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Encoding time of a get_products-sized payload with each JSON path.
+
+The payload is --products rows shaped like the dictionary-cursor rows
+behind /api/products: Decimal prices and ratings, datetime timestamps,
+nested image lists and media entries.
+
+    default   Flask's DefaultJSONProvider, the path before json_provider.py
+    fast      FastJSONProvider (orjson)
+    stream    FastJSONProvider.stream(), joined, to show the cost of encoding item by item
+    iso       FastJSONProvider with datetime_format='iso' (orjson encodes datetimes itself)
+
+Each mode except iso is checked to decode to the same document as the
+default path before it is timed.
+
+    python benchmarks/json_benchmark.py --products 1000 --rounds 200
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from json_provider import FastJSONProvider, orjson  # noqa: E402
+
+CONDITIONS = ['new', 'like_new', 'good', 'fair']
+BRANDS = ['Nike', 'Adidas', 'Levi\'s', 'Zara', 'H&M', 'Woolworths', 'Mr Price', 'Country Road']
+
+
+def product(i, now):
+    created = now - timedelta(minutes=i * 7)
+    images = [f'/static/uploads/{i:064x}.jpg', f'/static/uploads/{i + 1:064x}.jpg']
+    return {
+        'id': i,
+        'seller_id': 1 + i % 50,
+        'category_id': 1 + i % 12,
+        'name': f'Vintage denim jacket #{i}',
+        'description': 'Lightly worn, no stains or tears. Ships within two days from Cape Town. ' * 2,
+        'price': Decimal(random.randint(5000, 250000)) / 100,
+        'original_price': Decimal(random.randint(250000, 500000)) / 100,
+        'conditions': random.choice(CONDITIONS),
+        'size': random.choice(['S', 'M', 'L', 'XL']),
+        'color': random.choice(['black', 'blue', 'red', 'white']),
+        'brand': random.choice(BRANDS),
+        'material': 'cotton',
+        'images': images,
+        'videos': [],
+        'image_sources': [{'src': url, 'srcset': None, 'sources': []} for url in images],
+        'media': [{'id': i * 10 + n, 'media_type': 'image', 'file_url': url, 'alt_text': None, 'caption': None,
+                   'sort_order': n, 'is_primary': n == 0} for n, url in enumerate(images)],
+        'is_active': 1,
+        'featured': i % 20 == 0,
+        'category_name': 'Jackets',
+        'seller_name': f'Seller {1 + i % 50}',
+        'seller_rating': Decimal('4.50'),
+        'stock_quantity': random.randint(0, 5),
+        'reserved_quantity': 0,
+        'available_quantity': random.randint(0, 5),
+        'view_count': random.randint(0, 5000),
+        'purchase_count': random.randint(0, 50),
+        'wishlist_count': random.randint(0, 200),
+        'created_at': created,
+        'updated_at': created + timedelta(hours=1),
+    }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def measure(encode, rounds):
+    encode()  # warm-up
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        encode()
+        samples.append(time.perf_counter() - started)
+    return {
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--output', default='benchmarks/results/json_encoding.json')
+    args = parser.parse_args()
+
+    random.seed(42)
+    now = datetime(2024, 3, 5, 10, 0, 0)
+    products = [product(i, now) for i in range(1, args.products + 1)]
+    payload = {'products': products, 'next_cursor': 'eyJpZCI6IDEwMDB9'}
+
+    app = Flask(__name__)
+    default = DefaultJSONProvider(app)
+    fast = FastJSONProvider(app)
+    iso = FastJSONProvider(app)
+    iso.datetime_format = 'iso'
+    modes = {
+        'default': lambda: default.dumps(payload).encode('utf-8'),
+        'fast': lambda: fast.encode(payload),
+        'stream': lambda: b''.join(fast.stream('products', products, next_cursor=payload['next_cursor'])),
+        'iso': lambda: iso.encode(payload),
+    }
+
+    expected = json.loads(modes['default']())
+    for name, encode in modes.items():
+        if name != 'iso' and json.loads(encode()) != expected:
+            raise SystemExit(f'{name} output differs from the default provider')
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {'products': args.products, 'rounds': args.rounds, 'orjson': orjson is not None,
+                   'payload_bytes': len(modes['default']())},
+        'modes': {},
+    }
+    print(f"{'mode':<8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'speedup':>8}")
+    for name, encode in modes.items():
+        stats = measure(encode, args.rounds)
+        results['modes'][name] = stats
+        speedup = results['modes']['default']['mean_ms'] / stats['mean_ms']
+        print(f"{name:<8} {stats['mean_ms']:>9} {stats['p50_ms']:>9} {stats['p95_ms']:>9} {speedup:>7.1f}x")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""
+Closed-loop load test against the real API routes.
+
+Each worker logs in as one seeded buyer and one seeded seller (see
+seed_data.py) and repeatedly runs a weighted mix of scenarios for
+--duration seconds:
+
+    products          GET /api/products, sometimes filtered, following next_cursor
+    product_detail    GET /api/products/<id>
+    cart              POST /api/cart, GET /api/cart, DELETE /api/cart
+    orders            GET /api/orders (plus a checkout with --checkout)
+    seller_dashboard  GET /api/seller/dashboard
+
+Latency percentiles, throughput and DB statements per request (read from the
+Server-Timing header the app adds) are reported per endpoint and written as
+JSON. Pass --compare with an earlier result to print the differences.
+
+    python benchmarks/load_test.py --base-url http://127.0.0.1:5000 --concurrency 16 --duration 30
+    DB_NAME=thriftshop_bench python benchmarks/load_test.py --in-process --concurrency 8
+
+--in-process drives app.py through Flask's test client, so no server is
+needed, but it measures the app and database without the HTTP server in front.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ('products', 'product_detail', 'cart', 'orders', 'seller_dashboard')
+DEFAULT_MIX = {'products': 40, 'product_detail': 30, 'cart': 15, 'orders': 10, 'seller_dashboard': 5}
+SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+class HttpClient:
+    """Keep-alive HTTP client with a cookie jar of one (the Flask session)"""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        conn_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._conn = conn_class(parts.netloc, timeout=timeout)
+        self._prefix = parts.path.rstrip('/')
+        self._cookies = {}
+
+    def request(self, method, path, body=None):
+        headers = {'Accept': 'application/json'}
+        if self._cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self._cookies.items())
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self._conn.request(method, self._prefix + path, payload, headers)
+            response = self._conn.getresponse()
+        except (http.client.HTTPException, ConnectionError):
+            # Server closed the keep-alive connection; retry once on a fresh one
+            self._conn.close()
+            self._conn.request(method, self._prefix + path, payload, headers)
+            response = self._conn.getresponse()
+        data = response.read()
+        for header in response.headers.get_all('Set-Cookie') or []:
+            name, _, rest = header.partition('=')
+            self._cookies[name.strip()] = rest.split(';', 1)[0]
+        return response.status, response.headers.get('Server-Timing', ''), data
+
+
+class InProcessClient:
+    """Same interface as HttpClient, backed by Flask's test client"""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self._client.open(path, method=method, json=body, headers={'Accept': 'application/json'})
+        return response.status_code, response.headers.get('Server-Timing', ''), response.get_data()
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, label, latency, status, server_timing):
+        match = SERVER_TIMING_DB.search(server_timing or '')
+        queries = int(match.group(2)) if match else None
+        db_ms = float(match.group(1)) if match else None
+        with self._lock:
+            self.samples.setdefault(label, []).append((latency, status, queries, db_ms))
+
+
+class Worker(threading.Thread):
+    def __init__(self, index, args, make_client, recorder, product_ids, category_ids, deadline):
+        super().__init__(name=f'load-worker-{index}', daemon=True)
+        self.args = args
+        self.buyer = make_client()
+        self.seller = make_client()
+        self.recorder = recorder
+        self.product_ids = product_ids
+        self.category_ids = category_ids
+        self.deadline = deadline
+        self.rng = random.Random(args.seed + index)
+        self.buyer_email = f'buyer{index % args.buyers}@bench.thriftshop.test'
+        self.seller_email = f'seller{index % args.sellers}@bench.thriftshop.test'
+        self.errors = []
+
+    def call(self, client, method, path, body=None, label=None):
+        started = time.perf_counter()
+        status, server_timing, data = client.request(method, path, body)
+        latency = time.perf_counter() - started
+        self.recorder.add(label or f'{method} {path.split("?")[0]}', latency, status, server_timing)
+        if status >= 500:
+            self.errors.append(f'{method} {path} -> {status}')
+        try:
+            return status, json.loads(data) if data else None
+        except ValueError:
+            return status, None
+
+    def login(self):
+        status, _, _ = self.buyer.request('POST', '/api/login',
+                                          {'email': self.buyer_email, 'password': self.args.password})
+        if status != 200:
+            raise RuntimeError(f'buyer login failed for {self.buyer_email} ({status})')
+        status, _, _ = self.seller.request('POST', '/api/seller/login',
+                                           {'email': self.seller_email, 'password': self.args.password})
+        if status != 200:
+            raise RuntimeError(f'seller login failed for {self.seller_email} ({status})')
+
+    def scenario_products(self):
+        params = {'limit': self.args.page_size}
+        roll = self.rng.random()
+        if roll < 0.2:
+            params['featured'] = 'true'
+        elif roll < 0.4:
+            params['search'] = self.rng.choice(['takkies', 'vintage jersey', 'shweshwe', 'leather', 'nike'])
+        elif roll < 0.6 and self.category_ids:
+            params['category_id'] = self.rng.choice(self.category_ids)
+        for _ in range(self.rng.choice([1, 1, 2, 3])):
+            status, body = self.call(self.buyer, 'GET', '/api/products?' + urlencode(params))
+            next_cursor = body.get('next_cursor') if status == 200 and body else None
+            if not next_cursor:
+                break
+            params['cursor'] = next_cursor
+
+    def scenario_product_detail(self):
+        product_id = self.rng.choice(self.product_ids)
+        self.call(self.buyer, 'GET', f'/api/products/{product_id}', label='GET /api/products/<id>')
+
+    def scenario_cart(self):
+        product_id = self.rng.choice(self.product_ids)
+        self.call(self.buyer, 'POST', '/api/cart', {'product_id': product_id, 'quantity': 1})
+        self.call(self.buyer, 'GET', '/api/cart')
+        self.call(self.buyer, 'DELETE', f'/api/cart?product_id={product_id}')
+
+    def scenario_orders(self):
+        self.call(self.buyer, 'GET', '/api/orders?limit=20')
+        if self.args.checkout:
+            product_id = self.rng.choice(self.product_ids)
+            status, _ = self.call(self.buyer, 'POST', '/api/cart', {'product_id': product_id, 'quantity': 1})
+            if status == 200:
+                self.call(self.buyer, 'POST', '/api/orders', {
+                    'shipping_address': {'city': 'Johannesburg', 'province': 'Gauteng'},
+                    'payment_method': 'eft'})
+
+    def scenario_seller_dashboard(self):
+        self.call(self.seller, 'GET', '/api/seller/dashboard')
+
+    def run(self):
+        names = list(self.args.mix)
+        weights = [self.args.mix[name] for name in names]
+        while time.monotonic() < self.deadline:
+            scenario = self.rng.choices(names, weights)[0]
+            try:
+                getattr(self, f'scenario_{scenario}')()
+            except Exception as err:
+                self.errors.append(f'{scenario}: {err}')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # nearest-rank
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(s[0] * 1000 for s in samples)
+    queries = [s[2] for s in samples if s[2] is not None]
+    db_ms = [s[3] for s in samples if s[3] is not None]
+    statuses = {}
+    for s in samples:
+        statuses[str(s[1])] = statuses.get(str(s[1]), 0) + 1
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'max_ms': round(latencies[-1], 2),
+        'errors': sum(1 for s in samples if s[1] >= 500),
+        'statuses': statuses,
+        'db_queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'db_ms_per_request': round(sum(db_ms) / len(db_ms), 2) if db_ms else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def collect_category_ids(client):
+    status, _, data = client.request('GET', '/api/categories')
+    return [c['id'] for c in json.loads(data)['categories']] if status == 200 else []
+
+
+def collect_product_ids(client, pages=5, page_size=100):
+    ids, params = [], {'limit': page_size}
+    for _ in range(pages):
+        status, _, data = client.request('GET', '/api/products?' + urlencode(params))
+        if status != 200:
+            raise RuntimeError(f'GET /api/products returned {status}; is the app pointed at a seeded database?')
+        body = json.loads(data)
+        ids.extend(p['id'] for p in body['products'])
+        if not body.get('next_cursor'):
+            break
+        params['cursor'] = body['next_cursor']
+    if not ids:
+        raise RuntimeError('no products found; run seed_data.py first')
+    return ids
+
+
+def print_report(results, baseline=None):
+    header = f"{'endpoint':<28}{'reqs':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'q/req':>7}{'5xx':>6}"
+    print(header)
+    print('-' * len(header))
+    for label, row in sorted(results['endpoints'].items()) + [('TOTAL', results['total'])]:
+        queries = row['db_queries_per_request']
+        print(f"{label:<28}{row['requests']:>8}{row['throughput_rps']:>9.1f}{row['p50_ms']:>9.1f}"
+              f"{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{queries if queries is not None else '-':>7}"
+              f"{row['errors']:>6}")
+        old = (baseline or {}).get('endpoints', {}).get(label) if label != 'TOTAL' else (baseline or {}).get('total')
+        if old:
+            print(f"{'  vs baseline':<28}{'':>8}{row['throughput_rps'] - old['throughput_rps']:>+9.1f}"
+                  f"{row['p50_ms'] - old['p50_ms']:>+9.1f}{row['p95_ms'] - old['p95_ms']:>+9.1f}"
+                  f"{row['p99_ms'] - old['p99_ms']:>+9.1f}")
+
+
+def parse_mix(raw):
+    mix = dict(DEFAULT_MIX)
+    for part in raw or []:
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f'unknown scenario {name!r}')
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--in-process', action='store_true', help='drive app.py through the Flask test client')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='seconds of measured load')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds of unmeasured load first')
+    parser.add_argument('--mix', nargs='*', metavar='SCENARIO=WEIGHT',
+                        help=f'override scenario weights (default {DEFAULT_MIX})')
+    parser.add_argument('--checkout', action='store_true', help='include POST /api/orders in the orders scenario')
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--buyers', type=int, default=5000, help='seeded buyer accounts to spread workers over')
+    parser.add_argument('--sellers', type=int, default=2000, help='seeded seller accounts to spread workers over')
+    parser.add_argument('--password', default='benchpass')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='benchmarks/results/load_test.json')
+    parser.add_argument('--compare', help='earlier result JSON to diff against')
+    args = parser.parse_args()
+    args.mix = parse_mix(args.mix)
+
+    if args.in_process:
+        sys.path.insert(0, ROOT)
+        from app import app  # noqa: E402
+        make_client = lambda: InProcessClient(app)  # noqa: E731
+        target = 'in-process'
+    else:
+        make_client = lambda: HttpClient(args.base_url)  # noqa: E731
+        target = args.base_url
+
+    setup_client = make_client()
+    product_ids = collect_product_ids(setup_client)
+    category_ids = collect_category_ids(setup_client)
+
+    # Warm-up run fills caches and the connection pool; its samples are discarded
+    def run_phase(seconds, recorder):
+        deadline = time.monotonic() + seconds
+        workers = [Worker(i, args, make_client, recorder, product_ids, category_ids, deadline) for i in range(args.concurrency)]
+        for worker in workers:
+            worker.login()
+        started = time.monotonic()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.monotonic() - started, [e for w in workers for e in w.errors]
+
+    if args.warmup > 0:
+        run_phase(args.warmup, Recorder())
+    recorder = Recorder()
+    elapsed, errors = run_phase(args.duration, recorder)
+
+    all_samples = [s for samples in recorder.samples.values() for s in samples]
+    if not all_samples:
+        raise SystemExit(f'no requests completed: {errors[:5]}')
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'target': target,
+        'config': {'concurrency': args.concurrency, 'duration': args.duration, 'mix': args.mix,
+                   'checkout': args.checkout, 'page_size': args.page_size, 'seed': args.seed},
+        'elapsed_seconds': round(elapsed, 2),
+        'total': summarize(all_samples, elapsed),
+        'endpoints': {label: summarize(samples, elapsed) for label, samples in recorder.samples.items()},
+        'errors': errors[:50],
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Logins per second at different bcrypt cost factors.
+
+For each cost, a hash is made once and then verified:
+
+    inline   one thread calling bcrypt directly, as the login routes used to
+    pooled   --concurrency threads going through PasswordHasher, as the app does now,
+             counting the requests it turned away (the app's fast 503s)
+
+Only bcrypt is exercised, not the database or HTTP, so the numbers are the
+ceiling the password work puts on /api/login and /api/seller/login.
+
+    python benchmarks/password_benchmark.py --costs 10 11 12 13 --workers 2 --concurrency 16
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from password_hashing import HasherBusy, PasswordHasher, _check, _hash  # noqa: E402
+
+PASSWORD = 'correct horse battery staple'
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def run_inline(password_hash, duration):
+    latencies = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline or not latencies:
+        started = time.perf_counter()
+        _check(PASSWORD, password_hash)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run_pooled(hasher, password_hash, concurrency, duration):
+    latencies, rejected = [], [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                hasher.verify(PASSWORD, password_hash)
+            except HasherBusy:
+                with lock:
+                    rejected[0] += 1
+                time.sleep(0.01)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, rejected[0], time.monotonic() - started
+
+
+def summarize(latencies, elapsed):
+    return {
+        'logins_per_second': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--costs', type=int, nargs='+', default=[10, 11, 12, 13])
+    parser.add_argument('--workers', type=int, default=2, help='PasswordHasher process pool size')
+    parser.add_argument('--max-queue', type=int, default=32)
+    parser.add_argument('--concurrency', type=int, default=16, help='client threads in the pooled run')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per cost and mode')
+    parser.add_argument('--output', default='benchmarks/results/password_hashing.json')
+    args = parser.parse_args()
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {'workers': args.workers, 'max_queue': args.max_queue, 'concurrency': args.concurrency,
+                   'duration': args.duration, 'cpus': os.cpu_count()},
+        'costs': {},
+    }
+    print(f"{'cost':>4}  {'inline/s':>9} {'p50 ms':>8}  {'pooled/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'503s':>6}")
+    for cost in args.costs:
+        password_hash = _hash(PASSWORD, cost)
+
+        started = time.monotonic()
+        inline = summarize(run_inline(password_hash, args.duration), time.monotonic() - started)
+
+        hasher = PasswordHasher(rounds=cost, max_workers=args.workers, max_queue=args.max_queue)
+        try:
+            hasher.verify(PASSWORD, password_hash)  # start the worker processes outside the measurement
+            latencies, rejected, elapsed = run_pooled(hasher, password_hash, args.concurrency, args.duration)
+        finally:
+            hasher.shutdown(wait=True)
+        pooled = dict(summarize(latencies, elapsed), rejected=rejected)
+
+        results['costs'][cost] = {'inline': inline, 'pooled': pooled}
+        print(f"{cost:>4}  {inline['logins_per_second']:>9} {inline['p50_ms']:>8}  "
+              f"{pooled['logins_per_second']:>9} {pooled['p50_ms']!s:>8} {pooled['p95_ms']!s:>8} {rejected:>6}")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
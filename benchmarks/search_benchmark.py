@@ -0,0 +1,145 @@
+"""
+Product search latency versus catalog size: leading-wildcard LIKE (the old
+get_products() filter) against the FULLTEXT query built by search.py.
+
+Seeds a scratch table shaped like `products` (name, brand, description plus
+the same FULLTEXT indexes) in steps, timing both strategies at each size.
+
+    python benchmarks/search_benchmark.py --sizes 1000 10000 100000 1000000
+
+Needs a MySQL server reachable with the DB_* settings from .env.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import mysql.connector
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from search import search_clause  # noqa: E402
+
+load_dotenv()
+
+TABLE = 'products_search_bench'
+
+BRANDS = ['Nike', 'Adidas', 'Puma', 'Mr Price', 'Woolworths', 'Truworths', 'Da Gama Textiles',
+          'Samsung', 'Levi\'s', 'Springbok', 'Local Art', 'Converse', 'Edgars', 'Vans']
+NOUNS = ['takkies', 'sneakers', 'jersey', 'dress', 'hoodie', 'jacket', 'jeans', 'boots',
+         'tablet', 'cellphone', 'braai stand', 'wire art car', 'doek', 'plakkies', 'cozzie',
+         'biography set', 'soccer boots', 'leather bag', 'earrings', 'shweshwe skirt']
+ADJECTIVES = ['vintage', 'retro', 'pre-loved', 'classic', 'handmade', 'barely used', 'lekker',
+              'authentic', 'original', 'traditional', 'local', 'designer']
+FILLER = ('Great condition with minimal wear. Collected in Gauteng or couriered anywhere in '
+          'Mzansi. No stains or tears, smoke-free home, bought at the Rosebank market.').split()
+
+QUERIES = ['takkies', 'vintage jersey', 'shweshwe', 'nike sneakers', 'leather', 'braai',
+           'hoodies', 'wire art', 'ab', 'springbok jerseys']
+
+
+def make_row(rng):
+    noun = rng.choice(NOUNS)
+    name = f'{rng.choice(ADJECTIVES).title()} {noun.title()}'
+    description = ' '.join(rng.choice(FILLER) for _ in range(rng.randint(20, 60)))
+    return name, rng.choice(BRANDS), f'{name}. {description}'
+
+
+def create_table(cursor):
+    cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+    cursor.execute(f"""
+        CREATE TABLE {TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            brand VARCHAR(100),
+            description TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FULLTEXT INDEX ft_products_search (name, brand, description),
+            FULLTEXT INDEX ft_products_name (name)
+        )
+    """)
+
+
+def seed(conn, cursor, count, rng, batch_size=5000):
+    while count > 0:
+        rows = [make_row(rng) for _ in range(min(batch_size, count))]
+        cursor.executemany(f'INSERT INTO {TABLE} (name, brand, description) VALUES (%s, %s, %s)', rows)
+        conn.commit()
+        count -= len(rows)
+    # Let InnoDB merge the FULLTEXT insert cache before timing
+    cursor.execute(f'OPTIMIZE TABLE {TABLE}')
+    cursor.fetchall()
+
+
+def time_query(cursor, sql, params, repeats):
+    timings = []
+    rows = 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        rows = len(cursor.fetchall())
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), rows
+
+
+def like_sql(search):
+    sql = (f'SELECT p.id FROM {TABLE} p WHERE (p.name LIKE %s OR p.description LIKE %s '
+           f'OR p.brand LIKE %s) ORDER BY p.created_at DESC LIMIT 50')
+    return sql, [f'%{search}%'] * 3
+
+
+def fulltext_sql(search):
+    where, where_params, rank, rank_params = search_clause(search)
+    order = f' ORDER BY {rank} DESC, p.created_at DESC' if rank else ' ORDER BY p.created_at DESC'
+    return f'SELECT p.id FROM {TABLE} p WHERE 1 = 1{where}{order} LIMIT 50', where_params + rank_params
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='benchmarks/results/search_benchmark.json')
+    parser.add_argument('--keep-table', action='store_true')
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASSWORD', ''),
+        database=os.getenv('DB_NAME', 'thriftshop_sa'),
+    )
+    cursor = conn.cursor()
+    rng = random.Random(args.seed)
+    results = []
+
+    try:
+        create_table(cursor)
+        seeded = 0
+        for size in sorted(args.sizes):
+            seed(conn, cursor, size - seeded, rng)
+            seeded = size
+            for search in QUERIES:
+                like_ms, like_rows = time_query(cursor, *like_sql(search), args.repeats)
+                ft_ms, ft_rows = time_query(cursor, *fulltext_sql(search), args.repeats)
+                results.append({'catalog_size': size, 'query': search,
+                                'like_ms': round(like_ms, 3), 'like_rows': like_rows,
+                                'fulltext_ms': round(ft_ms, 3), 'fulltext_rows': ft_rows})
+                print(f'{size:>9} {search!r:<22} LIKE {like_ms:9.2f} ms   FULLTEXT {ft_ms:9.2f} ms')
+    finally:
+        if not args.keep_table:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+        cursor.close()
+        conn.close()
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+Build a benchmark database with production-like volumes.
+
+Creates (or recreates) a separate database from thriftshop_sa_ddl.sql plus
+the columns the app adds on top of it, then bulk-loads buyers, approved
+sellers, products spread over two years, and order history. Finishes by
+reconciling seller_stats so the dashboard has real numbers.
+
+    python benchmarks/seed_data.py --database thriftshop_bench \
+        --products 100000 --sellers 2000 --buyers 5000 --orders 50000
+
+Every seeded account uses the password given by --password, with emails
+buyer<N>@bench.thriftshop.test and seller<N>@bench.thriftshop.test, which is
+what load_test.py logs in with. Needs a MySQL server reachable with the DB_*
+settings from .env.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import mysql.connector
+from dotenv import load_dotenv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import seller_stats  # noqa: E402
+from search_benchmark import BRANDS, make_row  # noqa: E402
+
+load_dotenv()
+
+PROVINCES = ['Eastern Cape', 'Free State', 'Gauteng', 'KwaZulu-Natal', 'Limpopo', 'Mpumalanga',
+             'North West', 'Northern Cape', 'Western Cape']
+CITIES = ['Johannesburg', 'Pretoria', 'Durban', 'Cape Town', 'Gqeberha', 'Bloemfontein', 'Polokwane',
+          'Mbombela', 'Mahikeng', 'Kimberley', 'Soweto', 'East London']
+CONDITIONS = ['excellent', 'good', 'good', 'fair', 'poor']
+SIZES = ['XS', 'S', 'M', 'L', 'XL', '6', '7', '8', '9', '10', None]
+COLORS = ['black', 'white', 'blue', 'red', 'green', 'brown', 'grey', 'yellow', 'multi', None]
+ORDER_STATUSES = ['pending', 'confirmed', 'processing', 'shipped', 'delivered', 'delivered', 'delivered',
+                  'cancelled']
+PAYMENT_METHODS = ['credit_card', 'debit_card', 'eft', 'cash_on_delivery']
+
+# Columns app.py uses that the DDL does not create (see thriftshop-ecommerce-website-script.sql)
+EXTRA_COLUMNS = [
+    "ALTER TABLE products ADD COLUMN featured TINYINT(1) DEFAULT 0",
+    "ALTER TABLE products ADD COLUMN images JSON",
+    "ALTER TABLE products ADD COLUMN videos JSON",
+]
+
+
+def load_setup_module():
+    """setup-database.py is not importable by name; load it for its SQL file runner"""
+    spec = importlib.util.spec_from_file_location('setup_database', os.path.join(ROOT, 'setup-database.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def create_schema(conn, cursor, database):
+    cursor.execute(f'DROP DATABASE IF EXISTS `{database}`')
+    cursor.execute(f'CREATE DATABASE `{database}`')
+    cursor.execute(f'USE `{database}`')
+    setup = load_setup_module()
+    setup.execute_sql_file(cursor, os.path.join(ROOT, 'thriftshop_sa_ddl.sql'))
+    for statement in EXTRA_COLUMNS:
+        try:
+            cursor.execute(statement)
+        except mysql.connector.Error as err:
+            if err.errno != 1060:  # duplicate column: the DDL already has it
+                raise
+    conn.commit()
+
+
+def insert_batches(conn, cursor, sql, rows, batch_size=5000):
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany(sql, rows[start:start + batch_size])
+        conn.commit()
+
+
+def random_time(rng, now, days=730):
+    return now - timedelta(seconds=rng.randint(0, days * 86400))
+
+
+def seed_accounts(conn, cursor, rng, buyers, sellers, password_hash, now):
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM users')
+    first_user = cursor.fetchone()[0] + 1
+    insert_batches(conn, cursor, """
+        INSERT INTO users (email, password_hash, full_name, phone, city, province, email_verified, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, TRUE, %s)
+        """, [(f'buyer{n}@bench.thriftshop.test', password_hash, f'Bench Buyer {n}', f'07{n:08d}',
+               rng.choice(CITIES), rng.choice(PROVINCES), random_time(rng, now)) for n in range(buyers)])
+
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM sellers')
+    first_seller = cursor.fetchone()[0] + 1
+    insert_batches(conn, cursor, """
+        INSERT INTO sellers (email, password_hash, business_name, phone, city, province, status, rating,
+                             email_verified, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, 'approved', %s, TRUE, %s)
+        """, [(f'seller{n}@bench.thriftshop.test', password_hash, f'Bench Thrift {n}', f'08{n:08d}',
+               rng.choice(CITIES), rng.choice(PROVINCES), round(rng.uniform(3, 5), 2), random_time(rng, now))
+              for n in range(sellers)])
+
+    return (list(range(first_user, first_user + buyers)),
+            list(range(first_seller, first_seller + sellers)))
+
+
+def seed_products(conn, cursor, rng, count, seller_ids, category_ids, now, featured_share=0.02):
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM products')
+    first_product = cursor.fetchone()[0] + 1
+    rows = []
+    for _ in range(count):
+        name, brand, description = make_row(rng)
+        price = round(rng.uniform(20, 2500), 2)
+        image = f'/static/uploads/images/bench_{rng.randint(1, 500)}.jpg'
+        rows.append((rng.choice(seller_ids), rng.choice(category_ids), name, description, description[:200],
+                     price, round(price * rng.uniform(1.1, 3), 2), rng.choice(CONDITIONS), rng.choice(SIZES),
+                     rng.choice(COLORS), brand or rng.choice(BRANDS), rng.choice([1, 1, 1, 2, 3, 5]),
+                     rng.random() < featured_share, rng.randint(0, 5000), json.dumps([image]),
+                     random_time(rng, now)))
+    insert_batches(conn, cursor, """
+        INSERT INTO products (seller_id, category_id, name, description, short_description, price, original_price,
+                              conditions, size, color, brand, stock_quantity, featured, view_count, images,
+                              created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, rows)
+    return [(first_product + i, row[0], row[2], row[5]) for i, row in enumerate(rows)]
+
+
+def seed_orders(conn, cursor, rng, count, buyer_ids, products, now, batch_size=2000):
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM orders')
+    next_order = cursor.fetchone()[0] + 1
+    orders, items = [], []
+    for n in range(count):
+        order_id = next_order + n
+        status = rng.choice(ORDER_STATUSES)
+        lines = rng.sample(products, rng.randint(1, 4))
+        subtotal = 0
+        for product_id, seller_id, name, price in lines:
+            quantity = rng.choice([1, 1, 1, 2])
+            subtotal += price * quantity
+            item_status = status if status in ('pending', 'confirmed', 'shipped', 'delivered', 'cancelled') \
+                else 'confirmed'
+            items.append((order_id, product_id, seller_id, name, price, quantity, price, round(price * quantity, 2),
+                          item_status))
+        province = rng.choice(PROVINCES)
+        shipping = 85.0
+        orders.append((order_id, f'BENCH-{order_id:09d}', rng.choice(buyer_ids), round(subtotal + shipping, 2),
+                       shipping, round(subtotal + shipping, 2), status,
+                       json.dumps({'city': rng.choice(CITIES), 'province': province}),
+                       rng.choice(PAYMENT_METHODS),
+                       'completed' if status not in ('pending', 'cancelled') else 'pending',
+                       random_time(rng, now)))
+
+        if len(orders) >= batch_size or n == count - 1:
+            cursor.executemany("""
+                INSERT INTO orders (id, order_number, user_id, total_amount, shipping_fee, final_amount, status,
+                                    shipping_address, payment_method, payment_status, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, orders)
+            cursor.executemany("""
+                INSERT INTO order_items (order_id, product_id, seller_id, product_name, product_price, quantity,
+                                         unit_price, total_price, status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, items)
+            conn.commit()
+            orders, items = [], []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', default=os.getenv('BENCH_DB_NAME', 'thriftshop_bench'))
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--sellers', type=int, default=2000)
+    parser.add_argument('--buyers', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=50000)
+    parser.add_argument('--password', default='benchpass')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.database == os.getenv('DB_NAME', 'thriftshop_sa'):
+        parser.error('refusing to drop the application database; pick another --database')
+
+    import bcrypt  # installed with flask_bcrypt
+    password_hash = bcrypt.hashpw(args.password.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8')
+
+    conn = mysql.connector.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASSWORD', ''),
+    )
+    cursor = conn.cursor()
+    rng = random.Random(args.seed)
+    now = datetime.now().replace(microsecond=0)
+    started = time.monotonic()
+
+    try:
+        create_schema(conn, cursor, args.database)
+        cursor.execute('SELECT id FROM categories')
+        category_ids = [row[0] for row in cursor.fetchall()]
+
+        buyer_ids, seller_ids = seed_accounts(conn, cursor, rng, args.buyers, args.sellers, password_hash, now)
+        print(f'{len(buyer_ids)} buyers, {len(seller_ids)} sellers')
+        products = seed_products(conn, cursor, rng, args.products, seller_ids, category_ids, now)
+        print(f'{len(products)} products')
+        seed_orders(conn, cursor, rng, args.orders, buyer_ids, products, now)
+        print(f'{args.orders} orders')
+        seller_stats.reconcile(conn)
+        cursor.execute('ANALYZE TABLE products, orders, order_items, sellers, users')
+        cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    print(f'Seeded {args.database} in {time.monotonic() - started:.1f}s. '
+          f'Run the app with DB_NAME={args.database} and point load_test.py at it.')
+
+
+if __name__ == '__main__':
+    main()
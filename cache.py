@@ -0,0 +1,287 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCache:
+    """
+    In-process LRU cache with per-entry TTL.
+
+    Generation counters (used for invalidation) live beside the entries and
+    are never evicted, so bumping one is always visible to later lookups.
+    """
+
+    def __init__(self, max_entries=1024, default_ttl=60):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'expired': 0}
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._stats['misses'] += 1
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            self._stats['sets'] += 1
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def incr(self, counter):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + 1
+            return self._counters[counter]
+
+    def counters(self, names):
+        with self._lock:
+            return [self._counters.get(name, 0) for name in names]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({'backend': 'local', 'entries': len(self._data),
+                          'max_entries': self.max_entries})
+        return stats
+
+
+class RedisCache:
+    """
+    Shared cache backed by Redis, so every worker sees the same entries and
+    invalidations. Eviction is left to Redis (configure maxmemory-policy
+    allkeys-lru). Any Redis failure degrades to a cache miss.
+    """
+
+    def __init__(self, url, prefix='thriftshop:', default_ttl=60):
+        import redis  # optional dependency, only needed for the shared backend
+
+        self._redis = redis
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'errors': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key):
+        try:
+            raw = self._client.get(self.prefix + key)
+        except self._redis.RedisError as err:
+            logger.warning(f'Redis cache get failed: {err}')
+            self._count('errors')
+            return None
+        if raw is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        try:
+            self._client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+            self._count('sets')
+        except self._redis.RedisError as err:
+            logger.warning(f'Redis cache set failed: {err}')
+            self._count('errors')
+
+    def delete(self, *keys):
+        if not keys:
+            return
+        try:
+            self._client.delete(*[self.prefix + key for key in keys])
+        except self._redis.RedisError as err:
+            logger.warning(f'Redis cache delete failed: {err}')
+            self._count('errors')
+
+    def clear(self):
+        try:
+            for key in self._client.scan_iter(match=self.prefix + '*'):
+                self._client.delete(key)
+        except self._redis.RedisError as err:
+            logger.warning(f'Redis cache clear failed: {err}')
+            self._count('errors')
+
+    def incr(self, counter):
+        try:
+            return self._client.incr(self.prefix + 'gen:' + counter)
+        except self._redis.RedisError as err:
+            logger.warning(f'Redis cache incr failed: {err}')
+            self._count('errors')
+            return None
+
+    def counters(self, names):
+        if not names:
+            return []
+        try:
+            values = self._client.mget([self.prefix + 'gen:' + name for name in names])
+        except self._redis.RedisError as err:
+            logger.warning(f'Redis cache counters failed: {err}')
+            self._count('errors')
+            return None
+        return [int(value) if value is not None else 0 for value in values]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['backend'] = 'redis'
+        return stats
+
+
+def create_cache(backend='local', redis_url=None, **options):
+    """Build a cache backend by name ('local' or 'redis')"""
+    if backend == 'redis':
+        return RedisCache(redis_url or 'redis://localhost:6379/0', **options)
+    return LocalCache(**options)
+
+
+TRUTHY = ('1', 'true', 'yes')
+
+
+class ProductListingCache:
+    """
+    Read-through cache for /api/products responses.
+
+    Entries are keyed on the normalized query plus the generation counters of
+    every scope the query depends on. Writers bump the counters for the
+    categories and sellers they touched, which orphans exactly the affected
+    listings; orphaned entries age out through TTL/LRU.
+
+    The same generation stamp goes into the listing's ETag. Checkout and
+    cancellations change stock without moving the catalog watermark, so the
+    stamp is what changes the ETag of just the listings they touched.
+    """
+
+    namespace = 'products:list'
+
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+
+    @staticmethod
+    def normalize(category_id=None, seller_id=None, search=None, featured=None, limit=None, cursor=None,
+                  filters=None, facets=False, fields=None):
+        def as_id(value):
+            value = (value or '').strip()
+            return int(value) if value.isdigit() else (value or None)
+
+        search = ' '.join((search or '').lower().split()) or None
+        return {
+            'category_id': as_id(category_id),
+            'seller_id': as_id(seller_id),
+            'search': search,
+            'featured': bool(featured) and featured.lower() in TRUTHY,
+            'limit': int(limit) if limit and str(limit).isdigit() else None,
+            'cursor': cursor or None,
+            'filters': {name: value if isinstance(value, list) else str(value)
+                        for name, value in sorted((filters or {}).items())},
+            'facets': bool(facets),
+            'fields': list(fields) if fields else None,
+        }
+
+    @staticmethod
+    def _scopes(query):
+        scopes = ['all']
+        if query['category_id'] is None and query['seller_id'] is None:
+            scopes.append('any')
+        if query['category_id'] is not None:
+            scopes.append(f"category:{query['category_id']}")
+        if query['seller_id'] is not None:
+            scopes.append(f"seller:{query['seller_id']}")
+        return scopes
+
+    def generation(self, query):
+        """Generation stamp of the scopes `query` depends on, None while the backend is unavailable"""
+        generations = self.backend.counters([f'{self.namespace}:{s}' for s in self._scopes(query)])
+        return '.'.join(str(g) for g in generations) if generations is not None else None
+
+    def _key(self, query, generation):
+        return f'{self.namespace}:{generation}:' + json.dumps(query, sort_keys=True)
+
+    def get(self, query, generation):
+        return self.backend.get(self._key(query, generation)) if generation is not None else None
+
+    def set(self, query, generation, value):
+        if generation is not None:
+            self.backend.set(self._key(query, generation), value, self.ttl)
+
+    def invalidate(self, category_ids=(), seller_ids=()):
+        """Drop listings touching the given categories/sellers plus unfiltered listings"""
+        self.backend.incr(f'{self.namespace}:any')
+        for category_id in {c for c in category_ids if c is not None}:
+            self.backend.incr(f'{self.namespace}:category:{category_id}')
+        for seller_id in {s for s in seller_ids if s is not None}:
+            self.backend.incr(f'{self.namespace}:seller:{seller_id}')
+
+    def invalidate_all(self):
+        self.backend.incr(f'{self.namespace}:all')
+
+    def stats(self):
+        stats = self.backend.stats()
+        stats['ttl'] = self.ttl
+        return stats
+
+
+class ResponseCache:
+    """
+    Serialized response bodies keyed by URL and audience, stored with the
+    ETag they were built for. A lookup only hits when the stored ETag is the
+    request's current one, so entries never outlive the data they came from
+    and need no invalidation of their own.
+    """
+
+    namespace = 'responses'
+
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+
+    def _key(self, url, audience):
+        return f'{self.namespace}:{audience}:{url}'
+
+    def get(self, url, audience, etag):
+        entry = self.backend.get(self._key(url, audience))
+        if entry is not None and entry.get('etag') == etag:
+            return entry['body']
+        return None
+
+    def set(self, url, audience, etag, body):
+        self.backend.set(self._key(url, audience), {'etag': etag, 'body': body}, self.ttl)
+
+    def stats(self):
+        stats = self.backend.stats()
+        stats['ttl'] = self.ttl
+        return stats
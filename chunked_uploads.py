@@ -0,0 +1,306 @@
+"""
+Resumable chunked uploads for large product media (mostly videos).
+
+A single multipart upload ties up a worker for as long as the client takes
+to send it, and starts over from zero when a mobile connection drops. The
+chunked protocol splits it into short requests:
+
+    POST   /api/products/<id>/media/uploads      {"file_name", "file_size"}  -> upload_id, chunk_size
+    PUT    /api/media/uploads/<upload_id>?offset=N   raw bytes of one chunk -> new offset
+    GET    /api/media/uploads/<upload_id>         -> current offset, to resume after a failure
+    POST   /api/media/uploads/<upload_id>/complete    -> product_media row
+    DELETE /api/media/uploads/<upload_id>         abort
+
+Each chunk is streamed to its own file under <upload_folder>/.chunks/<upload_id>/
+(named after its offset and renamed into place once fully written), so a
+dropped connection never leaves a half-written chunk behind and the current
+offset is simply the contiguous length of the chunks on disk. A chunk must
+start at the current offset; anything else gets the offset back so the
+client can resume. Completion streams the chunks, in order, into the
+content-addressed MediaStore.
+
+Session metadata lives in upload_sessions. The functions taking a cursor
+expect a dictionary cursor and leave the commit to the caller.
+UploadSessionSweeper removes sessions (and their chunks) that have not
+received data within the TTL, plus chunk directories without a session.
+
+    python chunked_uploads.py        # sweep abandoned uploads once and exit
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+CHUNKS_DIR = '.chunks'
+COPY_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    """A chunk could not be accepted; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=409):
+        super().__init__(message)
+        self.status = status
+
+
+class ChunkStore:
+    def __init__(self, upload_folder):
+        self.root = os.path.join(upload_folder, CHUNKS_DIR)
+
+    def session_dir(self, upload_id):
+        return os.path.join(self.root, upload_id)
+
+    def create(self, upload_id):
+        os.makedirs(self.session_dir(upload_id), exist_ok=True)
+
+    def _chunks(self, upload_id):
+        """[(offset, size, path)] of the complete chunks, sorted by offset"""
+        directory = self.session_dir(upload_id)
+        if not os.path.isdir(directory):
+            return []
+        chunks = []
+        for name in os.listdir(directory):
+            if not name.endswith('.chunk'):
+                continue
+            path = os.path.join(directory, name)
+            chunks.append((int(name[:-len('.chunk')]), os.path.getsize(path), path))
+        return sorted(chunks)
+
+    def _contiguous(self, upload_id):
+        """The chunks that follow each other from offset 0, and the offset after the last one"""
+        offset, run = 0, []
+        for start, size, path in self._chunks(upload_id):
+            if start != offset:
+                if start > offset:
+                    break
+                continue  # overlaps an earlier chunk (concurrent retry); ignore it
+            run.append(path)
+            offset += size
+        return run, offset
+
+    def offset(self, upload_id):
+        return self._contiguous(upload_id)[1]
+
+    def write_chunk(self, upload_id, offset, stream, max_bytes):
+        """
+        Stream one chunk to disk; returns the new offset. Raises ChunkError if
+        `offset` is not where the upload currently ends, or if the chunk is
+        empty or larger than `max_bytes`.
+        """
+        current = self.offset(upload_id)
+        if offset != current:
+            raise ChunkError(f'Expected offset {current}')
+        directory = self.session_dir(upload_id)
+        os.makedirs(directory, exist_ok=True)
+        temp_path = os.path.join(directory, f'{offset:015d}.{uuid.uuid4().hex}.part')
+        written = 0
+        try:
+            with open(temp_path, 'wb') as out:
+                while True:
+                    data = stream.read(COPY_SIZE)
+                    if not data:
+                        break
+                    written += len(data)
+                    if written > max_bytes:
+                        raise ChunkError(f'Chunk larger than {max_bytes} bytes', 413)
+                    out.write(data)
+            if not written:
+                raise ChunkError('Empty chunk', 400)
+            os.replace(temp_path, os.path.join(directory, f'{offset:015d}.chunk'))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return offset + written
+
+    def reader(self, upload_id):
+        """File-like object reading the assembled upload, for MediaStore.save()"""
+        return _ChainedReader(self._contiguous(upload_id)[0])
+
+    def discard(self, upload_id):
+        shutil.rmtree(self.session_dir(upload_id), ignore_errors=True)
+
+
+class _ChainedReader:
+    def __init__(self, paths):
+        self._paths = list(paths)
+        self._current = None
+
+    def read(self, size=-1):
+        while True:
+            if self._current is None:
+                if not self._paths:
+                    return b''
+                self._current = open(self._paths.pop(0), 'rb')
+            data = self._current.read(size)
+            if data:
+                return data
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+
+def create_session(cursor, seller_id, product_id, file_name, file_size, media_type, mime_type, ttl):
+    upload_id = uuid.uuid4().hex
+    cursor.execute("""
+                   INSERT INTO upload_sessions (id, seller_id, product_id, file_name, file_size, media_type,
+                                                mime_type, expires_at)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, NOW() + INTERVAL %s SECOND)
+                   """, (upload_id, seller_id, product_id, file_name, file_size, media_type, mime_type, ttl))
+    return upload_id
+
+
+def get_session(cursor, upload_id, seller_id):
+    """The seller's unexpired session, or None"""
+    cursor.execute("""
+                   SELECT * FROM upload_sessions
+                   WHERE id = %s AND seller_id = %s AND expires_at > NOW()
+                   """, (upload_id, seller_id))
+    return cursor.fetchone()
+
+
+def touch_session(cursor, upload_id, received_bytes, ttl):
+    """Record progress and restart the TTL after a chunk arrived"""
+    cursor.execute("""
+                   UPDATE upload_sessions
+                   SET received_bytes = %s, expires_at = NOW() + INTERVAL %s SECOND
+                   WHERE id = %s
+                   """, (received_bytes, ttl, upload_id))
+
+
+def delete_session(cursor, upload_id):
+    cursor.execute("DELETE FROM upload_sessions WHERE id = %s", (upload_id,))
+    return cursor.rowcount == 1
+
+
+def sweep(conn, store, orphan_age=86400):
+    """Delete expired sessions and their chunks; returns how many sessions were removed"""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT id FROM upload_sessions WHERE expires_at <= NOW()")
+        expired = [row['id'] for row in cursor.fetchall()]
+        if expired:
+            placeholders = ', '.join(['%s'] * len(expired))
+            cursor.execute(f"DELETE FROM upload_sessions WHERE id IN ({placeholders}) AND expires_at <= NOW()",
+                           expired)
+            conn.commit()
+            for upload_id in expired:
+                store.discard(upload_id)
+
+        # Chunk directories whose session row is gone (e.g. a crash between commit and cleanup)
+        if os.path.isdir(store.root):
+            cutoff = time.time() - orphan_age
+            stale = [name for name in os.listdir(store.root)
+                     if os.path.getmtime(store.session_dir(name)) < cutoff]
+            if stale:
+                placeholders = ', '.join(['%s'] * len(stale))
+                cursor.execute(f"SELECT id FROM upload_sessions WHERE id IN ({placeholders})", stale)
+                live = {row['id'] for row in cursor.fetchall()}
+                for name in stale:
+                    if name not in live:
+                        store.discard(name)
+        return len(expired)
+    finally:
+        cursor.close()
+
+
+class UploadSessionSweeper:
+    """
+    Background thread that runs sweep() every `interval` seconds; a MySQL
+    named lock keeps it to one process at a time
+    """
+
+    lock_name = 'upload_session_sweeper'
+
+    def __init__(self, connection_factory, store, interval=900):
+        self.connection_factory = connection_factory
+        self.store = store
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+        self.last_run = None
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.abandoned = 0
+
+    def _locked(self, conn, sql):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, (self.lock_name,))
+            return cursor.fetchone()[0] == 1
+        finally:
+            cursor.close()
+
+    def run_once(self):
+        try:
+            with self.connection_factory() as conn:
+                if not self._locked(conn, "SELECT GET_LOCK(%s, 0)"):
+                    self.skipped += 1  # another process is sweeping
+                    return True
+                try:
+                    removed = sweep(conn, self.store)
+                finally:
+                    self._locked(conn, "SELECT RELEASE_LOCK(%s)")
+        except Exception as err:
+            self.failures += 1
+            logger.error(f'Upload session sweep failed: {err}')
+            return False
+        self.runs += 1
+        self.abandoned += removed
+        self.last_run = time.time()
+        if removed:
+            logger.info(f'Removed {removed} abandoned upload sessions')
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='upload-session-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'abandoned': self.abandoned,
+            'last_run': self.last_run,
+        }
+
+
+if __name__ == '__main__':
+    import argparse
+    from contextlib import closing
+
+    import mysql.connector
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description='Remove abandoned chunked uploads')
+    parser.add_argument('--upload-folder', default='static/uploads')
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    config = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'user': os.getenv('DB_USER', 'root'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'database': os.getenv('DB_NAME', 'thriftshop_sa'),
+    }
+    with closing(mysql.connector.connect(**config)) as conn:
+        print(f'Removed {sweep(conn, ChunkStore(args.upload_folder))} abandoned upload sessions')
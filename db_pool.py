@@ -0,0 +1,233 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import mysql.connector
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the wait timeout"""
+
+
+class PooledConnection:
+    """Thin wrapper around a MySQL connection that returns itself to the pool on close()"""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.checked_out_at = None
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        wrap = self._pool.cursor_wrapper
+        return wrap(cursor) if wrap else cursor
+
+    def close(self):
+        # Routes still written against get_db_connection() call close();
+        # hand the connection back instead of tearing down the socket.
+        if self.checked_out_at is not None:
+            self._pool.release(self)
+
+
+class ConnectionPool:
+    """
+    Fixed-size MySQL connection pool.
+
+    Connections are created lazily up to `size`. Idle connections older than
+    `max_idle` seconds or alive longer than `max_lifetime` seconds are recycled,
+    and a connection that has sat idle for more than `ping_after` seconds is
+    pinged before being handed out. When every connection is in use, callers
+    wait up to `wait_timeout` seconds before PoolTimeout is raised.
+
+    Optional hooks: `cursor_wrapper(cursor)` wraps every cursor opened on a
+    pooled connection, and `wait_observer(seconds)` is called with the time
+    each checkout took.
+    """
+
+    def __init__(self, db_config, name='default', size=10, max_idle=300,
+                 max_lifetime=3600, wait_timeout=5.0, ping_after=1.0,
+                 cursor_wrapper=None, wait_observer=None):
+        self.db_config = dict(db_config)
+        self.name = name
+        self.size = size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.wait_timeout = wait_timeout
+        self.ping_after = ping_after
+        self.cursor_wrapper = cursor_wrapper
+        self.wait_observer = wait_observer
+
+        self._idle = deque()
+        self._open = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._closed = False
+
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'failed_pings': 0,
+            'connect_errors': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    def _connect(self):
+        try:
+            raw = mysql.connector.connect(**self.db_config)
+        except mysql.connector.Error:
+            with self._lock:
+                self._open -= 1
+                self._stats['connect_errors'] += 1
+                self._available.notify()
+            raise
+        with self._lock:
+            self._stats['created'] += 1
+        return PooledConnection(self, raw)
+
+    def _discard(self, conn):
+        """Close a connection for good. Caller must hold the lock."""
+        self._open -= 1
+        try:
+            conn._raw.close()
+        except Exception:
+            pass
+        self._available.notify()
+
+    def _is_stale(self, conn, now):
+        return (now - conn.created_at > self.max_lifetime or
+                now - conn.last_used > self.max_idle)
+
+    def _is_healthy(self, conn, now):
+        if now - conn.last_used < self.ping_after:
+            return True
+        try:
+            conn._raw.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    def acquire(self, timeout=None):
+        """Check a connection out of the pool, blocking up to `timeout` seconds"""
+        timeout = self.wait_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise PoolTimeout(f'Connection pool {self.name!r} is closed')
+
+                conn = None
+                while self._idle:
+                    candidate = self._idle.pop()
+                    if self._is_stale(candidate, time.monotonic()):
+                        self._stats['recycled'] += 1
+                        self._discard(candidate)
+                        continue
+                    conn = candidate
+                    break
+
+                if conn is None:
+                    if self._open < self.size:
+                        self._open += 1
+                        conn = False  # reserve a slot, connect outside the lock
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats['timeouts'] += 1
+                            raise PoolTimeout(
+                                f'Timed out after {timeout:.1f}s waiting for a connection '
+                                f'from pool {self.name!r}')
+                        waited = True
+                        self._available.wait(remaining)
+                        continue
+
+            if conn is False:
+                conn = self._connect()
+            elif not self._is_healthy(conn, time.monotonic()):
+                with self._lock:
+                    self._stats['failed_pings'] += 1
+                    self._discard(conn)
+                continue
+
+            now = time.monotonic()
+            wait_time = now - started
+            conn.checked_out_at = now
+            with self._lock:
+                self._stats['checkouts'] += 1
+                if waited:
+                    self._stats['waits'] += 1
+                self._stats['wait_time_total'] += wait_time
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+            if self.wait_observer:
+                self.wait_observer(wait_time)
+            return conn
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back anything left uncommitted"""
+        conn.checked_out_at = None
+        conn.last_used = time.monotonic()
+
+        healthy = True
+        try:
+            if conn._raw.in_transaction:
+                conn._raw.rollback()
+        except mysql.connector.Error:
+            healthy = False
+
+        with self._lock:
+            if not healthy or self._closed:
+                self._discard(conn)
+            else:
+                self._idle.append(conn)
+                self._available.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def cursor(self, dictionary=True, timeout=None):
+        """Yield (conn, cursor); both are always returned, even on early returns"""
+        with self.connection(timeout) as conn:
+            cursor = conn.cursor(dictionary=dictionary)
+            try:
+                yield conn, cursor
+            finally:
+                cursor.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            in_use = self._open - len(self._idle)
+            stats.update({
+                'name': self.name,
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': in_use,
+                'wait_time_avg': (stats['wait_time_total'] / stats['checkouts']
+                                  if stats['checkouts'] else 0.0),
+            })
+        return stats
+
+    def close_all(self):
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
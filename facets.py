@@ -0,0 +1,659 @@
+"""
+In-memory facet index over the catalog.
+
+Counting "Nike (42)" for every brand, color, size and condition of a
+filtered listing takes one GROUP BY per facet in MySQL, and each of them
+scans every matching row. FacetIndex keeps an inverted index of the
+products table in memory. Every product gets a slot number, and every facet
+value (brand 'Nike', color 'red', a price range, a category, ...) keeps the
+set of slots that have it. A slot set is a plain Python int used as a bitmap
+once it has more than SPARSE_LIMIT members, and a set() below that. Filters
+are ANDs and ORs of bitmaps. Counts are popcounts (int.bit_count) of the
+filter ANDed with each value's bitmap. Both run in C over 1M-bit integers.
+Per slot, the index stores only the price, in an array('d'), and one value
+code per dimension, in an array('H') per dimension; there is no Python
+object per product.
+
+- Counts are disjunctive: a facet's counts apply every filter except the
+  facet's own, so choosing 'Nike' still shows what picking 'Adidas' as well
+  would add. Values of a facet are ORed together, facets are ANDed.
+- Price filters are exact (min_price/max_price), through fine geometric
+  price buckets plus a check of the two partially covered buckets. The price
+  facet reports the PRICE_RANGES.
+- Only listed products (active, approved seller) count; unlisted ones keep
+  their slot so that re-listing them is cheap.
+- Values are matched case-insensitively, as the columns' collation does in
+  SQL: 'Nike' and 'NIKE' are one value, reported in the first spelling seen.
+
+A background thread loads the index and then applies the rows changed since
+the previous sync: products.updated_at or sellers.updated_at from a few seconds
+before the last sync on. poke() wakes it right after a write. Deleted rows leave
+no updated_at behind. When the delete counts the triggers keep in
+catalog_deletes (see http_validators.py) move, the sync looks up which indexed
+ids are gone, one id range at a time, and clears their slots. The index is
+reloaded from scratch every `rebuild_interval` seconds. Only one process
+loads at a time: a load takes a MySQL named lock, and a worker that finds it
+held keeps syncing its current index and tries again on the next run.
+version changes whenever the index does.
+"""
+import logging
+import math
+import threading
+import time
+from array import array
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+logger = logging.getLogger(__name__)
+
+FACETS = ('conditions', 'size', 'color', 'brand')
+SCOPES = ('category_id', 'seller_id', 'featured')
+# Price facet buckets in rand: (label, min inclusive, max exclusive or None)
+PRICE_RANGES = (('0-100', 0, 100), ('100-250', 100, 250), ('250-500', 250, 500), ('500-1000', 500, 1000),
+                ('1000-2500', 1000, 2500), ('2500+', 2500, None))
+PRICE_BUCKET_RATIO = 1.1  # consecutive fine price buckets differ by 10%
+SPARSE_LIMIT = 512  # slot sets up to this size stay Python sets
+SCAN_LIMIT = 5000  # below this many matches, values of large facets are counted row by row
+FACET_LIMIT = 20  # values reported per facet
+PRICE_MASK_CACHE = 64
+SYNC_OVERLAP = 5  # seconds
+
+DELETE_CHECK_BATCH = 5000  # indexed ids checked per query after a delete
+
+# Deletes from these tables (or cascading from them) change indexed products
+DELETES_SQL = "SELECT scope, deletes FROM catalog_deletes WHERE scope IN ('products', 'sellers', 'categories')"
+
+COLUMNS = """p.id, p.category_id, p.seller_id, p.featured, p.conditions, p.size, p.color, p.brand, p.price,
+             (p.is_active = TRUE AND s.status = 'approved') AS listed"""
+
+
+def facet_key(value):
+    """What a facet value is indexed and looked up as: trailing spaces and case don't count, as in SQL"""
+    return str(value).rstrip().casefold()
+
+
+def price_bucket(price):
+    return int(math.log1p(max(float(price), 0)) / math.log(PRICE_BUCKET_RATIO))
+
+
+def price_range(price):
+    for label, low, high in PRICE_RANGES:
+        if price >= low and (high is None or price < high):
+            return label
+    return PRICE_RANGES[0][0]
+
+
+def parse_filters(args):
+    """
+    Facet filters from request args: min_price/max_price, and conditions, size,
+    color, brand as repeated (also name[]) or comma-separated values. Raises ValueError.
+    """
+    filters = {}
+    for name in ('min_price', 'max_price'):
+        raw = (args.get(name) or '').strip()
+        if raw:
+            try:
+                value = Decimal(raw)
+            except InvalidOperation:
+                raise ValueError(f'{name} must be a number')
+            if not value.is_finite() or value < 0:
+                raise ValueError(f'{name} must be a non-negative number')
+            filters[name] = value
+    for name in FACETS:
+        raw_values = args.getlist(name) + args.getlist(f'{name}[]')  # backend-connector.js sends arrays as name[]
+        # One spelling per value; the SQL comparison ignores case anyway
+        values = sorted({facet_key(v): v.strip() for raw in raw_values for v in raw.split(',') if v.strip()}.values())
+        if values:
+            filters[name] = values
+    return filters
+
+
+def filter_clause(filters):
+    """(' AND ...', params) restricting a products query aliased p to the filters"""
+    sql, params = '', []
+    if 'min_price' in filters:
+        sql += ' AND p.price >= %s'
+        params.append(filters['min_price'])
+    if 'max_price' in filters:
+        sql += ' AND p.price <= %s'
+        params.append(filters['max_price'])
+    for name in FACETS:
+        if name in filters:
+            sql += f" AND p.{name} IN ({', '.join(['%s'] * len(filters[name]))})"
+            params.extend(filters[name])
+    return sql, params
+
+
+def sql_counts(cursor, where, params, filters, limit=FACET_LIMIT):
+    """
+    The counts of FacetIndex.query(), computed in MySQL, for result sets too
+    large to hand to the index as product ids (a broad search). `where` and
+    `params` restrict `products p JOIN sellers s` to the listing's scope and
+    search, without the facet filters. Expects a dictionary cursor.
+    """
+    def counted(value_sql, skip, tail, tail_params=()):
+        filter_sql, filter_params = filter_clause({key: value for key, value in filters.items() if key not in skip})
+        cursor.execute(f"""
+                       SELECT {value_sql} AS value, COUNT(*) AS n
+                       FROM products p JOIN sellers s ON p.seller_id = s.id
+                       {where}{filter_sql}{tail}
+                       """, list(params) + filter_params + list(tail_params))
+        return [(row['value'], row['n']) for row in cursor.fetchall()]
+
+    facets = {}
+    for name in FACETS:
+        top = counted(f'p.{name}', (name,),
+                      f' AND p.{name} IS NOT NULL GROUP BY p.{name} ORDER BY n DESC, value LIMIT %s', (limit,))
+        reported = {facet_key(value) for value, _ in top}
+        missing = [value for value in filters.get(name, []) if facet_key(value) not in reported]
+        if missing:
+            found = {facet_key(value): (value, n) for value, n in counted(
+                f'p.{name}', (name,), f" AND p.{name} IN ({', '.join(['%s'] * len(missing))}) GROUP BY p.{name}",
+                missing)}
+            top.extend(found.get(facet_key(value), (value, 0)) for value in missing)
+        facets[name] = [{'value': value, 'count': count} for value, count in top]
+
+    ranges = ' '.join(f"WHEN p.price < {high} THEN '{label}'" for label, _, high in PRICE_RANGES if high is not None)
+    in_range = dict(counted(f"CASE {ranges} ELSE '{PRICE_RANGES[-1][0]}' END", ('min_price', 'max_price'),
+                            ' GROUP BY value'))
+    facets['price'] = [{'value': label, 'min': low, 'max': high, 'count': in_range.get(label, 0)}
+                       for label, low, high in PRICE_RANGES]
+
+    filter_sql, filter_params = filter_clause(filters)
+    cursor.execute(f"SELECT COUNT(*) AS n FROM products p JOIN sellers s ON p.seller_id = s.id {where}{filter_sql}",
+                   list(params) + filter_params)
+    return {'total': cursor.fetchone()['n'], 'facets': facets}
+
+
+def _bits(slots):
+    """Bitmap int with the given slot bits set"""
+    if not slots:
+        return 0
+    buffer = bytearray((max(slots) >> 3) + 1)
+    for slot in slots:
+        buffer[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _slots(bits):
+    """Slot numbers of the set bits, ascending"""
+    text = bin(bits)[:1:-1]
+    position = text.find('1')
+    while position != -1:
+        yield position
+        position = text.find('1', position + 1)
+
+
+class _Posting:
+    """The slots holding one facet value: a set while small, a bitmap int once large"""
+
+    __slots__ = ('slots', 'bits', 'size')
+
+    def __init__(self, slots=()):
+        if len(slots) > SPARSE_LIMIT:
+            self.slots, self.bits = None, _bits(slots)
+            self.size = self.bits.bit_count()
+        else:
+            self.slots, self.bits = set(slots), 0
+            self.size = len(self.slots)
+
+    def add(self, slot):
+        if self.slots is None:
+            if not self.bits >> slot & 1:
+                self.bits |= 1 << slot
+                self.size += 1
+            return
+        if slot not in self.slots:
+            self.slots.add(slot)
+            self.size += 1
+            if self.size > SPARSE_LIMIT:
+                self.bits, self.slots = _bits(self.slots), None
+
+    def discard(self, slot):
+        if self.slots is None:
+            if self.bits >> slot & 1:
+                self.bits &= ~(1 << slot)
+                self.size -= 1
+        elif slot in self.slots:
+            self.slots.discard(slot)
+            self.size -= 1
+
+    def as_bits(self):
+        return self.bits if self.slots is None else _bits(self.slots)
+
+    def count_in(self, mask, mask_bytes):
+        """Members inside the bitmap `mask` (mask_bytes: the same bitmap as little-endian bytes)"""
+        if self.slots is None:
+            return (self.bits & mask).bit_count()
+        size = len(mask_bytes)
+        return sum(1 for slot in self.slots if slot >> 3 < size and mask_bytes[slot >> 3] >> (slot & 7) & 1)
+
+
+class _Column:
+    """
+    One dimension's value for every slot, as a code into `values` (0: none).
+    Codes are array('H') entries, widened to array('I') past 65535 values.
+    """
+
+    __slots__ = ('codes', 'values', 'code_of')
+
+    def __init__(self):
+        self.codes = array('H')
+        self.values = [None]  # code -> value
+        self.code_of = {}  # value -> code
+
+    def code(self, value):
+        if value is None:
+            return 0
+        code = self.code_of.get(value)
+        if code is None:
+            code = self.code_of[value] = len(self.values)
+            self.values.append(value)
+            if code > 0xFFFF and self.codes.typecode == 'H':
+                self.codes = array('I', self.codes)
+        return code
+
+    def append(self, value):
+        code = self.code(value)  # before touching self.codes, which it may replace
+        self.codes.append(code)
+
+    def set(self, slot, value):
+        code = self.code(value)
+        self.codes[slot] = code
+
+    def __getitem__(self, slot):
+        return self.values[self.codes[slot]]
+
+
+class FacetIndex:
+    lock_name = 'facet_index_rebuild'
+
+    def __init__(self, connection_factory, interval=5, rebuild_interval=600, scan_limit=SCAN_LIMIT):
+        self.connection_factory = connection_factory
+        self.interval = interval
+        self.rebuild_interval = rebuild_interval
+        self.scan_limit = scan_limit
+        self.version = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._ready = False
+        self._watermark = None
+        self._deletes = {}
+        self._rebuilt_at = 0.0
+        self._reset()
+        self.last_run = None
+        self.runs = 0
+        self.failures = 0
+        self.rebuilds = 0
+        self.skipped = 0
+
+    def _reset(self):
+        self._slot_of = {}  # product id -> slot
+        self._free = []
+        self._prices = array('d')  # slot -> price
+        self._columns = {name: _Column() for name in SCOPES + FACETS}
+        self._listed = _Posting()
+        self._postings = {name: {} for name in SCOPES + FACETS + ('price_range', 'price_bucket')}
+        self._labels = {name: {} for name in FACETS}  # facet_key -> spelling reported
+        self._mask_cache = {}
+        self._ranked = {}
+
+    @staticmethod
+    def _dimensions(row):
+        """({dimension: value} for SCOPES and FACETS, price) of a row selecting COLUMNS"""
+        dimensions = {name: row[name] for name in SCOPES if row.get(name) is not None}
+        dimensions.update((name, facet_key(row[name])) for name in FACETS if row.get(name) is not None)
+        dimensions['featured'] = bool(row.get('featured'))
+        return dimensions, float(row['price'] or 0)
+
+    @staticmethod
+    def _keys(dimensions, price):
+        """The (posting, value) pairs a product belongs to"""
+        yield from dimensions.items()
+        yield 'price_range', price_range(price)
+        yield 'price_bucket', price_bucket(price)
+
+    def _stored(self, slot):
+        """_dimensions() of the product in `slot`, read back from the columns"""
+        dimensions = {}
+        for name, column in self._columns.items():
+            value = column[slot]
+            if value is not None:
+                dimensions[name] = value
+        return dimensions, self._prices[slot]
+
+    # -- maintenance -------------------------------------------------------
+
+    def _unset(self, slot):
+        self._listed.discard(slot)
+        for name, value in self._keys(*self._stored(slot)):
+            posting = self._postings[name].get(value)
+            if posting is not None:
+                posting.discard(slot)
+                if not posting.size:
+                    del self._postings[name][value]
+        for column in self._columns.values():
+            column.codes[slot] = 0
+
+    def apply(self, rows):
+        """Add or replace products from rows selecting COLUMNS"""
+        with self._lock:
+            for row in rows:
+                slot = self._slot_of.get(row['id'])
+                if slot is None:
+                    slot = self._free.pop() if self._free else len(self._prices)
+                    if slot == len(self._prices):
+                        self._prices.append(0.0)
+                        for column in self._columns.values():
+                            column.codes.append(0)
+                    self._slot_of[row['id']] = slot
+                else:
+                    self._unset(slot)
+                dimensions, price = self._dimensions(row)
+                self._prices[slot] = price
+                for name, value in dimensions.items():
+                    self._columns[name].set(slot, value)
+                if row['listed']:
+                    self._listed.add(slot)
+                for name, value in self._keys(dimensions, price):
+                    self._postings[name].setdefault(value, _Posting()).add(slot)
+                for name in FACETS:
+                    if name in dimensions:
+                        self._labels[name].setdefault(dimensions[name], row[name])
+            self._changed()
+
+    def remove(self, product_ids):
+        """Drop deleted products; their slots are reused by later ones"""
+        with self._lock:
+            for product_id in product_ids:
+                slot = self._slot_of.pop(product_id, None)
+                if slot is not None:
+                    self._unset(slot)
+                    self._free.append(slot)
+            self._changed()
+
+    def _drop_categories(self, existing):
+        """Products of categories not in `existing` lose their category (ON DELETE SET NULL)"""
+        with self._lock:
+            postings, column = self._postings['category_id'], self._columns['category_id']
+            for category_id in [value for value in postings if value not in existing]:
+                posting = postings.pop(category_id)
+                for slot in (posting.slots if posting.slots is not None else _slots(posting.bits)):
+                    column.codes[slot] = 0
+            self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._mask_cache = {}
+        self._ranked = {}
+
+    def _read_deletes(self, cursor):
+        cursor.execute(DELETES_SQL)
+        return {row['scope']: row['deletes'] for row in cursor.fetchall()}
+
+    def _load(self, cursor):
+        """Replace the whole index with the products table"""
+        cursor.execute("SELECT NOW() AS now")
+        watermark = cursor.fetchone()['now']
+        deletes = self._read_deletes(cursor)
+        cursor.execute(f"SELECT {COLUMNS} FROM products p JOIN sellers s ON p.seller_id = s.id ORDER BY p.id")
+        slot_of, prices, listed = {}, array('d'), array('I')
+        columns = {name: _Column() for name in SCOPES + FACETS}
+        members = {name: {} for name in self._postings}
+        labels = {name: {} for name in FACETS}
+        for slot, row in enumerate(cursor):
+            dimensions, price = self._dimensions(row)
+            slot_of[row['id']] = slot
+            prices.append(price)
+            for name, column in columns.items():
+                column.append(dimensions.get(name))
+            if row['listed']:
+                listed.append(slot)
+            for name, value in self._keys(dimensions, price):
+                members[name].setdefault(value, array('I')).append(slot)
+            for name in FACETS:
+                if name in dimensions:
+                    labels[name].setdefault(dimensions[name], row[name])
+        postings = {name: {value: _Posting(slots) for value, slots in values.items()}
+                    for name, values in members.items()}
+        with self._lock:
+            self._slot_of, self._free, self._prices, self._columns = slot_of, [], prices, columns
+            self._listed, self._postings, self._labels = _Posting(listed), postings, labels
+            self._watermark, self._deletes = watermark, deletes
+            self._rebuilt_at, self._ready = time.monotonic(), True
+            self._changed()
+        self.rebuilds += 1
+        logger.info(f'Facet index loaded: {len(slot_of)} products')
+
+    def _deleted_ids(self, cursor):
+        """Indexed products that are no longer in the products table, checked one id range at a time"""
+        with self._lock:
+            ids = array('q', sorted(self._slot_of))
+        deleted = []
+        for start in range(0, len(ids), DELETE_CHECK_BATCH):
+            chunk = ids[start:start + DELETE_CHECK_BATCH]
+            cursor.execute("SELECT id FROM products WHERE id BETWEEN %s AND %s", (chunk[0], chunk[-1]))
+            present = {row['id'] for row in cursor.fetchall()}
+            deleted.extend(product_id for product_id in chunk if product_id not in present)
+        return deleted
+
+    def _apply_deletes(self, cursor, deletes):
+        """Take out what the deletes counted in catalog_deletes since the last sync removed"""
+        moved = {scope for scope in ('products', 'sellers', 'categories')
+                 if deletes.get(scope, 0) != self._deletes.get(scope, 0)}
+        if moved & {'products', 'sellers'}:  # a seller's products go with it
+            deleted = self._deleted_ids(cursor)
+            if deleted:
+                self.remove(deleted)
+        if 'categories' in moved:
+            cursor.execute("SELECT id FROM categories")
+            self._drop_categories({row['id'] for row in cursor.fetchall()})
+        self._deletes = deletes
+
+    def _sync(self, cursor):
+        """Apply products changed since the last watermark, and deletes since the last sync"""
+        cursor.execute("SELECT NOW() AS now")
+        watermark = cursor.fetchone()['now']
+        deletes = self._read_deletes(cursor)
+        if deletes != self._deletes:
+            self._apply_deletes(cursor, deletes)
+        # Rows written by transactions that were still open at the last sync carry an older
+        # updated_at, so a few seconds are read again
+        since = self._watermark - timedelta(seconds=SYNC_OVERLAP)
+        cursor.execute(f"""
+                       SELECT {COLUMNS} FROM products p JOIN sellers s ON p.seller_id = s.id
+                       WHERE p.updated_at >= %s
+                       UNION
+                       SELECT {COLUMNS} FROM products p JOIN sellers s ON p.seller_id = s.id
+                       WHERE s.updated_at >= %s
+                       """, (since, since))
+        rows = cursor.fetchall()
+        if rows:
+            self.apply(rows)
+        self._watermark = watermark
+
+    def _locked(self, cursor, sql):
+        cursor.execute(sql, (self.lock_name,))
+        return cursor.fetchone()['locked'] == 1
+
+    def run_once(self):
+        try:
+            with self.connection_factory() as conn:
+                cursor = conn.cursor(dictionary=True)
+                try:
+                    if not self._ready or time.monotonic() - self._rebuilt_at >= self.rebuild_interval:
+                        # Full loads read the whole catalog; workers take turns instead of all at once
+                        if self._locked(cursor, "SELECT GET_LOCK(%s, 0) AS locked"):
+                            try:
+                                self._load(cursor)
+                            finally:
+                                self._locked(cursor, "SELECT RELEASE_LOCK(%s) AS locked")
+                        else:
+                            self.skipped += 1
+                            if self._ready:
+                                self._sync(cursor)
+                    else:
+                        self._sync(cursor)
+                finally:
+                    cursor.close()
+        except Exception as err:
+            self.failures += 1
+            logger.error(f'Facet index refresh failed: {err}')
+            return False
+        self.runs += 1
+        self.last_run = time.time()
+        return True
+
+    def poke(self):
+        """Sync now instead of at the next interval (call after committing a product write)"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.run_once()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='facet-index', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    @property
+    def ready(self):
+        return self._ready
+
+    # -- queries -----------------------------------------------------------
+
+    def _union(self, name, values):
+        bits = 0
+        for value in values:
+            posting = self._postings[name].get(facet_key(value))
+            if posting is not None:
+                bits |= posting.as_bits()
+        return bits
+
+    def _price_mask(self, low, high):
+        """Bitmap of products priced within [low, high] (either end may be None)"""
+        key = (low, high)
+        if key in self._mask_cache:
+            return self._mask_cache[key]
+        low_bucket = price_bucket(low) if low is not None else None
+        high_bucket = price_bucket(high) if high is not None else None
+        bits, edges = 0, []
+        for bucket, posting in self._postings['price_bucket'].items():
+            if (low_bucket is not None and bucket < low_bucket) or (high_bucket is not None and bucket > high_bucket):
+                continue
+            if bucket == low_bucket or bucket == high_bucket:
+                edges.append(posting)
+            else:
+                bits |= posting.as_bits()
+        prices, exact = self._prices, []
+        for posting in edges:
+            for slot in (posting.slots if posting.slots is not None else _slots(posting.bits)):
+                if (low is None or prices[slot] >= low) and (high is None or prices[slot] <= high):
+                    exact.append(slot)
+        bits |= _bits(exact)
+        if len(self._mask_cache) >= PRICE_MASK_CACHE:
+            self._mask_cache.clear()
+        self._mask_cache[key] = bits
+        return bits
+
+    def _values(self, name, mask, selected, limit):
+        """[(value, count)] for facet `name` within `mask`, largest first, selected values always included"""
+        labels = self._labels[name]
+        # Selected values the index has never seen are reported as the request spelled them
+        spelled = {facet_key(value): value for value in reversed(selected)}
+        selected = list(dict.fromkeys(facet_key(value) for value in selected))
+        postings = self._postings[name]
+        counts = {}
+        if len(postings) > limit * 2 and mask.bit_count() <= self.scan_limit:
+            # Few matching products but many values (brands): count their codes
+            column = self._columns[name]
+            codes, codes_counted = column.codes, {}
+            for slot in _slots(mask):
+                code = codes[slot]
+                if code:
+                    codes_counted[code] = codes_counted.get(code, 0) + 1
+            counts = {column.values[code]: count for code, count in codes_counted.items()}
+        else:
+            if len(postings) > limit * 2:
+                # Counting every value of a large facet is too slow; take the globally most common ones
+                if name not in self._ranked:
+                    self._ranked[name] = sorted(postings, key=lambda value: postings[value].size,
+                                                reverse=True)[:limit * 2]
+                candidates = self._ranked[name]
+            else:
+                candidates = list(postings)
+            mask_bytes = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+            for value in dict.fromkeys(candidates + [v for v in selected if v in postings]):
+                count = postings[value].count_in(mask, mask_bytes)
+                if count:
+                    counts[value] = count
+        top = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))[:limit]
+        reported = {value for value, _ in top}
+        top.extend((value, counts.get(value, 0)) for value in selected if value not in reported)
+        return [(labels.get(value, spelled.get(value, value)), count) for value, count in top]
+
+    def query(self, filters, scope=None, product_ids=None, limit=FACET_LIMIT):
+        """
+        Total and facet counts for listed products matching `scope`
+        ({'category_id', 'seller_id', 'featured'}), parse_filters() `filters`
+        and, when given, the `product_ids` of a search. None until loaded.
+        """
+        if not self._ready:
+            return None
+        with self._lock:
+            base = self._listed.as_bits()
+            for name, value in (scope or {}).items():
+                if value is not None:
+                    posting = self._postings[name].get(value)
+                    base &= posting.as_bits() if posting is not None else 0
+            if product_ids is not None:
+                base &= _bits([self._slot_of[i] for i in product_ids if i in self._slot_of])
+
+            low, high = filters.get('min_price'), filters.get('max_price')
+            price = None
+            if low is not None or high is not None:
+                price = self._price_mask(float(low) if low is not None else None,
+                                         float(high) if high is not None else None)
+            selected = {name: self._union(name, filters[name]) for name in FACETS if name in filters}
+
+            def masked(*skip):
+                mask = base
+                if price is not None and 'price' not in skip:
+                    mask &= price
+                for name, bits in selected.items():
+                    if name not in skip:
+                        mask &= bits
+                return mask
+
+            facets = {name: [{'value': value, 'count': count}
+                             for value, count in self._values(name, masked(name), filters.get(name, []), limit)]
+                      for name in FACETS}
+            price_mask = masked('price')
+            ranges = self._postings['price_range']
+            facets['price'] = [{'value': label, 'min': low_, 'max': high_,
+                                'count': (price_mask & ranges[label].as_bits()).bit_count() if label in ranges else 0}
+                               for label, low_, high_ in PRICE_RANGES]
+            return {'total': masked().bit_count(), 'facets': facets, 'version': self.version}
+
+    def stats(self):
+        return {
+            'ready': self._ready,
+            'products': len(self._slot_of),
+            'listed': self._listed.size,
+            'version': self.version,
+            'interval': self.interval,
+            'runs': self.runs,
+            'failures': self.failures,
+            'rebuilds': self.rebuilds,
+            'skipped': self.skipped,
+            'last_run': self.last_run,
+        }
@@ -0,0 +1,53 @@
+"""
+Sparse fieldsets: the `fields=` query parameter of the product, order and
+seller-product endpoints.
+
+A Fieldset whitelists the fields an endpoint can return and maps each one
+to the SQL expression behind it (None for fields that come out of a stored
+product document). Requested fields are pushed into the SELECT list, so a
+listing that asks for `fields=id,name,price` reads just those columns.
+
+    fields=id,name,price    just those fields (plus nothing else)
+    fields=all              every whitelisted field
+    (no fields=)            the endpoint's default projection
+
+Unknown names raise ValueError, which the endpoints answer with a 400.
+"""
+
+
+class Fieldset:
+    def __init__(self, columns, default=None):
+        """
+        `columns` maps each field to its SQL expression or None, in response
+        order; `default` is the projection without fields= (None: every field)
+        """
+        self.columns = dict(columns)
+        self.default = tuple(default) if default is not None else tuple(self.columns)
+        unknown = [name for name in self.default if name not in self.columns]
+        if unknown:
+            raise ValueError(f"Default fields not in the whitelist: {', '.join(unknown)}")
+
+    def parse(self, raw):
+        """Requested field names, in whitelist order"""
+        names = {name.strip() for name in (raw or '').split(',') if name.strip()}
+        if not names:
+            return self.default
+        if names == {'all'}:
+            return tuple(self.columns)
+        unknown = sorted(names - self.columns.keys())
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+        return tuple(name for name in self.columns if name in names)
+
+    def select(self, fields, extra=()):
+        """
+        SELECT list for `fields` plus `extra` (e.g. keyset sort columns the
+        response doesn't include); fields without SQL are skipped
+        """
+        names = dict.fromkeys((*fields, *extra))
+        return ', '.join(f'{self.columns[name]} AS {name}' for name in names if self.columns.get(name))
+
+    @staticmethod
+    def project(rows, fields):
+        """rows cut down to `fields`, dropping anything selected only for paging"""
+        return [{name: row[name] for name in fields if name in row} for row in rows]
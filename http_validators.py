@@ -0,0 +1,151 @@
+"""
+ETag/Last-Modified validators for the catalog endpoints.
+
+The validators come from updated_at watermarks, not from the response body,
+so a matching If-None-Match can be answered with a 304 before any product is
+read or serialized.
+
+CatalogWatermark reads MAX(updated_at) of products, sellers and categories,
+plus MAX(built_at) of product_documents, in one query; each is a single dive
+into an index on that column. Deleted rows leave MAX(updated_at) unchanged,
+so AFTER DELETE triggers count them in catalog_deletes (one row per table,
+see thriftshop_sa_triggers.sql) and each scope also carries its table's
+delete count and last delete time. A delete that cascades from another
+table fires no trigger, but the table it cascades from is counted, and the
+listings read every scope it can cascade into. The result is cached for
+`ttl` seconds so busy endpoints share one query. invalidate() drops it, and
+the app calls it after its own catalog writes. Writes made by another worker
+process can take up to `ttl` seconds to show up.
+
+TIMESTAMP columns have one-second resolution, so two writes in the same
+second can leave the watermark unchanged. While the newest change is in
+the second the watermark was read in, the read time goes into the ETag
+as well, so nothing from that second is validated against a stale copy.
+
+Live fields (stock, view and purchase counters) are not edits: their UPDATEs
+pin updated_at and leave the watermark alone, so a busy product doesn't
+invalidate every listing it is on. Responses that include them put
+live_epoch() into the ETag instead, which lets those fields trail by at most
+`max_age` seconds.
+"""
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+SCOPES = {
+    'products': "SELECT 'products' AS scope, UNIX_TIMESTAMP(MAX(updated_at)) AS modified, 0 AS n FROM products",
+    'sellers': "SELECT 'sellers' AS scope, UNIX_TIMESTAMP(MAX(updated_at)) AS modified, 0 AS n FROM sellers",
+    'categories': "SELECT 'categories' AS scope, UNIX_TIMESTAMP(MAX(updated_at)) AS modified, 0 AS n "
+                  "FROM categories",
+    'product_documents': "SELECT 'product_documents' AS scope, UNIX_TIMESTAMP(MAX(built_at)) AS modified, 0 AS n "
+                         "FROM product_documents",
+    'now': "SELECT 'now' AS scope, UNIX_TIMESTAMP(NOW(6)) AS modified, 0 AS n",
+}
+# One row per table that has had deletes; folded into the scope of the same name
+DELETES = ("SELECT CONCAT('deleted:', scope) AS scope, UNIX_TIMESTAMP(deleted_at) AS modified, deletes AS n "
+           "FROM catalog_deletes")
+
+
+def make_etag(*parts):
+    """Opaque ETag value for the given parts (without the quotes)"""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+
+def http_datetime(timestamp):
+    """Epoch seconds -> aware UTC datetime at the one-second resolution of HTTP dates"""
+    return datetime.fromtimestamp(int(timestamp), timezone.utc) if timestamp is not None else None
+
+
+def validators(stamps, now, *parts):
+    """
+    (etag, last_modified) from {name: (modified epoch seconds or None, change count)}
+    read at `now` (database time, epoch seconds); `parts` tell representations apart
+    """
+    tokens = [f'{name}:{modified}:{n}' for name, (modified, n) in sorted(stamps.items())]
+    modified = [stamp[0] for stamp in stamps.values() if stamp[0] is not None]
+    if modified and max(modified) >= int(now):
+        tokens.append(now)
+    return make_etag(*parts, *tokens), http_datetime(max(modified)) if modified else None
+
+
+def live_epoch(now, max_age):
+    """ETag part for responses with live fields: changes every `max_age` seconds"""
+    return f'live:{int(now // max_age)}' if max_age > 0 else f'live:{now}'
+
+
+class CatalogWatermark:
+    def __init__(self, connection_factory, ttl=1.0):
+        self.connection_factory = connection_factory
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._marks = None
+        self._read_at = 0.0
+        self._generation = 0
+        self._stats = {'reads': 0, 'hits': 0, 'invalidations': 0, 'failures': 0}
+
+    def _read(self):
+        with self.connection_factory() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute(' UNION ALL '.join((*SCOPES.values(), DELETES)))
+                rows = {row['scope']: (float(row['modified']) if row['modified'] is not None else None, row['n'])
+                        for row in cursor.fetchall()}
+            finally:
+                cursor.close()
+        marks = {}
+        for scope in SCOPES:
+            modified, _ = rows[scope]
+            deleted, deletes = rows.get(f'deleted:{scope}', (None, 0))
+            if deleted is not None and (modified is None or deleted > modified):
+                modified = deleted
+            marks[scope] = (modified, deletes)
+        return marks
+
+    def current(self):
+        """{scope: (newest change as epoch seconds or None, delete count)}"""
+        marks = self._marks
+        if marks is not None and time.monotonic() - self._read_at < self.ttl:
+            self._stats['hits'] += 1
+            return marks
+        with self._lock:
+            # Another thread may have refreshed it while this one waited
+            if self._marks is not None and time.monotonic() - self._read_at < self.ttl:
+                self._stats['hits'] += 1
+                return self._marks
+            generation = self._generation
+            try:
+                marks = self._read()
+            except Exception as err:
+                self._stats['failures'] += 1
+                logger.error(f'Catalog watermark read failed: {err}')
+                raise
+            self._stats['reads'] += 1
+            # A write invalidated during the read may not be in it; use it for this request only
+            if generation == self._generation:
+                self._marks, self._read_at = marks, time.monotonic()
+            return marks
+
+    def validators(self, scopes, *parts, live_max_age=None):
+        """
+        (etag, last_modified) for a response built from the given SCOPES;
+        pass live_max_age when it includes live fields
+        """
+        marks = self.current()
+        now = marks['now'][0]
+        if live_max_age is not None:
+            parts += (live_epoch(now, live_max_age),)
+        return validators({scope: marks[scope] for scope in scopes}, now, *parts)
+
+    def invalidate(self):
+        self._generation += 1
+        self._marks = None
+        self._stats['invalidations'] += 1
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats['ttl'] = self.ttl
+        return stats
@@ -0,0 +1,130 @@
+"""
+orjson-backed JSON provider for the Flask app.
+
+Routes hand jsonify() dictionary-cursor rows full of Decimal and datetime
+values. Flask's default provider encodes them with the pure-Python encoder
+and calls a Python hook for every one of those values. FastJSONProvider
+encodes with orjson and keeps the output the clients already parse:
+
+- Decimal -> string ("149.99"), as Flask does
+- datetime/date -> HTTP date ("Tue, 05 Mar 2024 10:00:00 GMT"), as Flask does, or
+  ISO 8601 with datetime_format='iso', which orjson writes natively
+- time/timedelta (TIME columns) -> string
+- bytes/bytearray (BLOB and some JSON columns) -> UTF-8 text, base64 if not valid UTF-8
+- keys sorted; responses indented in debug mode, as Flask does
+
+Without orjson installed, or when called with keyword arguments for the
+json module, it falls back to Flask's encoder.
+
+stream() encodes a large array item by item, so a response body of
+thousands of rows is never built as one string.
+"""
+import base64
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def http_date(value):
+    """werkzeug.http.http_date() output without its parsing overhead (naive values are taken as UTC)"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        hour, minute, second = value.hour, value.minute, value.second
+    else:
+        hour = minute = second = 0
+    return (f'{_DAYS[value.weekday()]}, {value.day:02d} {_MONTHS[value.month - 1]} {value.year:04d} '
+            f'{hour:02d}:{minute:02d}:{second:02d} GMT')
+
+
+def _default_http(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return http_date(value)
+    return _default_common(value)
+
+
+def _default_iso(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    return _default_common(value)
+
+
+def _default_common(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        raw = bytes(value)
+        try:
+            return raw.decode('utf-8')
+        except UnicodeDecodeError:
+            return base64.b64encode(raw).decode('ascii')
+    if isinstance(value, (time, timedelta, uuid.UUID)):
+        return str(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    datetime_format = 'http'  # or 'iso'
+    stream_batch = 100  # items encoded per yielded chunk
+
+    def encode(self, obj, indent=False):
+        """obj as UTF-8 JSON bytes"""
+        if orjson is None:
+            return super().dumps(obj, **({'indent': 2} if indent else {})).encode('utf-8')
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        if self.datetime_format == 'http':
+            options |= orjson.OPT_PASSTHROUGH_DATETIME
+            return orjson.dumps(obj, default=_default_http, option=options)
+        return orjson.dumps(obj, default=_default_iso, option=options)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self.encode(obj, indent) + b'\n', mimetype=self.mimetype)
+
+    def stream(self, key, items, **fields):
+        """
+        Generator of the bytes of {key: [items...], **fields}; items may be any
+        iterable (e.g. rows fetched in batches). Serve it with
+        app.response_class(stream_with_context(...), mimetype=app.json.mimetype).
+        """
+        yield b'{' + self.encode(key) + b':['
+        batch, first = [], True
+        for item in items:
+            batch.append(self.encode(item))
+            if len(batch) >= self.stream_batch:
+                yield (b'' if first else b',') + b','.join(batch)
+                batch, first = [], False
+        if batch:
+            yield (b'' if first else b',') + b','.join(batch)
+        yield b']'
+        for name, value in fields.items():
+            yield b',' + self.encode(name) + b':' + self.encode(value)
+        yield b'}\n'
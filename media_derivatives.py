@@ -0,0 +1,309 @@
+"""
+Resized WebP/AVIF derivatives for uploaded product images.
+
+Uploads are stored as-is; DerivativePipeline then renders a thumbnail, card
+and detail size of each image in a process pool, off the request thread,
+and records the result in product_media.variants:
+
+    {"thumb": {"width": 160, "height": 213,
+               "webp": "/static/uploads/derived/<name>-thumb.webp",
+               "avif": "/static/uploads/derived/<name>-thumb.avif"},
+     "card": {...}, "detail": {...}}
+
+image_sources() turns that into the srcset-style structure returned in the
+product JSON. Images are never upscaled, so a small original yields
+derivatives at its own width.
+
+Needs Pillow, plus pillow-avif-plugin for AVIF on Pillow < 11.2. Without
+AVIF support only WebP is written.
+
+    python media_derivatives.py backfill     # derivatives for everything under static/uploads/images
+"""
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Workers must not be forked from the app: a fork copies its pool connections and background threads' locks
+POOL_CONTEXT = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+                                           else 'spawn')
+
+SIZES = {'thumb': 160, 'card': 480, 'detail': 1200}  # max width in px
+FORMATS = ('avif', 'webp')  # preference order for <picture>/srcset
+QUALITY = {'avif': 50, 'webp': 75}
+DERIVED_DIR = 'derived'
+
+
+def derivative_name(file_url):
+    """File-name stem for an upload's derivatives; keeps the extension so a.png and a.webp differ"""
+    return os.path.basename(file_url).replace('.', '_')
+
+
+def _avif_supported():
+    from PIL import features
+
+    try:
+        import pillow_avif  # noqa: F401  registers the AVIF plugin on older Pillow
+    except ImportError:
+        pass
+    try:
+        return features.check('avif')
+    except ValueError:
+        # Older Pillow only knows the feature once the plugin registered it
+        from PIL import Image
+        return 'AVIF' in Image.SAVE
+
+
+def render_derivatives(source_path, output_dir, url_prefix, name, sizes=None, formats=FORMATS, quality=None):
+    """
+    Write every size/format of one image and return its variants dict.
+
+    Runs in a worker process, so it only takes and returns plain data.
+    """
+    from PIL import Image, ImageOps
+
+    sizes = sizes or SIZES
+    quality = quality or QUALITY
+    formats = [fmt for fmt in formats if fmt != 'avif' or _avif_supported()]
+    os.makedirs(output_dir, exist_ok=True)
+
+    variants = {}
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        for label, max_width in sorted(sizes.items(), key=lambda item: item[1]):
+            width = min(max_width, image.width)
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            entry = {'width': width, 'height': height}
+            for fmt in formats:
+                filename = f'{name}-{label}.{fmt}'
+                path = os.path.join(output_dir, filename)
+                temp_path = path + '.tmp'
+                resized.save(temp_path, format=fmt.upper(), quality=quality[fmt])
+                os.replace(temp_path, path)
+                entry[fmt] = f'{url_prefix}/{filename}'
+            variants[label] = entry
+    return variants
+
+
+def image_sources(url, variants):
+    """srcset-style description of one image for the product JSON"""
+    entry = {'src': url}
+    if not variants:
+        return entry
+    ordered = sorted(variants.values(), key=lambda v: v['width'])
+    entry['srcset'] = {fmt: ', '.join(f"{v[fmt]} {v['width']}w" for v in ordered if fmt in v)
+                       for fmt in FORMATS if any(fmt in v for v in ordered)}
+    entry['variants'] = variants
+    return entry
+
+
+def register_product_images(cursor, product_id, uploader_id, urls):
+    """
+    Make sure every image URL stored on products.images has a product_media
+    row; returns [(media_id, url)] for the rows created, which still need
+    derivatives. Expects a dictionary cursor and leaves the commit to the caller.
+    """
+    urls = [url for url in dict.fromkeys(urls or []) if url]
+    if not urls:
+        return []
+    placeholders = ', '.join(['%s'] * len(urls))
+    cursor.execute(f"""
+                   SELECT file_url FROM product_media
+                   WHERE product_id = %s AND file_url IN ({placeholders})
+                   """, [product_id] + urls)
+    existing = {row['file_url'] for row in cursor.fetchall()}
+    created = []
+    for index, url in enumerate(urls):
+        if url in existing:
+            continue
+        extension = url.rsplit('.', 1)[-1].lower() if '.' in url else ''
+        cursor.execute("""
+                       INSERT INTO product_media (product_id, media_type, file_url, file_name, mime_type,
+                                                  sort_order, is_primary, uploader_id, uploader_type)
+                       VALUES (%s, 'image', %s, %s, %s, %s, %s, %s, 'seller')
+                       """, (product_id, url, os.path.basename(url), f'image/{extension}', index,
+                             index == 0 and not existing, uploader_id))
+        created.append((cursor.lastrowid, url))
+    return created
+
+
+class DerivativePipeline:
+    """
+    Renders derivatives in a process pool and records them on product_media.
+
+    The pool is created on first use, so importing the app does not fork.
+    `on_complete(product)` is called with {'id', 'category_id', 'seller_id'}
+    after a product's media row has been updated, e.g. to drop cached listings.
+    """
+
+    def __init__(self, connection_factory, upload_folder, url_prefix='/static/uploads', max_workers=2,
+                 on_complete=None):
+        self.connection_factory = connection_factory
+        self.upload_folder = upload_folder
+        self.url_prefix = url_prefix.rstrip('/')
+        self.max_workers = max_workers
+        self.on_complete = on_complete
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {'scheduled': 0, 'completed': 0, 'failed': 0}
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=POOL_CONTEXT)
+            return self._executor
+
+    def source_path(self, file_url):
+        """Filesystem path of an upload URL, or None if it is not under the upload folder"""
+        prefix = self.url_prefix + '/'
+        if not file_url.startswith(prefix):
+            return None
+        relative = file_url[len(prefix):]
+        path = os.path.normpath(os.path.join(self.upload_folder, relative))
+        if not path.startswith(os.path.normpath(self.upload_folder) + os.sep):
+            return None
+        return path
+
+    def submit(self, file_url):
+        """Queue rendering for one upload URL; returns the future (or None if the URL is not ours)"""
+        source = self.source_path(file_url)
+        if source is None:
+            return None
+        with self._lock:
+            self._stats['scheduled'] += 1
+        return self._pool().submit(render_derivatives, source, os.path.join(self.upload_folder, DERIVED_DIR),
+                                   f'{self.url_prefix}/{DERIVED_DIR}', derivative_name(file_url))
+
+    def schedule(self, media_id, file_url):
+        future = self.submit(file_url)
+        if future is not None:
+            future.add_done_callback(lambda f: self._record(media_id, file_url, f))
+
+    def _record(self, media_id, file_url, future):
+        try:
+            variants = future.result()
+            with self.connection_factory() as conn:
+                cursor = conn.cursor(dictionary=True)
+                try:
+                    cursor.execute("UPDATE product_media SET variants = %s WHERE id = %s",
+                                   (json.dumps(variants), media_id))
+                    cursor.execute("""
+                                   SELECT p.id, p.category_id, p.seller_id
+                                   FROM product_media pm
+                                            JOIN products p ON pm.product_id = p.id
+                                   WHERE pm.id = %s
+                                   """, (media_id,))
+                    product = cursor.fetchone()
+                    conn.commit()
+                finally:
+                    cursor.close()
+        except Exception as err:
+            with self._lock:
+                self._stats['failed'] += 1
+            logger.error(f'Image derivatives failed for {file_url}: {err}')
+            return
+        with self._lock:
+            self._stats['completed'] += 1
+        if product and self.on_complete:
+            self.on_complete(product)
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['workers'] = self.max_workers
+        stats['pending'] = stats['scheduled'] - stats['completed'] - stats['failed']
+        return stats
+
+
+def backfill(conn, upload_folder, url_prefix='/static/uploads', workers=None, force=False):
+    """
+    Register product_media rows for images only listed on products.images,
+    then render derivatives for every file under <upload_folder>/images and
+    store them on the matching product_media rows.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT id, seller_id, images FROM products WHERE images IS NOT NULL")
+        for product in cursor.fetchall():
+            try:
+                filenames = json.loads(product['images']) or []
+            except ValueError:
+                continue
+            urls = [name if name.startswith('/static/') else f'{url_prefix}/images/{name}' for name in filenames]
+            register_product_images(cursor, product['id'], product['seller_id'], urls)
+        conn.commit()
+
+        images_dir = os.path.join(upload_folder, 'images')
+        output_dir = os.path.join(upload_folder, DERIVED_DIR)
+        jobs = {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT) as pool:
+            # Walk the tree: media_store shards uploads as images/ab/cd/<sha256>.<ext>
+            for directory, subdirs, filenames in os.walk(images_dir):
+                subdirs.sort()
+                for filename in sorted(filenames):
+                    source = os.path.join(directory, filename)
+                    relative = os.path.relpath(source, images_dir).replace(os.sep, '/')
+                    name = derivative_name(filename)
+                    done = os.path.exists(os.path.join(output_dir, f'{name}-detail.webp'))
+                    if done and not force:
+                        continue
+                    jobs[f'{url_prefix}/images/{relative}'] = pool.submit(
+                        render_derivatives, source, output_dir, f'{url_prefix}/{DERIVED_DIR}', name)
+
+            rendered = failed = 0
+            for url, future in jobs.items():
+                try:
+                    variants = future.result()
+                except Exception as err:
+                    failed += 1
+                    logger.error(f'Image derivatives failed for {url}: {err}')
+                    continue
+                cursor.execute("UPDATE product_media SET variants = %s WHERE file_url = %s",
+                               (json.dumps(variants), url))
+                rendered += 1
+            conn.commit()
+        return rendered, failed
+    finally:
+        cursor.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    from contextlib import closing
+
+    import mysql.connector
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description='Image derivative tools')
+    parser.add_argument('command', choices=['backfill'])
+    parser.add_argument('--upload-folder', default='static/uploads')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action='store_true', help='re-render images that already have derivatives')
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    config = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'user': os.getenv('DB_USER', 'root'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'database': os.getenv('DB_NAME', 'thriftshop_sa'),
+    }
+    with closing(mysql.connector.connect(**config)) as conn:
+        rendered, failed = backfill(conn, args.upload_folder, workers=args.workers, force=args.force)
+        print(f'Rendered derivatives for {rendered} images ({failed} failed)')
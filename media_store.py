@@ -0,0 +1,335 @@
+"""
+Content-addressed storage for uploaded media.
+
+Uploads are streamed to a temp file while their SHA-256 is computed, then
+moved to a path derived from the digest:
+
+    static/uploads/images/3f/a2/3fa2...e9.jpg
+
+Uploading the same bytes twice therefore stores them once and yields the
+same URL, and a URL's content never changes, so it can be cached forever.
+
+Each blob has a media_blobs row whose ref_count tracks the product_media
+rows pointing at it. Deleting media (or the product it belongs to) only
+drops a reference; files are removed by collect_garbage(), which recounts
+references from product_media and deletes blobs that have been
+unreferenced for longer than the grace period, together with their image
+derivatives. Blobs still listed in products.images/videos are kept.
+
+    python media_store.py gc [--grace-hours 24] [--dry-run]
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from media_derivatives import DERIVED_DIR, derivative_name
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+KINDS = ('images', 'videos')
+
+StoredBlob = namedtuple('StoredBlob', 'sha256 url path size created')
+
+
+class MediaStore:
+    def __init__(self, root, url_prefix='/static/uploads'):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip('/')
+        self.temp_dir = os.path.join(root, '.tmp')
+
+    def relative_path(self, digest, extension, kind):
+        return os.path.join(kind, digest[:2], digest[2:4], f'{digest}.{extension}')
+
+    def url_for(self, relative_path):
+        return f"{self.url_prefix}/{relative_path.replace(os.sep, '/')}"
+
+    def save(self, stream, extension, kind):
+        """Stream an upload into the store; returns a StoredBlob (created=False if it was already there)"""
+        if kind not in KINDS:
+            raise ValueError(f'Unknown media kind: {kind}')
+        os.makedirs(self.temp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.temp_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            return self.adopt(temp_path, digest.hexdigest(), size, extension, kind)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def adopt(self, temp_path, digest, size, extension, kind):
+        """Move an already-hashed temp file to its content address (or drop it if the blob exists)"""
+        relative = self.relative_path(digest, extension.lower(), kind)
+        final_path = os.path.join(self.root, relative)
+        if os.path.exists(final_path):
+            os.remove(temp_path)
+            created = False
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(temp_path, final_path)
+            created = True
+        return StoredBlob(digest, self.url_for(relative), final_path, size, created)
+
+    def path_for_url(self, url):
+        prefix = self.url_prefix + '/'
+        if not url.startswith(prefix):
+            return None
+        path = os.path.normpath(os.path.join(self.root, url[len(prefix):]))
+        return path if path.startswith(os.path.normpath(self.root) + os.sep) else None
+
+    def remove(self, url):
+        """Delete a blob file and its image derivatives"""
+        path = self.path_for_url(url)
+        if path and os.path.exists(path):
+            os.remove(path)
+        derived_dir = os.path.join(self.root, DERIVED_DIR)
+        prefix = derivative_name(url) + '-'
+        if os.path.isdir(derived_dir):
+            for name in os.listdir(derived_dir):
+                if name.startswith(prefix):
+                    os.remove(os.path.join(derived_dir, name))
+
+
+# media_blobs bookkeeping; these take a cursor and leave the commit to the caller
+
+def record_blob(cursor, blob, mime_type):
+    cursor.execute("""
+                   INSERT INTO media_blobs (sha256, url, file_size, mime_type)
+                   VALUES (%s, %s, %s, %s)
+                   ON DUPLICATE KEY UPDATE
+                       -- re-uploading an unreferenced blob restarts its grace period
+                       last_released_at = IF(ref_count = 0, NOW(), last_released_at)
+                   """, (blob.sha256, blob.url, blob.size, mime_type))
+
+
+def add_reference(cursor, url):
+    cursor.execute("UPDATE media_blobs SET ref_count = ref_count + 1 WHERE url = %s", (url,))
+
+
+def remove_reference(cursor, url):
+    cursor.execute("""
+                   UPDATE media_blobs
+                   SET ref_count = GREATEST(0, ref_count - 1), last_released_at = NOW()
+                   WHERE url = %s
+                   """, (url,))
+
+
+# Every ref_count from its product_media rows. Assignments run left to right, so a blob
+# that drifted to zero references starts its grace period from now.
+RECOUNT_SQL = """
+    UPDATE media_blobs b
+    SET b.last_released_at = IF(b.ref_count > 0
+                                    AND NOT EXISTS (SELECT 1 FROM product_media m WHERE m.file_url = b.url),
+                                NOW(), b.last_released_at),
+        b.ref_count = (SELECT COUNT(*) FROM product_media m WHERE m.file_url = b.url)
+"""
+
+
+def _json_urls(raw, kind, url_prefix):
+    try:
+        names = json.loads(raw) if raw else []
+    except ValueError:
+        return []
+    return [name if name.startswith('/static/') else f'{url_prefix}/{kind}/{name}' for name in names or []]
+
+
+def collect_garbage(conn, store, grace_hours=24, dry_run=False):
+    """
+    Recount references and delete blobs unreferenced for longer than the
+    grace period (which protects uploads not yet attached to a product).
+    Returns (blobs removed, bytes freed).
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if not dry_run:
+            # Recount in place, so a reference added or dropped meanwhile isn't overwritten by a stale count
+            cursor.execute(RECOUNT_SQL)
+            conn.commit()
+
+        # products.images/videos may point at blobs without a product_media row
+        listed = set()
+        cursor.execute("SELECT images, videos FROM products WHERE images IS NOT NULL OR videos IS NOT NULL")
+        for row in cursor.fetchall():
+            listed.update(_json_urls(row['images'], 'images', store.url_prefix))
+            listed.update(_json_urls(row['videos'], 'videos', store.url_prefix))
+
+        cursor.execute("""
+                       SELECT b.url, b.file_size, b.created_at, b.last_released_at
+                       FROM media_blobs b
+                       WHERE NOT EXISTS (SELECT 1 FROM product_media m WHERE m.file_url = b.url)
+                       """)
+        unreferenced = cursor.fetchall()
+        cutoff = time.time() - grace_hours * 3600
+        cutoff_at = datetime.fromtimestamp(cutoff)
+        removed, freed = 0, 0
+        for blob in unreferenced:
+            if blob['url'] in listed:
+                continue
+            last_touched = max(t for t in (blob['created_at'], blob['last_released_at']) if t is not None)
+            if last_touched.timestamp() > cutoff:
+                continue
+            if not dry_run:
+                # Drop the row first; if a new reference landed or the blob was re-recorded since the
+                # select, keep the file
+                cursor.execute("""
+                               DELETE FROM media_blobs
+                               WHERE url = %s AND ref_count = 0 AND COALESCE(last_released_at, created_at) < %s
+                               """, (blob['url'], cutoff_at))
+                if cursor.rowcount != 1:
+                    continue
+                store.remove(blob['url'])
+            logger.info(f"Removed unreferenced blob {blob['url']}")
+            removed += 1
+            freed += blob['file_size'] or 0
+
+        # Files that reached the disk but never got a media_blobs row (e.g. the request failed after saving)
+        cursor.execute("SELECT url FROM media_blobs")
+        known = {row['url'] for row in cursor.fetchall()}
+        for kind in KINDS:
+            for directory, _, files in os.walk(os.path.join(store.root, kind)):
+                if directory == os.path.join(store.root, kind):
+                    continue  # legacy uuid-named uploads live at the top level
+                for name in files:
+                    path = os.path.join(directory, name)
+                    url = store.url_for(os.path.relpath(path, store.root))
+                    if url in known or url in listed or os.path.getmtime(path) > cutoff:
+                        continue
+                    logger.info(f'Removing untracked blob {url}')
+                    freed += os.path.getsize(path)
+                    removed += 1
+                    if not dry_run:
+                        store.remove(url)
+
+        # Temp files left by interrupted uploads
+        if os.path.isdir(store.temp_dir):
+            for name in os.listdir(store.temp_dir):
+                path = os.path.join(store.temp_dir, name)
+                if os.path.getmtime(path) < cutoff and not dry_run:
+                    os.remove(path)
+
+        if not dry_run:
+            conn.commit()
+        return removed, freed
+    finally:
+        cursor.close()
+
+
+class MediaGarbageCollector:
+    """
+    Background thread that runs collect_garbage() every `interval` seconds; a
+    MySQL named lock keeps it to one process at a time
+    """
+
+    lock_name = 'media_garbage_collector'
+
+    def __init__(self, connection_factory, store, interval=86400, grace_hours=24):
+        self.connection_factory = connection_factory
+        self.store = store
+        self.interval = interval
+        self.grace_hours = grace_hours
+        self._stopped = threading.Event()
+        self._thread = None
+        self.last_run = None
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.removed = 0
+        self.bytes_freed = 0
+
+    def _locked(self, conn, sql):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, (self.lock_name,))
+            return cursor.fetchone()[0] == 1
+        finally:
+            cursor.close()
+
+    def run_once(self):
+        try:
+            with self.connection_factory() as conn:
+                if not self._locked(conn, "SELECT GET_LOCK(%s, 0)"):
+                    self.skipped += 1  # another process is collecting
+                    return True
+                try:
+                    removed, freed = collect_garbage(conn, self.store, self.grace_hours)
+                finally:
+                    self._locked(conn, "SELECT RELEASE_LOCK(%s)")
+        except Exception as err:
+            self.failures += 1
+            logger.error(f'Media garbage collection failed: {err}')
+            return False
+        self.runs += 1
+        self.removed += removed
+        self.bytes_freed += freed
+        self.last_run = time.time()
+        if removed:
+            logger.info(f'Media GC removed {removed} blobs ({freed} bytes)')
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='media-gc', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'grace_hours': self.grace_hours,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'removed': self.removed,
+            'bytes_freed': self.bytes_freed,
+            'last_run': self.last_run,
+        }
+
+
+if __name__ == '__main__':
+    import argparse
+    from contextlib import closing
+
+    import mysql.connector
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description='Content-addressed media store tools')
+    parser.add_argument('command', choices=['gc'])
+    parser.add_argument('--upload-folder', default='static/uploads')
+    parser.add_argument('--grace-hours', type=float, default=24)
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    config = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'user': os.getenv('DB_USER', 'root'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'database': os.getenv('DB_NAME', 'thriftshop_sa'),
+    }
+    with closing(mysql.connector.connect(**config)) as conn:
+        removed, freed = collect_garbage(conn, MediaStore(args.upload_folder), args.grace_hours, args.dry_run)
+        verb = 'Would remove' if args.dry_run else 'Removed'
+        print(f'{verb} {removed} blobs, {freed / 1_000_000:.1f} MB')
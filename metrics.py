@@ -0,0 +1,269 @@
+"""
+In-process request and query metrics, rendered in the Prometheus text format.
+
+Every request records its latency by route, and every statement run through
+an InstrumentedCursor records its duration and row count by statement kind.
+Both are a perf_counter() pair and a bisect into fixed buckets. The more
+detailed per-(route, kind, table) breakdown only runs for a sampled fraction
+of statements. Statements slower than the threshold always go to the
+slow-query log, sampled or not.
+
+Metrics are per process; with several workers, scrape each one (or run a
+single worker behind /api/metrics).
+"""
+import bisect
+import logging
+import random
+import re
+import threading
+import time
+
+slow_query_logger = logging.getLogger('thriftshop.slow_query')
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 10000)
+
+_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+`?(\w+)', re.IGNORECASE)
+
+
+def statement_kind(sql):
+    """First keyword of a statement: 'select', 'insert', 'update', ..."""
+    head = sql.lstrip()[:10].split(None, 1)
+    return head[0].lower() if head else 'unknown'
+
+
+def statement_table(sql):
+    match = _TABLE_RE.search(sql)
+    return match.group(1).lower() if match else 'unknown'
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else str(int(value))
+    return str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values"""
+
+    def __init__(self, name, help, labels=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # one slot per bucket plus +Inf, then sum
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Metrics:
+    """
+    Registry for the app's request, query and connection-wait metrics.
+
+    `query_sample_rate` is the fraction of statements that get the per-route
+    and per-table breakdown; `slow_query_threshold` is in seconds (0 disables
+    the slow-query log).
+    """
+
+    def __init__(self, namespace='thriftshop', query_sample_rate=0.1, slow_query_threshold=0.2):
+        self.namespace = namespace
+        self.query_sample_rate = query_sample_rate
+        self.slow_query_threshold = slow_query_threshold
+        self._local = threading.local()
+        self._collectors = []
+        ns = namespace
+
+        self.request_duration = Histogram(
+            f'{ns}_http_request_duration_seconds', 'HTTP request latency by route',
+            ('method', 'route', 'status'), REQUEST_BUCKETS)
+        self.request_queries = Histogram(
+            f'{ns}_http_request_db_queries', 'Database statements issued per request',
+            ('route',), (0, 1, 2, 5, 10, 20, 50, 100))
+        self.query_duration = Histogram(
+            f'{ns}_db_query_duration_seconds', 'Statement execution time by kind',
+            ('kind',), QUERY_BUCKETS)
+        self.query_rows = Counter(
+            f'{ns}_db_query_rows_total', 'Rows returned or affected by kind', ('kind',))
+        self.slow_queries = Counter(
+            f'{ns}_db_slow_queries_total', 'Statements slower than the slow-query threshold', ('route', 'kind'))
+        self.sampled_duration = Histogram(
+            f'{ns}_db_query_sampled_duration_seconds', 'Sampled statement time by route and table',
+            ('route', 'kind', 'table'), QUERY_BUCKETS)
+        self.sampled_rows = Histogram(
+            f'{ns}_db_query_sampled_rows', 'Sampled rows returned or affected by route and table',
+            ('route', 'kind', 'table'), ROW_BUCKETS)
+        self.connection_wait = Histogram(
+            f'{ns}_db_connection_wait_seconds', 'Time spent checking a connection out of the pool',
+            (), QUERY_BUCKETS)
+        self._metrics = [self.request_duration, self.request_queries, self.query_duration, self.query_rows,
+                         self.slow_queries, self.sampled_duration, self.sampled_rows, self.connection_wait]
+
+    # Per-request context, kept in a thread local so cursors need no reference to the request
+
+    def begin_request(self, route):
+        local = self._local
+        local.route = route
+        local.queries = 0
+        local.db_time = 0.0
+        local.started = time.perf_counter()
+
+    def end_request(self, method, status):
+        """Record the request; returns (duration, queries, db_time) for response headers"""
+        local = self._local
+        started = getattr(local, 'started', None)
+        if started is None:
+            return None
+        duration = time.perf_counter() - started
+        route = local.route
+        self.request_duration.observe(duration, method, route, str(status))
+        self.request_queries.observe(local.queries, route)
+        result = duration, local.queries, local.db_time
+        local.started = None
+        return result
+
+    def current_route(self):
+        return getattr(self._local, 'route', None) or 'background'
+
+    def observe_connection_wait(self, seconds):
+        self.connection_wait.observe(seconds)
+
+    def observe_query(self, sql, seconds, rows):
+        kind = statement_kind(sql)
+        self.query_duration.observe(seconds, kind)
+        if rows > 0:
+            self.query_rows.inc(kind, amount=rows)
+
+        local = self._local
+        if getattr(local, 'started', None) is not None:
+            local.queries += 1
+            local.db_time += seconds
+
+        sampled = self.query_sample_rate >= 1 or random.random() < self.query_sample_rate
+        slow = self.slow_query_threshold and seconds >= self.slow_query_threshold
+        if not (sampled or slow):
+            return
+
+        route = self.current_route()
+        if sampled:
+            table = statement_table(sql)
+            self.sampled_duration.observe(seconds, route, kind, table)
+            self.sampled_rows.observe(max(rows, 0), route, kind, table)
+        if slow:
+            self.slow_queries.inc(route, kind)
+            # Parameters are left out on purpose: they carry emails, addresses and hashes
+            statement = ' '.join(sql.split())[:500]
+            slow_query_logger.warning(f'Slow query {seconds * 1000:.1f}ms rows={rows} route={route}: {statement}')
+
+    def instrument(self, cursor):
+        return InstrumentedCursor(cursor, self)
+
+    def register_collector(self, collector):
+        """`collector()` returns extra rendered lines, e.g. gauges read from the connection pool"""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+def gauge_lines(name, help, samples, kind='gauge'):
+    """Render pre-computed samples: [(labels_dict, value), ...]"""
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+    for labels, value in samples:
+        label_text = _format_labels(labels.keys(), labels.values())
+        lines.append(f'{name}{label_text} {_format_value(value)}')
+    return lines
+
+
+class InstrumentedCursor:
+    """
+    Cursor proxy that times execute()/executemany() and reports row counts.
+
+    Expects a buffered cursor, so execute() includes fetching the result set
+    and rowcount is the number of rows returned.
+    """
+
+    def __init__(self, cursor, metrics):
+        self._cursor = cursor
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            self._metrics.observe_query(operation, time.perf_counter() - started, self._cursor.rowcount)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            self._metrics.observe_query(operation, time.perf_counter() - started, self._cursor.rowcount)
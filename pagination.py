@@ -0,0 +1,99 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue"""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'dec': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'dec' in value:
+            return Decimal(value['dec'])
+        raise InvalidCursor('Unknown cursor value')
+    return value
+
+
+def encode_cursor(values):
+    """Opaque, URL-safe cursor for the sort key of the last row on a page"""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, key_length):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as err:
+        raise InvalidCursor('Malformed cursor') from err
+    if not isinstance(values, list) or len(values) != key_length:
+        raise InvalidCursor('Cursor does not match this listing')
+    try:
+        return [_decode_value(v) for v in values]
+    except (ArithmeticError, ValueError, TypeError) as err:
+        raise InvalidCursor('Malformed cursor') from err
+
+
+def page_limit(raw, default, maximum):
+    """Clamp a client-supplied page size to 1..maximum"""
+    try:
+        limit = int(raw) if raw not in (None, '') else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+class Keyset:
+    """
+    Descending keyset over a list of sort columns, e.g. (p.created_at, p.id).
+
+    Each column is (sql, row_key) or (sql, row_key, sql_params) where sql may
+    be an expression; row_key names the value in the fetched row. The last
+    column must be unique so cursors are stable across inserts.
+    """
+
+    def __init__(self, *columns):
+        self.columns = [c if len(c) == 3 else (c[0], c[1], []) for c in columns]
+
+    def order_by(self):
+        sql = ' ORDER BY ' + ', '.join(f'{col} DESC' for col, _, _ in self.columns)
+        params = [p for _, _, col_params in self.columns for p in col_params]
+        return sql, params
+
+    def after(self, cursor):
+        """WHERE fragment selecting rows strictly after the cursor position"""
+        if not cursor:
+            return '', []
+        values = decode_cursor(cursor, len(self.columns))
+        clauses, params = [], []
+        for i, (col, _, col_params) in enumerate(self.columns):
+            parts = []
+            for j, (prev_col, _, prev_params) in enumerate(self.columns[:i]):
+                parts.append(f'{prev_col} = %s')
+                params.extend(prev_params)
+                params.append(values[j])
+            parts.append(f'{col} < %s')
+            params.extend(col_params)
+            params.append(values[i])
+            clauses.append('(' + ' AND '.join(parts) + ')')
+        return ' AND (' + ' OR '.join(clauses) + ')', params
+
+    def page(self, rows, limit):
+        """Trim a LIMIT limit+1 result to one page and build next_cursor"""
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, encode_cursor([last[key] for _, key, _ in self.columns])
@@ -0,0 +1,154 @@
+"""
+bcrypt hashing and verification in a bounded process pool.
+
+A bcrypt check at cost 12 burns a few hundred milliseconds of CPU. Run
+inline, a burst of logins occupies every request thread and catalog pages
+queue behind them. PasswordHasher runs the work in a small process pool
+instead, and admits at most `max_workers + max_queue` operations at a time.
+Anything beyond that raises HasherBusy straight away, which the app turns
+into a 503 with Retry-After, rather than letting requests pile up.
+
+Hashes are the same $2b$ strings Flask-Bcrypt writes. needs_rehash() reports
+hashes made with a different cost than the configured one, so the login
+routes can upgrade them with rehash_later() once the password is known.
+
+The pool is created on first use. Its workers are started by a forkserver
+(spawn where that is unavailable), never forked from the app, so they
+don't inherit its pool connections or locks held by its background threads.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+logger = logging.getLogger(__name__)
+
+MAX_PASSWORD_BYTES = 72  # bcrypt ignores (newer versions reject) anything longer
+POOL_CONTEXT = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+                                           else 'spawn')
+
+
+class HasherBusy(Exception):
+    """Too many password operations in flight; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Password hashing queue is full; retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+def _encode(password):
+    return password.encode('utf-8')[:MAX_PASSWORD_BYTES]
+
+
+def _hash(password, rounds):
+    import bcrypt
+    return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _check(password, password_hash):
+    import bcrypt
+    try:
+        return bcrypt.checkpw(_encode(password), password_hash.encode('utf-8'))
+    except ValueError:  # malformed hash
+        return False
+
+
+def hash_cost(password_hash):
+    """The cost factor of a $2a$/$2b$/$2y$ hash, or None if it is not one"""
+    parts = (password_hash or '').split('$')
+    if len(parts) < 4 or parts[1] not in ('2a', '2b', '2y') or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    def __init__(self, rounds=12, max_workers=2, max_queue=32, timeout=10, retry_after=1):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {'hashed': 0, 'verified': 0, 'rehashed': 0, 'rejected': 0, 'timeouts': 0}
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=POOL_CONTEXT)
+        return self._executor
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._stats['rejected'] += 1
+                raise HasherBusy(self.retry_after)
+            self._in_flight += 1
+            try:
+                future = self._pool().submit(fn, *args)
+            except BaseException:
+                self._in_flight -= 1
+                raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _result(self, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise HasherBusy(self.retry_after)
+
+    def hash(self, password):
+        password_hash = self._result(self._submit(_hash, password, self.rounds))
+        with self._lock:
+            self._stats['hashed'] += 1
+        return password_hash
+
+    def verify(self, password, password_hash):
+        matches = self._result(self._submit(_check, password, password_hash))
+        with self._lock:
+            self._stats['verified'] += 1
+        return matches
+
+    def needs_rehash(self, password_hash):
+        return hash_cost(password_hash) != self.rounds
+
+    def rehash_later(self, password, store):
+        """Hash `password` at the current cost in the background and pass the result to `store(new_hash)`"""
+        try:
+            future = self._submit(_hash, password, self.rounds)
+        except HasherBusy:
+            return False  # try again on a later login
+
+        def done(f):
+            try:
+                store(f.result())
+            except Exception as err:
+                logger.error(f'Password rehash failed: {err}')
+                return
+            with self._lock:
+                self._stats['rehashed'] += 1
+
+        future.add_done_callback(done)
+        return True
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = self._in_flight
+        stats.update(rounds=self.rounds, workers=self.max_workers, max_queue=self.max_queue)
+        return stats
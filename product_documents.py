@@ -0,0 +1,367 @@
+"""
+Denormalized, ready-to-serve product documents.
+
+Every product response used to re-derive the same things per row: parse
+products.images/videos, turn bare filenames into /static/uploads URLs, fall
+back to the no-image placeholder, join the category and seller names and
+attach the image derivatives. product_documents stores the result, one JSON
+document per product, so the catalog endpoints read it by key or range
+and only overlay the few fields that change all the time (LIVE_FIELDS: stock,
+counters, updated_at), which they select from products alongside.
+
+Documents also carry the product's product_media rows (`media`), which the
+old responses ignored.
+
+Next to each document, `summary` stores just its SUMMARY_FIELDS, the
+compact projection listing cards use. Listings that need nothing else read
+that column and skip the description, SEO text and media.
+
+Keeping them current:
+
+- The app calls refresh() with the ids of the products it changed, in the
+  same transaction or right after its commit.
+- DocumentRefresher periodically rebuilds documents older than their
+  product, seller or category row (catching edits made outside the app, e.g.
+  an admin renaming a category). It only looks at rows whose updated_at
+  moved since its last sweep, through the updated_at indexes; counter and
+  stock updates pin updated_at, so busy products don't come up.
+- A listing that meets a product without a document builds it on the spot.
+
+The functions taking a cursor expect a dictionary cursor and leave the
+commit to the caller.
+
+    python product_documents.py rebuild      # have the running app rebuild every document
+"""
+import json
+import logging
+import threading
+import time
+
+from media_derivatives import image_sources
+
+logger = logging.getLogger(__name__)
+
+NO_IMAGE = '/static/uploads/images/no-image.png'
+# Selected from products on every read instead of being stored in the document
+VOLATILE_FIELDS = ('stock_quantity', 'reserved_quantity', 'view_count', 'purchase_count', 'wishlist_count',
+                   'updated_at')
+LIVE_FIELDS = VOLATILE_FIELDS + ('available_quantity', 'seller_sales')
+# Fields of a stored document, for ?fields= whitelists (they follow the products table)
+DOCUMENT_FIELDS = ('id', 'seller_id', 'category_id', 'name', 'description', 'short_description', 'price',
+                   'original_price', 'conditions', 'size', 'color', 'brand', 'material', 'sku', 'min_order_quantity',
+                   'max_order_quantity', 'weight', 'dimensions', 'is_active', 'is_featured', 'featured', 'is_approved',
+                   'seo_title', 'seo_description', 'seo_keywords', 'created_at', 'category_name', 'seller_name',
+                   'seller_rating', 'images', 'videos', 'image_sources', 'media')
+# Stored in product_documents.summary
+SUMMARY_FIELDS = ('id', 'seller_id', 'category_id', 'name', 'price', 'original_price', 'conditions', 'size',
+                  'color', 'brand', 'featured', 'created_at', 'category_name', 'seller_name', 'seller_rating',
+                  'images', 'image_sources')
+BATCH_SIZE = 500
+# `product_documents.py rebuild` sets built_at to the TIMESTAMP minimum; anything older than this is marked
+REBUILD_MARK_BEFORE = '1970-01-02 00:00:00'
+
+
+def media_urls(raw, kind):
+    """Public URLs for a products.images/videos JSON list of bare filenames or /static/ paths"""
+    if not raw:
+        return []
+    names = json.loads(raw) if isinstance(raw, str) else raw
+    return [name if name.startswith('/static/') else f'/static/uploads/{kind}/{name}' for name in names or []]
+
+
+def image_urls(filenames):
+    """Public URLs for the entries of a products.images list"""
+    return media_urls(filenames, 'images')
+
+
+def build_document(row, media_rows):
+    """The response document for one product row (p.* plus category/seller names)"""
+    document = {key: value for key, value in row.items() if key not in VOLATILE_FIELDS}
+    try:
+        images = media_urls(row.get('images'), 'images')
+    except (ValueError, TypeError, AttributeError):
+        images = []
+    # Products created through /api/products-with-media only have product_media rows
+    images = images or [item['file_url'] for item in media_rows if item['media_type'] == 'image']
+    document['images'] = images or [NO_IMAGE]
+    try:
+        document['videos'] = media_urls(row.get('videos'), 'videos')
+    except (ValueError, TypeError, AttributeError):
+        document['videos'] = []
+
+    variants = {}
+    media = []
+    for item in media_rows:
+        item_variants = json.loads(item['variants']) if item['variants'] else None
+        if item_variants:
+            variants[item['file_url']] = item_variants
+        entry = {key: item[key] for key in ('id', 'media_type', 'file_url', 'alt_text', 'caption',
+                                            'sort_order', 'is_primary')}
+        if item['media_type'] == 'image':
+            entry['image_sources'] = image_sources(item['file_url'], item_variants)
+        media.append(entry)
+    document['image_sources'] = [image_sources(url, variants.get(url)) for url in document['images']]
+    document['media'] = media
+    return document
+
+
+def summarize(document):
+    return {key: document[key] for key in SUMMARY_FIELDS if key in document}
+
+
+def _chunks(ids, size=BATCH_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def refresh(cursor, dumps, product_ids=(), seller_ids=(), category_ids=()):
+    """
+    Rebuild the documents of the given products and of every product of the
+    given sellers/categories; `dumps` serializes a document (the app's JSON
+    provider). Returns {product_id: document}.
+    """
+    ids = set(product_ids or ())
+    for column, values in (('seller_id', seller_ids), ('category_id', category_ids)):
+        values = [v for v in dict.fromkeys(values or ()) if v is not None]
+        if values:
+            cursor.execute(f"SELECT id FROM products WHERE {column} IN ({', '.join(['%s'] * len(values))})",
+                           values)
+            ids.update(row['id'] for row in cursor.fetchall())
+    ids = sorted(i for i in ids if i is not None)
+
+    cursor.execute("SELECT NOW() AS now")
+    built_at = cursor.fetchone()['now']  # read time, so writes during the rebuild count as newer
+    documents = {}
+    for chunk in _chunks(ids):
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(f"""
+                       SELECT p.*, c.name as category_name, s.business_name as seller_name,
+                              s.rating as seller_rating
+                       FROM products p
+                                LEFT JOIN categories c ON p.category_id = c.id
+                                LEFT JOIN sellers s ON p.seller_id = s.id
+                       WHERE p.id IN ({placeholders})
+                       """, chunk)
+        rows = cursor.fetchall()
+        cursor.execute(f"""
+                       SELECT id, product_id, media_type, file_url, alt_text, caption, sort_order,
+                              is_primary, variants
+                       FROM product_media
+                       WHERE product_id IN ({placeholders}) AND is_approved = TRUE
+                       ORDER BY product_id, sort_order, created_at
+                       """, chunk)
+        media = {}
+        for item in cursor.fetchall():
+            media.setdefault(item['product_id'], []).append(item)
+
+        values = []
+        for row in rows:
+            document = build_document(row, media.get(row['id'], []))
+            documents[row['id']] = document
+            values.extend((row['id'], dumps(document), dumps(summarize(document)), built_at))
+        if values:
+            cursor.execute(f"""
+                           INSERT INTO product_documents (product_id, document, summary, built_at)
+                           VALUES {', '.join(['(%s, %s, %s, %s)'] * (len(values) // 4))}
+                           ON DUPLICATE KEY UPDATE document = VALUES(document), summary = VALUES(summary),
+                                                   built_at = VALUES(built_at)
+                           """, values)
+    return documents
+
+
+def merge(cursor, rows, dumps, loads=json.loads, column='document'):
+    """
+    Response documents for rows selecting `d.document` (or `d.summary`, with
+    column='summary') plus any LIVE_FIELDS. Products without one get it built
+    now. Returns (products, built), and the caller should commit when built > 0.
+    """
+    missing = [row['id'] for row in rows if row.get(column) is None]
+    built = refresh(cursor, dumps, missing) if missing else {}
+    products = []
+    for row in rows:
+        document = loads(row[column]) if row.get(column) is not None else dict(built.get(row['id'], {}))
+        for field in LIVE_FIELDS:
+            if field in row:
+                document[field] = row[field]
+        products.append(document)
+    return products, len(built)
+
+
+def stale_ids(cursor, since=None):
+    """
+    Products whose document is missing or older than the product, its seller
+    or its category. With `since` (a database time) only rows changed at or
+    after it are considered, found through the updated_at indexes, plus
+    documents marked for rebuild; without it every product is checked.
+    """
+    if since is None:
+        cursor.execute("""
+                       SELECT p.id
+                       FROM products p
+                                LEFT JOIN product_documents d ON d.product_id = p.id
+                                LEFT JOIN sellers s ON p.seller_id = s.id
+                                LEFT JOIN categories c ON p.category_id = c.id
+                       WHERE d.product_id IS NULL
+                          OR d.summary IS NULL
+                          OR p.updated_at >= d.built_at
+                          OR s.updated_at >= d.built_at
+                          OR c.updated_at >= d.built_at
+                       """)
+    else:
+        cursor.execute("""
+                       SELECT p.id
+                       FROM products p
+                                LEFT JOIN product_documents d ON d.product_id = p.id
+                       WHERE p.updated_at >= %s AND (d.product_id IS NULL OR p.updated_at >= d.built_at)
+                       UNION
+                       SELECT p.id
+                       FROM sellers s
+                                JOIN products p ON p.seller_id = s.id
+                                LEFT JOIN product_documents d ON d.product_id = p.id
+                       WHERE s.updated_at >= %s AND (d.product_id IS NULL OR s.updated_at >= d.built_at)
+                       UNION
+                       SELECT p.id
+                       FROM categories c
+                                JOIN products p ON p.category_id = c.id
+                                LEFT JOIN product_documents d ON d.product_id = p.id
+                       WHERE c.updated_at >= %s AND (d.product_id IS NULL OR c.updated_at >= d.built_at)
+                       UNION
+                       SELECT product_id FROM product_documents WHERE built_at < %s
+                       """, (since, since, since, REBUILD_MARK_BEFORE))
+    return sorted(row['id'] for row in cursor.fetchall())
+
+
+def rebuild_stale(conn, dumps, since=None, limit=BATCH_SIZE):
+    """
+    Refresh stale documents (see stale_ids) `limit` at a time, committing each
+    batch. Returns (documents rebuilt, {'category_ids', 'seller_ids'}, the
+    database time to pass as `since` next time).
+    """
+    cursor = conn.cursor(dictionary=True)
+    rebuilt, touched = 0, {'category_ids': set(), 'seller_ids': set()}
+    try:
+        cursor.execute("SELECT NOW() AS now")
+        # Read before looking, so anything written during the sweep is picked up by the next one
+        swept_at = cursor.fetchone()['now']
+        for chunk in _chunks(stale_ids(cursor, since), limit):
+            documents = refresh(cursor, dumps, chunk)
+            conn.commit()
+            for document in documents.values():
+                touched['category_ids'].add(document.get('category_id'))
+                touched['seller_ids'].add(document.get('seller_id'))
+            rebuilt += len(documents)
+        return rebuilt, touched, swept_at
+    finally:
+        cursor.close()
+
+
+class DocumentRefresher:
+    """
+    Background thread that runs rebuild_stale() every `interval` seconds.
+    Its first sweep checks every product; later ones only look at rows
+    changed since the previous sweep. Only one process sweeps at a time:
+    each run takes a MySQL named lock and skips the sweep if another
+    process holds it.
+
+    `on_rebuilt(category_ids, seller_ids)` is called when documents changed,
+    e.g. to drop cached listings.
+    """
+
+    lock_name = 'product_documents_refresher'
+
+    def __init__(self, connection_factory, dumps, interval=60, on_rebuilt=None):
+        self.connection_factory = connection_factory
+        self.dumps = dumps
+        self.interval = interval
+        self.on_rebuilt = on_rebuilt
+        self._since = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self.last_run = None
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.rebuilt = 0
+
+    def _locked(self, conn, sql):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, (self.lock_name,))
+            return cursor.fetchone()[0] == 1
+        finally:
+            cursor.close()
+
+    def run_once(self):
+        try:
+            with self.connection_factory() as conn:
+                if not self._locked(conn, "SELECT GET_LOCK(%s, 0)"):
+                    self.skipped += 1  # another process is sweeping
+                    return True
+                try:
+                    rebuilt, touched, self._since = rebuild_stale(conn, self.dumps, self._since)
+                finally:
+                    self._locked(conn, "SELECT RELEASE_LOCK(%s)")
+        except Exception as err:
+            self.failures += 1
+            logger.error(f'Product document refresh failed: {err}')
+            return False
+        self.runs += 1
+        self.rebuilt += rebuilt
+        self.last_run = time.time()
+        if rebuilt:
+            logger.info(f'Rebuilt {rebuilt} product documents')
+            if self.on_rebuilt:
+                self.on_rebuilt(touched['category_ids'], touched['seller_ids'])
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='product-document-refresher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'rebuilt': self.rebuilt,
+            'since': self._since.isoformat() if self._since else None,
+            'last_run': self.last_run,
+        }
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    from contextlib import closing
+
+    import mysql.connector
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description='Product read model tools')
+    parser.add_argument('command', choices=['rebuild'])
+    args = parser.parse_args()
+
+    load_dotenv()
+    config = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'user': os.getenv('DB_USER', 'root'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'database': os.getenv('DB_NAME', 'thriftshop_sa'),
+    }
+    with closing(mysql.connector.connect(**config)) as conn:
+        # Documents must be encoded by the app's JSON provider, so mark them stale and
+        # let the running app's DocumentRefresher rebuild them; listings keep serving meanwhile
+        cursor = conn.cursor()
+        cursor.execute("UPDATE product_documents SET built_at = '1970-01-01 00:00:01'")  # < REBUILD_MARK_BEFORE
+        conn.commit()
+        print(f'Marked {cursor.rowcount} product documents for rebuild')
+        cursor.close()
@@ -0,0 +1,230 @@
+"""
+Time-limited stock holds for items sitting in a cart.
+
+Adding to the cart reserves the quantity for `ttl` seconds. Holds are rows in
+stock_reservations (one per user and product) and their sum is kept in
+products.reserved_quantity, so anything reading a product can compute
+
+    available = stock_quantity - reserved_quantity
+
+without joining the holds. Both are changed in the same transaction, always
+locking the reservation row before the product row. Expired holds keep
+counting until ReservationSweeper removes them.
+
+The functions taking a cursor expect a dictionary cursor and leave the
+commit to the caller. Holds change available_quantity, so callers drop the
+cached listings of the products involved once they have committed.
+
+    python reservations.py        # sweep expired holds once and exit
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def reserve(cursor, user_id, product_id, quantity, ttl):
+    """
+    Set the user's hold on a product to `quantity` and restart its TTL.
+
+    Returns False if the extra quantity is not available; the caller should
+    roll back in that case.
+    """
+    cursor.execute("""
+                   SELECT quantity FROM stock_reservations
+                   WHERE user_id = %s AND product_id = %s
+                   FOR UPDATE
+                   """, (user_id, product_id))
+    row = cursor.fetchone()
+    held = row['quantity'] if row else 0
+    delta = quantity - held
+
+    if delta > 0:
+        cursor.execute("""
+                       UPDATE products SET reserved_quantity = reserved_quantity + %s, updated_at = updated_at
+                       WHERE id = %s AND is_active = TRUE AND stock_quantity - reserved_quantity >= %s
+                       """, (delta, product_id, delta))
+        if cursor.rowcount != 1:
+            return False
+    elif delta < 0:
+        cursor.execute("""
+                       UPDATE products
+                       SET reserved_quantity = GREATEST(0, reserved_quantity - %s), updated_at = updated_at
+                       WHERE id = %s
+                       """, (-delta, product_id))
+
+    cursor.execute("""
+                   INSERT INTO stock_reservations (user_id, product_id, quantity, expires_at)
+                   VALUES (%s, %s, %s, NOW() + INTERVAL %s SECOND)
+                   ON DUPLICATE KEY UPDATE
+                       quantity = VALUES(quantity),
+                       expires_at = VALUES(expires_at)
+                   """, (user_id, product_id, quantity, int(ttl)))
+    return True
+
+
+def release(cursor, user_id, product_id=None):
+    """
+    Drop the user's hold on one product, or on every product when product_id
+    is None. Returns (category_ids, seller_ids) of the products it released.
+    """
+    query = "SELECT id, product_id, quantity FROM stock_reservations WHERE user_id = %s"
+    params = [user_id]
+    if product_id is not None:
+        query += " AND product_id = %s"
+        params.append(product_id)
+    cursor.execute(query + " FOR UPDATE", params)
+    return _drop(cursor, cursor.fetchall())
+
+
+def _drop(cursor, holds):
+    """
+    Delete the given reservation rows and give their quantity back to the
+    products; returns (category_ids, seller_ids) of those products
+    """
+    if not holds:
+        return [], []
+    totals = {}
+    for hold in holds:
+        totals[hold['product_id']] = totals.get(hold['product_id'], 0) + hold['quantity']
+
+    ids = sorted(totals)
+    cases = ' '.join('WHEN %s THEN %s' for _ in ids)
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"""
+                   UPDATE products
+                   SET reserved_quantity = GREATEST(0, reserved_quantity - CASE id {cases} END),
+                       updated_at = updated_at
+                   WHERE id IN ({placeholders})
+                   """, [v for product_id in ids for v in (product_id, totals[product_id])] + ids)
+
+    hold_ids = [hold['id'] for hold in holds]
+    cursor.execute(f"DELETE FROM stock_reservations WHERE id IN ({', '.join(['%s'] * len(hold_ids))})",
+                   hold_ids)
+
+    cursor.execute(f"SELECT category_id, seller_id FROM products WHERE id IN ({placeholders})", ids)
+    products = cursor.fetchall()
+    return [product['category_id'] for product in products], [product['seller_id'] for product in products]
+
+
+def sweep(conn, batch_size=1000, on_expired=None):
+    """
+    Remove expired holds in batches; returns the number of holds removed.
+    `on_expired(category_ids, seller_ids)` is called after each batch commits.
+    """
+    removed = 0
+    cursor = conn.cursor(dictionary=True)
+    try:
+        while True:
+            cursor.execute("""
+                           SELECT id, product_id, quantity FROM stock_reservations
+                           WHERE expires_at < NOW()
+                           ORDER BY expires_at
+                           LIMIT %s
+                           FOR UPDATE SKIP LOCKED
+                           """, (batch_size,))
+            holds = cursor.fetchall()
+            touched = _drop(cursor, holds)
+            conn.commit()
+            if holds and on_expired:
+                on_expired(*touched)
+            removed += len(holds)
+            if len(holds) < batch_size:
+                return removed
+    finally:
+        cursor.close()
+
+
+class ReservationSweeper:
+    """
+    Background thread that runs sweep() every `interval` seconds.
+
+    `on_expired(category_ids, seller_ids)` is called for the products whose
+    holds expired, e.g. to drop cached listings. A MySQL named lock keeps the
+    sweep to one process at a time.
+    """
+
+    lock_name = 'reservation_sweeper'
+
+    def __init__(self, connection_factory, interval=60, on_expired=None):
+        self.connection_factory = connection_factory
+        self.interval = interval
+        self.on_expired = on_expired
+        self._stopped = threading.Event()
+        self._thread = None
+        self.last_run = None
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.expired = 0
+
+    def _locked(self, conn, sql):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, (self.lock_name,))
+            return cursor.fetchone()[0] == 1
+        finally:
+            cursor.close()
+
+    def run_once(self):
+        try:
+            with self.connection_factory() as conn:
+                if not self._locked(conn, "SELECT GET_LOCK(%s, 0)"):
+                    self.skipped += 1  # another process is sweeping
+                    return True
+                try:
+                    removed = sweep(conn, on_expired=self.on_expired)
+                finally:
+                    self._locked(conn, "SELECT RELEASE_LOCK(%s)")
+        except Exception as err:
+            self.failures += 1
+            logger.error(f'Reservation sweep failed: {err}')
+            return False
+        self.runs += 1
+        self.expired += removed
+        self.last_run = time.time()
+        if removed:
+            logger.info(f'Released {removed} expired stock reservations')
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='reservation-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'expired': self.expired,
+            'last_run': self.last_run,
+        }
+
+
+if __name__ == '__main__':
+    import os
+    from contextlib import closing
+
+    import mysql.connector
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    config = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'user': os.getenv('DB_USER', 'root'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'database': os.getenv('DB_NAME', 'thriftshop_sa'),
+    }
+    with closing(mysql.connector.connect(**config)) as conn:
+        print(f'Released {sweep(conn)} expired stock reservations')
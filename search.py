@@ -0,0 +1,112 @@
+import re
+
+# Columns covered by the ft_products_search FULLTEXT index (see thriftshop_sa_ddl.sql)
+SEARCH_COLUMNS = 'p.name, p.brand, p.description'
+NAME_COLUMN = 'p.name'
+
+# InnoDB ignores tokens shorter than innodb_ft_min_token_size (default 3)
+MIN_TOKEN_SIZE = 3
+
+# Subset of the InnoDB default stopword list; required (+) stopwords never match
+STOPWORDS = {
+    'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for', 'from',
+    'how', 'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the', 'this', 'to',
+    'was', 'what', 'when', 'where', 'who', 'will', 'with', 'und', 'www', 'and',
+}
+
+# South African English / slang used in listings, grouped with what buyers also type
+SYNONYM_GROUPS = [
+    {'takkies', 'tekkies', 'sneakers', 'trainers'},
+    {'plakkies', 'slops', 'sandals', 'flipflops'},
+    {'vellies', 'velskoen', 'velskoene'},
+    {'jersey', 'sweater', 'jumper'},
+    {'cozzie', 'costume', 'swimsuit', 'swimwear'},
+    {'doek', 'headwrap', 'headscarf'},
+    {'shweshwe', 'seshoeshoe', 'isishweshwe'},
+    {'braai', 'grill', 'bbq'},
+    {'bakkie', 'pickup'},
+    {'cellphone', 'cell', 'smartphone', 'phone'},
+    {'boks', 'bokke', 'springbok', 'springboks'},
+    {'kombi', 'minibus'},
+]
+
+_SYNONYMS = {}
+for group in SYNONYM_GROUPS:
+    for word in group:
+        _SYNONYMS.setdefault(word, set()).update(group - {word})
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_VOWELS = set('aeiou')
+
+
+def tokenize(text):
+    """Lower-case word tokens with boolean-mode operators stripped"""
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+def stem(word):
+    """
+    Light suffix stripper. The result is used as a prefix (stem*), so it only
+    has to be a common prefix of the word's inflections: dresses -> dress,
+    hoodies/hoodie -> hood, batteries/battery -> batter, clothing -> cloth.
+    """
+    if len(word) <= MIN_TOKEN_SIZE or word.isdigit():
+        return word
+    for suffix in ('ings', 'ing', 'ies', 'ied', 'ie', 'es', 'ed', 's', 'y'):
+        if not word.endswith(suffix):
+            continue
+        base = word[:-len(suffix)]
+        if len(base) < MIN_TOKEN_SIZE:
+            continue
+        if suffix == 'es' and not base.endswith(('s', 'x', 'z', 'ch', 'sh')):
+            continue
+        if suffix == 'y' and base[-1] in _VOWELS:
+            continue
+        if suffix == 's' and base.endswith('s'):
+            continue
+        return base
+    return word
+
+
+def expand(term):
+    """All prefixes that should match a single search term"""
+    variants = {term} | _SYNONYMS.get(term, set())
+    return sorted({stem(v) for v in variants if len(v) >= MIN_TOKEN_SIZE})
+
+
+def build_boolean_query(search):
+    """
+    Translate free text into a MATCH ... AGAINST boolean-mode expression.
+
+    Every term is required; each is matched on its stem or a synonym as a
+    prefix, e.g. "vintage takkies" -> +(vintage*) +(sneaker* takk* tekk* trainer*).
+    Returns None when nothing indexable is left (only very short words or
+    stopwords), in which case callers should fall back to a prefix LIKE.
+    """
+    groups = []
+    seen = set()
+    for term in tokenize(search):
+        if len(term) < MIN_TOKEN_SIZE or term in STOPWORDS or term in seen:
+            continue
+        seen.add(term)
+        prefixes = expand(term)
+        if prefixes:
+            groups.append('+(' + ' '.join(f'{p}*' for p in prefixes) + ')')
+    return ' '.join(groups) or None
+
+
+def search_clause(search):
+    """
+    Return (where_sql, where_params, rank_sql, rank_params) for a product
+    search. rank_sql is a relevance expression weighting name matches double
+    over brand/description, or None for the LIKE fallback.
+    """
+    ft_query = build_boolean_query(search)
+    if ft_query is None:
+        prefix = ' '.join(tokenize(search)) + '%'
+        return ' AND (p.name LIKE %s OR p.brand LIKE %s)', [prefix, prefix], None, []
+
+    where = f' AND MATCH({SEARCH_COLUMNS}) AGAINST (%s IN BOOLEAN MODE)'
+    rank = (f'(MATCH({NAME_COLUMN}) AGAINST (%s IN BOOLEAN MODE) * 2'
+            f' + MATCH({SEARCH_COLUMNS}) AGAINST (%s IN BOOLEAN MODE))')
+    return where, [ft_query], rank, [ft_query, ft_query]
@@ -0,0 +1,238 @@
+"""
+Incremental maintenance of the seller_stats table.
+
+The write paths apply small per-seller deltas computed from the order being
+touched, so their cost depends on the size of that order and not on the
+seller's history:
+
+    record_checkout(cursor, order_id)       new order: revenue, orders, pending items
+    record_payment(cursor, order_id)        pending items confirmed
+    record_cancellation(cursor, order_id)   reverses the order's contribution
+
+Reviews are handled by the after_review_insert trigger. SellerStatsReconciler
+periodically recomputes every seller in one read and corrects any drift seller
+by seller, which also fills in total_customers, only maintained that way.
+
+    python seller_stats.py        # run one reconciliation pass and exit
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def record_checkout(cursor, order_id):
+    """Add a freshly inserted order's items to each seller's totals"""
+    cursor.execute("""
+                   INSERT INTO seller_stats (seller_id, total_revenue, total_orders, pending_orders)
+                   SELECT seller_id, SUM(total_price), 1, COUNT(*)
+                   FROM order_items
+                   WHERE order_id = %s
+                   GROUP BY seller_id
+                   ON DUPLICATE KEY UPDATE
+                       total_revenue = total_revenue + VALUES(total_revenue),
+                       total_orders = total_orders + 1,
+                       pending_orders = pending_orders + VALUES(pending_orders)
+                   """, (order_id,))
+
+
+def record_payment(cursor, order_id):
+    """Call before the order's items move from 'pending' to 'confirmed'"""
+    cursor.execute("""
+                   UPDATE seller_stats ss
+                       JOIN (SELECT seller_id, COUNT(*) AS items
+                             FROM order_items
+                             WHERE order_id = %s AND status = 'pending'
+                             GROUP BY seller_id) d ON d.seller_id = ss.seller_id
+                   SET ss.pending_orders = GREATEST(0, ss.pending_orders - d.items)
+                   """, (order_id,))
+
+
+def record_cancellation(cursor, order_id):
+    """Call before the order's items are marked 'cancelled'"""
+    cursor.execute("""
+                   UPDATE seller_stats ss
+                       JOIN (SELECT seller_id,
+                                    SUM(total_price) AS revenue,
+                                    SUM(status = 'pending') AS pending_items
+                             FROM order_items
+                             WHERE order_id = %s AND status NOT IN ('cancelled', 'refunded')
+                             GROUP BY seller_id) d ON d.seller_id = ss.seller_id
+                   SET ss.total_revenue = GREATEST(0, ss.total_revenue - d.revenue),
+                       ss.total_orders = GREATEST(0, ss.total_orders - 1),
+                       ss.pending_orders = GREATEST(0, ss.pending_orders - d.pending_items)
+                   """, (order_id,))
+
+
+# Columns reconcile() recomputes
+STAT_COLUMNS = ('total_revenue', 'total_orders', 'total_products', 'pending_orders', 'total_customers',
+                'average_rating', 'total_reviews')
+
+# Each aggregate comes from its own grouped derived table, so there is no
+# products x order_items x reviews fan-out as in CalculateSellerStats. A plain
+# SELECT is a consistent non-locking read, so checkouts carry on while it runs.
+RECOMPUTE_SQL = """
+    SELECT s.id AS seller_id,
+           COALESCE(o.revenue, 0) AS total_revenue,
+           COALESCE(o.orders, 0) AS total_orders,
+           COALESCE(p.products, 0) AS total_products,
+           COALESCE(o.pending_items, 0) AS pending_orders,
+           COALESCE(o.customers, 0) AS total_customers,
+           COALESCE(r.average_rating, 0) AS average_rating,
+           COALESCE(r.reviews, 0) AS total_reviews,
+           COALESCE(ss.total_revenue, 0) AS current_total_revenue,
+           COALESCE(ss.total_orders, 0) AS current_total_orders,
+           COALESCE(ss.total_products, 0) AS current_total_products,
+           COALESCE(ss.pending_orders, 0) AS current_pending_orders,
+           COALESCE(ss.total_customers, 0) AS current_total_customers,
+           COALESCE(ss.average_rating, 0) AS current_average_rating,
+           COALESCE(ss.total_reviews, 0) AS current_total_reviews
+    FROM sellers s
+             LEFT JOIN seller_stats ss ON ss.seller_id = s.id
+             LEFT JOIN (SELECT seller_id, COUNT(*) AS products
+                        FROM products
+                        GROUP BY seller_id) p ON p.seller_id = s.id
+             LEFT JOIN (SELECT oi.seller_id,
+                               SUM(oi.total_price) AS revenue,
+                               COUNT(DISTINCT oi.order_id) AS orders,
+                               SUM(oi.status = 'pending') AS pending_items,
+                               COUNT(DISTINCT ord.user_id) AS customers
+                        FROM order_items oi
+                                 JOIN orders ord ON ord.id = oi.order_id
+                        WHERE oi.status NOT IN ('cancelled', 'refunded')
+                        GROUP BY oi.seller_id) o ON o.seller_id = s.id
+             LEFT JOIN (SELECT pr.seller_id, ROUND(AVG(rv.rating), 2) AS average_rating, COUNT(*) AS reviews
+                        FROM reviews rv
+                                 JOIN products pr ON pr.id = rv.product_id
+                        WHERE rv.is_approved = TRUE
+                        GROUP BY pr.seller_id) r ON r.seller_id = s.id
+"""
+
+# Adds a seller's drift to the live row, so deltas written since the read are kept
+CORRECT_SQL = f"""
+    INSERT INTO seller_stats (seller_id, {', '.join(STAT_COLUMNS)})
+    VALUES (%s, {', '.join(['%s'] * len(STAT_COLUMNS))})
+    ON DUPLICATE KEY UPDATE
+        {', '.join(f'{name} = {name} + VALUES({name})' for name in STAT_COLUMNS)}
+"""
+
+
+def reconcile(conn):
+    """
+    Recompute seller_stats for every seller from one consistent read, then
+    correct each drifted seller by (recomputed - current) in its own short
+    transaction. Returns the number of sellers corrected.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(RECOMPUTE_SQL)
+        sellers = cursor.fetchall()
+        conn.commit()  # end the read before writing
+
+        corrected = 0
+        for seller in sellers:
+            deltas = [seller[name] - seller[f'current_{name}'] for name in STAT_COLUMNS]
+            if not any(deltas):
+                continue
+            cursor.execute(CORRECT_SQL, [seller['seller_id'], *deltas])
+            conn.commit()
+            corrected += 1
+        return corrected
+    finally:
+        cursor.close()
+
+
+class SellerStatsReconciler:
+    """
+    Background thread that runs reconcile() every `interval` seconds; a
+    MySQL named lock keeps it to one process at a time
+    """
+
+    lock_name = 'seller_stats_reconciler'
+
+    def __init__(self, connection_factory, interval=3600):
+        self.connection_factory = connection_factory
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+        self.last_run = None
+        self.last_duration = None
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.corrected = 0
+
+    def _locked(self, conn, sql):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, (self.lock_name,))
+            return cursor.fetchone()[0] == 1
+        finally:
+            cursor.close()
+
+    def run_once(self):
+        started = time.monotonic()
+        try:
+            with self.connection_factory() as conn:
+                if not self._locked(conn, "SELECT GET_LOCK(%s, 0)"):
+                    self.skipped += 1  # another process is reconciling
+                    return True
+                try:
+                    corrected = reconcile(conn)
+                finally:
+                    self._locked(conn, "SELECT RELEASE_LOCK(%s)")
+        except Exception as err:
+            self.failures += 1
+            logger.error(f'Seller stats reconciliation failed: {err}')
+            return False
+        self.runs += 1
+        self.corrected += corrected
+        self.last_run = time.time()
+        self.last_duration = time.monotonic() - started
+        logger.info(f'Seller stats reconciled in {self.last_duration:.2f}s, {corrected} sellers corrected')
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='seller-stats-reconciler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'corrected': self.corrected,
+            'last_run': self.last_run,
+            'last_duration': self.last_duration,
+        }
+
+
+if __name__ == '__main__':
+    import os
+    from contextlib import closing
+
+    import mysql.connector
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    config = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'user': os.getenv('DB_USER', 'root'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'database': os.getenv('DB_NAME', 'thriftshop_sa'),
+    }
+    with closing(mysql.connector.connect(**config)) as conn:
+        started = time.monotonic()
+        corrected = reconcile(conn)
+        print(f'Seller stats reconciled in {time.monotonic() - started:.2f}s, {corrected} sellers corrected')
@@ -0,0 +1,172 @@
+"""
+Server-side sessions, and a cache of the signed-in account's profile.
+
+Flask keeps the whole session in a signed cookie. ServerSessionInterface
+keeps it in a cache backend (cache.LocalCache in this process, or
+cache.RedisCache shared by every worker), and the cookie carries only a
+random session id. So:
+
+- logout deletes the session, instead of trusting the browser to drop a
+  still-valid cookie
+- the session id changes whenever the session is cleared (login, logout),
+  so an id handed out before sign-in never becomes a signed-in one
+- an unchanged session is written back at most once per `refresh_after`
+  seconds, just to extend its expiry
+
+ProfileCache keeps the users/sellers row behind /api/user and
+/api/bootstrap per session (per account with cookie sessions, which have no
+id) for `ttl` seconds, so signed-in page loads don't read it from MySQL each
+time. invalidate() bumps the account's generation counter after a profile
+update, which orphans that account's entries in every session. forget()
+drops one session's entry at logout.
+"""
+import logging
+import secrets
+import threading
+import time
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, saved_at=0.0):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = sid is None
+        self.saved_at = saved_at
+        self.modified = False
+        self.cleared = False
+
+    def clear(self):
+        super().clear()
+        self.cleared = True
+
+
+class ServerSessionInterface(SessionInterface):
+    namespace = 'session'
+
+    def __init__(self, backend, refresh_after=60):
+        self.backend = backend
+        self.refresh_after = refresh_after
+        self._lock = threading.Lock()
+        self._stats = {'opened': 0, 'unknown': 0, 'created': 0, 'saved': 0, 'refreshed': 0, 'ended': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _key(self, sid):
+        return f'{self.namespace}:{sid}'
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            entry = self.backend.get(self._key(sid))
+            if entry is not None:
+                self._count('opened')
+                return ServerSession(entry['data'], sid, entry['saved_at'])
+            # Expired, evicted or forged: start over with an id of our own
+            self._count('unknown')
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.cleared and session.sid is not None:
+            self.backend.delete(self._key(session.sid))
+            self._count('ended')
+            session.sid = None
+        if not session:
+            if not session.new:
+                response.delete_cookie(name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                       httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        now = time.time()
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+            self._count('created')
+        elif session.modified:
+            self._count('saved')
+        elif now - session.saved_at >= self.refresh_after:
+            self._count('refreshed')
+        else:
+            return
+        ttl = max(1, int(app.permanent_session_lifetime.total_seconds()))
+        self.backend.set(self._key(session.sid), {'data': dict(session), 'saved_at': now}, ttl)
+        session.saved_at = now
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            domain=domain, path=path, secure=self.get_cookie_secure(app),
+                            httponly=self.get_cookie_httponly(app), samesite=self.get_cookie_samesite(app))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['store'] = self.backend.stats()
+        return stats
+
+
+class ProfileCache:
+    namespace = 'profiles'
+
+    def __init__(self, backend, dumps, loads, ttl=60):
+        self.backend = backend
+        self.dumps = dumps
+        self.loads = loads
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _counter(self, kind, account_id):
+        return f'{self.namespace}:{kind}:{account_id}'
+
+    def get_or_load(self, sid, kind, account_id, load):
+        """
+        Profile of the ('user' or 'seller', account_id) signed in to session
+        `sid` (None for cookie sessions), calling load() on a miss
+        """
+        account = self._counter(kind, account_id)
+        key = f'{self.namespace}:{sid}' if sid else f'{account}:profile'
+        # Read before load(), so an update landing meanwhile orphans what gets stored
+        generations = self.backend.counters([account])
+        entry = self.backend.get(key)
+        if (entry is not None and generations is not None and entry['account'] == account
+                and entry['generation'] == generations[0]):
+            self._count('hits')
+            return self.loads(entry['profile'])
+        self._count('misses')
+        profile = load()
+        if profile is not None and generations is not None:
+            self.backend.set(key, {'account': account, 'generation': generations[0], 'profile': self.dumps(profile)},
+                             self.ttl)
+        return profile
+
+    def invalidate(self, kind, account_id):
+        """Call after committing a change to the account's users/sellers row"""
+        self.backend.incr(self._counter(kind, account_id))
+        self._count('invalidations')
+
+    def forget(self, sid):
+        if sid:
+            self.backend.delete(f'{self.namespace}:{sid}')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['ttl'] = self.ttl
+        return stats
@@ -274,6 +274,11 @@ class BackendConnector {
         return this.request('/categories');
     }
 
+    // Session user, cart count, categories, featured and newest products in one request
+    async getBootstrap() {
+        return this.request('/bootstrap');
+    }
+
     // Review Methods
     async getProductReviews(productId) {
         return this.request(`/products/${productId}/reviews`);
@@ -728,13 +733,22 @@ function logout() {
 }
 
 
+// Responses that came with /api/bootstrap, each used once by the first render that needs it
+const preloaded = {};
+
+function takePreloaded(key) {
+    const value = preloaded[key];
+    delete preloaded[key];
+    return value;
+}
+
 // Replace the mock product loading
 async function loadFeaturedProducts() {
     const featuredContainer = document.getElementById('featuredProducts');
     featuredContainer.innerHTML = '<div class="loading"><div class="spinner"></div></div>';
 
     try {
-        const result = await api.getProducts({ featured: true, limit: 6 });
+        const result = takePreloaded('featured') || await api.getProducts({ featured: true, limit: 6 });
 
         featuredContainer.innerHTML = '';
 
@@ -790,7 +804,9 @@ async function loadAllProducts() {
         if (priceRange !== 'all') filters.price_range = priceRange;
         if (conditions.length > 0) filters.conditions = conditions;
 
-        const result = await api.getProducts(filters);
+        // The bootstrap listing is unfiltered, so it only stands in for an unfiltered first load
+        const initial = takePreloaded('products');
+        const result = (Object.keys(filters).length === 0 && initial) || await api.getProducts(filters);
 
         productsContainer.innerHTML = '';
 
@@ -1181,40 +1197,30 @@ function getSelectedConditions() {
 // Update the initialization to load categories from backend
 async function init() {
     try {
-        // Load categories
-        const categoriesResult = await api.getCategories();
-        state.categories = categoriesResult.categories;
+        // One request for everything the home page needs
+        const data = await api.getBootstrap();
+
+        state.categories = data.categories.categories;
         loadCategories();
 
-        // Check if user is logged in
-//        if (api.isAuthenticated()) {
-            try {
-               const userResult = await api.getCurrentUser();
-                if (userResult.user) {
-                    state.currentUser = userResult.user;
-                    localStorage.setItem('currentUser', JSON.stringify(userResult.user));
-                } else if (userResult.seller) {
-                    state.currentSeller = userResult.seller;
-                    localStorage.setItem('currentSeller', JSON.stringify(userResult.seller));
-                }
-            } catch (error) {
-                // Token might be invalid, clear it
-                api.logout();
-            }
-//        }
+        if (data.user_type === 'seller') {
+            state.currentSeller = data.user;
+            localStorage.setItem('currentSeller', JSON.stringify(data.user));
+        } else if (data.user) {
+            state.currentUser = data.user;
+            localStorage.setItem('currentUser', JSON.stringify(data.user));
+        }
 
         updateAuthUI();
 
-        // Load initial data
-        await loadFeaturedProducts();
-        await loadAllProducts();
+        // The cart itself is fetched when the cart page is opened
+        document.getElementById('cartCount').textContent = data.cart_count;
 
-        // Load cart if user is logged in
-        if (state.currentUser) {
-            await loadCart();
-        }
+        preloaded.featured = data.featured;
+        preloaded.products = data.products;
+        await loadAllProducts();
 
-        // Show home page
+        // Show home page (renders the preloaded featured products)
         showPage('home');
 
     } catch (error) {
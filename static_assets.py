@@ -0,0 +1,168 @@
+"""
+Caching helpers for files the app serves itself.
+
+- file_etag() gives a strong ETag for an upload. Content-addressed blobs
+  (see media_store.py) already carry their SHA-256 in the name; other
+  files are hashed once per (mtime, size).
+- is_immutable_upload() tells whether an upload URL can never change and
+  may be cached for a year.
+- CompressedAsset holds identity/gzip/brotli encodings of a small text
+  asset (app.js, backend-connector.js, the rendered index.html).
+  Precompressed .gz/.br files next to the source are used when they are
+  at least as new as it; otherwise the asset is compressed once in memory.
+
+    python static_assets.py static/app.js static/backend-connector.js   # write .gz/.br files
+
+Brotli needs the optional `brotli` package; without it only gzip is offered.
+"""
+import gzip
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+CONTENT_ADDRESSED = re.compile(r'^(?:images|videos)/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.\w+$')
+DERIVED_CONTENT_ADDRESSED = re.compile(r'^derived/([0-9a-f]{64})_\w+-\w+\.\w+$')
+ENCODINGS = ('br', 'gzip')  # server preference when the client accepts both
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+_etag_cache = OrderedDict()
+_etag_lock = threading.Lock()
+_ETAG_CACHE_SIZE = 4096
+
+
+def is_immutable_upload(relative_path):
+    return bool(CONTENT_ADDRESSED.match(relative_path) or DERIVED_CONTENT_ADDRESSED.match(relative_path))
+
+
+def file_etag(path, relative_path):
+    """Strong validator for an upload: its content hash"""
+    match = CONTENT_ADDRESSED.match(relative_path)
+    if match:
+        return match.group(1)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _etag_lock:
+        etag = _etag_cache.get(key)
+        if etag is not None:
+            _etag_cache.move_to_end(key)
+            return etag
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    etag = digest.hexdigest()[:40]
+    with _etag_lock:
+        _etag_cache[key] = etag
+        while len(_etag_cache) > _ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    return etag
+
+
+def compress(body, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(body, quality=11)
+    return None
+
+
+def negotiate(quality, available):
+    """Pick the best encoding the client accepts; `quality(name)` returns its q-value (0 = not accepted)"""
+    for encoding in ENCODINGS:
+        if encoding in available and quality(encoding) > 0:
+            return encoding
+    return 'identity'
+
+
+class CompressedAsset:
+    """One text asset in every encoding we can offer, with a strong ETag per encoding"""
+
+    def __init__(self, body, source_path=None):
+        self.identity = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.encodings = {'identity': body}
+        for encoding in ENCODINGS:
+            precompressed = _read_fresh(source_path, encoding) if source_path else None
+            encoded = precompressed if precompressed is not None else compress(body, encoding)
+            if encoded is not None and len(encoded) < len(body):
+                self.encodings[encoding] = encoded
+
+    def body(self, encoding):
+        return self.encodings[encoding]
+
+    def etag_for(self, encoding):
+        return self.etag if encoding == 'identity' else f'{self.etag}-{encoding}'
+
+
+def _read_fresh(source_path, encoding):
+    path = source_path + SUFFIXES[encoding]
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(source_path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class AssetCache:
+    """CompressedAsset per key, rebuilt when the source's mtime changes"""
+
+    def __init__(self):
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def file(self, path):
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._assets.get(path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        with open(path, 'rb') as f:
+            asset = CompressedAsset(f.read(), path)
+        with self._lock:
+            self._assets[path] = (mtime, asset)
+        return asset
+
+    def rendered(self, key, version, render):
+        """Asset for generated output (e.g. a template); `version` changes when it must be re-rendered"""
+        with self._lock:
+            cached = self._assets.get(key)
+            if cached and cached[0] == version:
+                return cached[1]
+        asset = CompressedAsset(render().encode('utf-8'))
+        with self._lock:
+            self._assets[key] = (version, asset)
+        return asset
+
+
+def write_precompressed(path):
+    """Write path.gz (and path.br when brotli is installed); returns the files written"""
+    with open(path, 'rb') as f:
+        body = f.read()
+    written = []
+    for encoding in ENCODINGS:
+        encoded = compress(body, encoding)
+        if encoded is None:
+            continue
+        target = path + SUFFIXES[encoding]
+        with open(target, 'wb') as f:
+            f.write(encoded)
+        written.append((target, len(encoded)))
+    return written
+
+
+if __name__ == '__main__':
+    import sys
+
+    for source in sys.argv[1:] or ['static/app.js', 'static/backend-connector.js']:
+        size = os.path.getsize(source)
+        for target, compressed in write_precompressed(source):
+            print(f'{target}: {size} -> {compressed} bytes')
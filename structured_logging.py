@@ -0,0 +1,203 @@
+"""
+Structured logging for the app and its background modules.
+
+configure_logging() routes every logger (app.logger, the module loggers,
+werkzeug) through the root logger:
+
+- Records are written as one JSON object per line: time, level, logger,
+  message, the request id/method/path when logged inside a request, any
+  `extra={...}` fields, and the traceback.
+- Levels can be set per logger, e.g. LOG_LEVELS="werkzeug=WARNING,cache=DEBUG".
+- Below WARNING, records from loggers listed in the sample rates
+  (e.g. "thriftshop.slow_query=0.1") are kept only with that probability.
+  Warnings and errors are always kept.
+- Values of sensitive keys (password, token, secret, ...) are masked in
+  `extra` fields and dict arguments, and in the message text when they
+  appear as key/value pairs.
+- The request thread only puts the record on a queue. A QueueListener
+  thread formats it and does the file and console I/O.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import traceback
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+REDACTED = '[REDACTED]'
+SENSITIVE_KEYS = ('password', 'passwd', 'secret', 'token', 'authorization', 'cookie', 'card_number', 'cvv')
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+_CONTEXT_ATTRS = ('request_id', 'method', 'path')
+_SENSITIVE_TEXT = re.compile(
+    r"""(?P<key>['"]?[\w-]*(?:%s)[\w-]*['"]?\s*[:=]\s*)(?P<value>'[^']*'|"[^"]*"|[^\s,}&]+)""" % '|'.join(SENSITIVE_KEYS),
+    re.IGNORECASE)
+
+
+def is_sensitive(key):
+    key = str(key).lower()
+    return any(word in key for word in SENSITIVE_KEYS)
+
+
+def redact(value):
+    """Copy of a dict/list structure with sensitive values masked"""
+    if isinstance(value, dict):
+        return {k: REDACTED if is_sensitive(k) else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(v) for v in value)
+    return value
+
+
+def redact_text(text):
+    return _SENSITIVE_TEXT.sub(lambda m: m.group('key') + REDACTED, text)
+
+
+def parse_levels(spec):
+    """"name=LEVEL,name=LEVEL" -> {name: LEVEL}"""
+    return {name.strip(): level.strip().upper()
+            for name, _, level in (item.partition('=') for item in (spec or '').split(',')) if level}
+
+
+def parse_rates(spec):
+    """"name=0.1,name=0.01" -> {name: 0.1, ...}"""
+    return {name.strip(): float(rate)
+            for name, _, rate in (item.partition('=') for item in (spec or '').split(',')) if rate}
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records logged inside a request with its id, method and path (the listener thread has no request)"""
+
+    def filter(self, record):
+        if has_request_context():
+            if 'request_id' not in g:
+                g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+            record.request_id = g.request_id
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep sub-WARNING records of the configured loggers (and their children) with the given probability"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self._resolved = {}
+
+    def _rate(self, name):
+        if name not in self._resolved:
+            rate, probe = 1.0, name
+            while probe:
+                if probe in self.rates:
+                    rate = self.rates[probe]
+                    break
+                probe = probe.rpartition('.')[0]
+            self._resolved[name] = rate
+        return self._resolved[name]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class RedactingFilter(logging.Filter):
+    def filter(self, record):
+        for key, value in list(vars(record).items()):
+            if key in _RECORD_ATTRS:
+                continue
+            setattr(record, key, REDACTED if is_sensitive(key) else redact(value))
+        if isinstance(record.args, dict):
+            record.args = redact(record.args)
+        elif isinstance(record.args, tuple):
+            record.args = tuple(redact(arg) for arg in record.args)
+        # Redact the formatted message: in the template, 'token=%s' would lose its placeholder
+        record.msg, record.args = redact_text(record.getMessage()), None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = ''.join(traceback.format_exception(*record.exc_info))
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(name)s] %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        context = ' '.join(f'{key}={getattr(record, key)}' for key in _CONTEXT_ATTRS if hasattr(record, key))
+        return f'{line} ({context})' if context else line
+
+
+class _PreparedQueueHandler(logging.handlers.QueueHandler):
+    """Keep `extra` fields and the exception for the listener's formatter instead of pre-rendering them"""
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+
+def configure_logging(app, level='INFO', logger_levels=None, sample_rates=None, log_file=None,
+                      max_bytes=20_000_000, backup_count=10, json_format=True, console=True):
+    """Install the queue handler on the root logger; returns the QueueListener (stop() it at exit)"""
+    from flask.logging import default_handler
+
+    formatter = JsonFormatter() if json_format else TextFormatter()
+    outputs = []
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                                            delay=True, encoding='utf-8')
+        file_handler.setFormatter(formatter)
+        outputs.append(file_handler)
+    if console:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(formatter)
+        outputs.append(stream_handler)
+
+    queue_handler = _PreparedQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(SamplingFilter(sample_rates or {}))
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(RedactingFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    # Flask gives app.logger its own stderr handler and a DEBUG level in debug mode; defer to the root
+    app.logger.removeHandler(default_handler)
+    app.logger.setLevel(logging.NOTSET)
+    for name, logger_level in (logger_levels or {}).items():
+        logging.getLogger(app.logger.name if name == 'app' else name).setLevel(logger_level)
+
+    listener = logging.handlers.QueueListener(queue_handler.queue, *outputs, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,126 @@
+import os
+import re
+import sqlite3
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+
+# The modules live at the repository root, next to app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings that keep app.py's background workers and log file out of the tests
+QUIET_APP = {'LOG_FILE': '', 'LOG_LEVEL': 'CRITICAL', 'FACET_INDEX_INTERVAL': '0', 'MEDIA_GC_INTERVAL': '0',
+             'REFRESH_TOKEN_SWEEP_INTERVAL': '0', 'RESERVATION_SWEEP_INTERVAL': '0',
+             'UPLOAD_SESSION_SWEEP_INTERVAL': '0', 'SELLER_STATS_RECONCILE_INTERVAL': '0',
+             'PRODUCT_DOCUMENT_REFRESH_INTERVAL': '0', 'MEDIA_DERIVATIVES_ENABLED': 'false'}
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    """app.py, imported once with its background workers switched off"""
+    for module in ('flask_mail', 'flask_cors', 'flask_bcrypt', 'mysql.connector'):
+        pytest.importorskip(module)
+    for name, value in QUIET_APP.items():
+        os.environ.setdefault(name, value)
+    import app
+    return app
+
+
+def _timestamp(value):
+    """DATETIME/TIMESTAMP values come back as datetimes, as from mysql.connector"""
+    if isinstance(value, str) and re.fullmatch(r'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d', value):
+        return datetime.fromisoformat(value)
+    return value
+
+
+class SqliteCursor:
+    def __init__(self, db, dictionary):
+        self.db = db
+        self.dictionary = dictionary
+        self.rows = []
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        for pattern, replacement in SqliteConnection.DIALECT:
+            sql = re.sub(pattern, replacement, sql)
+        cursor = self.db.execute(sql, tuple(params))
+        names = [column[0] for column in cursor.description or ()]
+        rows = [tuple(map(_timestamp, row)) for row in cursor.fetchall()]
+        self.rows = [dict(zip(names, row)) if self.dictionary else row for row in rows]
+        self.rowcount, self.lastrowid = cursor.rowcount, cursor.lastrowid
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+class SqliteConnection:
+    """
+    In-memory sqlite behind the mysql.connector calls the modules make, with
+    the MySQL-only parts of their SQL rewritten; enough to run their
+    statements for real instead of matching SQL text
+    """
+
+    DIALECT = [
+        (r'FOR UPDATE( SKIP LOCKED)?', ''),
+        (r'NOW\(\) \+ INTERVAL %s SECOND', "datetime('now', %s || ' seconds')"),
+        (r'NOW\(\)', "datetime('now')"),
+        (r'GREATEST\(', 'MAX('),
+        (r'ON DUPLICATE KEY UPDATE', 'ON CONFLICT DO UPDATE SET'),
+        (r'VALUES\((\w+)\)', r'excluded.\1'),
+        (r'%s', '?'),
+    ]
+
+    def __init__(self, schema):
+        self.db = sqlite3.connect(':memory:', isolation_level=None)
+        self.db.executescript(schema)
+        # Named locks by holder; a test stands in for another process by holding one itself
+        self.locks = {}
+        self.db.create_function('GET_LOCK', 2, self._get_lock)
+        self.db.create_function('RELEASE_LOCK', 1, self._release_lock)
+        self.db.execute('BEGIN')
+        self.commits = 0
+
+    def _get_lock(self, name, timeout):
+        return int(self.locks.setdefault(name, self) is self)
+
+    def _release_lock(self, name):
+        return int(self.locks.get(name) is self and self.locks.pop(name) is self)
+
+    def cursor(self, dictionary=False, buffered=False):
+        return SqliteCursor(self.db, dictionary)
+
+    def commit(self):
+        self.db.execute('COMMIT')
+        self.db.execute('BEGIN')
+        self.commits += 1
+
+    def rollback(self):
+        self.db.execute('ROLLBACK')
+        self.db.execute('BEGIN')
+
+    def query(self, sql, params=()):
+        """Rows of a SELECT, as tuples"""
+        return self.db.execute(sql, params).fetchall()
+
+    def factory(self):
+        """A connection_factory handing out this connection"""
+        @contextmanager
+        def connection():
+            yield self
+        return connection
+
+
+@pytest.fixture
+def sqlite_connection():
+    """SqliteConnection, to be called with the schema a test needs"""
+    return SqliteConnection
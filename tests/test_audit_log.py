@@ -0,0 +1,138 @@
+import glob
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import pytest
+
+connector = pytest.importorskip('mysql.connector')
+
+from audit_log import AuditLog  # noqa: E402
+
+
+class FakeConnection:
+    """Collects activity_logs rows; rows with action 'bad' fail like a broken foreign key"""
+
+    def __init__(self):
+        self.down = False
+        self.batches = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params):
+        width = sql.count('%s') // sql.count('(%s')
+        rows = [tuple(params[i:i + width]) for i in range(0, len(params), width)]
+        if any(row[2] == 'bad' for row in rows):
+            raise connector.IntegrityError('Cannot add or update a child row')
+        self.batches.append(rows)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+    @property
+    def written(self):
+        return [row[2] for batch in self.batches for row in batch]
+
+
+@pytest.fixture
+def conn():
+    return FakeConnection()
+
+
+@pytest.fixture
+def make_log(conn, tmp_path):
+    @contextmanager
+    def connection_factory():
+        if conn.down:
+            raise connector.Error("Can't connect to MySQL server")
+        yield conn
+
+    def make_log(**kwargs):
+        return AuditLog(connection_factory, journal_dir=str(tmp_path), **kwargs)
+    return make_log
+
+
+def test_flush_writes_batches(conn, make_log):
+    audit = make_log(batch_size=2)
+    for action in ('login', 'logout', 'order'):
+        audit.record(action, user_id=1, metadata={'ip': 'x'})
+    assert audit.flush() == 3
+    assert [len(batch) for batch in conn.batches] == [2, 1]
+    assert conn.batches[0][0][8] == json.dumps({'ip': 'x'})
+    assert audit.stats()['written'] == 3
+
+
+def test_full_queue_drops_new_events(make_log):
+    audit = make_log(max_queue=1)
+    assert audit.record('login')
+    assert not audit.record('logout')
+    assert audit.stats()['dropped'] == 1
+
+
+def test_rejected_batch_is_retried_row_by_row(conn, make_log):
+    audit = make_log()
+    for action in ('login', 'bad', 'logout'):
+        audit.record(action)
+    audit.flush()
+    assert conn.written == ['login', 'logout']
+    assert audit.stats()['rejected'] == 1
+
+
+def test_events_are_journaled_while_mysql_is_down_and_replayed_after(conn, make_log, tmp_path):
+    audit = make_log(batch_size=2)
+    conn.down = True
+    for action in ('login', 'logout', 'order'):
+        audit.record(action)
+    audit.flush()
+    assert audit.stats()['journaled'] == 3
+    assert len(glob.glob(str(tmp_path / 'audit-journal-*.jsonl'))) == 1
+
+    conn.down = False
+    audit.record('later')
+    audit.flush()
+    assert conn.written == ['later', 'login', 'logout', 'order']
+    assert audit.stats()['replayed'] == 3
+    assert os.listdir(tmp_path) == []
+
+
+def test_journals_of_other_processes_are_replayed(conn, make_log, tmp_path):
+    (tmp_path / 'audit-journal-99999.jsonl').write_text(json.dumps([1, 'user', 'orphaned'] + [None] * 7) + '\n')
+    audit = make_log()
+    audit.flush()
+    assert conn.written == ['orphaned']
+
+
+def test_abandoned_replays_are_put_back_in_line(conn, make_log, tmp_path):
+    row = json.dumps([1, 'user', 'interrupted'] + [None] * 7) + '\n'
+    (tmp_path / f'audit-journal-1.jsonl.replay-{os.getpid()}').write_text(row)
+    claimed_elsewhere = tmp_path / f'audit-journal-2.jsonl.replay-{os.getppid()}'
+    claimed_elsewhere.write_text(row)
+
+    audit = make_log()
+    assert (tmp_path / f'audit-journal-1-recovered-{os.getpid()}.jsonl').exists()
+    assert claimed_elsewhere.exists()  # its replay is still running
+    audit.flush()
+    assert conn.written == ['interrupted']
+
+
+def test_writer_thread_fills_batches_over_the_flush_interval(conn, make_log):
+    audit = make_log(batch_size=3, flush_interval=0.1)
+    for action in ('a', 'b', 'c', 'd'):
+        audit.record(action)
+    audit.start()
+    time.sleep(0.5)
+    audit.stop()
+    assert [len(batch) for batch in conn.batches] == [3, 1]
+
+
+def test_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        AuditLog(None, overflow='spill')
@@ -0,0 +1,161 @@
+import time
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('jwt')
+
+from auth_tokens import (AccessTokens, RefreshTokenSweeper, TokenError, TokenKeys,  # noqa: E402
+                         issue_refresh_token, revoke_refresh_token, rotate_refresh_token)
+
+# HS256 wants keys of at least 32 bytes
+NEW_SECRET, OLD_SECRET = 'n' * 32, 'o' * 32
+
+
+class RefreshTokenCursor:
+    """Dictionary cursor over an in-memory auth_refresh_tokens table"""
+
+    def __init__(self):
+        self.rows = []
+        self.result = None
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        if sql.startswith('INSERT INTO auth_refresh_tokens'):
+            token_hash, family, kind, account_id, ttl = params
+            self.rows.append({'id': len(self.rows) + 1, 'token_hash': token_hash, 'family': family,
+                              'account_type': kind, 'account_id': account_id, 'used_at': None,
+                              'revoked_at': None, 'expires_at': time.time() + ttl})
+        elif sql.startswith('SELECT'):
+            row = next((row for row in self.rows if row['token_hash'] == params[0]), None)
+            self.result = row and {**row, 'expired': row['expires_at'] <= time.time()}
+        elif 'SET used_at' in sql:
+            self._update(lambda row: row['id'] == params[0], 'used_at')
+        elif 'WHERE family' in sql:
+            self._update(lambda row: row['family'] == params[0] and row['revoked_at'] is None, 'revoked_at')
+        else:
+            raise AssertionError(f'Unexpected query: {sql}')
+
+    def _update(self, where, column):
+        matched = [row for row in self.rows if where(row)]
+        for row in matched:
+            row[column] = time.time()
+        self.rowcount = len(matched)
+
+    def fetchone(self):
+        return self.result
+
+
+@pytest.fixture
+def keys():
+    return TokenKeys.parse(f'new:{NEW_SECRET},old:{OLD_SECRET}')
+
+
+def test_parse_keys():
+    keys = TokenKeys.parse(' a:one , b:two:with-colon')
+    assert keys.active == 'a'
+    assert keys.keys == {'a': 'one', 'b': 'two:with-colon'}
+    assert TokenKeys.parse('', 'app secret').active == 'default'
+    assert TokenKeys.parse('', 'app secret').keys['default'] != 'app secret'
+    with pytest.raises(ValueError):
+        TokenKeys.parse('no-secret')
+    with pytest.raises(ValueError):
+        TokenKeys.parse('', None)
+
+
+def test_issue_and_verify(keys):
+    tokens = AccessTokens(keys, ttl=60)
+    token, expires_in = tokens.issue('seller', 3)
+    assert expires_in == 60
+    assert tokens.verify(token) == ('seller', 3)
+    assert tokens.verify(token) == ('seller', 3)
+    assert tokens.stats()['cache_hits'] == 1
+    with pytest.raises(ValueError):
+        tokens.issue('admin', 1)
+
+
+@pytest.mark.parametrize('cache_size', [0, 4096])
+def test_expired_tokens_are_rejected(keys, cache_size):
+    tokens = AccessTokens(keys, ttl=60, leeway=0, cache_size=cache_size)
+    token, _ = tokens.issue('user', 12, now=time.time() - 120)
+    with pytest.raises(TokenError, match='expired'):
+        tokens.verify(token)
+
+
+def test_tampered_and_foreign_tokens_are_rejected(keys):
+    token, _ = AccessTokens(keys).issue('user', 12)
+    header, payload, signature = token.split('.')
+    forged = AccessTokens(TokenKeys([('new', 'x' * 32)])).issue('user', 1)[0]
+    for bad in ('not a token', f'{header}.{payload}.{signature[::-1]}', forged):
+        with pytest.raises(TokenError):
+            AccessTokens(keys).verify(bad)
+
+
+def test_rotation_keeps_old_tokens_until_their_key_is_dropped():
+    old = TokenKeys.parse(f'old:{OLD_SECRET}')
+    token, _ = AccessTokens(old).issue('user', 12)
+
+    rotated = TokenKeys.parse(f'new:{NEW_SECRET},old:{OLD_SECRET}')
+    tokens = AccessTokens(rotated)
+    assert tokens.verify(token) == ('user', 12)
+    assert tokens.issue('user', 12)[0] != token
+
+    # Dropping the retired key also invalidates what the cache remembered
+    del rotated.keys['old']
+    with pytest.raises(TokenError, match='unknown key'):
+        tokens.verify(token)
+
+
+def test_refresh_tokens_rotate_within_a_family():
+    cursor = RefreshTokenCursor()
+    first = issue_refresh_token(cursor, 'user', 12, ttl=3600)
+    kind, account_id, second = rotate_refresh_token(cursor, first, ttl=3600)
+    assert (kind, account_id) == ('user', 12)
+    assert second != first
+    assert cursor.rows[0]['family'] == cursor.rows[1]['family']
+    assert first not in {row['token_hash'] for row in cursor.rows}  # only digests are stored
+    assert rotate_refresh_token(cursor, second, ttl=3600)[:2] == ('user', 12)
+
+
+def test_reusing_a_spent_refresh_token_revokes_the_family():
+    cursor = RefreshTokenCursor()
+    first = issue_refresh_token(cursor, 'user', 12, ttl=3600)
+    other_sign_in = issue_refresh_token(cursor, 'user', 12, ttl=3600)
+    _, _, second = rotate_refresh_token(cursor, first, ttl=3600)
+
+    with pytest.raises(TokenError, match='already used'):
+        rotate_refresh_token(cursor, first, ttl=3600)
+    with pytest.raises(TokenError, match='revoked'):
+        rotate_refresh_token(cursor, second, ttl=3600)
+    assert rotate_refresh_token(cursor, other_sign_in, ttl=3600)[:2] == ('user', 12)
+
+
+def test_unknown_expired_and_revoked_refresh_tokens():
+    cursor = RefreshTokenCursor()
+    with pytest.raises(TokenError, match='Invalid'):
+        rotate_refresh_token(cursor, None, ttl=3600)
+    expired = issue_refresh_token(cursor, 'seller', 3, ttl=-1)
+    with pytest.raises(TokenError, match='expired'):
+        rotate_refresh_token(cursor, expired, ttl=3600)
+
+    token = issue_refresh_token(cursor, 'seller', 3, ttl=3600)
+    assert revoke_refresh_token(cursor, token)
+    assert not revoke_refresh_token(cursor, 'unknown')
+    with pytest.raises(TokenError, match='revoked'):
+        rotate_refresh_token(cursor, token, ttl=3600)
+
+
+def test_refresh_token_sweeper_runs_in_one_process_at_a_time(sqlite_connection):
+    db = sqlite_connection("CREATE TABLE auth_refresh_tokens (id INTEGER PRIMARY KEY, expires_at TEXT,"
+                           " revoked_at TEXT);")
+    sweeper = RefreshTokenSweeper(db.factory(), interval=0)
+    db.locks[RefreshTokenSweeper.lock_name] = 'another process'
+    assert sweeper.run_once()
+    assert sweeper.stats()['skipped'] == 1
+    assert sweeper.stats()['runs'] == 0
+
+    del db.locks[RefreshTokenSweeper.lock_name]
+    sweeper.run_once()
+    assert sweeper.stats()['skipped'] == 1
+    assert db.locks == {}
@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+
+import pytest
+
+MODIFIED = datetime(2024, 3, 5, 10, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def catalog(app_module, monkeypatch):
+    """Stand-ins for the listing builders /api/bootstrap shares with /api/categories and /api/products"""
+    pieces = {
+        'categories': ('{"categories":[{"id":1,"name":"Jackets"}]}', 'cat-etag', MODIFIED),
+        'featured': ('{"products":[{"id":2}]}', 'featured-etag', None),
+        'products': ('{"products":[{"id":2},{"id":3}]}', 'products-etag', None),
+    }
+    calls = []
+
+    def product_listing(args, audience, is_current=None):
+        calls.append((args.to_dict(), audience))
+        return pieces['featured' if args.get('featured') else 'products']
+
+    monkeypatch.setattr(app_module, 'category_listing', lambda audience, is_current=None: pieces['categories'])
+    monkeypatch.setattr(app_module, 'product_listing', product_listing)
+    monkeypatch.setattr(app_module, 'session_summary',
+                        lambda user_id, seller_id: {'user': None, 'user_type': None, 'cart_count': 0})
+    return pieces, calls
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def test_bootstrap_splices_the_listings_into_one_response(app_module, client, catalog):
+    _, calls = catalog
+    response = client.get('/api/bootstrap')
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'categories': {'categories': [{'id': 1, 'name': 'Jackets'}]},
+        'featured': {'products': [{'id': 2}]},
+        'products': {'products': [{'id': 2}, {'id': 3}]},
+        'user': None, 'user_type': None, 'cart_count': 0,
+    }
+    limit = str(app_module.app.config['BOOTSTRAP_FEATURED_LIMIT'])
+    assert sorted(calls, key=lambda call: len(call[0])) == [({}, 'anonymous'),
+                                                            ({'featured': '1', 'limit': limit}, 'anonymous')]
+    assert response.last_modified is None
+    assert response.headers['Cache-Control'] == 'public, no-cache'
+
+
+def test_bootstrap_revalidates(client, catalog):
+    pieces, _ = catalog
+    etag = client.get('/api/bootstrap').headers['ETag']
+    assert client.get('/api/bootstrap', headers={'If-None-Match': etag}).status_code == 304
+
+    pieces['featured'] = ('{"products":[]}', 'featured-etag-2', None)
+    response = client.get('/api/bootstrap', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_bootstrap_errors_are_json(app_module, client, catalog, monkeypatch):
+    def broken(audience, is_current=None):
+        raise RuntimeError('boom')
+    monkeypatch.setattr(app_module, 'category_listing', broken)
+    response = client.get('/api/bootstrap')
+    assert response.status_code == 500
+    assert response.get_json() == {'error': 'Failed to load the home page'}
+
+
+def test_bootstrap_ignores_if_modified_since(client, catalog):
+    response = client.get('/api/bootstrap', headers={'If-Modified-Since': 'Wed, 01 Jan 2031 00:00:00 GMT'})
+    assert response.status_code == 200
@@ -0,0 +1,66 @@
+from cache import LocalCache, ProductListingCache, ResponseCache
+
+
+def listing(category_id=None, seller_id=None, **kwargs):
+    return ProductListingCache.normalize(category_id, seller_id, **kwargs)
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_local_cache_expires_entries():
+    cache = LocalCache()
+    cache.set('a', 1, ttl=-1)
+    assert cache.get('a') is None
+    assert cache.stats()['expired'] == 1
+
+
+def test_normalize_treats_equivalent_queries_alike():
+    assert listing(' 3 ', search='  Vintage   TAKKIES ') == listing('3', search='vintage takkies')
+    assert listing(featured='yes')['featured'] is True
+    assert listing(limit='abc')['limit'] is None
+
+
+def test_invalidate_orphans_only_the_touched_scopes():
+    cache = ProductListingCache(LocalCache())
+    in_category, other_category, unfiltered = listing('3'), listing('4'), listing()
+    before = [cache.generation(query) for query in (in_category, other_category, unfiltered)]
+    cache.set(other_category, before[1], {'etag': 'e', 'body': '{}'})
+
+    cache.invalidate(category_ids=[3, None], seller_ids=[])
+
+    after = [cache.generation(query) for query in (in_category, other_category, unfiltered)]
+    assert after[0] != before[0]
+    assert after[1] == before[1]
+    assert after[2] != before[2]
+    assert cache.get(other_category, after[1]) == {'etag': 'e', 'body': '{}'}
+
+
+def test_invalidate_all_reaches_every_scope():
+    cache = ProductListingCache(LocalCache())
+    query = listing(seller_id='7')
+    before = cache.generation(query)
+    cache.invalidate_all()
+    assert cache.generation(query) != before
+
+
+def test_listing_cache_is_off_without_a_generation():
+    cache = ProductListingCache(LocalCache())
+    cache.set(listing(), None, {'etag': 'e'})
+    assert cache.get(listing(), None) is None
+
+
+def test_response_cache_hits_only_for_the_stored_etag():
+    cache = ResponseCache(LocalCache())
+    cache.set('/api/categories', 'anonymous', 'v1', 'body')
+    assert cache.get('/api/categories', 'anonymous', 'v1') == 'body'
+    assert cache.get('/api/categories', 'anonymous', 'v2') is None
+    assert cache.get('/api/categories', 'member', 'v1') is None
@@ -0,0 +1,54 @@
+import pytest
+
+SCHEMA = """
+CREATE TABLE products (id INTEGER PRIMARY KEY, stock_quantity INT, reserved_quantity INT, purchase_count INT,
+                       updated_at TEXT DEFAULT '2024-01-01');
+INSERT INTO products (id, stock_quantity, reserved_quantity, purchase_count) VALUES (1, 5, 0, 0), (2, 3, 2, 10),
+                                                                                    (3, 1, 0, 0);
+"""
+
+
+@pytest.fixture
+def db(sqlite_connection):
+    return sqlite_connection(SCHEMA)
+
+
+def stock(db):
+    return {row[0]: row[1:] for row in db.query("SELECT id, stock_quantity, purchase_count FROM products")}
+
+
+def test_decrement_stock_updates_every_product_at_once(app_module, db):
+    assert app_module.decrement_stock(db.cursor(), {1: 2, 3: 1})
+    assert stock(db) == {1: (3, 2), 2: (3, 10), 3: (0, 1)}
+
+
+def test_decrement_stock_reports_a_short_product(app_module, db):
+    # Product 2 has 3 in stock, 2 of them held by other carts
+    assert not app_module.decrement_stock(db.cursor(), {1: 1, 2: 2})
+    assert stock(db)[2] == (3, 10)
+
+
+def test_decrement_stock_never_oversells(app_module, db):
+    cursor = db.cursor()
+    assert app_module.decrement_stock(cursor, {3: 1})
+    assert not app_module.decrement_stock(cursor, {3: 1})
+    assert stock(db)[3] == (0, 1)
+
+
+def test_restore_stock_undoes_a_decrement(app_module, db):
+    cursor = db.cursor()
+    assert app_module.decrement_stock(cursor, {1: 2, 3: 1})
+    app_module.restore_stock(cursor, {1: 2, 3: 1})
+    assert stock(db) == {1: (5, 0), 2: (3, 10), 3: (1, 0)}
+
+
+def test_restore_stock_keeps_purchase_count_non_negative(app_module, db):
+    app_module.restore_stock(db.cursor(), {1: 4})
+    app_module.restore_stock(db.cursor(), {})
+    assert stock(db)[1] == (9, 0)
+
+
+def test_stock_updates_leave_updated_at_alone(app_module, db):
+    app_module.decrement_stock(db.cursor(), {1: 1})
+    app_module.restore_stock(db.cursor(), {1: 1})
+    assert db.query("SELECT updated_at FROM products WHERE id = 1") == [('2024-01-01',)]
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from chunked_uploads import ChunkStore, UploadSessionSweeper
+
+SCHEMA = """
+CREATE TABLE upload_sessions (id TEXT PRIMARY KEY, expires_at TEXT);
+INSERT INTO upload_sessions (id, expires_at) VALUES ('expired', '2024-01-01 00:00:00'),
+                                                    ('live', '2999-01-01 00:00:00');
+"""
+
+
+@pytest.fixture
+def sweeper(sqlite_connection, tmp_path):
+    db = sqlite_connection(SCHEMA)
+    store = ChunkStore(str(tmp_path))
+    for upload_id in ('expired', 'live'):
+        store.create(upload_id)
+    return db, store, UploadSessionSweeper(db.factory(), store, interval=0)
+
+
+def test_sweeper_removes_expired_sessions_and_their_chunks(sweeper):
+    db, store, sweeper = sweeper
+    assert sweeper.run_once()
+    assert sweeper.stats()['abandoned'] == 1
+    assert db.query("SELECT id FROM upload_sessions") == [('live',)]
+    assert os.listdir(store.root) == ['live']
+    assert db.locks == {}
+
+
+def test_sweeper_skips_while_another_process_sweeps(sweeper):
+    db, store, sweeper = sweeper
+    db.locks[UploadSessionSweeper.lock_name] = 'another process'
+    assert sweeper.run_once()
+    assert sweeper.stats()['skipped'] == 1
+    assert len(db.query("SELECT id FROM upload_sessions")) == 2
@@ -0,0 +1,121 @@
+import threading
+
+import pytest
+
+connector = pytest.importorskip('mysql.connector')
+
+import db_pool  # noqa: E402
+from db_pool import ConnectionPool, PoolTimeout  # noqa: E402
+
+
+class FakeRaw:
+    def __init__(self):
+        self.in_transaction = False
+        self.rolled_back = 0
+        self.closed = False
+        self.ping_error = None
+
+    def cursor(self, **kwargs):
+        return object()
+
+    def ping(self, reconnect=False):
+        if self.ping_error:
+            raise self.ping_error
+
+    def rollback(self):
+        self.rolled_back += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def connects(monkeypatch):
+    made = []
+
+    def connect(**config):
+        made.append(FakeRaw())
+        return made[-1]
+    monkeypatch.setattr(db_pool.mysql.connector, 'connect', connect)
+    return made
+
+
+def test_connections_are_reused(connects):
+    pool = ConnectionPool({}, size=2)
+    with pool.connection() as conn:
+        first = conn._raw
+    with pool.connection() as conn:
+        assert conn._raw is first
+    assert len(connects) == 1
+    assert pool.stats()['checkouts'] == 2
+    assert pool.stats()['idle'] == 1
+
+
+def test_release_rolls_back_open_transactions(connects):
+    pool = ConnectionPool({}, size=1)
+    conn = pool.acquire()
+    conn._raw.in_transaction = True
+    conn.close()
+    conn.close()  # a second close() must not return it twice
+    assert connects[0].rolled_back == 1
+    assert pool.stats()['idle'] == 1
+
+
+def test_exhausted_pool_times_out(connects):
+    pool = ConnectionPool({}, size=1, wait_timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()['timeouts'] == 1
+    assert pool.stats()['in_use'] == 1
+    held.close()
+
+
+def test_waiters_get_the_released_connection(connects):
+    pool = ConnectionPool({}, size=1, wait_timeout=5)
+    held = pool.acquire()
+    timer = threading.Timer(0.05, held.close)
+    timer.start()
+    with pool.connection() as conn:
+        assert conn._raw is connects[0]
+    timer.join()
+    assert pool.stats()['waits'] == 1
+
+
+def test_stale_and_unhealthy_connections_are_replaced(connects):
+    pool = ConnectionPool({}, size=1, max_idle=300, ping_after=0)
+    with pool.connection():
+        pass
+    connects[0].ping_error = connector.Error('gone away')
+    with pool.connection() as conn:
+        assert conn._raw is connects[1]
+    assert connects[0].closed
+    assert pool.stats()['failed_pings'] == 1
+
+    pool.max_lifetime = -1
+    with pool.connection() as conn:
+        assert conn._raw is connects[2]
+    assert pool.stats()['recycled'] == 1
+
+
+def test_connect_errors_free_the_slot(monkeypatch):
+    def refuse(**config):
+        raise connector.Error('refused')
+    monkeypatch.setattr(db_pool.mysql.connector, 'connect', refuse)
+    pool = ConnectionPool({}, size=1)
+    for _ in range(2):
+        with pytest.raises(connector.Error):
+            pool.acquire()
+    assert pool.stats()['open'] == 0
+    assert pool.stats()['connect_errors'] == 2
+
+
+def test_closed_pool_refuses_checkouts(connects):
+    pool = ConnectionPool({}, size=1)
+    with pool.connection():
+        pass
+    pool.close_all()
+    assert connects[0].closed
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
@@ -0,0 +1,280 @@
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from facets import (FACETS, SPARSE_LIMIT, FacetIndex, _Column, _Posting, facet_key, filter_clause,
+                    parse_filters, sql_counts)
+
+
+class Args(dict):
+    """The getlist() side of request.args"""
+
+    def getlist(self, name):
+        value = self.get(name)
+        return [] if value is None else value if isinstance(value, list) else [value]
+
+
+class FakeCursor:
+    """The catalog as the index's queries see it; `changed` is what the next sync reads as updated"""
+
+    def __init__(self, products):
+        self.products = list(products)
+        self.changed = []
+        self.categories = [1, 2]
+        self.deletes = {}
+        self.lock_held = False
+        self.result = []
+
+    def execute(self, sql, params=None):
+        if 'NOW()' in sql:
+            self.result = [{'now': datetime(2024, 1, 1)}]
+        elif 'catalog_deletes' in sql:
+            self.result = [{'scope': scope, 'deletes': n} for scope, n in self.deletes.items()]
+        elif 'GET_LOCK' in sql:
+            self.result = [{'locked': 0 if self.lock_held else 1}]
+        elif 'RELEASE_LOCK' in sql:
+            self.result = [{'locked': 1}]
+        elif 'BETWEEN' in sql:
+            low, high = params
+            self.result = [{'id': row['id']} for row in self.products if low <= row['id'] <= high]
+        elif 'FROM categories' in sql:
+            self.result = [{'id': category_id} for category_id in self.categories]
+        elif 'updated_at >=' in sql:
+            self.result = list(self.changed)
+        else:
+            self.result = list(self.products)
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+    def __iter__(self):
+        return iter(self.result)
+
+    def close(self):
+        pass
+
+
+def product(id, price, brand=None, color=None, category_id=1, listed=True, **extra):
+    return {'id': id, 'category_id': category_id, 'seller_id': 1, 'featured': False, 'conditions': 'good',
+            'size': None, 'color': color, 'brand': brand, 'price': Decimal(price), 'listed': listed, **extra}
+
+
+CATALOG = [
+    product(1, '80', brand='Nike', color='red'),
+    product(2, '120', brand='NIKE', color='blue'),
+    product(3, '300', brand='Adidas', color='red'),
+    product(4, '600', brand='Puma', color='red', category_id=2),
+    product(5, '99.99', brand='Adidas', color='blue', listed=False),
+]
+
+
+def unloaded(products=CATALOG, **kwargs):
+    cursor = FakeCursor(products)
+
+    @contextmanager
+    def connection_factory():
+        yield type('Conn', (), {'cursor': lambda self, dictionary=False: cursor})()
+    return FacetIndex(connection_factory, interval=0, **kwargs), cursor
+
+
+def loaded(products=CATALOG, **kwargs):
+    index, cursor = unloaded(products, **kwargs)
+    assert index.run_once()
+    return index, cursor
+
+
+SCHEMA = """
+CREATE TABLE sellers (id INTEGER PRIMARY KEY, status TEXT);
+CREATE TABLE products (id INTEGER PRIMARY KEY, category_id INT, seller_id INT, featured BOOLEAN, is_active BOOLEAN,
+                       conditions TEXT, size TEXT, color TEXT COLLATE NOCASE, brand TEXT COLLATE NOCASE, price REAL);
+INSERT INTO sellers (id, status) VALUES (1, 'approved');
+"""
+
+
+def counts(result, name):
+    return {entry['value']: entry['count'] for entry in result['facets'][name]}
+
+
+def test_query_is_none_until_loaded():
+    assert FacetIndex(None).query({}) is None
+
+
+def test_counts_cover_listed_products_only():
+    index, _ = loaded()
+    result = index.query({})
+    assert result['total'] == 4
+    assert counts(result, 'brand') == {'Nike': 2, 'Adidas': 1, 'Puma': 1}
+
+
+def test_values_match_case_insensitively_in_the_first_spelling():
+    index, _ = loaded()
+    result = index.query({'brand': ['nike ']})
+    assert result['total'] == 2
+    assert counts(result, 'brand')['Nike'] == 2
+    assert facet_key('NIKE ') == facet_key('nike')
+
+
+def test_counts_are_disjunctive():
+    index, _ = loaded()
+    result = index.query({'brand': ['Nike'], 'color': ['red']})
+    assert result['total'] == 1
+    # Each facet ignores its own filter: brand counts among red, color counts among Nike
+    assert counts(result, 'brand') == {'Nike': 1, 'Adidas': 1, 'Puma': 1}
+    assert counts(result, 'color') == {'red': 1, 'blue': 1}
+
+
+def test_selected_values_are_reported_even_without_matches():
+    index, _ = loaded()
+    assert counts(index.query({'brand': ['Gucci']}), 'brand')['Gucci'] == 0
+
+
+def test_scope_and_search_restrict_the_base():
+    index, _ = loaded()
+    assert index.query({}, scope={'category_id': 2})['total'] == 1
+    assert index.query({}, scope={'category_id': 99})['total'] == 0
+    assert index.query({}, product_ids=[1, 3, 42])['total'] == 2
+
+
+def test_price_filters_are_exact_at_bucket_edges():
+    index, _ = loaded()
+    assert index.query({'min_price': Decimal('80'), 'max_price': Decimal('120')})['total'] == 2
+    assert index.query({'min_price': Decimal('80.01'), 'max_price': Decimal('119.99')})['total'] == 0
+    result = index.query({'max_price': Decimal('300')})
+    assert result['total'] == 3
+    # The price facet ignores the price filter
+    assert {entry['value']: entry['count'] for entry in result['facets']['price']}['500-1000'] == 1
+
+
+def test_apply_and_remove_keep_the_index_current():
+    index, _ = loaded()
+    version = index.version
+    index.apply([product(4, '600', brand='Puma', color='red', category_id=2, listed=False),
+                 product(6, '50', brand='Reebok')])
+    index.remove([1])
+    result = index.query({})
+    assert index.version > version
+    assert result['total'] == 3
+    assert counts(result, 'brand') == {'Nike': 1, 'Adidas': 1, 'Reebok': 1}
+
+
+def test_sync_applies_changed_rows():
+    index, cursor = loaded()
+    cursor.changed = [product(1, '80', brand='Puma', color='red')]
+    assert index.run_once()
+    assert counts(index.query({}), 'brand') == {'Nike': 1, 'Adidas': 1, 'Puma': 2}
+    assert index.rebuilds == 1
+
+
+def test_sync_clears_deleted_products_without_a_rebuild():
+    index, cursor = loaded()
+    cursor.products, cursor.deletes = CATALOG[:2], {'products': 3}
+    assert index.run_once()
+    assert index.rebuilds == 1
+    assert index.stats()['products'] == 2
+    result = index.query({})
+    assert result['total'] == 2
+    assert counts(result, 'brand') == {'Nike': 2}
+
+    # A new product takes a freed slot
+    cursor.changed = [product(6, '50', brand='Reebok')]
+    assert index.run_once()
+    assert len(index._prices) == len(CATALOG)
+    assert counts(index.query({}), 'brand') == {'Nike': 2, 'Reebok': 1}
+
+
+def test_sync_drops_deleted_categories():
+    index, cursor = loaded()
+    cursor.categories, cursor.deletes = [1], {'categories': 1}
+    assert index.run_once()
+    assert index.query({}, scope={'category_id': 2})['total'] == 0
+    assert index.query({})['total'] == 4
+    assert index.rebuilds == 1
+
+
+def test_one_process_loads_at_a_time():
+    index, cursor = unloaded()
+    cursor.lock_held = True
+    assert index.run_once()
+    assert index.query({}) is None
+    assert index.stats()['skipped'] == 1
+
+    cursor.lock_held = False
+    assert index.run_once()
+    assert index.rebuilds == 1
+
+
+def test_a_due_rebuild_syncs_while_another_process_loads():
+    index, cursor = loaded(rebuild_interval=0)
+    cursor.lock_held = True
+    cursor.changed = [product(6, '50', brand='Reebok')]
+    assert index.run_once()
+    assert index.rebuilds == 1
+    assert index.stats()['skipped'] == 1
+    assert counts(index.query({}), 'brand')['Reebok'] == 1
+
+
+def test_posting_switches_to_a_bitmap_and_back_down():
+    posting = _Posting(range(SPARSE_LIMIT))
+    assert posting.slots is not None
+    posting.add(SPARSE_LIMIT)
+    assert posting.slots is None and posting.size == SPARSE_LIMIT + 1
+    posting.discard(0)
+    posting.discard(0)
+    assert posting.size == SPARSE_LIMIT
+    assert posting.as_bits().bit_count() == SPARSE_LIMIT
+
+
+def test_column_codes_widen_past_65535_values():
+    column = _Column()
+    for value in range(70000):
+        column.append(value)
+    assert column.codes.typecode == 'I'
+    assert column[0] == 0 and column[69999] == 69999
+    column.set(0, None)
+    assert column[0] is None
+
+
+def test_parse_filters():
+    filters = parse_filters(Args({'min_price': ' 10 ', 'brand': ['Nike,nike', 'Adidas'], 'color[]': ['red']}))
+    assert filters == {'min_price': Decimal('10'), 'brand': ['Adidas', 'nike'], 'color': ['red']}
+
+
+@pytest.mark.parametrize('raw', ['abc', '-1', 'NaN', 'Infinity'])
+def test_parse_filters_rejects_bad_prices(raw):
+    with pytest.raises(ValueError):
+        parse_filters(Args({'max_price': raw}))
+
+
+def test_filter_clause():
+    sql, params = filter_clause({'min_price': Decimal('10'), 'brand': ['Nike', 'Adidas']})
+    assert sql == ' AND p.price >= %s AND p.brand IN (%s, %s)'
+    assert params == [Decimal('10'), 'Nike', 'Adidas']
+
+
+def keyed(result):
+    """A query() result with facet values as facet_key(): MySQL reports whichever spelling it grouped on"""
+    facets = {name: [(facet_key(entry['value']), entry['count']) for entry in result['facets'][name]]
+              for name in FACETS}
+    return {'total': result['total'], 'facets': facets, 'price': result['facets']['price']}
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'brand': ['nike']},
+    {'brand': ['Gucci', 'Puma'], 'color': ['red']},
+    {'min_price': 100, 'color': ['blue', 'red']},
+])
+def test_sql_counts_match_the_index(sqlite_connection, filters):
+    db = sqlite_connection(SCHEMA)
+    for row in CATALOG:
+        db.query("INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                 (row['id'], row['category_id'], row['seller_id'], row['featured'], row['listed'], row['conditions'],
+                  row['size'], row['color'], row['brand'], float(row['price'])))
+    index, _ = loaded()
+    where = " WHERE p.is_active = TRUE AND s.status = 'approved'"
+    assert keyed(sql_counts(db.cursor(dictionary=True), where, [], filters)) == keyed(index.query(filters))
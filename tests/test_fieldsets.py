@@ -0,0 +1,41 @@
+import pytest
+
+from fieldsets import Fieldset
+
+PRODUCTS = Fieldset({'id': 'p.id', 'name': 'p.name', 'price': 'p.price', 'images': None},
+                    default=('id', 'name', 'price'))
+
+
+@pytest.mark.parametrize('raw', [None, '', ' , '])
+def test_parse_defaults_without_fields(raw):
+    assert PRODUCTS.parse(raw) == ('id', 'name', 'price')
+
+
+def test_parse_returns_whitelist_order_without_duplicates():
+    assert PRODUCTS.parse(' price,id ,price') == ('id', 'price')
+
+
+def test_parse_all():
+    assert PRODUCTS.parse('all') == ('id', 'name', 'price', 'images')
+
+
+def test_parse_rejects_unknown_fields():
+    with pytest.raises(ValueError, match='password_hash, secret'):
+        PRODUCTS.parse('id,secret,password_hash')
+    with pytest.raises(ValueError):
+        PRODUCTS.parse('all,id')
+
+
+def test_default_must_be_whitelisted():
+    with pytest.raises(ValueError):
+        Fieldset({'id': 'p.id'}, default=('id', 'name'))
+    assert Fieldset({'id': 'p.id', 'name': 'p.name'}).default == ('id', 'name')
+
+
+def test_select_adds_extra_columns_once_and_skips_fields_without_sql():
+    assert PRODUCTS.select(('name', 'images'), extra=('id', 'name')) == 'p.name AS name, p.id AS id'
+
+
+def test_project_drops_columns_selected_for_paging():
+    rows = [{'id': 1, 'name': 'Jacket', 'created_at': '2024-01-01'}]
+    assert Fieldset.project(rows, ('name', 'images')) == [{'name': 'Jacket'}]
@@ -0,0 +1,113 @@
+from contextlib import contextmanager
+
+from http_validators import CatalogWatermark, live_epoch, validators
+
+NOW = 1_700_000_100.5
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, sql, params=None):
+        self.queries.append(sql)
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.cursors = []
+        self.rows = rows
+
+    def cursor(self, dictionary=False):
+        cursor = FakeCursor(self.rows)
+        self.cursors.append(cursor)
+        return cursor
+
+
+def watermark(rows, **kwargs):
+    conn = FakeConnection(rows)
+
+    @contextmanager
+    def connection_factory():
+        yield conn
+    return CatalogWatermark(connection_factory, **kwargs), conn
+
+
+def scope_rows(products=1_700_000_000, deleted=None, deletes=0):
+    rows = [{'scope': scope, 'modified': modified, 'n': 0} for scope, modified in (
+        ('products', products), ('sellers', 1_600_000_000), ('categories', None),
+        ('product_documents', 1_650_000_000), ('now', NOW))]
+    if deleted is not None:
+        rows.append({'scope': 'deleted:products', 'modified': deleted, 'n': deletes})
+    return rows
+
+
+def test_validators_change_with_any_stamp():
+    stamps = {'products': (1_700_000_000.0, 0), 'sellers': (None, 0)}
+    etag, last_modified = validators(stamps, NOW, 'listing')
+    assert last_modified.timestamp() == 1_700_000_000
+    assert validators(stamps, NOW, 'listing')[0] == etag
+    assert validators({**stamps, 'products': (1_700_000_000.0, 1)}, NOW, 'listing')[0] != etag
+    assert validators(stamps, NOW, 'detail')[0] != etag
+
+
+def test_validators_include_read_time_for_changes_in_the_current_second():
+    stamps = {'products': (NOW - 0.2, 0)}
+    assert validators(stamps, NOW)[0] != validators(stamps, NOW + 0.3)[0]
+    settled = {'products': (NOW - 5, 0)}
+    assert validators(settled, NOW)[0] == validators(settled, NOW + 0.3)[0]
+
+
+def test_validators_without_any_stamp_have_no_last_modified():
+    assert validators({'categories': (None, 0)}, NOW)[1] is None
+
+
+def test_live_epoch_buckets_by_max_age():
+    assert live_epoch(119.9, 60) == live_epoch(60, 60) == 'live:1'
+    assert live_epoch(120, 60) == 'live:2'
+    assert live_epoch(NOW, 0) == f'live:{NOW}'
+
+
+def test_watermark_folds_deletes_into_their_scope():
+    catalog, _ = watermark(scope_rows(deleted=1_700_000_050, deletes=3))
+    marks = catalog.current()
+    assert marks['products'] == (1_700_000_050.0, 3)
+    assert marks['sellers'] == (1_600_000_000.0, 0)
+    assert marks['categories'] == (None, 0)
+
+
+def test_watermark_keeps_newer_edit_over_older_delete():
+    catalog, _ = watermark(scope_rows(products=1_700_000_000, deleted=1_600_000_000, deletes=1))
+    assert catalog.current()['products'] == (1_700_000_000.0, 1)
+
+
+def test_a_delete_changes_the_etag():
+    before, _ = watermark(scope_rows())
+    after, _ = watermark(scope_rows(deleted=1_500_000_000, deletes=1))
+    assert before.validators(['products'], 'listing')[0] != after.validators(['products'], 'listing')[0]
+
+
+def test_watermark_is_cached_until_invalidated():
+    catalog, conn = watermark(scope_rows(), ttl=60)
+    catalog.current()
+    catalog.current()
+    assert len(conn.cursors) == 1
+    catalog.invalidate()
+    catalog.current()
+    assert len(conn.cursors) == 2
+    assert catalog.stats()['hits'] == 1
+
+
+def test_live_max_age_adds_the_epoch_to_the_etag():
+    catalog, _ = watermark(scope_rows(), ttl=60)
+    plain = catalog.validators(['products'], 'listing')
+    live = catalog.validators(['products'], 'listing', live_max_age=60)
+    assert live[0] != plain[0]
+    assert live[1] == plain[1]
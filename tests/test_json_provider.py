@@ -0,0 +1,79 @@
+import json
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+flask = pytest.importorskip('flask')
+pytest.importorskip('orjson')
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from json_provider import FastJSONProvider  # noqa: E402
+
+ROW = {
+    'price': Decimal('149.99'),
+    'created_at': datetime(2024, 3, 5, 10, 0, 7),
+    'updated_at': datetime(2024, 3, 5, 12, 0, tzinfo=timezone(timedelta(hours=2))),
+    'birthday': date(1990, 1, 2),
+    'token': uuid.UUID(int=1),
+    'name': 'Takkies – size 8',
+    'tags': ['vintage', None, True, 1.5],
+}
+
+
+@pytest.fixture
+def app():
+    app = flask.Flask(__name__)
+    app.json = FastJSONProvider(app)
+    return app
+
+
+def test_output_matches_flasks_encoder(app):
+    expected = json.loads(DefaultJSONProvider(app).dumps(ROW))
+    assert json.loads(app.json.dumps(ROW)) == expected
+    assert expected['created_at'] == 'Tue, 05 Mar 2024 10:00:07 GMT'
+    assert expected['updated_at'] == 'Tue, 05 Mar 2024 10:00:00 GMT'
+
+
+def test_time_columns_are_strings(app):
+    assert json.loads(app.json.dumps([time(8, 30), timedelta(hours=1, minutes=5)])) == ['08:30:00', '1:05:00']
+
+
+def test_keys_are_sorted(app):
+    assert app.json.dumps({'b': 1, 'a': 2, 3: 'c'}) == '{"3":"c","a":2,"b":1}'
+
+
+def test_iso_datetimes(app):
+    app.json.datetime_format = 'iso'
+    assert json.loads(app.json.dumps({'at': datetime(2024, 3, 5, 10, 0, 7), 'price': Decimal('1.50')})) == {
+        'at': '2024-03-05T10:00:07', 'price': '1.50'}
+
+
+def test_bytes_are_text_or_base64(app):
+    assert json.loads(app.json.dumps([b'caf\xc3\xa9', b'\xff\x00'])) == ['café', '/wA=']
+
+
+def test_unknown_types_raise(app):
+    with pytest.raises(TypeError):
+        app.json.dumps({'value': object()})
+
+
+def test_keyword_arguments_fall_back_to_the_json_module(app):
+    assert app.json.dumps({'b': 1, 'a': Decimal('2')}, indent=1) == '{\n "a": "2",\n "b": 1\n}'
+
+
+def test_jsonify_response(app):
+    with app.app_context():
+        response = flask.jsonify(products=[ROW])
+    assert response.mimetype == 'application/json'
+    assert response.get_json()['products'][0]['price'] == '149.99'
+
+
+def test_stream_matches_a_single_encode(app):
+    app.json.stream_batch = 2
+    items = [{'id': i, 'price': Decimal(i)} for i in range(5)]
+    body = b''.join(app.json.stream('products', iter(items), count=5, next_cursor=None))
+    assert json.loads(body) == json.loads(app.json.dumps({'products': items, 'count': 5, 'next_cursor': None}))
+    assert json.loads(b''.join(app.json.stream('products', []))) == {'products': []}
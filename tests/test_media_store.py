@@ -0,0 +1,26 @@
+import pytest
+
+from media_store import MediaGarbageCollector, MediaStore
+
+
+@pytest.fixture
+def collector(sqlite_connection, tmp_path):
+    db = sqlite_connection("CREATE TABLE media_blobs (url TEXT PRIMARY KEY, ref_count INT);")
+    return db, MediaGarbageCollector(db.factory(), MediaStore(str(tmp_path)), interval=0)
+
+
+def test_collector_skips_while_another_process_collects(collector):
+    db, gc = collector
+    db.locks[MediaGarbageCollector.lock_name] = 'another process'
+    assert gc.run_once()
+    assert gc.stats()['skipped'] == 1
+    assert gc.stats()['runs'] == 0
+    assert db.locks == {MediaGarbageCollector.lock_name: 'another process'}
+
+
+def test_collector_releases_its_lock_when_a_run_fails(collector):
+    db, gc = collector
+    # No product_media table: the recount fails
+    assert not gc.run_once()
+    assert gc.stats()['failures'] == 1
+    assert db.locks == {}
@@ -0,0 +1,85 @@
+import logging
+
+import pytest
+
+from metrics import Counter, Histogram, Metrics, gauge_lines, statement_kind, statement_table
+
+
+class FakeCursor:
+    rowcount = 3
+
+    def execute(self, operation, params=None):
+        return 'done'
+
+    def fetchall(self):
+        return [1, 2, 3]
+
+
+@pytest.mark.parametrize('sql, kind, table', [
+    ('  select * FROM `products` p JOIN sellers s', 'select', 'products'),
+    ('INSERT INTO orders (id) VALUES (1)', 'insert', 'orders'),
+    ('UPDATE Products SET x = 1', 'update', 'products'),
+    ('', 'unknown', 'unknown'),
+])
+def test_statement_kind_and_table(sql, kind, table):
+    assert statement_kind(sql) == kind
+    assert statement_table(sql) == table
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram('latency', 'Latency', ('route',), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, '/api/products')
+    assert histogram.render()[2:] == [
+        'latency_bucket{route="/api/products",le="0.1"} 2',
+        'latency_bucket{route="/api/products",le="1"} 3',
+        'latency_bucket{route="/api/products",le="+Inf"} 4',
+        'latency_sum{route="/api/products"} 3.65',
+        'latency_count{route="/api/products"} 4',
+    ]
+
+
+def test_counter_escapes_label_values():
+    counter = Counter('errors_total', 'Errors', ('message',))
+    counter.inc('say "hi"\n', amount=2)
+    assert counter.render()[-1] == 'errors_total{message="say \\"hi\\"\\n"} 2'
+
+
+def test_requests_count_their_queries():
+    metrics = Metrics(query_sample_rate=0, slow_query_threshold=0)
+    cursor = metrics.instrument(FakeCursor())
+    metrics.begin_request('/api/products')
+    assert cursor.execute('SELECT 1') == 'done'
+    cursor.execute('SELECT 2')
+    assert cursor.fetchall() == [1, 2, 3]
+    duration, queries, db_time = metrics.end_request('GET', 200)
+    assert queries == 2
+    assert 0 <= db_time <= duration
+    assert metrics.end_request('GET', 200) is None
+
+    text = metrics.render()
+    assert 'thriftshop_db_query_rows_total{kind="select"} 6' in text
+    assert 'thriftshop_http_request_db_queries_count{route="/api/products"} 1' in text
+
+
+def test_sampled_queries_are_broken_down_by_route_and_table():
+    metrics = Metrics(query_sample_rate=1, slow_query_threshold=0)
+    metrics.observe_query('UPDATE products SET x = 1', 0.001, 2)
+    assert ('thriftshop_db_query_sampled_rows_count{route="background",kind="update",table="products"} 1'
+            in metrics.render())
+
+
+def test_slow_queries_are_logged_without_parameters(caplog):
+    metrics = Metrics(query_sample_rate=0, slow_query_threshold=0.1)
+    with caplog.at_level(logging.WARNING, logger='thriftshop.slow_query'):
+        metrics.observe_query('SELECT *\n  FROM users WHERE email = %s', 0.5, 1)
+        metrics.observe_query('SELECT 1', 0.01, 1)
+    assert [record.getMessage() for record in caplog.records] == [
+        'Slow query 500.0ms rows=1 route=background: SELECT * FROM users WHERE email = %s']
+    assert 'thriftshop_db_slow_queries_total{route="background",kind="select"} 1' in metrics.render()
+
+
+def test_collectors_add_their_lines():
+    metrics = Metrics()
+    metrics.register_collector(lambda: gauge_lines('pool_open', 'Open connections', [({'pool': 'main'}, 4.0)]))
+    assert metrics.render().endswith('pool_open{pool="main"} 4\n')
@@ -0,0 +1,59 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from pagination import InvalidCursor, Keyset, decode_cursor, encode_cursor, page_limit
+
+
+def test_cursor_round_trips_datetimes_and_decimals():
+    values = [Decimal('199.90'), datetime(2024, 5, 1, 12, 30, 5), 42]
+    token = encode_cursor(values)
+    assert '=' not in token
+    assert decode_cursor(token, 3) == values
+
+
+@pytest.mark.parametrize('token', ['not base64!', encode_cursor([1]) + 'x', 'W3siZHQiOiAibm9wZSJ9XQ'])
+def test_malformed_cursors_are_rejected(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, 1)
+
+
+def test_cursor_from_another_listing_is_rejected():
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor([1, 2]), 3)
+
+
+def test_unknown_cursor_values_are_rejected():
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor([{'x': 1}]), 1)
+
+
+@pytest.mark.parametrize('raw, expected', [(None, 50), ('', 50), ('10', 10), ('0', 1), ('500', 100), ('ten', 50)])
+def test_page_limit_is_clamped(raw, expected):
+    assert page_limit(raw, 50, 100) == expected
+
+
+def test_keyset_continues_strictly_after_the_cursor():
+    keyset = Keyset(('p.created_at', 'created_at'), ('p.id', 'id'))
+    created = datetime(2024, 1, 1)
+    sql, params = keyset.after(encode_cursor([created, 7]))
+    assert sql == ' AND ((p.created_at < %s) OR (p.created_at = %s AND p.id < %s))'
+    assert params == [created, created, 7]
+    assert keyset.after(None) == ('', [])
+
+
+def test_keyset_passes_expression_params_through():
+    keyset = Keyset(('MATCH(p.name) AGAINST (%s)', 'rank', ['q']), ('p.id', 'id'))
+    assert keyset.order_by() == (' ORDER BY MATCH(p.name) AGAINST (%s) DESC, p.id DESC', ['q'])
+    sql, params = keyset.after(encode_cursor([1.5, 9]))
+    assert params == ['q', 1.5, 'q', 1.5, 9]
+
+
+def test_page_builds_next_cursor_only_when_more_rows_exist():
+    keyset = Keyset(('p.id', 'id'))
+    rows = [{'id': 5}, {'id': 4}, {'id': 3}]
+    page, next_cursor = keyset.page(rows, 2)
+    assert page == rows[:2]
+    assert decode_cursor(next_cursor, 1) == [4]
+    assert keyset.page(rows, 3) == (rows, None)
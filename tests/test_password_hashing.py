@@ -0,0 +1,81 @@
+from concurrent.futures import Future
+
+import pytest
+
+from password_hashing import HasherBusy, PasswordHasher, hash_cost
+
+
+class StalledExecutor:
+    """Accepts work and never runs it, like a pool whose workers are all busy"""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        self.futures.append(Future())
+        return self.futures[-1]
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+@pytest.fixture
+def stalled():
+    hasher = PasswordHasher(rounds=4, max_workers=1, max_queue=1, timeout=0.01, retry_after=3)
+    hasher._executor = StalledExecutor()
+    return hasher
+
+
+@pytest.mark.parametrize('password_hash, cost', [
+    ('$2b$12$' + 'a' * 53, 12),
+    ('$2a$04$' + 'a' * 53, 4),
+    ('$argon2id$v=19$m=65536', None),
+    ('', None),
+    (None, None),
+])
+def test_hash_cost(password_hash, cost):
+    assert hash_cost(password_hash) == cost
+
+
+def test_needs_rehash_when_the_cost_differs():
+    hasher = PasswordHasher(rounds=12)
+    assert not hasher.needs_rehash('$2b$12$' + 'a' * 53)
+    assert hasher.needs_rehash('$2b$10$' + 'a' * 53)
+    assert hasher.needs_rehash('plaintext')
+
+
+def test_a_stalled_operation_times_out_as_busy(stalled):
+    with pytest.raises(HasherBusy) as raised:
+        stalled.verify('secret', '$2b$04$' + 'a' * 53)
+    assert raised.value.retry_after == 3
+    assert stalled.stats()['timeouts'] == 1
+    assert stalled._executor.futures[0].cancelled()
+
+
+def test_work_beyond_the_queue_is_rejected_at_once(stalled):
+    stored = []
+    assert stalled.rehash_later('one', stored.append)
+    assert stalled.rehash_later('two', stored.append)
+    assert not stalled.rehash_later('three', stored.append)
+    with pytest.raises(HasherBusy):
+        stalled.hash('four')
+    assert stalled.stats()['rejected'] == 2
+    assert stalled.stats()['in_flight'] == 2
+
+    stalled._executor.futures[0].set_result('$2b$04$hash')
+    assert stalled.stats()['in_flight'] == 1
+    assert stalled.stats()['rehashed'] == 1
+    assert stored == ['$2b$04$hash']
+
+
+def test_hash_and_verify_in_worker_processes():
+    pytest.importorskip('bcrypt')
+    hasher = PasswordHasher(rounds=4, max_workers=1, timeout=30)
+    try:
+        password_hash = hasher.hash('correct horse')
+        assert hash_cost(password_hash) == 4
+        assert hasher.verify('correct horse', password_hash)
+        assert not hasher.verify('wrong', password_hash)
+        assert not hasher.verify('correct horse', 'not a hash')
+    finally:
+        hasher.shutdown(wait=True)
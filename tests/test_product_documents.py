@@ -0,0 +1,127 @@
+import json
+
+import pytest
+
+import product_documents
+from product_documents import NO_IMAGE, DocumentRefresher, build_document, merge, rebuild_stale, stale_ids
+
+SCHEMA = """
+CREATE TABLE categories (id INTEGER PRIMARY KEY, name TEXT, updated_at TEXT DEFAULT (datetime('now', '-1 hour')));
+CREATE TABLE sellers (id INTEGER PRIMARY KEY, business_name TEXT, rating REAL,
+                      updated_at TEXT DEFAULT (datetime('now', '-1 hour')));
+CREATE TABLE products (id INTEGER PRIMARY KEY, seller_id INT, category_id INT, name TEXT, price REAL, images TEXT,
+                       videos TEXT, stock_quantity INT DEFAULT 1, view_count INT DEFAULT 0,
+                       updated_at TEXT DEFAULT (datetime('now', '-1 hour')));
+CREATE TABLE product_media (id INTEGER PRIMARY KEY, product_id INT, media_type TEXT, file_url TEXT, alt_text TEXT,
+                            caption TEXT, sort_order INT DEFAULT 0, is_primary BOOLEAN DEFAULT FALSE, variants TEXT,
+                            is_approved BOOLEAN DEFAULT TRUE, created_at TEXT);
+CREATE TABLE product_documents (product_id INTEGER PRIMARY KEY, document TEXT, summary TEXT, built_at TEXT);
+INSERT INTO categories (id, name) VALUES (1, 'Jackets'), (2, 'Shoes');
+INSERT INTO sellers (id, business_name, rating) VALUES (1, 'Vintage Vibes', 4.5), (2, 'Sole Mates', 4.0);
+INSERT INTO products (id, seller_id, category_id, name, price, images) VALUES
+    (1, 1, 1, 'Denim jacket', 250, '["denim.jpg"]'),
+    (2, 2, 2, 'Sneakers', 400, NULL),
+    (3, 2, 1, 'Bomber', 300, NULL);
+INSERT INTO product_media (id, product_id, media_type, file_url, variants) VALUES
+    (7, 2, 'image', '/static/uploads/images/ab/sneakers.jpg', '{"320": {"width": 320, "webp": "/s-320.webp"}}');
+"""
+
+
+def dumps(document):
+    return json.dumps(document, default=str)
+
+
+@pytest.fixture
+def db(sqlite_connection):
+    return sqlite_connection(SCHEMA)
+
+
+def stored(db):
+    return {product_id: json.loads(document)
+            for product_id, document in db.query("SELECT product_id, document FROM product_documents")}
+
+
+def test_build_document_resolves_media_urls():
+    row = {'id': 1, 'name': 'Denim jacket', 'images': '["a.jpg", "/static/uploads/images/b.jpg"]',
+           'videos': 'not json', 'stock_quantity': 3}
+    document = build_document(row, [])
+    assert document['images'] == ['/static/uploads/images/a.jpg', '/static/uploads/images/b.jpg']
+    assert document['videos'] == []
+    assert 'stock_quantity' not in document
+    assert build_document({'id': 2, 'images': None}, [])['images'] == [NO_IMAGE]
+
+
+def test_refresh_stores_documents_with_names_and_media(db):
+    documents = product_documents.refresh(db.cursor(dictionary=True), dumps, seller_ids=[2])
+    assert sorted(documents) == [2, 3]
+    sneakers = stored(db)[2]
+    assert (sneakers['category_name'], sneakers['seller_name']) == ('Shoes', 'Sole Mates')
+    assert sneakers['images'] == ['/static/uploads/images/ab/sneakers.jpg']
+    assert sneakers['image_sources'][0]['srcset'] == {'webp': '/s-320.webp 320w'}
+    assert [item['id'] for item in sneakers['media']] == [7]
+    summary, = db.query("SELECT summary FROM product_documents WHERE product_id = 2")[0]
+    assert set(json.loads(summary)) <= set(product_documents.SUMMARY_FIELDS)
+
+
+def test_merge_overlays_live_fields_and_builds_missing_documents(db):
+    cursor = db.cursor(dictionary=True)
+    product_documents.refresh(cursor, dumps, [1])
+    cursor.execute("""SELECT p.id, p.stock_quantity, p.view_count, d.document
+                      FROM products p LEFT JOIN product_documents d ON d.product_id = p.id
+                      WHERE p.id IN (1, 2) ORDER BY p.id""")
+    products, built = merge(cursor, cursor.fetchall(), dumps)
+    assert built == 1
+    assert [(p['name'], p['stock_quantity'], p['view_count']) for p in products] == [('Denim jacket', 1, 0),
+                                                                                      ('Sneakers', 1, 0)]
+
+
+def test_stale_ids_finds_documents_older_than_their_rows(db):
+    cursor = db.cursor(dictionary=True)
+    assert stale_ids(cursor) == [1, 2, 3]
+    product_documents.refresh(cursor, dumps, [1, 2, 3])
+    assert stale_ids(cursor) == []
+
+    db.query("UPDATE sellers SET updated_at = datetime('now', '+1 minute') WHERE id = 1")
+    db.query("UPDATE categories SET updated_at = datetime('now', '+1 minute') WHERE id = 2")
+    assert stale_ids(cursor) == [1, 2]
+    assert stale_ids(cursor, since='2000-01-01 00:00:00') == [1, 2]
+    assert stale_ids(cursor, since='2999-01-01 00:00:00') == []
+
+
+def test_documents_marked_for_rebuild_are_stale_since_any_watermark(db):
+    cursor = db.cursor(dictionary=True)
+    product_documents.refresh(cursor, dumps, [1, 2, 3])
+    db.query("UPDATE product_documents SET built_at = '1970-01-01 00:00:01' WHERE product_id = 3")
+    assert stale_ids(cursor, since='2999-01-01 00:00:00') == [3]
+
+
+def test_rebuild_stale_commits_batches_and_reports_scopes(db):
+    rebuilt, touched, swept_at = rebuild_stale(db, dumps, limit=2)
+    assert rebuilt == 3
+    assert db.commits == 2
+    assert touched == {'category_ids': {1, 2}, 'seller_ids': {1, 2}}
+    assert rebuild_stale(db, dumps, since=swept_at)[0] == 0
+
+
+def test_refresher_sweeps_from_its_last_watermark(db):
+    calls = []
+    refresher = DocumentRefresher(db.factory(), dumps, interval=0,
+                                  on_rebuilt=lambda categories, sellers: calls.append((categories, sellers)))
+    assert refresher.run_once()
+    assert refresher.stats()['rebuilt'] == 3
+    assert calls == [({1, 2}, {1, 2})]
+    assert refresher.stats()['since'] is not None
+
+    db.query("UPDATE products SET updated_at = datetime('now', '+1 minute') WHERE id = 3")
+    assert refresher.run_once()
+    assert refresher.stats()['rebuilt'] == 4
+    assert calls[-1] == ({1}, {2})
+    assert db.locks == {}
+
+
+def test_refresher_skips_while_another_process_sweeps(db):
+    db.locks[DocumentRefresher.lock_name] = 'another process'
+    refresher = DocumentRefresher(db.factory(), dumps, interval=0)
+    assert refresher.run_once()
+    assert refresher.stats()['skipped'] == 1
+    assert stored(db) == {}
@@ -0,0 +1,122 @@
+import pytest
+
+import reservations
+from reservations import ReservationSweeper
+
+SCHEMA = """
+CREATE TABLE products (id INTEGER PRIMARY KEY, stock_quantity INT, reserved_quantity INT DEFAULT 0,
+                       is_active BOOLEAN DEFAULT TRUE, updated_at TEXT DEFAULT '2024-01-01',
+                       category_id INT DEFAULT 7, seller_id INT DEFAULT 8);
+CREATE TABLE stock_reservations (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INT, product_id INT,
+                                 quantity INT CHECK (quantity > 0), expires_at TEXT,
+                                 UNIQUE (user_id, product_id));
+INSERT INTO products (id, stock_quantity) VALUES (1, 5);
+INSERT INTO products (id, stock_quantity, category_id, seller_id) VALUES (2, 2, 17, 18);
+INSERT INTO products (id, stock_quantity, is_active) VALUES (3, 5, FALSE);
+"""
+
+
+@pytest.fixture
+def db(sqlite_connection):
+    return sqlite_connection(SCHEMA)
+
+
+def reserved(db):
+    return {product_id: n for product_id, n in db.query("SELECT id, reserved_quantity FROM products")}
+
+
+def holds(db):
+    return {(user_id, product_id): n
+            for user_id, product_id, n in db.query("SELECT user_id, product_id, quantity FROM stock_reservations")}
+
+
+def test_reserve_holds_stock(db):
+    cursor = db.cursor(dictionary=True)
+    assert reservations.reserve(cursor, 10, 1, 2, ttl=900)
+    assert reservations.reserve(cursor, 11, 1, 3, ttl=900)
+    assert reserved(db)[1] == 5
+    assert holds(db) == {(10, 1): 2, (11, 1): 3}
+
+
+def test_reserve_sets_the_users_hold_to_the_new_quantity(db):
+    cursor = db.cursor(dictionary=True)
+    assert reservations.reserve(cursor, 10, 1, 2, ttl=900)
+    assert reservations.reserve(cursor, 10, 1, 4, ttl=900)
+    assert reserved(db)[1] == 4
+    assert reservations.reserve(cursor, 10, 1, 1, ttl=900)
+    assert reserved(db)[1] == 1
+    assert holds(db) == {(10, 1): 1}
+
+
+def test_reserve_refuses_what_is_not_available(db):
+    cursor = db.cursor(dictionary=True)
+    assert reservations.reserve(cursor, 10, 2, 2, ttl=900)
+    assert not reservations.reserve(cursor, 11, 2, 1, ttl=900)
+    assert not reservations.reserve(cursor, 10, 3, 1, ttl=900)  # inactive product
+    assert reserved(db) == {1: 0, 2: 2, 3: 0}
+
+
+def test_release_gives_the_quantity_back(db):
+    cursor = db.cursor(dictionary=True)
+    for product_id in (1, 2):
+        assert reservations.reserve(cursor, 10, product_id, 2, ttl=900)
+    assert reservations.reserve(cursor, 11, 1, 1, ttl=900)
+
+    assert reservations.release(cursor, 10, 1) == ([7], [8])
+    assert reserved(db) == {1: 1, 2: 2, 3: 0}
+    assert reservations.release(cursor, 10) == ([17], [18])
+    assert reserved(db) == {1: 1, 2: 0, 3: 0}
+    assert holds(db) == {(11, 1): 1}
+    assert reservations.release(cursor, 10) == ([], [])
+
+
+def test_sweep_removes_only_expired_holds(db):
+    cursor = db.cursor(dictionary=True)
+    assert reservations.reserve(cursor, 10, 1, 2, ttl=-60)
+    assert reservations.reserve(cursor, 11, 1, 1, ttl=900)
+    assert reservations.reserve(cursor, 12, 2, 2, ttl=-60)
+    db.commit()
+
+    assert reservations.sweep(db, batch_size=1) == 2
+    assert reserved(db) == {1: 1, 2: 0, 3: 0}
+    assert holds(db) == {(11, 1): 1}
+
+
+def test_sweeper_counts_what_it_released(db):
+    assert reservations.reserve(db.cursor(dictionary=True), 10, 1, 2, ttl=-60)
+    db.commit()
+    sweeper = ReservationSweeper(db.factory(), interval=0)
+    assert sweeper.run_once()
+    assert sweeper.stats()['expired'] == 1
+    assert reserved(db)[1] == 0
+
+
+def test_sweeper_reports_the_products_it_released(db):
+    cursor = db.cursor(dictionary=True)
+    assert reservations.reserve(cursor, 10, 1, 2, ttl=-60)
+    assert reservations.reserve(cursor, 11, 2, 1, ttl=-60)
+    assert reservations.reserve(cursor, 12, 2, 1, ttl=900)
+    db.commit()
+    expired = []
+    sweeper = ReservationSweeper(db.factory(), interval=0,
+                                 on_expired=lambda *touched: expired.append((touched, db.commits)))
+    assert sweeper.run_once()
+    # Called once the batch has committed
+    assert expired == [(([7, 17], [8, 18]), 2)]
+    assert sweeper.run_once()
+    assert len(expired) == 1
+
+
+def test_sweeper_runs_in_one_process_at_a_time(db):
+    assert reservations.reserve(db.cursor(dictionary=True), 10, 1, 2, ttl=-60)
+    db.commit()
+    sweeper = ReservationSweeper(db.factory(), interval=0)
+    db.locks[ReservationSweeper.lock_name] = 'another process'
+    assert sweeper.run_once()
+    assert sweeper.stats()['skipped'] == 1
+    assert reserved(db)[1] == 2
+
+    del db.locks[ReservationSweeper.lock_name]
+    assert sweeper.run_once()
+    assert reserved(db)[1] == 0
+    assert db.locks == {}
@@ -0,0 +1,43 @@
+from search import build_boolean_query, expand, search_clause, stem, tokenize
+
+
+def test_tokenize_strips_boolean_operators():
+    assert tokenize('+Nike -"Air" (max)*') == ['nike', 'air', 'max']
+    assert tokenize(None) == []
+
+
+def test_stem_keeps_a_common_prefix_of_inflections():
+    assert stem('dresses') == 'dress'
+    assert stem('hoodies') == stem('hoodie') == 'hood'
+    assert stem('clothing') == 'cloth'
+    assert stem('boys') == 'boy'  # vowel before y: not a -y suffix
+    assert stem('glass') == 'glass'
+    assert stem('2024') == '2024'
+
+
+def test_expand_adds_synonyms():
+    assert expand('takkies') == ['sneaker', 'takk', 'tekk', 'trainer']
+
+
+def test_every_term_is_required():
+    assert build_boolean_query('vintage takkies') == '+(vintage*) +(sneaker* takk* tekk* trainer*)'
+
+
+def test_short_words_stopwords_and_repeats_are_dropped():
+    assert build_boolean_query('the red red top') == '+(red*) +(top*)'
+    assert build_boolean_query('a to of') is None
+
+
+def test_search_clause_falls_back_to_prefix_like():
+    where, params, rank, rank_params = search_clause('xl')
+    assert 'LIKE' in where
+    assert params == ['xl%', 'xl%']
+    assert rank is None and rank_params == []
+
+
+def test_search_clause_ranks_name_matches_double():
+    where, params, rank, rank_params = search_clause('denim')
+    assert 'MATCH(p.name, p.brand, p.description)' in where
+    assert params == ['+(denim*)']
+    assert '* 2' in rank
+    assert rank_params == ['+(denim*)', '+(denim*)']
@@ -0,0 +1,86 @@
+import pytest
+
+import seller_stats
+from seller_stats import STAT_COLUMNS, SellerStatsReconciler
+
+SCHEMA = """
+CREATE TABLE sellers (id INTEGER PRIMARY KEY);
+CREATE TABLE products (id INTEGER PRIMARY KEY, seller_id INT);
+CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INT);
+CREATE TABLE order_items (id INTEGER PRIMARY KEY, order_id INT, seller_id INT, total_price INT, status TEXT);
+CREATE TABLE reviews (id INTEGER PRIMARY KEY, product_id INT, rating INT, is_approved BOOLEAN);
+CREATE TABLE seller_stats (id INTEGER PRIMARY KEY, seller_id INT UNIQUE, total_revenue INT DEFAULT 0,
+                           total_orders INT DEFAULT 0, total_products INT DEFAULT 0, pending_orders INT DEFAULT 0,
+                           total_customers INT DEFAULT 0, average_rating REAL DEFAULT 0, total_reviews INT DEFAULT 0);
+INSERT INTO sellers (id) VALUES (1), (2), (3);
+INSERT INTO products (id, seller_id) VALUES (10, 1), (11, 1), (20, 2);
+INSERT INTO orders (id, user_id) VALUES (100, 7), (101, 8), (102, 7);
+INSERT INTO order_items (order_id, seller_id, total_price, status) VALUES
+    (100, 1, 50, 'pending'), (100, 1, 30, 'confirmed'), (101, 1, 20, 'confirmed'), (102, 1, 40, 'cancelled'),
+    (101, 2, 15, 'pending');
+INSERT INTO reviews (product_id, rating, is_approved) VALUES (10, 5, TRUE), (11, 4, TRUE), (20, 1, FALSE);
+"""
+
+EXPECTED = {
+    1: (100, 2, 2, 1, 2, 4.5, 2),
+    2: (15, 1, 1, 1, 1, 0, 0),
+    3: (0, 0, 0, 0, 0, 0, 0),
+}
+
+
+@pytest.fixture
+def db(sqlite_connection):
+    return sqlite_connection(SCHEMA)
+
+
+def stats(db):
+    rows = db.query(f"SELECT seller_id, {', '.join(STAT_COLUMNS)} FROM seller_stats")
+    return {row[0]: row[1:] for row in rows}
+
+
+def test_reconcile_fills_in_missing_sellers(db):
+    # Seller 3 has nothing to count, so it gets no row
+    assert seller_stats.reconcile(db) == 2
+    assert stats(db) == {1: EXPECTED[1], 2: EXPECTED[2]}
+
+
+def test_reconcile_corrects_drift_seller_by_seller(db):
+    db.query("INSERT INTO seller_stats (seller_id, total_revenue, total_orders, total_products, pending_orders,"
+             " total_customers, average_rating, total_reviews) VALUES (1, 90, 2, 2, 1, 2, 4.5, 2), (2, 15, 1, 1, 1,"
+             " 1, 0, 0), (3, 5, 1, 0, 0, 0, 0, 0)")
+    db.commit()
+    commits = db.commits
+    assert seller_stats.reconcile(db) == 2
+    assert stats(db) == EXPECTED
+    # The read, then one short transaction per corrected seller
+    assert db.commits - commits == 3
+
+
+def test_reconcile_keeps_deltas_written_after_its_read(db):
+    seller_stats.reconcile(db)
+    db.query("UPDATE seller_stats SET total_revenue = total_revenue - 10 WHERE seller_id = 1")
+    # A checkout lands between the read and the correction
+    checkouts = ["UPDATE seller_stats SET total_revenue = total_revenue + 25 WHERE seller_id = 1"]
+    commit = db.commit
+
+    def commit_then_checkout():
+        commit()
+        while checkouts:
+            db.query(checkouts.pop())
+    db.commit = commit_then_checkout
+
+    assert seller_stats.reconcile(db) == 1
+    assert stats(db)[1][0] == 125
+
+
+def test_reconciler_runs_in_one_process_at_a_time(db):
+    reconciler = SellerStatsReconciler(db.factory(), interval=0)
+    db.locks[SellerStatsReconciler.lock_name] = 'another process'
+    assert reconciler.run_once()
+    assert stats(db) == {}
+    assert reconciler.stats()['skipped'] == 1
+
+    del db.locks[SellerStatsReconciler.lock_name]
+    assert reconciler.run_once()
+    assert reconciler.stats()['corrected'] == 2
+    assert db.locks == {}
@@ -0,0 +1,114 @@
+import json
+from datetime import timedelta
+
+import pytest
+
+flask = pytest.importorskip('flask')
+
+from cache import LocalCache  # noqa: E402
+from sessions import ProfileCache, ServerSessionInterface  # noqa: E402
+
+
+@pytest.fixture
+def store():
+    return LocalCache()
+
+
+@pytest.fixture
+def app(store):
+    app = flask.Flask(__name__)
+    app.config.update(SECRET_KEY='test', PERMANENT_SESSION_LIFETIME=timedelta(hours=1))
+    app.session_interface = ServerSessionInterface(store, refresh_after=60)
+
+    @app.post('/login/<int:user_id>')
+    def login(user_id):
+        flask.session.clear()
+        flask.session['user_id'] = user_id
+        return ''
+
+    @app.post('/logout')
+    def logout():
+        flask.session.clear()
+        return ''
+
+    @app.get('/me')
+    def me():
+        return {'user_id': flask.session.get('user_id')}
+    return app
+
+
+def session_cookie(response):
+    return next((value.split(';')[0].partition('=')[2] for value in response.headers.getlist('Set-Cookie')
+                 if value.startswith('session=')), None)
+
+
+def test_login_stores_the_session_server_side(app, store):
+    client = app.test_client()
+    sid = session_cookie(client.post('/login/7'))
+    assert sid
+    assert store.get(f'session:{sid}')['data']['user_id'] == 7
+    assert client.get('/me').json == {'user_id': 7}
+
+
+def test_anonymous_requests_get_no_session(app, store):
+    response = app.test_client().get('/me')
+    assert session_cookie(response) is None
+    assert store.stats()['entries'] == 0
+
+
+def test_sign_in_and_out_change_the_session_id(app, store):
+    client = app.test_client()
+    first = session_cookie(client.post('/login/7'))
+    second = session_cookie(client.post('/login/8'))
+    assert first != second
+    assert store.get(f'session:{first}') is None
+
+    client.post('/logout')
+    assert store.get(f'session:{second}') is None
+    assert client.get('/me').json == {'user_id': None}
+
+
+def test_unknown_session_ids_start_over(app):
+    client = app.test_client()
+    client.set_cookie('session', 'forged')
+    assert client.get('/me').json == {'user_id': None}
+    assert app.session_interface.stats()['unknown'] == 1
+
+
+def test_unchanged_sessions_are_not_written_back_until_refresh_after(app):
+    client = app.test_client()
+    client.post('/login/7')
+    assert session_cookie(client.get('/me')) is None
+    app.session_interface.refresh_after = 0
+    assert session_cookie(client.get('/me'))
+    assert app.session_interface.stats()['refreshed'] == 1
+
+
+@pytest.mark.parametrize('sid', ['abc', None])
+def test_profile_cache_hits_until_invalidated(store, sid):
+    profiles = ProfileCache(store, json.dumps, json.loads)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return {'full_name': f'Version {len(loads)}'}
+
+    assert profiles.get_or_load(sid, 'user', 7, load) == {'full_name': 'Version 1'}
+    assert profiles.get_or_load(sid, 'user', 7, load) == {'full_name': 'Version 1'}
+    profiles.invalidate('user', 7)
+    assert profiles.get_or_load(sid, 'user', 7, load) == {'full_name': 'Version 2'}
+    assert profiles.stats()['hits'] == 1
+
+
+def test_profile_cache_keeps_accounts_apart_without_a_session_id(store):
+    profiles = ProfileCache(store, json.dumps, json.loads)
+    profiles.get_or_load(None, 'user', 7, lambda: {'id': 7})
+    assert profiles.get_or_load(None, 'seller', 7, lambda: {'id': 'seller 7'}) == {'id': 'seller 7'}
+    assert profiles.get_or_load(None, 'user', 8, lambda: {'id': 8}) == {'id': 8}
+
+
+def test_profile_cache_forget(store):
+    profiles = ProfileCache(store, json.dumps, json.loads)
+    profiles.get_or_load('abc', 'user', 7, lambda: {'id': 7})
+    profiles.forget('abc')
+    assert profiles.get_or_load('abc', 'user', 7, lambda: {'id': 'reloaded'}) == {'id': 'reloaded'}
@@ -0,0 +1,64 @@
+import json
+import logging
+
+import pytest
+
+pytest.importorskip('flask')
+
+from structured_logging import (REDACTED, JsonFormatter, RedactingFilter, SamplingFilter,  # noqa: E402
+                                parse_levels, parse_rates, redact, redact_text)
+
+
+def record(msg, args=(), **extra):
+    entry = logging.LogRecord('app', logging.INFO, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(entry, key, value)
+    return entry
+
+
+def test_redact_masks_sensitive_keys_at_any_depth():
+    value = {'email': 'a@b.c', 'password': 'hunter2',
+             'items': [{'card_number': '4111', 'qty': 1}], 'headers': ('x', {'Authorization': 'Bearer t'})}
+    assert redact(value) == {'email': 'a@b.c', 'password': REDACTED,
+                             'items': [{'card_number': REDACTED, 'qty': 1}], 'headers': ('x', {'Authorization': REDACTED})}
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('login password=hunter2 ok', f'login password={REDACTED} ok'),
+    ("{'refresh_token': 'abc.def', 'user': 3}", f"{{'refresh_token': {REDACTED}, 'user': 3}}"),
+    ('GET /x?session_token=abc&page=2', f'GET /x?session_token={REDACTED}&page=2'),
+    ('nothing to hide', 'nothing to hide'),
+])
+def test_redact_text_masks_key_value_pairs(text, expected):
+    assert redact_text(text) == expected
+
+
+def test_redacting_filter_covers_message_args_and_extra():
+    entry = record('token=%s for %s', ('abc', {'password': 'x'}), api_secret='s3', user_id=5)
+    RedactingFilter().filter(entry)
+    assert entry.api_secret == REDACTED
+    assert entry.user_id == 5
+    assert entry.getMessage() == f"token={REDACTED} for {{'password': {REDACTED}}}"
+
+
+def test_json_formatter_includes_extra_fields():
+    entry = record('checkout', order_id=12)
+    line = json.loads(JsonFormatter().format(entry))
+    assert line['message'] == 'checkout'
+    assert line['order_id'] == 12
+    assert line['level'] == 'INFO'
+
+
+def test_sampling_keeps_warnings_and_resolves_parent_loggers(monkeypatch):
+    sampling = SamplingFilter({'app.views': 0.0})
+    quiet = logging.LogRecord('app.views.cache', logging.INFO, __file__, 1, 'x', (), None)
+    loud = logging.LogRecord('app.views.cache', logging.WARNING, __file__, 1, 'x', (), None)
+    other = logging.LogRecord('app.orders', logging.INFO, __file__, 1, 'x', (), None)
+    assert not sampling.filter(quiet)
+    assert sampling.filter(loud)
+    assert sampling.filter(other)
+
+
+def test_parse_specs():
+    assert parse_levels('werkzeug=warning, app=DEBUG,bad') == {'werkzeug': 'WARNING', 'app': 'DEBUG'}
+    assert parse_rates('app.views=0.1') == {'app.views': 0.1}
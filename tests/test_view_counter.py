@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+
+from view_counter import ViewCountBuffer
+
+
+class FakeConnection:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.executed = []
+        self.commits = 0
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params):
+        if self.fail:
+            raise RuntimeError('database is down')
+        self.executed.append((sql, list(params)))
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        pass
+
+
+def buffer(conn, **kwargs):
+    @contextmanager
+    def connection_factory():
+        yield conn
+    return ViewCountBuffer(connection_factory, **kwargs)
+
+
+def test_flush_writes_every_product_in_one_update():
+    conn = FakeConnection()
+    views = buffer(conn)
+    for product_id in (7, 3, 7, 7):
+        views.record(product_id)
+    assert views.pending(7) == 3
+
+    assert views.flush() == 4
+    (sql, params), = conn.executed
+    assert sql.startswith('UPDATE products SET view_count = view_count + CASE id WHEN %s THEN %s WHEN %s THEN %s')
+    assert params == [3, 1, 7, 3, 3, 7]
+    assert conn.commits == 1
+    assert views.pending(7) == 0
+    assert views.flush() == 0
+    assert len(conn.executed) == 1
+
+
+def test_flush_leaves_updated_at_alone():
+    conn = FakeConnection()
+    views = buffer(conn)
+    views.record(1)
+    views.flush()
+    assert 'updated_at = updated_at' in conn.executed[0][0]
+
+
+def test_failed_flush_keeps_the_views():
+    conn = FakeConnection(fail=True)
+    views = buffer(conn)
+    views.record(1)
+    views.record(1)
+    assert views.flush() == 0
+    views.record(1)
+    assert views.pending(1) == 3
+    assert views.stats()['failed_flushes'] == 1
+
+    conn.fail = False
+    assert views.flush() == 3
+
+
+def test_repeat_views_inside_the_window_are_collapsed():
+    views = buffer(FakeConnection(), dedupe_window=60, max_tracked_viewers=2)
+    views.record(1, viewer='a')
+    views.record(1, viewer='a')
+    views.record(2, viewer='a')
+    views.record(1, viewer=None)
+    assert views.pending(1) == 2
+    assert views.stats()['collapsed'] == 1
+    # Only the most recent viewers are remembered
+    views.record(3, viewer='b')
+    views.record(1, viewer='a')
+    assert views.pending(1) == 3
+
+
+def test_a_full_buffer_wakes_the_flusher():
+    views = buffer(FakeConnection(), max_pending=2)
+    views.record(1)
+    assert not views._wake.is_set()
+    views.record(2)
+    assert views._wake.is_set()
+
+
+def test_stop_flushes_what_is_pending():
+    conn = FakeConnection()
+    views = buffer(conn, flush_interval=60)
+    views.start()
+    views.record(5)
+    views.stop()
+    assert views.stats()['flushed'] == 1
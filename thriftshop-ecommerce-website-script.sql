@@ -12,7 +12,101 @@ UPDATE products SET featured = 1 WHERE id IN (1,2,3,4,5,6);
 SELECT id, name, images
 FROM products
 WHERE images LIKE '%.webf%';
-
-
-
-
+ALTER TABLE products ADD FULLTEXT INDEX ft_products_search (name, brand, description);
+ALTER TABLE products ADD FULLTEXT INDEX ft_products_name (name);
+CREATE INDEX idx_products_seller_created ON products(seller_id, created_at, id);
+CREATE INDEX idx_products_active_created ON products(is_active, created_at, id);
+CREATE INDEX idx_orders_user_created ON orders(user_id, created_at, id);
+CREATE INDEX idx_order_items_seller_order ON order_items(seller_id, order_id);
+ALTER TABLE seller_stats ADD COLUMN total_reviews INT DEFAULT 0 AFTER average_rating;
+-- Backfill the review counts the after_review_insert running average builds on
+UPDATE seller_stats ss
+    JOIN (SELECT pr.seller_id, AVG(rv.rating) AS average_rating, COUNT(*) AS reviews
+          FROM reviews rv
+                   JOIN products pr ON pr.id = rv.product_id
+          WHERE rv.is_approved = TRUE
+          GROUP BY pr.seller_id) r ON r.seller_id = ss.seller_id
+SET ss.total_reviews = r.reviews,
+    ss.average_rating = r.average_rating;
+ALTER TABLE products ADD COLUMN reserved_quantity INT DEFAULT 0 AFTER stock_quantity;
+CREATE TABLE stock_reservations (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL CHECK (quantity > 0),
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_reservation (user_id, product_id),
+    INDEX idx_reservations_expires (expires_at),
+    INDEX idx_reservations_product (product_id)
+);
+ALTER TABLE product_media ADD COLUMN variants JSON AFTER uploader_type;
+-- Content-addressed upload blobs (see media_store.py)
+CREATE TABLE media_blobs (
+    url VARCHAR(500) PRIMARY KEY,
+    sha256 CHAR(64) NOT NULL,
+    file_size BIGINT,
+    mime_type VARCHAR(100),
+    ref_count INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_released_at TIMESTAMP NULL,
+    INDEX idx_blobs_sha256 (sha256),
+    INDEX idx_blobs_unreferenced (ref_count, last_released_at)
+);
+CREATE INDEX idx_product_media_file_url ON product_media(file_url); -- media GC reference recount
+-- In-progress resumable uploads (see chunked_uploads.py)
+CREATE TABLE upload_sessions (
+    id CHAR(32) PRIMARY KEY,
+    seller_id INT NOT NULL,
+    product_id INT NOT NULL,
+    file_name VARCHAR(255) NOT NULL,
+    file_size BIGINT NOT NULL,
+    media_type ENUM('image', 'video') NOT NULL,
+    mime_type VARCHAR(100),
+    received_bytes BIGINT DEFAULT 0,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (seller_id) REFERENCES sellers(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+    INDEX idx_upload_sessions_expires (expires_at)
+);
+-- Ready-to-serve product JSON (see product_documents.py)
+CREATE TABLE product_documents (
+    product_id INT PRIMARY KEY,
+    document MEDIUMTEXT NOT NULL, -- JSON as served, minus the live stock/counter fields
+    summary TEXT, -- the document's listing-card fields (product_documents.SUMMARY_FIELDS)
+    built_at TIMESTAMP NOT NULL,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+    INDEX idx_product_documents_built (built_at)
+);
+-- Catalog ETag watermarks (see http_validators.py)
+CREATE INDEX idx_products_updated ON products(updated_at);
+CREATE INDEX idx_sellers_updated ON sellers(updated_at);
+-- Rows deleted from the catalog tables, kept by the after_*_delete triggers in thriftshop_sa_triggers.sql (see http_validators.py)
+CREATE TABLE catalog_deletes (
+    scope VARCHAR(32) PRIMARY KEY, -- 'products', 'sellers' or 'categories'
+    deletes BIGINT NOT NULL DEFAULT 0,
+    deleted_at TIMESTAMP(6) NULL
+);
+-- Facet filters on /api/products (see facets.py)
+CREATE INDEX idx_products_brand_created ON products(brand, created_at, id);
+CREATE INDEX idx_products_color_created ON products(color, created_at, id);
+CREATE INDEX idx_products_size_created ON products(size, created_at, id);
+CREATE INDEX idx_products_conditions_created ON products(conditions, created_at, id);
+-- Refresh tokens of bearer-token sign-ins (see auth_tokens.py); only their SHA-256 is stored
+CREATE TABLE auth_refresh_tokens (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    token_hash CHAR(64) NOT NULL UNIQUE,
+    family CHAR(32) NOT NULL, -- every token issued from one sign-in
+    account_type ENUM('user', 'seller') NOT NULL,
+    account_id INT NOT NULL, -- users.id or sellers.id, by account_type
+    expires_at TIMESTAMP NOT NULL,
+    used_at TIMESTAMP NULL, -- spent by a refresh; presenting it again revokes the family
+    revoked_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_auth_refresh_tokens_family (family),
+    INDEX idx_auth_refresh_tokens_account (account_type, account_id),
+    INDEX idx_auth_refresh_tokens_expires (expires_at)
+);
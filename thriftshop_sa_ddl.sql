@@ -8,6 +8,9 @@ DROP PROCEDURE IF EXISTS CalculateSellerStats;
 
 DROP TRIGGER IF EXISTS after_order_item_insert;
 DROP TRIGGER IF EXISTS after_review_insert;
+DROP TRIGGER IF EXISTS after_product_delete;
+DROP TRIGGER IF EXISTS after_seller_delete;
+DROP TRIGGER IF EXISTS after_category_delete;
 
 -- Drop Views
 DROP VIEW IF EXISTS product_details;
@@ -27,8 +30,14 @@ DROP TABLE IF EXISTS reviews;
 DROP TABLE IF EXISTS order_items;
 DROP TABLE IF EXISTS orders;
 DROP TABLE IF EXISTS wishlist;
+DROP TABLE IF EXISTS stock_reservations;
 DROP TABLE IF EXISTS cart;
 DROP TABLE IF EXISTS product_variants;
+DROP TABLE IF EXISTS catalog_deletes;
+DROP TABLE IF EXISTS product_documents;
+DROP TABLE IF EXISTS upload_sessions;
+DROP TABLE IF EXISTS auth_refresh_tokens;
+DROP TABLE IF EXISTS media_blobs;
 DROP TABLE IF EXISTS product_media;
 DROP TABLE IF EXISTS products;
 DROP TABLE IF EXISTS categories;
@@ -140,6 +149,7 @@ CREATE TABLE products (
     material VARCHAR(100),
     sku VARCHAR(100) UNIQUE,
     stock_quantity INT DEFAULT 1,
+    reserved_quantity INT DEFAULT 0, -- sum of active cart holds in stock_reservations
     min_order_quantity INT DEFAULT 1,
     max_order_quantity INT DEFAULT 10,
     weight DECIMAL(8,2) DEFAULT 0.5, -- in kg
@@ -162,7 +172,9 @@ CREATE TABLE products (
     INDEX idx_products_active (is_active),
     INDEX idx_products_featured (is_featured),
     INDEX idx_products_price (price),
-    INDEX idx_products_created (created_at)
+    INDEX idx_products_created (created_at),
+    FULLTEXT INDEX ft_products_search (name, brand, description),
+    FULLTEXT INDEX ft_products_name (name)
 );
 
 -- ============================
@@ -183,6 +195,7 @@ CREATE TABLE product_media (
     is_approved BOOLEAN DEFAULT TRUE,
     uploader_id INT, -- user/seller who uploaded
     uploader_type ENUM('seller', 'admin') DEFAULT 'seller',
+    variants JSON, -- resized WebP/AVIF derivatives (see media_derivatives.py)
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
     INDEX idx_media_product (product_id),
@@ -191,6 +204,69 @@ CREATE TABLE product_media (
     INDEX idx_media_sort (sort_order)
 );
 
+-- Content-addressed upload blobs (see media_store.py)
+CREATE TABLE media_blobs (
+    url VARCHAR(500) PRIMARY KEY,
+    sha256 CHAR(64) NOT NULL,
+    file_size BIGINT,
+    mime_type VARCHAR(100),
+    ref_count INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_released_at TIMESTAMP NULL,
+    INDEX idx_blobs_sha256 (sha256),
+    INDEX idx_blobs_unreferenced (ref_count, last_released_at)
+);
+
+-- Refresh tokens of bearer-token sign-ins (see auth_tokens.py); only their SHA-256 is stored
+CREATE TABLE auth_refresh_tokens (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    token_hash CHAR(64) NOT NULL UNIQUE,
+    family CHAR(32) NOT NULL, -- every token issued from one sign-in
+    account_type ENUM('user', 'seller') NOT NULL,
+    account_id INT NOT NULL, -- users.id or sellers.id, by account_type
+    expires_at TIMESTAMP NOT NULL,
+    used_at TIMESTAMP NULL, -- spent by a refresh; presenting it again revokes the family
+    revoked_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_auth_refresh_tokens_family (family),
+    INDEX idx_auth_refresh_tokens_account (account_type, account_id),
+    INDEX idx_auth_refresh_tokens_expires (expires_at)
+);
+
+-- In-progress resumable uploads (see chunked_uploads.py)
+CREATE TABLE upload_sessions (
+    id CHAR(32) PRIMARY KEY,
+    seller_id INT NOT NULL,
+    product_id INT NOT NULL,
+    file_name VARCHAR(255) NOT NULL,
+    file_size BIGINT NOT NULL,
+    media_type ENUM('image', 'video') NOT NULL,
+    mime_type VARCHAR(100),
+    received_bytes BIGINT DEFAULT 0,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (seller_id) REFERENCES sellers(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+    INDEX idx_upload_sessions_expires (expires_at)
+);
+
+-- Ready-to-serve product JSON (see product_documents.py)
+CREATE TABLE product_documents (
+    product_id INT PRIMARY KEY,
+    document MEDIUMTEXT NOT NULL, -- JSON as served, minus the live stock/counter fields
+    summary TEXT, -- the document's listing-card fields (product_documents.SUMMARY_FIELDS)
+    built_at TIMESTAMP NOT NULL,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+    INDEX idx_product_documents_built (built_at)
+);
+
+-- Rows deleted from the catalog tables, kept by the after_*_delete triggers (see http_validators.py)
+CREATE TABLE catalog_deletes (
+    scope VARCHAR(32) PRIMARY KEY, -- 'products', 'sellers' or 'categories'
+    deletes BIGINT NOT NULL DEFAULT 0,
+    deleted_at TIMESTAMP(6) NULL
+);
+
 -- ============================
 -- PRODUCT VARIANTS
 -- ============================
@@ -229,6 +305,21 @@ CREATE TABLE cart (
     INDEX idx_cart_product (product_id)
 );
 
+-- Time-limited stock holds for cart items (see reservations.py)
+CREATE TABLE stock_reservations (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL CHECK (quantity > 0),
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_reservation (user_id, product_id),
+    INDEX idx_reservations_expires (expires_at),
+    INDEX idx_reservations_product (product_id)
+);
+
 -- ============================
 -- WISHLIST
 -- ============================
@@ -433,6 +524,7 @@ CREATE TABLE seller_stats (
     pending_orders INT DEFAULT 0,
     total_customers INT DEFAULT 0,
     average_rating DECIMAL(3,2) DEFAULT 0.00,
+    total_reviews INT DEFAULT 0, -- approved reviews behind average_rating
     response_rate DECIMAL(5,2) DEFAULT 0.00, -- percentage
     cancellation_rate DECIMAL(5,2) DEFAULT 0.00, -- percentage
     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
@@ -644,10 +736,22 @@ LEFT JOIN seller_stats ss ON s.id = ss.seller_id
 WHERE s.status = 'approved';
 
 -- Create Indexes for better performance
+CREATE INDEX idx_products_seller_created ON products(seller_id, created_at, id);
+CREATE INDEX idx_products_active_created ON products(is_active, created_at, id);
+CREATE INDEX idx_orders_user_created ON orders(user_id, created_at, id);
+CREATE INDEX idx_order_items_seller_order ON order_items(seller_id, order_id);
 CREATE INDEX idx_product_media_product ON product_media(product_id);
+CREATE INDEX idx_product_media_file_url ON product_media(file_url); -- media GC reference recount
 CREATE INDEX idx_product_media_primary ON product_media(is_primary);
 CREATE INDEX idx_orders_dates ON orders(created_at, updated_at);
 CREATE INDEX idx_sellers_rating ON sellers(rating);
 CREATE INDEX idx_products_price_range ON products(price, is_active);
+CREATE INDEX idx_products_updated ON products(updated_at); -- catalog ETag watermark
+CREATE INDEX idx_sellers_updated ON sellers(updated_at);
+-- Facet filters on /api/products (see facets.py)
+CREATE INDEX idx_products_brand_created ON products(brand, created_at, id);
+CREATE INDEX idx_products_color_created ON products(color, created_at, id);
+CREATE INDEX idx_products_size_created ON products(size, created_at, id);
+CREATE INDEX idx_products_conditions_created ON products(conditions, created_at, id);
 CREATE INDEX idx_order_items_dates ON order_items(created_at);
 CREATE INDEX idx_reviews_dates ON reviews(created_at);
\ No newline at end of file
@@ -3,24 +3,16 @@
 -- ======================================================
 DROP TRIGGER IF EXISTS after_order_item_insert;
 DROP TRIGGER IF EXISTS after_review_insert;
+DROP TRIGGER IF EXISTS after_product_delete;
+DROP TRIGGER IF EXISTS after_seller_delete;
+DROP TRIGGER IF EXISTS after_category_delete;
 
 -- Start custom delimiter
 DELIMITER //
 
-CREATE TRIGGER after_order_item_insert
-AFTER INSERT ON order_items
-FOR EACH ROW
-BEGIN
-    -- Update product purchase count
-    UPDATE products 
-    SET purchase_count = purchase_count + NEW.quantity 
-    WHERE id = NEW.product_id;
-    
-    -- Update seller stats (Calls the stored procedure created earlier)
-    CALL CalculateSellerStats(NEW.seller_id);
-END//
-
-
+-- after_order_item_insert is gone: checkout decrements stock and bumps
+-- purchase_count in one statement, and seller stats are applied once per
+-- order by the application (seller_stats.record_checkout)
 
 CREATE TRIGGER after_review_insert
 AFTER INSERT ON reviews
@@ -35,10 +27,41 @@ BEGIN
     )
     WHERE p.id = NEW.product_id;
     
-    -- Update seller stats (Recalculate seller stats on new review)
-    CALL CalculateSellerStats(
-        (SELECT seller_id FROM products WHERE id = NEW.product_id LIMIT 1)
-    );
+    -- Fold the new rating into the seller's running average. Single-table UPDATE
+    -- assignments run left to right, so the average still sees the old count.
+    IF NEW.is_approved THEN
+        UPDATE seller_stats
+        SET average_rating = (average_rating * total_reviews + NEW.rating) / (total_reviews + 1),
+            total_reviews = total_reviews + 1
+        WHERE seller_id = (SELECT seller_id FROM products WHERE id = NEW.product_id);
+    END IF;
+END//
+
+-- Deletes leave MAX(updated_at) unchanged, so the catalog watermark counts them
+-- here (http_validators.py). Rows removed by a cascade fire no trigger; the
+-- delete they cascade from is counted instead.
+CREATE TRIGGER after_product_delete
+AFTER DELETE ON products
+FOR EACH ROW
+BEGIN
+    INSERT INTO catalog_deletes (scope, deletes, deleted_at) VALUES ('products', 1, NOW(6))
+    ON DUPLICATE KEY UPDATE deletes = deletes + 1, deleted_at = NOW(6);
+END//
+
+CREATE TRIGGER after_seller_delete
+AFTER DELETE ON sellers
+FOR EACH ROW
+BEGIN
+    INSERT INTO catalog_deletes (scope, deletes, deleted_at) VALUES ('sellers', 1, NOW(6))
+    ON DUPLICATE KEY UPDATE deletes = deletes + 1, deleted_at = NOW(6);
+END//
+
+CREATE TRIGGER after_category_delete
+AFTER DELETE ON categories
+FOR EACH ROW
+BEGIN
+    INSERT INTO catalog_deletes (scope, deletes, deleted_at) VALUES ('categories', 1, NOW(6))
+    ON DUPLICATE KEY UPDATE deletes = deletes + 1, deleted_at = NOW(6);
 END//
 
 -- Reset delimiter
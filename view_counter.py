@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCountBuffer:
+    """
+    Write-behind aggregator for products.view_count.
+
+    Views are counted in memory per product and written back as one
+    multi-row UPDATE every `flush_interval` seconds, or sooner once
+    `max_pending` views are waiting. Repeat views of the same product from the
+    same viewer inside `dedupe_window` seconds are collapsed into one.
+    """
+
+    def __init__(self, connection_factory, flush_interval=10.0, max_pending=1000,
+                 dedupe_window=0, max_tracked_viewers=100_000):
+        self.connection_factory = connection_factory
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dedupe_window = dedupe_window
+        self.max_tracked_viewers = max_tracked_viewers
+
+        self._pending = {}
+        self._pending_total = 0
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        self._stats = {'recorded': 0, 'collapsed': 0, 'flushed': 0, 'flushes': 0, 'failed_flushes': 0}
+
+    def _seen_recently(self, product_id, viewer, now):
+        """Remember (viewer, product) and report whether it was viewed inside the window"""
+        key = (viewer, product_id)
+        last_seen = self._recent.get(key)
+        if last_seen is not None and now - last_seen < self.dedupe_window:
+            return True
+        self._recent[key] = now
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.max_tracked_viewers:
+            self._recent.popitem(last=False)
+        return False
+
+    def record(self, product_id, viewer=None):
+        now = time.monotonic()
+        with self._lock:
+            if viewer is not None and self.dedupe_window and self._seen_recently(product_id, viewer, now):
+                self._stats['collapsed'] += 1
+                return
+            self._pending[product_id] = self._pending.get(product_id, 0) + 1
+            self._pending_total += 1
+            self._stats['recorded'] += 1
+            full = self._pending_total >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def pending(self, product_id):
+        """Views recorded for a product that have not reached the database yet"""
+        with self._lock:
+            return self._pending.get(product_id, 0)
+
+    def flush(self):
+        """Write all pending counts in one statement; returns the number of views written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._pending_total = 0
+            if not batch:
+                return 0
+
+            # Fixed id order keeps concurrent flushes from deadlocking on row locks
+            ids = sorted(batch)
+            cases = ' '.join('WHEN %s THEN %s' for _ in ids)
+            placeholders = ', '.join(['%s'] * len(ids))
+            params = [v for product_id in ids for v in (product_id, batch[product_id])] + ids
+            # updated_at is pinned: view counts are not edits, and the catalog watermark,
+            # listing ETags and the document refresher all go by updated_at
+            query = (f"UPDATE products SET view_count = view_count + CASE id {cases} END, updated_at = updated_at "
+                     f"WHERE id IN ({placeholders})")
+
+            try:
+                with self.connection_factory() as conn:
+                    cursor = conn.cursor()
+                    try:
+                        cursor.execute(query, params)
+                        conn.commit()
+                    finally:
+                        cursor.close()
+            except Exception as err:
+                logger.error(f'View count flush failed, keeping {sum(batch.values())} views: {err}')
+                with self._lock:
+                    for product_id, count in batch.items():
+                        self._pending[product_id] = self._pending.get(product_id, 0) + count
+                        self._pending_total += count
+                    self._stats['failed_flushes'] += 1
+                return 0
+
+            written = sum(batch.values())
+            with self._lock:
+                self._stats['flushed'] += written
+                self._stats['flushes'] += 1
+            return written
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='view-count-flusher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background flusher and write whatever is still pending"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({'pending': self._pending_total, 'pending_products': len(self._pending)})
+        return stats